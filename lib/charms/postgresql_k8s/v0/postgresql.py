@@ -20,11 +20,19 @@ Any charm using this library should import the `psycopg2` or `psycopg2-binary` d
 """
 
 import logging
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Set, Tuple
 
 import psycopg2
 from ops.model import Relation
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS,
+)
 from psycopg2.sql import SQL, Composed, Identifier, Literal
 
 # The unique Charmhub library identifier, never change it
@@ -35,7 +43,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 58
+LIBPATCH = 59
 
 # Groups to distinguish HBA access
 ACCESS_GROUP_IDENTITY = "identity_access"
@@ -66,6 +74,53 @@ DEPENDENCY_PLUGINS = set()
 for dependencies in REQUIRED_PLUGINS.values():
     DEPENDENCY_PLUGINS |= set(dependencies)
 
+# Value of pgaudit.log set when the pgaudit plugin is enabled.
+PGAUDIT_LOG = "ROLE,DDL,MISC,MISC_SET"
+# Databases where the extensions are checked and changed at the same time.
+EXTENSIONS_MAX_WORKERS = 8
+# Objects whose ownership is transferred in the same transaction, and the time after
+# which the transaction is committed even if it has fewer objects.
+OWNERSHIP_CHUNK_SIZE = 1000
+OWNERSHIP_CHUNK_SECONDS = 5
+# Time after which the transfer of the ownership stops, to be resumed in a later hook.
+OWNERSHIP_TRANSFER_SECONDS = 60
+
+# Roles owning objects only in the current database (and not too many of them), which
+# can hand all of them over to another role with a single REASSIGN OWNED. As REASSIGN
+# OWNED also hands over schemas, types, etc., only the roles owning nothing but the
+# objects listed by OWNED_OBJECTS_QUERY qualify, so the result doesn't depend on
+# which of the two ways transferred the ownership.
+REASSIGNABLE_OWNERS_QUERY = """SELECT r.rolname FROM pg_catalog.pg_shdepend d
+JOIN pg_catalog.pg_roles r ON r.oid = d.refobjid
+WHERE d.deptype = 'o' AND d.refclassid = 'pg_catalog.pg_authid'::regclass
+AND d.dbid = (SELECT oid FROM pg_catalog.pg_database WHERE datname = current_database())
+AND NOT r.rolsuper AND NOT r.rolname = ANY({})
+AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_shdepend o
+WHERE o.refobjid = r.oid AND o.refclassid = d.refclassid AND o.deptype = 'o' AND o.dbid <> d.dbid)
+AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_shdepend o
+LEFT JOIN pg_catalog.pg_class c ON o.classid = 'pg_catalog.pg_class'::regclass AND c.oid = o.objid
+WHERE o.refobjid = r.oid AND o.refclassid = d.refclassid AND o.deptype = 'o' AND o.dbid = d.dbid
+AND (o.classid NOT IN ('pg_catalog.pg_class'::regclass, 'pg_catalog.pg_proc'::regclass)
+OR c.relkind NOT IN ('r', 'p', 'S', 'v')))
+GROUP BY r.rolname HAVING count(*) <= {} ORDER BY r.rolname;"""
+# Tables, sequences (not linked to a table column), functions, procedures, aggregates
+# and views of the current database not owned by the role yet.
+OWNED_OBJECTS_QUERY = """WITH target AS (SELECT oid FROM pg_catalog.pg_roles WHERE rolname = {})
+SELECT kind, name FROM (
+SELECT 1 AS index, CASE c.relkind WHEN 'S' THEN 'SEQUENCE' WHEN 'v' THEN 'VIEW' ELSE 'TABLE' END AS kind,
+format('%I.%I', n.nspname, c.relname) AS name
+FROM pg_catalog.pg_class c JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p', 'S', 'v') AND c.relowner <> (SELECT oid FROM target)
+AND n.nspname NOT LIKE 'pg\\_%' AND n.nspname <> 'information_schema'
+AND (c.relkind <> 'S' OR NOT EXISTS (SELECT 1 FROM pg_catalog.pg_depend dep
+WHERE dep.classid = 'pg_catalog.pg_class'::regclass AND dep.objid = c.oid AND dep.deptype IN ('a', 'i')))
+UNION ALL SELECT 2 AS index, CASE p.prokind WHEN 'p' THEN 'PROCEDURE' WHEN 'a' THEN 'AGGREGATE' ELSE 'FUNCTION' END AS kind,
+format('%I.%I(%s)', n.nspname, p.proname, pg_catalog.pg_get_function_identity_arguments(p.oid)) AS name
+FROM pg_catalog.pg_proc p JOIN pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+WHERE p.prokind IN ('f', 'p', 'a') AND p.proowner <> (SELECT oid FROM target)
+AND n.nspname NOT LIKE 'pg\\_%' AND n.nspname <> 'information_schema'
+) AS objects ORDER BY index, kind, name;"""
+
 logger = logging.getLogger(__name__)
 
 
@@ -147,25 +202,27 @@ class PostgreSQL:
         self.password = password
         self.database = database
         self.system_users = system_users if system_users else []
+        # Connections are cached by (host, database) and shared by all the operations
+        # until close_connections is called (e.g. at the end of the hook); a cached
+        # connection closed by its user is opened again on the next use. The lock guards
+        # the cache and the counter, as the extensions are handled by parallel workers.
+        self._connections: Dict[Tuple[str, str], psycopg2.extensions.connection] = {}
+        self._connections_lock = threading.Lock()
+        self.connections_opened = 0
 
     def _configure_pgaudit(self, enable: bool) -> None:
-        connection = None
-        try:
-            connection = self._connect_to_database()
-            connection.autocommit = True
-            with connection.cursor() as cursor:
-                if enable:
-                    cursor.execute("ALTER SYSTEM SET pgaudit.log = 'ROLE,DDL,MISC,MISC_SET';")
-                    cursor.execute("ALTER SYSTEM SET pgaudit.log_client TO off;")
-                    cursor.execute("ALTER SYSTEM SET pgaudit.log_parameter TO off;")
-                else:
-                    cursor.execute("ALTER SYSTEM RESET pgaudit.log;")
-                    cursor.execute("ALTER SYSTEM RESET pgaudit.log_client;")
-                    cursor.execute("ALTER SYSTEM RESET pgaudit.log_parameter;")
-                cursor.execute("SELECT pg_reload_conf();")
-        finally:
-            if connection is not None:
-                connection.close()
+        connection = self._connect_to_database()
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            if enable:
+                cursor.execute(f"ALTER SYSTEM SET pgaudit.log = '{PGAUDIT_LOG}';")
+                cursor.execute("ALTER SYSTEM SET pgaudit.log_client TO off;")
+                cursor.execute("ALTER SYSTEM SET pgaudit.log_parameter TO off;")
+            else:
+                cursor.execute("ALTER SYSTEM RESET pgaudit.log;")
+                cursor.execute("ALTER SYSTEM RESET pgaudit.log_client;")
+                cursor.execute("ALTER SYSTEM RESET pgaudit.log_parameter;")
+            cursor.execute("SELECT pg_reload_conf();")
 
     def _connect_to_database(
         self, database: Optional[str] = None, database_host: Optional[str] = None
@@ -181,16 +238,85 @@ class PostgreSQL:
              psycopg2 connection object.
         """
         host = database_host if database_host is not None else self.primary_host
-        connection = psycopg2.connect(
-            f"dbname='{database if database else self.database}' user='{self.user}' host='{host}'"
-            f"password='{self.password}' connect_timeout=1"
-        )
+        database = database if database else self.database
+        with self._connections_lock:
+            connection = self._connections.get((host, database))
+        if connection is not None and self._is_connection_reusable(
+            connection, host == self.primary_host
+        ):
+            return connection
+
+        connection = self._open_connection(database, host)
         connection.autocommit = True
+        with self._connections_lock:
+            self._connections[(host, database)] = connection
+            self.connections_opened += 1
         return connection
 
+    def _open_connection(self, database: str, host: str) -> psycopg2.extensions.connection:
+        """Opens a new connection to a database."""
+        return psycopg2.connect(
+            f"dbname='{database}' user='{self.user}' host='{host}'"
+            f"password='{self.password}' connect_timeout=1"
+        )
+
+    @staticmethod
+    def _is_connection_reusable(connection: psycopg2.extensions.connection, primary: bool) -> bool:
+        """Returns whether a cached connection can be reused, resetting it if needed.
+
+        The connection is checked with a query before being reused, so a connection
+        broken since it was opened (e.g. by a restart) is replaced. The connections to the
+        primary host must also still reach the primary, as the host may have moved to
+        another member (after a switchover or a failover) since they were opened.
+        """
+        if connection.closed:
+            return False
+        try:
+            if connection.info.transaction_status in [
+                TRANSACTION_STATUS_INTRANS,
+                TRANSACTION_STATUS_INERROR,
+            ]:
+                # The transactions are opened with an explicit BEGIN (the connections are
+                # in autocommit mode), so connection.rollback() would be a no-op.
+                with connection.cursor() as cursor:
+                    cursor.execute(SQL("ROLLBACK;"))
+            if connection.info.transaction_status == TRANSACTION_STATUS_IDLE:
+                with connection.cursor() as cursor:
+                    cursor.execute(SQL("SELECT pg_is_in_recovery();"))
+                    if not primary or not cursor.fetchone()[0]:
+                        return True
+                logger.debug("Replacing a connection to a member that is no longer the primary")
+        except psycopg2.Error as e:
+            logger.debug(f"Replacing a broken connection: {e}")
+        # The connection is broken, busy or reaches a replica, so discard it.
+        try:
+            connection.close()
+        except psycopg2.Error as e:
+            logger.debug(f"Failed to close connection: {e}")
+        return False
+
+    def _release_connection(self, database: str) -> None:
+        """Close the cached connection to a database of the primary, if it's not the default one."""
+        if database == self.database:
+            return
+        with self._connections_lock:
+            connection = self._connections.pop((self.primary_host, database), None)
+        if connection is not None:
+            connection.close()
+
+    def close_connections(self) -> None:
+        """Close all the cached connections."""
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            try:
+                connection.close()
+            except psycopg2.Error as e:
+                logger.debug(f"Failed to close connection: {e}")
+
     def create_access_groups(self) -> None:
         """Create access groups to distinguish HBA authentication methods."""
-        connection = None
         try:
             with self._connect_to_database() as connection, connection.cursor() as cursor:
                 for group in ACCESS_GROUPS:
@@ -207,9 +333,6 @@ class PostgreSQL:
         except psycopg2.Error as e:
             logger.error(f"Failed to create access groups: {e}")
             raise PostgreSQLCreateGroupError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def create_database(
         self,
@@ -217,7 +340,7 @@ class PostgreSQL:
         user: str,
         plugins: Optional[List[str]] = None,
         client_relations: Optional[List[Relation]] = None,
-    ) -> None:
+    ) -> bool:
         """Creates a new database and grant privileges to a user on it.
 
         Args:
@@ -225,6 +348,11 @@ class PostgreSQL:
             user: user that will have access to the database.
             plugins: extensions to enable in the new database.
             client_relations: current established client relations.
+
+        Returns:
+            whether the database is ready, or the transfer of the ownership of its
+                objects to the user ran out of time and must be resumed by calling
+                this method again.
         """
         plugins = plugins if plugins else []
         client_relations = client_relations if client_relations else []
@@ -257,6 +385,10 @@ class PostgreSQL:
                     "SELECT schema_name FROM information_schema.schemata WHERE schema_name NOT LIKE 'pg_%' and schema_name <> 'information_schema';"
                 )
                 schemas = [row[0] for row in curs.fetchall()]
+                if relations_accessing_this_database == 1 and not self._transfer_ownership(
+                    curs, user
+                ):
+                    return False
                 statements = self._generate_database_privileges_statements(
                     relations_accessing_this_database, schemas, user
                 )
@@ -265,10 +397,14 @@ class PostgreSQL:
         except psycopg2.Error as e:
             logger.error(f"Failed to create database: {e}")
             raise PostgreSQLCreateDatabaseError() from e
+        finally:
+            # Don't keep a connection per database when they are created in a batch.
+            self._release_connection(database)
 
         # Enable preset extensions
         if plugins:
             self.enable_disable_extensions(dict.fromkeys(plugins, True), database)
+        return True
 
     def create_user(
         self,
@@ -285,61 +421,106 @@ class PostgreSQL:
             admin: whether the user should have additional admin privileges.
             extra_user_roles: additional privileges and/or roles to be assigned to the user.
         """
+        self.create_users({user: (password, extra_user_roles)}, admin)
+
+    def create_users(
+        self,
+        users: Dict[str, Tuple[Optional[str], Optional[List[str]]]],
+        admin: bool = False,
+    ) -> None:
+        """Creates (or updates) database users in a single transaction.
+
+        Args:
+            users: password and extra user roles (additional privileges and/or
+                roles) to be assigned to each user.
+            admin: whether the users should have additional admin privileges.
+
+        Raises:
+            PostgreSQLCreateUserError if any of the users fails to be created
+                (then none of them is created).
+        """
         try:
-            # Separate roles and privileges from the provided extra user roles.
-            admin_role = False
-            roles = privileges = None
-            if extra_user_roles:
-                admin_role = PERMISSIONS_GROUP_ADMIN in extra_user_roles
+            valid_privileges = valid_roles = None
+            if any(extra_user_roles for _, extra_user_roles in users.values()):
                 valid_privileges, valid_roles = self.list_valid_privileges_and_roles()
-                roles = [
-                    role
-                    for role in extra_user_roles
-                    if role in valid_roles and role != PERMISSIONS_GROUP_ADMIN
-                ]
-                privileges = {
-                    extra_user_role
-                    for extra_user_role in extra_user_roles
-                    if extra_user_role not in roles and extra_user_role != PERMISSIONS_GROUP_ADMIN
-                }
-                invalid_privileges = [
-                    privilege for privilege in privileges if privilege not in valid_privileges
-                ]
-                if "relation_access" in invalid_privileges:
-                    logger.warning("Extra user role relation_access not available. Skipping role.")
-                    invalid_privileges.remove("relation_access")
-                    privileges.remove("relation_access")
-                if len(invalid_privileges) > 0:
-                    logger.error(f"Invalid extra user roles: {', '.join(privileges)}")
-                    raise PostgreSQLCreateUserError(INVALID_EXTRA_USER_ROLE_BLOCKING_MESSAGE)
 
             with self._connect_to_database() as connection, connection.cursor() as cursor:
-                # Create or update the user.
                 cursor.execute(
-                    SQL("SELECT TRUE FROM pg_roles WHERE rolname={};").format(Literal(user))
+                    SQL("SELECT rolname FROM pg_roles WHERE rolname = ANY({});").format(
+                        Literal(list(users))
+                    )
                 )
-                if cursor.fetchone() is not None:
-                    user_definition = "ALTER ROLE {}"
-                else:
-                    user_definition = "CREATE ROLE {}"
-                user_definition += f"WITH {'NOLOGIN' if user == 'admin' else 'LOGIN'}{' SUPERUSER' if admin else ''} ENCRYPTED PASSWORD '{password}'{'IN ROLE admin CREATEDB' if admin_role else ''}"
-                if privileges:
-                    user_definition += f" {' '.join(privileges)}"
+                existing_users = {row[0] for row in cursor.fetchall()}
+                statements = []
+                for user, (password, extra_user_roles) in users.items():
+                    statements.extend(
+                        self._user_statements(
+                            user,
+                            password,
+                            admin,
+                            extra_user_roles,
+                            user in existing_users,
+                            valid_privileges,
+                            valid_roles,
+                        )
+                    )
                 cursor.execute(SQL("BEGIN;"))
                 cursor.execute(SQL("SET LOCAL log_statement = 'none';"))
-                cursor.execute(SQL(f"{user_definition};").format(Identifier(user)))
+                for statement in statements:
+                    cursor.execute(statement)
                 cursor.execute(SQL("COMMIT;"))
-
-                # Add extra user roles to the new user.
-                if roles:
-                    for role in roles:
-                        cursor.execute(
-                            SQL("GRANT {} TO {};").format(Identifier(role), Identifier(user))
-                        )
         except psycopg2.Error as e:
             logger.error(f"Failed to create user: {e}")
             raise PostgreSQLCreateUserError() from e
 
+    @staticmethod
+    def _user_statements(
+        user: str,
+        password: Optional[str],
+        admin: bool,
+        extra_user_roles: Optional[List[str]],
+        exists: bool,
+        valid_privileges: Optional[Set[str]],
+        valid_roles: Optional[Set[str]],
+    ) -> List[Composed]:
+        """Returns the statements creating or updating a user and granting its extra roles."""
+        # Separate roles and privileges from the provided extra user roles.
+        admin_role = False
+        roles = privileges = None
+        if extra_user_roles:
+            admin_role = PERMISSIONS_GROUP_ADMIN in extra_user_roles
+            roles = [
+                role
+                for role in extra_user_roles
+                if role in valid_roles and role != PERMISSIONS_GROUP_ADMIN
+            ]
+            privileges = {
+                extra_user_role
+                for extra_user_role in extra_user_roles
+                if extra_user_role not in roles and extra_user_role != PERMISSIONS_GROUP_ADMIN
+            }
+            invalid_privileges = [
+                privilege for privilege in privileges if privilege not in valid_privileges
+            ]
+            if "relation_access" in invalid_privileges:
+                logger.warning("Extra user role relation_access not available. Skipping role.")
+                invalid_privileges.remove("relation_access")
+                privileges.remove("relation_access")
+            if len(invalid_privileges) > 0:
+                logger.error(f"Invalid extra user roles: {', '.join(privileges)}")
+                raise PostgreSQLCreateUserError(INVALID_EXTRA_USER_ROLE_BLOCKING_MESSAGE)
+
+        user_definition = "ALTER ROLE {}" if exists else "CREATE ROLE {}"
+        user_definition += f"WITH {'NOLOGIN' if user == 'admin' else 'LOGIN'}{' SUPERUSER' if admin else ''} ENCRYPTED PASSWORD '{password}'{'IN ROLE admin CREATEDB' if admin_role else ''}"
+        if privileges:
+            user_definition += f" {' '.join(privileges)}"
+        statements = [SQL(f"{user_definition};").format(Identifier(user))]
+
+        # Add extra user roles to the user.
+        for role in roles or []:
+            statements.append(SQL("GRANT {} TO {};").format(Identifier(role), Identifier(user)))
+        return statements
+
     def delete_user(self, user: str) -> None:
         """Deletes a database user.
 
@@ -379,7 +560,6 @@ class PostgreSQL:
 
     def grant_internal_access_group_memberships(self) -> None:
         """Grant membership to the internal access-group to existing internal users."""
-        connection = None
         try:
             with self._connect_to_database() as connection, connection.cursor() as cursor:
                 for user in self.system_users:
@@ -392,9 +572,6 @@ class PostgreSQL:
         except psycopg2.Error as e:
             logger.error(f"Failed to grant internal access group memberships: {e}")
             raise PostgreSQLAssignGroupError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def grant_relation_access_group_memberships(self) -> None:
         """Grant membership to the relation access-group to existing relation users."""
@@ -402,7 +579,6 @@ class PostgreSQL:
         if not rel_users:
             return
 
-        connection = None
         try:
             with self._connect_to_database() as connection, connection.cursor() as cursor:
                 rel_groups = SQL(",").join(Identifier(group) for group in [ACCESS_GROUP_RELATION])
@@ -417,15 +593,15 @@ class PostgreSQL:
         except psycopg2.Error as e:
             logger.error(f"Failed to grant relation access group memberships: {e}")
             raise PostgreSQLAssignGroupError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def enable_disable_extensions(
         self, extensions: Dict[str, bool], database: Optional[str] = None
     ) -> None:
         """Enables or disables a PostgreSQL extension.
 
+        Only the extensions whose state differs from the requested one are created or
+        dropped. The databases are checked and changed in parallel, one connection each.
+
         Args:
             extensions: the name of the extensions.
             database: optional database where to enable/disable the extension.
@@ -433,15 +609,17 @@ class PostgreSQL:
         Raises:
             PostgreSQLEnableDisableExtensionError if the operation fails.
         """
-        connection = None
         try:
-            if database is not None:
-                databases = [database]
-            else:
-                # Retrieve all the databases.
-                with self._connect_to_database() as connection, connection.cursor() as cursor:
+            with self._connect_to_database() as connection, connection.cursor() as cursor:
+                if database is not None:
+                    databases = [database]
+                else:
+                    # Retrieve all the databases.
                     cursor.execute("SELECT datname FROM pg_database WHERE NOT datistemplate;")
-                    databases = {database[0] for database in cursor.fetchall()}
+                    databases = sorted(database[0] for database in cursor.fetchall())
+                cursor.execute("SELECT current_setting('pgaudit.log', true);")
+                row = cursor.fetchone()
+                pgaudit_enabled = row is not None and row[0] == PGAUDIT_LOG
 
             ordered_extensions = OrderedDict()
             for plugin in DEPENDENCY_PLUGINS:
@@ -449,29 +627,141 @@ class PostgreSQL:
             for extension, enable in extensions.items():
                 ordered_extensions[extension] = enable
 
-            self._configure_pgaudit(False)
-
-            # Enable/disabled the extension in each database.
-            for database in databases:
-                with self._connect_to_database(
-                    database=database
-                ) as connection, connection.cursor() as cursor:
-                    for extension, enable in ordered_extensions.items():
-                        cursor.execute(
-                            f"CREATE EXTENSION IF NOT EXISTS {extension};"
-                            if enable
-                            else f"DROP EXTENSION IF EXISTS {extension};"
-                        )
-            self._configure_pgaudit(ordered_extensions.get("pgaudit", False))
+            with ThreadPoolExecutor(
+                max_workers=min(EXTENSIONS_MAX_WORKERS, len(databases) or 1)
+            ) as executor:
+                changes = self._extension_changes(executor, databases, ordered_extensions)
+
+                # pgAudit is disabled while the extensions are created or dropped.
+                if changes and pgaudit_enabled:
+                    self._configure_pgaudit(False)
+                    pgaudit_enabled = False
+                # Consume the results, to raise the errors.
+                list(executor.map(self._apply_extension_changes, changes.keys(), changes.values()))
+            if pgaudit_enabled != ordered_extensions.get("pgaudit", False):
+                self._configure_pgaudit(ordered_extensions.get("pgaudit", False))
         except psycopg2.errors.UniqueViolation:
             pass
         except psycopg2.errors.DependentObjectsStillExist:
             raise
         except psycopg2.Error as e:
             raise PostgreSQLEnableDisableExtensionError() from e
+
+    def _extension_changes(
+        self,
+        executor: ThreadPoolExecutor,
+        databases: List[str],
+        extensions: Dict[str, bool],
+    ) -> Dict[str, List[Tuple[str, bool]]]:
+        """Returns the extensions to create or drop in each database, skipping the unchanged ones.
+
+        The names of the extensions may be quoted identifiers (e.g. '"uuid-ossp"'), while
+        pg_extension lists them unquoted.
+        """
+        changes = {}
+        for database, installed in zip(
+            databases, executor.map(self._list_installed_extensions, databases)
+        ):
+            database_changes = [
+                (extension, enable)
+                for extension, enable in extensions.items()
+                if enable != (extension.strip('"') in installed)
+            ]
+            if database_changes:
+                changes[database] = database_changes
+        return changes
+
+    def _list_installed_extensions(self, database: str) -> Set[str]:
+        """Returns the extensions installed in a database."""
+        try:
+            with self._connect_to_database(
+                database=database
+            ) as connection, connection.cursor() as cursor:
+                cursor.execute("SELECT extname FROM pg_extension;")
+                return {extension[0] for extension in cursor.fetchall()}
         finally:
-            if connection is not None:
-                connection.close()
+            self._release_connection(database)
+
+    def _apply_extension_changes(self, database: str, changes: List[Tuple[str, bool]]) -> None:
+        """Creates or drops extensions in a database."""
+        try:
+            with self._connect_to_database(
+                database=database
+            ) as connection, connection.cursor() as cursor:
+                for extension, enable in changes:
+                    cursor.execute(
+                        f"CREATE EXTENSION IF NOT EXISTS {extension};"
+                        if enable
+                        else f"DROP EXTENSION IF EXISTS {extension};"
+                    )
+        finally:
+            self._release_connection(database)
+
+    def _transfer_ownership(self, cursor, user: str) -> bool:
+        """Makes the user the owner of the objects of the database the cursor is connected to.
+
+        The roles owning only tables, sequences, views and functions, all of them in this
+        database, hand them over with a single REASSIGN OWNED. The objects of the other roles (like the operator user) are
+        transferred in chunks, each one committed as soon as it gets big or slow enough,
+        so the locks on the objects are not held until all of them are transferred.
+        Objects already owned by the user are skipped, so an interrupted transfer is
+        resumed where it stopped.
+
+        Returns:
+            whether all the objects were transferred, or the transfer stopped after
+                OWNERSHIP_TRANSFER_SECONDS.
+        """
+        cursor.execute(
+            SQL(REASSIGNABLE_OWNERS_QUERY).format(
+                Literal([user, self.user, PERMISSIONS_GROUP_ADMIN, *self.system_users]),
+                Literal(OWNERSHIP_CHUNK_SIZE),
+            )
+        )
+        for (owner,) in cursor.fetchall():
+            cursor.execute(
+                SQL("REASSIGN OWNED BY {} TO {};").format(Identifier(owner), Identifier(user))
+            )
+
+        cursor.execute(SQL(OWNED_OBJECTS_QUERY).format(Literal(user)))
+        objects = cursor.fetchall()
+        transferred = 0
+        start = time.monotonic()
+        while transferred < len(objects):
+            chunk_start = time.monotonic()
+            cursor.execute(SQL("BEGIN;"))
+            try:
+                for kind, name in objects[transferred : transferred + OWNERSHIP_CHUNK_SIZE]:
+                    # The names are quoted by the query that listed the objects.
+                    cursor.execute(
+                        SQL("ALTER {} {} OWNER TO {};").format(
+                            SQL(kind), SQL(name), Identifier(user)
+                        )
+                    )
+                    transferred += 1
+                    if time.monotonic() - chunk_start >= OWNERSHIP_CHUNK_SECONDS:
+                        break
+                cursor.execute(SQL("COMMIT;"))
+            except psycopg2.Error:
+                # Don't leave the connection in the aborted transaction (it's autocommit,
+                # so nothing else rolls it back).
+                try:
+                    cursor.execute(SQL("ROLLBACK;"))
+                except psycopg2.Error as e:
+                    logger.debug(f"Failed to roll back the ownership transfer: {e}")
+                raise
+            logger.info(
+                f"Transferred the ownership of {transferred}/{len(objects)} objects to {user}"
+                f" in {time.monotonic() - start:.1f}s"
+            )
+            if (
+                transferred < len(objects)
+                and time.monotonic() - start >= OWNERSHIP_TRANSFER_SECONDS
+            ):
+                logger.info(
+                    f"Stopping the transfer of the ownership to {user}, to resume it later"
+                )
+                return False
+        return True
 
     def _generate_database_privileges_statements(
         self, relations_accessing_this_database: int, schemas: List[str], user: str
@@ -479,35 +769,6 @@ class PostgreSQL:
         """Generates a list of databases privileges statements."""
         statements = []
         if relations_accessing_this_database == 1:
-            statements.append(
-                SQL(
-                    """DO $$
-DECLARE r RECORD;
-BEGIN
-  FOR r IN (SELECT statement FROM (SELECT 1 AS index,'ALTER TABLE '|| schemaname || '."' || tablename ||'" OWNER TO {};' AS statement
-FROM pg_tables WHERE NOT schemaname IN ('pg_catalog', 'information_schema')
-UNION SELECT 2 AS index,'ALTER SEQUENCE '|| sequence_schema || '."' || sequence_name ||'" OWNER TO {};' AS statement
-FROM information_schema.sequences WHERE NOT sequence_schema IN ('pg_catalog', 'information_schema')
-UNION SELECT 3 AS index,'ALTER FUNCTION '|| nsp.nspname || '."' || p.proname ||'"('||pg_get_function_identity_arguments(p.oid)||') OWNER TO {};' AS statement
-FROM pg_proc p JOIN pg_namespace nsp ON p.pronamespace = nsp.oid WHERE NOT nsp.nspname IN ('pg_catalog', 'information_schema') AND p.prokind = 'f'
-UNION SELECT 4 AS index,'ALTER PROCEDURE '|| nsp.nspname || '."' || p.proname ||'"('||pg_get_function_identity_arguments(p.oid)||') OWNER TO {};' AS statement
-FROM pg_proc p JOIN pg_namespace nsp ON p.pronamespace = nsp.oid WHERE NOT nsp.nspname IN ('pg_catalog', 'information_schema') AND p.prokind = 'p'
-UNION SELECT 5 AS index,'ALTER AGGREGATE '|| nsp.nspname || '."' || p.proname ||'"('||pg_get_function_identity_arguments(p.oid)||') OWNER TO {};' AS statement
-FROM pg_proc p JOIN pg_namespace nsp ON p.pronamespace = nsp.oid WHERE NOT nsp.nspname IN ('pg_catalog', 'information_schema') AND p.prokind = 'a'
-UNION SELECT 6 AS index,'ALTER VIEW '|| schemaname || '."' || viewname ||'" OWNER TO {};' AS statement
-FROM pg_catalog.pg_views WHERE NOT schemaname IN ('pg_catalog', 'information_schema')) AS statements ORDER BY index) LOOP
-      EXECUTE format(r.statement);
-  END LOOP;
-END; $$;"""
-                ).format(
-                    Identifier(user),
-                    Identifier(user),
-                    Identifier(user),
-                    Identifier(user),
-                    Identifier(user),
-                    Identifier(user),
-                )
-            )
             statements.append(
                 SQL(
                     "UPDATE pg_catalog.pg_largeobject_metadata\n"
@@ -646,7 +907,6 @@ END; $$;"""
         Returns:
             List of PostgreSQL database access groups.
         """
-        connection = None
         host = self.current_host if current_host else None
         try:
             with self._connect_to_database(
@@ -660,9 +920,6 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.error(f"Failed to list PostgreSQL database access groups: {e}")
             raise PostgreSQLListGroupsError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def list_accessible_databases_for_user(self, user: str, current_host=False) -> Set[str]:
         """Returns the list of accessible databases for a specific user.
@@ -676,7 +933,6 @@ END; $$;"""
             List of accessible database (the ones where
                 the user has the CONNECT privilege).
         """
-        connection = None
         host = self.current_host if current_host else None
         try:
             with self._connect_to_database(
@@ -699,9 +955,39 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.error(f"Failed to list accessible databases for user {user}: {e}")
             raise PostgreSQLListAccessibleDatabasesForUserError() from e
-        finally:
-            if connection is not None:
-                connection.close()
+
+    def list_accessible_databases_for_users(self, current_host=False) -> Dict[str, Set[str]]:
+        """Returns the accessible databases for all the users, in a single query.
+
+        Args:
+            current_host: whether to check the current host
+                instead of the primary host.
+
+        Returns:
+            Dictionary mapping each user to its accessible databases (the ones where
+                the user has the CONNECT privilege), or to {"all"} for superusers.
+        """
+        host = self.current_host if current_host else None
+        try:
+            with self._connect_to_database(
+                database_host=host
+            ) as connection, connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT u.usename, u.usesuper, "
+                    "array_remove(array_agg(d.datname ORDER BY d.datname), NULL) "
+                    "FROM pg_catalog.pg_user AS u "
+                    "LEFT JOIN pg_catalog.pg_database AS d ON NOT u.usesuper "
+                    "AND NOT d.datistemplate "
+                    "AND has_database_privilege(u.usesysid, d.oid, 'CONNECT') "
+                    "GROUP BY u.usename, u.usesuper ORDER BY u.usename;"
+                )
+                return {
+                    user: {"all"} if is_superuser else set(databases)
+                    for user, is_superuser, databases in cursor.fetchall()
+                }
+        except psycopg2.Error as e:
+            logger.error(f"Failed to list accessible databases for users: {e}")
+            raise PostgreSQLListUsersError() from e
 
     def list_users(self, group: Optional[str] = None, current_host=False) -> Set[str]:
         """Returns the list of PostgreSQL database users.
@@ -714,7 +1000,6 @@ END; $$;"""
         Returns:
             List of PostgreSQL database users.
         """
-        connection = None
         host = self.current_host if current_host else None
         try:
             with self._connect_to_database(
@@ -732,9 +1017,6 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.error(f"Failed to list PostgreSQL database users: {e}")
             raise PostgreSQLListUsersError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def list_users_from_relation(self, current_host=False) -> Set[str]:
         """Returns the list of PostgreSQL database users that were created by a relation.
@@ -746,7 +1028,6 @@ END; $$;"""
         Returns:
             List of PostgreSQL database users.
         """
-        connection = None
         host = self.current_host if current_host else None
         try:
             with self._connect_to_database(
@@ -763,9 +1044,6 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.error(f"Failed to list PostgreSQL database users: {e}")
             raise PostgreSQLListUsersError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def list_valid_privileges_and_roles(self) -> Tuple[Set[str], Set[str]]:
         """Returns two sets with valid privileges and roles.
@@ -784,7 +1062,6 @@ END; $$;"""
 
     def set_up_database(self) -> None:
         """Set up postgres database with the right permissions."""
-        connection = None
         cursor = None
         try:
             with self._connect_to_database() as connection, connection.cursor() as cursor:
@@ -810,8 +1087,6 @@ END; $$;"""
         finally:
             if cursor is not None:
                 cursor.close()
-            if connection is not None:
-                connection.close()
 
     def update_user_password(
         self, username: str, password: str, database_host: Optional[str] = None
@@ -826,7 +1101,6 @@ END; $$;"""
         Raises:
             PostgreSQLUpdateUserPasswordError if the password couldn't be changed.
         """
-        connection = None
         try:
             with self._connect_to_database(
                 database_host=database_host
@@ -842,13 +1116,9 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.error(f"Failed to update user password: {e}")
             raise PostgreSQLUpdateUserPasswordError() from e
-        finally:
-            if connection is not None:
-                connection.close()
 
     def is_restart_pending(self) -> bool:
         """Query pg_settings for pending restart."""
-        connection = None
         try:
             with self._connect_to_database(
                 database_host=self.current_host
@@ -861,9 +1131,6 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.error(f"Failed to check if restart is pending: {e}")
             return False
-        finally:
-            if connection:
-                connection.close()
 
     @staticmethod
     def build_postgresql_group_map(group_map: Optional[str]) -> List[Tuple]:
@@ -976,9 +1243,10 @@ END; $$;"""
             with self._connect_to_database(
                 database_host=self.current_host
             ) as connection, connection.cursor() as cursor:
+                # Only set it for the transaction, as the connection is reused.
                 cursor.execute(
                     SQL(
-                        "SET DateStyle to {};",
+                        "SET LOCAL DateStyle to {};",
                     ).format(Identifier(date_style))
                 )
             return True
@@ -1005,20 +1273,20 @@ END; $$;"""
         except ValueError:
             return False
 
-        for _, psql_group in group_map:
-            with self._connect_to_database() as connection, connection.cursor() as cursor:
-                query = SQL("SELECT TRUE FROM pg_roles WHERE rolname={};")
-                query = query.format(Literal(psql_group))
-                cursor.execute(query)
+        psql_groups = {psql_group for _, psql_group in group_map}
+        if not psql_groups:
+            return True
 
-                if cursor.fetchone() is None:
-                    return False
+        with self._connect_to_database() as connection, connection.cursor() as cursor:
+            query = SQL("SELECT rolname FROM pg_roles WHERE rolname = ANY({});")
+            query = query.format(Literal(sorted(psql_groups)))
+            cursor.execute(query)
+            existing_groups = {row[0] for row in cursor.fetchall()}
 
-        return True
+        return psql_groups <= existing_groups
 
     def is_user_in_hba(self, username: str) -> bool:
         """Check if user was added in pg_hba."""
-        connection = None
         try:
             with self._connect_to_database() as connection, connection.cursor() as cursor:
                 cursor.execute(
@@ -1030,6 +1298,3 @@ END; $$;"""
         except psycopg2.Error as e:
             logger.debug(f"Failed to check pg_hba: {e}")
             return False
-        finally:
-            if connection:
-                connection.close()
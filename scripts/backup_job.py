@@ -0,0 +1,138 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Service running a pgBackRest backup and reporting its progress."""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+STATE_FILE = "/home/postgres/backup-job.json"
+STDOUT_FILE = "/home/postgres/backup-job.log"
+# stdout is written in numbered segments of at least this size (the size of the parts of the
+# log uploaded to S3, which must be at least 5 MiB), uploaded and removed by the charm while
+# the backup runs.
+SEGMENT_SIZE = 8 * 1024 * 1024
+STDERR_FILE = "/home/postgres/backup-job.err"
+# Minimum interval (in seconds) between two writes of the progress.
+STATE_INTERVAL = 5
+# Pebble notice letting the charm finish the job right away, rather than on the next
+# update-status (custom notices need Juju 3.4 or later).
+NOTICE_KEY = "canonical.com/postgresql-k8s/backup-job"
+# Pebble binary mounted in the workload container by Juju (it's not in the PATH).
+PEBBLE = "/charm/bin/pebble"
+
+# e.g. "P01 DETAIL: backup file /var/lib/postgresql/data/pgdata/base/1/1249 (440KB, 0.89%)
+# checksum ..." (newer pgBackRest versions also print the bundle before the size).
+BACKUP_FILE_PATTERN = re.compile(
+    r"backup file \S+ \((?:bundle [^,]*, )?(?P<size>[\d.]+)(?P<unit>[KMGTP]?B), (?P<percent>[\d.]+)%\)"
+)
+BACKUP_LABEL_PATTERN = re.compile(r"new backup label = (\S+)")
+# e.g. "P00 INFO: execute non-exclusive backup stop and wait for all WAL segments to archive"
+# (older pgBackRest versions print pg_stop_backup()), once all the files were copied.
+BACKUP_STOP_PATTERN = re.compile(r"execute (?:non-)?exclusive (?:backup stop|pg_stop_backup)")
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4, "PB": 1024**5}
+
+
+def write_state(state: dict) -> None:
+    """Atomically replace the state file, so the charm never reads a partial one."""
+    state["updated"] = time.time()
+    with open(f"{STATE_FILE}.tmp", "w") as file:
+        json.dump(state, file)
+    os.replace(f"{STATE_FILE}.tmp", STATE_FILE)
+
+
+def notify_charm(state: dict) -> None:
+    """Record a Pebble notice, keeping a failure in the state.
+
+    The charm still finishes the job on the next update-status when it isn't notified.
+    """
+    try:
+        result = subprocess.run(  # noqa: S603
+            [PEBBLE, "notify", NOTICE_KEY],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        error = str(e)
+    else:
+        if result.returncode == 0:
+            return
+        error = result.stderr.strip() or f"exit code {result.returncode}"
+    print(f"Failed to notify the charm: {error}")
+    state["notify-error"] = error
+    write_state(state)
+
+
+def main():
+    """Run the backup command, keeping its output and parsing its progress."""
+    job_id, command = sys.argv[1], sys.argv[2:]
+    state = {
+        "id": job_id,
+        "status": "running",
+        "started": time.time(),
+        "files-done": 0,
+        "bytes-done": 0,
+        "percent": 0.0,
+        "label": None,
+        "copied": False,
+        "segments": 0,
+        "exit-code": None,
+    }
+    write_state(state)
+    last_write = time.monotonic()
+
+    stdout = open(f"{STDOUT_FILE}.1", "w")  # noqa: SIM115
+    segment_size = 0
+    with open(STDERR_FILE, "w") as stderr:
+        process = subprocess.Popen(  # noqa: S603
+            command, stdout=subprocess.PIPE, stderr=stderr, text=True
+        )
+        for line in process.stdout:
+            stdout.write(line)
+            # Characters, so the segment has at least as many bytes.
+            segment_size += len(line)
+            if match := BACKUP_FILE_PATTERN.search(line):
+                state["files-done"] += 1
+                state["bytes-done"] += int(
+                    float(match.group("size")) * SIZE_UNITS[match.group("unit")]
+                )
+                state["percent"] = float(match.group("percent"))
+            elif state["label"] is None and (match := BACKUP_LABEL_PATTERN.search(line)):
+                state["label"] = match.group(1)
+            elif not state["copied"] and BACKUP_STOP_PATTERN.search(line):
+                # Let the charm restore the connectivity to the database right away.
+                state["copied"] = True
+                stdout.flush()
+                write_state(state)
+                last_write = time.monotonic()
+                notify_charm(state)
+            if segment_size >= SEGMENT_SIZE:
+                # Let the charm upload the segment right away.
+                stdout.close()
+                state["segments"] += 1
+                stdout = open(f"{STDOUT_FILE}.{state['segments'] + 1}", "w")  # noqa: SIM115
+                segment_size = 0
+                write_state(state)
+                last_write = time.monotonic()
+                notify_charm(state)
+            elif time.monotonic() - last_write >= STATE_INTERVAL:
+                stdout.flush()
+                write_state(state)
+                last_write = time.monotonic()
+        exit_code = process.wait()
+    stdout.close()
+
+    state["status"] = "succeeded" if exit_code == 0 else "failed"
+    state["exit-code"] = exit_code
+    write_state(state)
+    notify_charm(state)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Backup job watcher, for the Juju versions without Pebble custom notices."""
+
+import json
+import subprocess
+import sys
+from time import sleep
+
+from ops import pebble
+
+# Interval (in seconds) between two checks of the progress of the backup job.
+CHECK_INTERVAL = 5
+
+
+def dispatch(run_cmd, unit, charm_dir, custom_event):
+    """Use the input juju-run command to dispatch a custom event."""
+    dispatch_sub_cmd = "JUJU_DISPATCH_PATH=hooks/{} {}/dispatch"
+    # Input is generated by the charm
+    subprocess.run([run_cmd, "-u", unit, dispatch_sub_cmd.format(custom_event, charm_dir)])  # noqa: S603
+
+
+def check_backup_job(client, state_file, service, job_id):
+    """Progress of the backup job.
+
+    It's the status of the job, whether it copied all the files and the number of completed
+    segments of stdout.
+
+    The status is "stopped" when the service stopped without reporting its result.
+    """
+    try:
+        with client.pull(state_file) as file:
+            state = json.load(file)
+    except (pebble.Error, ValueError) as e:
+        print(f"Failed to read the progress of the backup job: {e}")
+        state = {}
+    if state.get("id") != job_id:
+        state = {}
+    status = state.get("status", "running")
+    if status == "running":
+        try:
+            if not client.get_services([service])[0].is_running():
+                status = "stopped"
+        except (pebble.Error, IndexError) as e:
+            print(f"Failed to check the backup job service: {e}")
+    return status, state.get("copied", False), state.get("segments", 0)
+
+
+def main():
+    """Main watch and dispatch loop.
+
+    Watch the progress of the backup job. When it copied all the files, completes a segment of
+    its output or exits, dispatch the change event. The watcher exits with the backup job.
+    """
+    socket_path, state_file, service, job_id, run_cmd, unit, charm_dir = sys.argv[1:]
+
+    client = pebble.Client(socket_path=socket_path)
+    previous = ("running", False, 0)
+    while previous[0] == "running":
+        sleep(CHECK_INTERVAL)
+        current = check_backup_job(client, state_file, service, job_id)
+        if current != previous:
+            dispatch(run_cmd, unit, charm_dir, "backup_job_changed")
+        previous = current
+
+
+if __name__ == "__main__":
+    main()
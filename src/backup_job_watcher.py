@@ -0,0 +1,118 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Backup job watcher, for the Juju versions without Pebble custom notices."""
+
+import logging
+import os
+import signal
+import subprocess
+import typing
+from pathlib import Path
+from sys import version_info
+
+from ops.framework import EventBase, EventSource, Object, StoredState
+
+from authorisation_rules_observer import AuthorisationRulesChangeCharmEvents
+from constants import BACKUP_JOB_STATE_FILE
+
+if typing.TYPE_CHECKING:
+    from charm import PostgresqlOperatorCharm
+
+logger = logging.getLogger(__name__)
+
+# File path for the spawned backup job watcher process to write logs.
+LOG_FILE_PATH = "/var/log/backup_job_watcher.log"
+# Pebble socket of the workload container, mounted in the charm container.
+PEBBLE_SOCKET_PATH = "/charm/containers/postgresql/pebble.socket"
+
+
+class BackupJobChangedEvent(EventBase):
+    """A custom event for the progress of the backup job (a completed segment or its exit)."""
+
+
+class PostgresqlCharmEvents(AuthorisationRulesChangeCharmEvents):
+    """A CharmEvents extension for the authorisation rules and backup job changes.
+
+    Includes :class:`BackupJobChangedEvent` in those that can be handled.
+    """
+
+    backup_job_changed = EventSource(BackupJobChangedEvent)
+
+
+class BackupJobWatcher(Object):
+    """Watches the backup job, dispatching an event when it progresses.
+
+    The backup job records a Pebble custom notice instead when Juju supports them (3.4+).
+
+    Args:
+        charm: the charm that is instantiating the library.
+        run_cmd: run command to use to dispatch events.
+    """
+
+    _stored = StoredState()
+
+    def __init__(self, charm: "PostgresqlOperatorCharm", run_cmd: str):
+        super().__init__(charm, "backup-job-watcher")
+
+        self._charm = charm
+        self._run_cmd = run_cmd
+        self._stored.set_default(pid=None)
+
+    def start_backup_job_watcher(self, job_id: str) -> None:
+        """Start the watcher of a backup job running in a new process."""
+        self.stop_backup_job_watcher()
+        logger.info("Starting the backup job watcher")
+
+        # We need to trick Juju into thinking that we are not running
+        # in a hook context, as Juju will disallow use of juju-run.
+        new_env = os.environ.copy()
+        new_env.pop("JUJU_CONTEXT_ID", None)
+        # Generate the venv path based on the existing lib path (for ops).
+        for loc in new_env["PYTHONPATH"].split(":"):
+            path = Path(loc)
+            venv_path = (
+                path
+                / ".."
+                / "venv"
+                / "lib"
+                / f"python{version_info.major}.{version_info.minor}"
+                / "site-packages"
+            )
+            if path.stem == "lib":
+                new_env["PYTHONPATH"] = f"{venv_path.resolve()}:{new_env['PYTHONPATH']}"
+                break
+
+        # Input is generated by the charm
+        process = subprocess.Popen(  # noqa: S603
+            [
+                "/usr/bin/python3",
+                "scripts/backup_job_watcher.py",
+                PEBBLE_SOCKET_PATH,
+                BACKUP_JOB_STATE_FILE,
+                self._charm.backup_service,
+                job_id,
+                self._run_cmd,
+                self._charm.unit.name,
+                self._charm.charm_dir,
+            ],
+            # File shouldn't close
+            stdout=open(LOG_FILE_PATH, "a"),  # noqa: SIM115
+            stderr=subprocess.STDOUT,
+            env=new_env,
+        )
+
+        self._stored.pid = process.pid
+        logger.info(f"Started backup job watcher process with PID {process.pid}")
+
+    def stop_backup_job_watcher(self) -> None:
+        """Stop the backup job watcher process, if it's still running."""
+        if self._stored.pid is None:
+            return
+
+        try:
+            os.kill(self._stored.pid, signal.SIGTERM)
+            logger.info(f"Stopped backup job watcher process with PID {self._stored.pid}")
+        except OSError:
+            pass
+        self._stored.pid = None
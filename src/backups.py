@@ -3,42 +3,55 @@
 
 """Backups implementation."""
 
+import hashlib
 import json
 import logging
 import os
 import re
-import tempfile
+import shlex
 import time
-from datetime import datetime, timezone
+from bisect import bisect_right
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
 from functools import cached_property
 from io import BytesIO
+from typing import IO, TypedDict
+from uuid import uuid4
 
-from boto3.session import Session
-from botocore.client import Config
 from botocore.exceptions import ClientError
-from botocore.loaders import create_loader
-from botocore.regions import EndpointResolver
 from charms.data_platform_libs.v0.s3 import CredentialsChangedEvent, S3Requirer
-from jinja2 import Template
 from lightkube import ApiError, Client
 from lightkube.resources.core_v1 import Endpoints
 from ops import HookEvent
 from ops.charm import ActionEvent
-from ops.framework import Object
+from ops.framework import Object, StoredState
 from ops.jujuversion import JujuVersion
-from ops.model import ActiveStatus, MaintenanceStatus
-from ops.pebble import ChangeError, ExecError
+from ops.model import MaintenanceStatus, ModelError
+from ops.pebble import APIError, ChangeError, ExecError, PathError
+from ops.pebble import ConnectionError as PebbleConnectionError
 from tenacity import RetryError, Retrying, stop_after_attempt, wait_fixed
 
 from constants import (
+    BACKUP_JOB_NOTICE,
+    BACKUP_JOB_SCRIPT,
+    BACKUP_JOB_STATE_FILE,
+    BACKUP_JOB_STDERR_FILE,
+    BACKUP_JOB_STDOUT_FILE,
     BACKUP_TYPE_OVERRIDES,
     BACKUP_USER,
+    PEER,
+    PGBACKREST_CATALOG_FILE,
     PGBACKREST_LOGROTATE_FILE,
     PGBACKREST_LOGS_PATH,
+    WAL_SEGMENT_SIZE,
     WORKLOAD_OS_GROUP,
     WORKLOAD_OS_USER,
 )
+from patroni import STARTED_STATES
+from profiling import instrument_k8s_client, retry_sleep
 from relations.async_replication import REPLICATION_CONSUMER_RELATION, REPLICATION_OFFER_RELATION
+from schedule import CronSchedule
+from utils import label2name, render_template
 
 logger = logging.getLogger(__name__)
 
@@ -56,20 +69,292 @@ S3_BLOCK_MESSAGES = [
 ]
 
 
+# Size of the parts of the backup logs uploaded to S3 (S3 requires at least 5 MiB per part),
+# also the size of the stdout segments written by the backup job (scripts/backup_job.py).
+BACKUP_LOG_PART_SIZE = 8 * 1024 * 1024
+# Connections kept open to S3 by a client, also the number of parts of a multipart
+# transfer sent at the same time.
+S3_MAX_POOL_CONNECTIONS = 10
+
+# Maximum age (in seconds) of the cached output of `pgbackrest info`, which also reports the
+# range of the WAL archive and the backups changed by other clusters sharing the repository.
+PGBACKREST_INFO_TTL = 300
+
+# Share of the database size changed since the last full backup from which the scheduled
+# backup is a full one.
+FULL_BACKUP_CHANGE_RATIO = 0.5
+# Share of the database size changed since the last full or differential backup from which
+# the scheduled backup is a differential one.
+DIFFERENTIAL_BACKUP_CHANGE_RATIO = 0.1
+# Maximum number of incremental backups restored on top of a full or differential one.
+MAX_INCREMENTAL_CHAIN = 6
+# How far back a missed backup schedule is still honoured (e.g. after a long hook).
+BACKUP_SCHEDULE_LOOKBACK = timedelta(days=1)
+# e.g. "P01 DETAIL: restore file /var/lib/postgresql/data/pgdata/base/1/1249 (440KB, 0.89%)
+# checksum ..." (the files kept by a delta restore are logged with "- exists and matches backup").
+RESTORE_FILE_PATTERN = re.compile(
+    r"restore file \S+ (?:- [^(]+)?\((?:bundle [^,]*, )?[\d.]+[KMGTP]?B, (?P<percent>[\d.]+)%\)"
+)
+# e.g. 'LOG:  restored log file "000000010000000000000003" from archive'.
+RESTORED_WAL_PATTERN = re.compile(r'restored log file "([0-9A-F]{24})" from archive')
+
+
 def is_s3_block_message(message: str) -> bool:
     """Check if a status message is an S3 block message (with possible error hint suffix)."""
     return any(message.startswith(block_msg) for block_msg in S3_BLOCK_MESSAGES)
 
 
+class BackupLogUpload:
+    """Logs of a backup job, uploaded to S3 while the job runs.
+
+    The job writes its stdout in segments of BACKUP_LOG_PART_SIZE, each uploaded as a part of
+    a multipart upload as soon as it's complete. The backup label, which gives the key of the
+    log, is only known later, so the parts are uploaded under a provisional key and the log is
+    copied to its final key once the job exits, with the last segment and stderr appended.
+    The state of the upload is kept between hooks.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, state: dict | None = None):
+        self._client = s3_client
+        self._bucket = bucket
+        self.key = key
+        self.state = {"upload-id": None, "parts": [], "failed": False, **(state or {})}
+
+    def upload_part(self, body: bytes) -> bool:
+        """Upload the next part of the log.
+
+        Returns:
+            a boolean indicating success.
+        """
+        if self.state["failed"]:
+            return False
+        if not self.state["parts"]:
+            body = b"Stdout:\n" + body
+        try:
+            if self.state["upload-id"] is None:
+                self.state["upload-id"] = self._client.create_multipart_upload(
+                    Bucket=self._bucket, Key=self.key
+                )["UploadId"]
+            part_number = len(self.state["parts"]) + 1
+            response = self._client.upload_part(
+                Bucket=self._bucket,
+                Key=self.key,
+                UploadId=self.state["upload-id"],
+                PartNumber=part_number,
+                Body=body,
+            )
+            self.state["parts"].append({"ETag": response["ETag"], "PartNumber": part_number})
+            return True
+        except Exception as e:
+            logger.exception(f"Failed to upload backup logs to S3 key={self.key}", exc_info=e)
+            self.abort()
+            return False
+
+    def finish(self, stdout: IO[bytes] | None, stderr: IO[bytes] | None, key: str) -> bool:
+        """Upload the rest of the log and move it to its final key.
+
+        Args:
+            stdout: the last segment of stdout, if it could be read.
+            stderr: the whole stderr, if it could be read.
+            key: S3 key of the log.
+
+        Returns:
+            a boolean indicating success.
+        """
+        if self.state["failed"]:
+            return False
+        body = bytearray()
+        try:
+            for file, header in [(stdout, b""), (stderr, b"\n\nStderr:\n")]:
+                body += header
+                while file is not None and (chunk := file.read(BACKUP_LOG_PART_SIZE)):
+                    body += chunk
+                    if len(body) >= BACKUP_LOG_PART_SIZE:
+                        if not self.upload_part(bytes(body)):
+                            return False
+                        body.clear()
+            body += b"\n"
+            if self.state["upload-id"] is None:
+                # The whole log fits in a single part, so it's stored under its key directly.
+                self._client.put_object(Bucket=self._bucket, Key=key, Body=b"Stdout:\n" + body)
+                return True
+            if not self.upload_part(bytes(body)):
+                return False
+            self._client.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=self.key,
+                UploadId=self.state["upload-id"],
+                MultipartUpload={"Parts": self.state["parts"]},
+            )
+            self.state["upload-id"] = None
+            self._client.copy_object(
+                Bucket=self._bucket, Key=key, CopySource={"Bucket": self._bucket, "Key": self.key}
+            )
+            self._client.delete_object(Bucket=self._bucket, Key=self.key)
+            return True
+        except Exception as e:
+            logger.exception(f"Failed to upload backup logs to S3 key={key}", exc_info=e)
+            self.abort()
+            return False
+
+    def abort(self) -> None:
+        """Discard the parts already uploaded, the rest of the log isn't uploaded anymore."""
+        self.state["failed"] = True
+        if self.state["upload-id"] is None:
+            return
+        try:
+            self._client.abort_multipart_upload(
+                Bucket=self._bucket, Key=self.key, UploadId=self.state["upload-id"]
+            )
+        except Exception as e:
+            logger.warning(f"Failed to abort the upload of the backup logs: {e}")
+        self.state["upload-id"] = None
+
+
+class RecoveryPlan(TypedDict):
+    """Backups and WAL range needed to restore to a point in time."""
+
+    backups: list[str]
+    wal_start: str
+    wal_stop: str | None
+
+
+class RecoveryIndex:
+    """Backups and timeline switches of the repository, sorted by time.
+
+    Timestamps are parsed once when the index is built, so lookups are binary searches.
+    """
+
+    def __init__(
+        self, points: dict[str, tuple[str, str]], backups: list[dict] | None = None
+    ) -> None:
+        """Build the index.
+
+        Args:
+            points: (stanza, timeline) of the backups and timeline switches, by id.
+            backups: successful backups, as listed by `pgbackrest info`.
+        """
+        # The ids are timestamps, so they sort chronologically.
+        ordered = sorted(points.items())
+        self._epochs = [
+            datetime.strptime(key, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+            for key, _ in ordered
+        ]
+        self._points = [value for _, value in ordered]
+        self._backups = sorted(backups or [], key=lambda backup: backup["timestamp"]["stop"])
+        self._backup_stops = [backup["timestamp"]["stop"] for backup in self._backups]
+
+    def latest(self) -> tuple[str, str] | None:
+        """(stanza, timeline) of the latest backup or timeline switch."""
+        return self._points[-1] if self._points else None
+
+    def nearest(self, epoch: float) -> tuple[str, str] | None:
+        """(stanza, timeline) of the latest backup or timeline switch at or before a time."""
+        index = bisect_right(self._epochs, epoch)
+        return self._points[index - 1] if index else None
+
+    def recovery_plan(self, epoch: float) -> RecoveryPlan | None:
+        """Backups and WAL range needed to reach a time, or None if no backup ended before it.
+
+        The WAL range ends, at the latest, with the first backup that ended after the time,
+        or with the latest archived segment if there is none.
+        """
+        index = bisect_right(self._backup_stops, epoch)
+        if not index:
+            return None
+        base = self._backups[index - 1]
+        return RecoveryPlan(
+            backups=[*(base.get("reference") or []), base["label"]],
+            wal_start=base["archive"]["start"],
+            wal_stop=(
+                self._backups[index]["archive"]["stop"] if index < len(self._backups) else None
+            ),
+        )
+
+
+def _wal_segment_number(segment: str) -> int:
+    """Position of a WAL segment (e.g. 000000010000000A000000FF) across timelines."""
+    return int(segment[8:16], 16) * 0x100 + int(segment[16:24], 16)
+
+
+def _wal_segment_lsn(segment: str) -> str:
+    """LSN of the start of a WAL segment (e.g. 0/A000000 for 00000001000000000000000A)."""
+    offset = int(segment[16:24], 16) * WAL_SEGMENT_SIZE * 1024 * 1024
+    return f"{int(segment[8:16], 16):X}/{offset:X}"
+
+
+def plan_backup_type(
+    repository_info: dict | None, retention_days: int | None = None, now: float | None = None
+) -> str:
+    """Type of the next scheduled backup, from the repository as listed by `pgbackrest info`.
+
+    The data changed since a backup is estimated from the WAL archived after it ended and
+    compared to the database size of the last full backup:
+
+    - full when there is no full backup, when the data changed since the last one reaches
+      FULL_BACKUP_CHANGE_RATIO or when it's older than half of the retention (so that the
+      retention window always starts with a full backup to restore from);
+    - differential when the data changed since the last full or differential backup reaches
+      DIFFERENTIAL_BACKUP_CHANGE_RATIO, or when the incremental backups since it reach
+      MAX_INCREMENTAL_CHAIN (bounding the backups and WAL replayed by a restore);
+    - incremental otherwise, which copies the least data.
+    """
+    backups = [
+        backup for backup in (repository_info or {}).get("backup", []) if not backup["error"]
+    ]
+    full_backups = [backup for backup in backups if backup["type"] == "full"]
+    if not full_backups:
+        return "full"
+    last_full = full_backups[-1]
+    if (
+        retention_days is not None
+        and now is not None
+        and now - last_full["timestamp"]["stop"] >= retention_days * 86400 / 2
+    ):
+        return "full"
+
+    archives = (repository_info or {}).get("archive") or [{}]
+    last_segment = archives[-1].get("max")
+    if not last_segment:
+        return "incremental"
+    database_size = last_full["info"]["size"] or 1
+
+    def changed_since(backup: dict) -> float:
+        segments = _wal_segment_number(last_segment) - _wal_segment_number(
+            backup["archive"]["stop"]
+        )
+        return max(segments, 0) * WAL_SEGMENT_SIZE * 1024 * 1024 / database_size
+
+    if changed_since(last_full) >= FULL_BACKUP_CHANGE_RATIO:
+        return "full"
+
+    reference = next(backup for backup in reversed(backups) if backup["type"] != "incr")
+    chain = len(backups) - 1 - backups.index(reference)
+    if changed_since(reference) >= DIFFERENTIAL_BACKUP_CHANGE_RATIO or (
+        chain >= MAX_INCREMENTAL_CHAIN
+    ):
+        return "differential"
+    return "incremental"
+
+
 class PostgreSQLBackups(Object):
     """In this class, we manage PostgreSQL backups."""
 
+    _stored = StoredState()
+
     def __init__(self, charm, relation_name: str):
         """Manager of PostgreSQL backups."""
         super().__init__(charm, "backup")
         self.charm = charm
+        # State of the upload of the logs of the running backup job and progress parsed from
+        # the restore logs, as JSON.
+        self._stored.set_default(backup_log="{}", restore_log="{}")
         self.relation_name = relation_name
         self.container = self.charm.unit.get_container("postgresql")
+        # S3 resources created during the hook, by credentials, region, endpoint and CA chain.
+        self._s3_resources = {}
+        # Recovery indexes built during the hook, by the repository listings they come from.
+        self._recovery_indexes = {}
 
         # s3 relation handles the config options for s3 backups
         self.s3_client = S3Requirer(self.charm, self.relation_name)
@@ -82,7 +367,17 @@ class PostgreSQLBackups(Object):
         self.framework.observe(self.s3_client.on.credentials_gone, self._on_s3_credential_gone)
         self.framework.observe(self.charm.on.create_backup_action, self._on_create_backup_action)
         self.framework.observe(self.charm.on.list_backups_action, self._on_list_backups_action)
+        self.framework.observe(
+            self.charm.on.get_backup_status_action, self._on_get_backup_status_action
+        )
         self.framework.observe(self.charm.on.restore_action, self._on_restore_action)
+        self.framework.observe(
+            self.charm.on[PEER].relation_changed, self._on_peer_relation_changed
+        )
+        self.framework.observe(
+            self.charm.on.postgresql_pebble_custom_notice, self._on_pebble_custom_notice
+        )
+        self.framework.observe(self.charm.on.backup_job_changed, self._on_backup_job_changed)
 
     @cached_property
     def stanza_name(self) -> str:
@@ -98,6 +393,24 @@ class PostgreSQLBackups(Object):
         return ""
 
     def _get_s3_session_resource(self, s3_parameters: dict):
+        """S3 resource for the parameters, reused for the rest of the hook.
+
+        boto3 is only imported here, so hooks that don't talk to S3 don't pay for it.
+        """
+        verify = self._tls_ca_chain_filename or None
+        key = (
+            s3_parameters["access-key"],
+            s3_parameters["secret-key"],
+            s3_parameters.get("region"),
+            s3_parameters.get("endpoint"),
+            verify,
+        )
+        if key in self._s3_resources:
+            return self._s3_resources[key]
+
+        from boto3.session import Session
+        from botocore.client import Config
+
         kwargs = {
             "aws_access_key_id": s3_parameters["access-key"],
             "aws_secret_access_key": s3_parameters["secret-key"],
@@ -105,16 +418,31 @@ class PostgreSQLBackups(Object):
         if "region" in s3_parameters:
             kwargs["region_name"] = s3_parameters["region"]
         session = Session(**kwargs)
-        return session.resource(
+        resource = session.resource(
             "s3",
             endpoint_url=self._construct_endpoint(s3_parameters),
-            verify=(self._tls_ca_chain_filename or None),
+            verify=verify,
             config=Config(
                 # https://github.com/boto/boto3/issues/4400#issuecomment-2600742103
                 request_checksum_calculation="when_required",
                 response_checksum_validation="when_required",
+                max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                tcp_keepalive=True,
             ),
         )
+        self._s3_resources[key] = resource
+        return resource
+
+    @staticmethod
+    def _s3_transfer_config():
+        """Transfer settings of the uploads and downloads, in parts of the size of the log parts."""
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=BACKUP_LOG_PART_SIZE,
+            multipart_chunksize=BACKUP_LOG_PART_SIZE,
+            max_concurrency=S3_MAX_POOL_CONNECTIONS,
+        )
 
     def _are_backup_settings_ok(self) -> tuple[bool, str | None]:
         """Validates whether backup settings are OK."""
@@ -152,6 +480,9 @@ class PostgreSQLBackups(Object):
         if self.charm.is_blocked:
             return False, "Unit is in a blocking state"
 
+        if self.is_backup_job_running:
+            return False, "A backup is already being created on this unit"
+
         tls_enabled = "tls" in self.charm.unit_peer_data
 
         # Check if this unit is the primary (if it was not possible to retrieve that information,
@@ -174,6 +505,9 @@ class PostgreSQLBackups(Object):
         if not self.charm._patroni.member_started:
             return False, "Unit cannot perform backups as it's not in running state"
 
+        if not is_primary and not self.charm._patroni.get_member_health()["healthy"]:
+            return False, "Unit cannot perform backups as it's lagging behind the primary"
+
         if "stanza" not in self.charm.app_peer_data:
             return False, "Stanza was not initialised"
 
@@ -249,6 +583,9 @@ class PostgreSQLBackups(Object):
         endpoint = s3_parameters["endpoint"]
 
         # Load endpoints data.
+        from botocore.loaders import create_loader
+        from botocore.regions import EndpointResolver
+
         loader = create_loader()
         data = loader.load_data("endpoints")
 
@@ -295,10 +632,25 @@ class PostgreSQLBackups(Object):
                 )
                 raise error
 
-    def _empty_data_files(self) -> None:
-        """Empty the PostgreSQL data directory in preparation of backup restore."""
+    def _empty_data_files(self) -> bool:
+        """Empty the PostgreSQL data directory in preparation of backup restore.
+
+        A valid data directory is moved aside (in the same volume) instead of removed, so
+        pgBackRest restores over it, only fetching the files that differ from the backup.
+
+        Returns:
+            whether the previous data files were kept for a delta restore.
+        """
         try:
-            self.container.exec(["rm", "-r", "/var/lib/postgresql/data/pgdata"]).wait_output()
+            self.container.exec(["rm", "-rf", self.restore_staging_path]).wait_output()
+            if self.container.exists(f"{self.charm.pgdata_path}/PG_VERSION"):
+                self.container.exec([
+                    "mv",
+                    self.charm.pgdata_path,
+                    self.restore_staging_path,
+                ]).wait_output()
+                return True
+            self.container.exec(["rm", "-r", self.charm.pgdata_path]).wait_output()
         except ExecError as e:
             # If previous PITR restore was unsuccessful, there is no such directory.
             if "No such file or directory" not in e.stderr:
@@ -306,17 +658,17 @@ class PostgreSQLBackups(Object):
                     "Failed to empty data directory in prep for backup restore", exc_info=e
                 )
                 raise
+        return False
 
     def _change_connectivity_to_database(self, connectivity: bool) -> None:
         """Enable or disable the connectivity to the database."""
         self.charm.unit_peer_data.update({"connectivity": "on" if connectivity else "off"})
-        self.charm.update_config(is_creating_backup=True)
+        self.charm.update_config()
 
     def _execute_command(
         self,
         command: list[str],
         timeout: float | None = None,
-        stream: bool = False,
     ) -> tuple[str | None, str | None]:
         """Execute a command in the workload container."""
         try:
@@ -327,24 +679,109 @@ class PostgreSQLBackups(Object):
                 group=WORKLOAD_OS_GROUP,
                 timeout=timeout,
             )
-            if not stream:
-                return process.wait_output()
-
-            stdout = stderr = ""
-            # Read from stdout's IO stream directly, unbuffered
-            for line in process.stdout:
-                logger.debug("Captured stdout: \n%s", repr(line))
-                stdout += line
-            # Fetch from stderr afterwards (not in real time)
-            for line in process.stderr:
-                logger.debug("Captured stderr: \n%s", repr(line))
-                stderr += line
-            process.wait()
-            return stdout, stderr
-
+            return process.wait_output()
         except ChangeError:
             return None, None
 
+    @cached_property
+    def _catalog(self) -> dict:
+        """Cached listing of the pgBackRest repository, loaded from the workload container."""
+        try:
+            return json.loads(self.container.pull(PGBACKREST_CATALOG_FILE).read())
+        except (PathError, PebbleConnectionError, ValueError):
+            return {}
+
+    def _catalog_key(self, *parts) -> str:
+        """Key of a catalog entry, which changes with the stanza and the S3 credentials."""
+        s3_parameters, _ = self._retrieve_s3_parameters()
+        return hashlib.sha256(
+            json.dumps([self.stanza_name, s3_parameters, *parts], sort_keys=True).encode()
+        ).hexdigest()
+
+    def _catalog_output(
+        self, entry: str, key: str, command: list[str], ttl: float | None = None
+    ) -> str | None:
+        """Output of a listing command, served from the catalog while its key doesn't change.
+
+        Args:
+            entry: name of the catalog entry.
+            key: key of the entry, the output is refreshed when it changes.
+            command: the listing command.
+            ttl: maximum age of the output in seconds, if it's bounded.
+        """
+        cached = self._catalog.get(entry)
+        if (
+            cached
+            and cached["key"] == key
+            and (ttl is None or time.time() - cached.get("time", 0) < ttl)
+        ):
+            return cached["output"]
+        output, _ = self._execute_command(command)
+        if output is not None:
+            self._catalog[entry] = {"key": key, "output": output, "time": time.time()}
+            try:
+                self.container.push(
+                    PGBACKREST_CATALOG_FILE,
+                    json.dumps(self._catalog),
+                    make_dirs=True,
+                    user=WORKLOAD_OS_USER,
+                    group=WORKLOAD_OS_GROUP,
+                    permissions=0o600,
+                )
+            except (PathError, PebbleConnectionError) as e:
+                logger.warning(f"Failed to store the backups catalog: {e}")
+        return output
+
+    def _pgbackrest_info(self, ttl: float = PGBACKREST_INFO_TTL) -> str | None:
+        """Output of `pgbackrest info`, refreshed when the backups in the repository change.
+
+        The changes made by this cluster (a backup created or restored, new S3 parameters or
+        stanza) change the key of the cached output. The other changes (e.g. a backup expired
+        by another cluster using the same repository) are only seen once it expires.
+
+        Args:
+            ttl: maximum age of the output in seconds, for the range of the WAL archive.
+        """
+        markers = sorted(
+            self.charm._peers.data[unit].get("last-backup", "") for unit in self.charm.app_units
+        )
+        return self._catalog_output(
+            "info",
+            self._catalog_key(markers),
+            ["pgbackrest", "info", "--output=json"],
+            ttl=ttl,
+        )
+
+    def _archive_history(self) -> str | None:
+        """Timeline history files in the repository, refreshed when the timeline changes."""
+        try:
+            timeline = self.charm._patroni.cluster_topology.timeline
+        except RetryError:
+            timeline = None
+        return self._catalog_output(
+            "history",
+            self._catalog_key(timeline),
+            [
+                "pgbackrest",
+                "repo-ls",
+                "archive",
+                "--recurse",
+                "--filter",
+                "\\.history$",
+                "--output=json",
+            ],
+        )
+
+    def _mark_repository_changed(self) -> None:
+        """Let all the units know that a backup was created or restored."""
+        self.charm.unit_peer_data.update({"last-backup": str(time.time())})
+
+    def invalidate_catalog(self) -> None:
+        """Drop the cached listing of the repository."""
+        self._catalog.clear()
+        with suppress(PathError, PebbleConnectionError):
+            self.container.remove_path(PGBACKREST_CATALOG_FILE)
+
     def _format_backup_list(self, backup_list) -> str:
         """Formats provided list of backups as a table."""
         s3_parameters, _ = self._retrieve_s3_parameters()
@@ -386,7 +823,7 @@ class PostgreSQLBackups(Object):
         List contains successful and failed backups in order of ascending time.
         """
         backup_list = []
-        output, _ = self._execute_command(["pgbackrest", "info", "--output=json"])
+        output = self._pgbackrest_info()
         backups = json.loads(output)[0]["backup"]
         for backup in backups:
             backup_id, backup_type = self._parse_backup_id(backup["label"])
@@ -451,9 +888,13 @@ class PostgreSQLBackups(Object):
             a dict of previously created backups: id => (stanza, timeline) or an empty dict if there is no backups in
                 the S3 bucket.
         """
-        output, _ = self._execute_command(["pgbackrest", "info", "--output=json"])
-        repository_info = next(iter(json.loads(output)), None)
+        output = self._pgbackrest_info()
+        return self._backup_points(next(iter(json.loads(output)), None), show_failed, parse)
 
+    def _backup_points(
+        self, repository_info: dict | None, show_failed: bool = False, parse: bool = True
+    ) -> dict[str, tuple[str, str]]:
+        """(stanza, timeline) of the backups of the repository, by id."""
         # If there are no backups, returns an empty dict.
         if repository_info is None:
             return dict[str, tuple[str, str]]()
@@ -477,15 +918,7 @@ class PostgreSQLBackups(Object):
         Returns:
             a dict of timelines: id => (stanza, timeline) or an empty dict if there is no timelines in the S3 bucket.
         """
-        output, _ = self._execute_command([
-            "pgbackrest",
-            "repo-ls",
-            "archive",
-            "--recurse",
-            "--filter",
-            "\\.history$",
-            "--output=json",
-        ])
+        output = self._archive_history()
 
         repository = json.loads(output).items()
         if repository is None:
@@ -511,16 +944,35 @@ class PostgreSQLBackups(Object):
         Returns:
             (stanza, timeline) of the nearest timeline or backup. None, if there are no matches.
         """
-        timelines = self._list_backups(show_failed=False) | self._list_timelines()
+        index = self._recovery_index()
         if timestamp == "latest":
-            return max(timelines.items())[1] if len(timelines) > 0 else None
-        filtered_timelines = [
-            (timeline_key, timeline_object)
-            for timeline_key, timeline_object in timelines.items()
-            if datetime.strptime(timeline_key, "%Y-%m-%dT%H:%M:%SZ")
-            <= self._parse_psql_timestamp(timestamp)
-        ]
-        return max(filtered_timelines)[1] if len(filtered_timelines) > 0 else None
+            return index.latest()
+        return index.nearest(self._psql_timestamp_to_epoch(timestamp))
+
+    def _get_recovery_plan(self, timestamp: str) -> RecoveryPlan | None:
+        """Backups and WAL range needed to restore to the specified time."""
+        return self._recovery_index().recovery_plan(self._psql_timestamp_to_epoch(timestamp))
+
+    def _recovery_index(self) -> RecoveryIndex:
+        """Index of the backups and timeline switches of the repository, reused for the hook.
+
+        The points to restore from and the backups of the recovery plans come from the
+        same `pgbackrest info` output, so they always agree.
+        """
+        output = self._pgbackrest_info()
+        history = self._archive_history()
+        key = (output, history)
+        if key not in self._recovery_indexes:
+            repository_info = next(iter(json.loads(output)), None) if output else None
+            backups = [
+                backup
+                for backup in (repository_info or {}).get("backup", [])
+                if not backup["error"] and backup["archive"]
+            ]
+            self._recovery_indexes[key] = RecoveryIndex(
+                self._backup_points(repository_info) | self._list_timelines(), backups
+            )
+        return self._recovery_indexes[key]
 
     def _is_psql_timestamp(self, timestamp: str) -> bool:
         if not re.match(
@@ -547,6 +999,10 @@ class PostgreSQLBackups(Object):
             dt = dt.astimezone(tz=timezone.utc)
         return dt.replace(tzinfo=None)
 
+    def _psql_timestamp_to_epoch(self, timestamp: str) -> float:
+        """Intended to use with data only after _is_psql_timestamp check."""
+        return self._parse_psql_timestamp(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
     def _parse_backup_id(self, label) -> tuple[str, str]:
         """Parse backup ID as a timestamp and its type."""
         if label[-1] == "F":
@@ -615,7 +1071,9 @@ class PostgreSQLBackups(Object):
             # successfully complete validation, and upon receiving the same parent event other units should start it.
             # Therefore, the first retry may fail due to the delay of these other units to start this service. 60s given
             # for that or else the s3 initialization sequence will fail.
-            for attempt in Retrying(stop=stop_after_attempt(6), wait=wait_fixed(10), reraise=True):
+            for attempt in Retrying(
+                stop=stop_after_attempt(6), wait=wait_fixed(10), reraise=True, sleep=retry_sleep
+            ):
                 with attempt:
                     self._execute_command([
                         "pgbackrest",
@@ -664,7 +1122,9 @@ class PostgreSQLBackups(Object):
             # successfully complete validation, and upon receiving the same parent event other units should start it.
             # Therefore, the first retry may fail due to the delay of these other units to start this service. 60s given
             # for that or else the s3 initialization sequence will fail.
-            for attempt in Retrying(stop=stop_after_attempt(6), wait=wait_fixed(10), reraise=True):
+            for attempt in Retrying(
+                stop=stop_after_attempt(6), wait=wait_fixed(10), reraise=True, sleep=retry_sleep
+            ):
                 with attempt:
                     self._execute_command(["pgbackrest", f"--stanza={self.stanza_name}", "check"])
             self.charm._set_active_status()
@@ -832,7 +1292,7 @@ class PostgreSQLBackups(Object):
 
         return True
 
-    def _on_create_backup_action(self, event) -> None:  # noqa: C901
+    def _on_create_backup_action(self, event) -> None:
         """Request that pgBackRest creates a backup."""
         backup_type = event.params.get("type", "full")
         if backup_type not in BACKUP_TYPE_OVERRIDES:
@@ -852,12 +1312,60 @@ class PostgreSQLBackups(Object):
             event.fail(error_message)
             return
 
+        process_max = event.params.get("process-max")
+        unit = self._elect_backup_unit()
+        if unit is not None and unit != self.charm.unit.name:
+            # Move the backup to the elected unit, which starts it when it sees the request.
+            job_id = self._generate_backup_job_id()
+            logger.info(f"A {backup_type} backup has been requested, moving it to {unit}")
+            self.charm.unit_peer_data.update({
+                "backup-request": json.dumps({
+                    "id": job_id,
+                    "type": backup_type,
+                    "unit": unit,
+                    "process-max": process_max,
+                })
+            })
+            event.set_results({
+                "backup-status": "backup requested",
+                "job-id": job_id,
+                "unit": unit,
+            })
+            return
+
         logger.info(f"A {backup_type} backup has been requested on unit")
+        job_id, error_message = self._create_backup(backup_type, process_max)
+        if error_message:
+            event.fail(error_message)
+            return
+        event.set_results({
+            "backup-status": "backup started",
+            "job-id": job_id,
+            "unit": self.charm.unit.name,
+        })
+
+    def _create_backup(
+        self,
+        backup_type: str,
+        process_max: int | None = None,
+        scheduled: str | None = None,
+        job_id: str | None = None,
+    ) -> tuple[str | None, str | None]:
+        """Start a backup job.
+
+        Args:
+            backup_type: type of the backup (full, differential or incremental).
+            process_max: number of processes used by the backup, if not the configured one.
+            scheduled: the schedule slot of the backup, if it's a scheduled one.
+            job_id: id of the job, if it was requested by another unit.
+
+        Returns:
+            the id of the job, or an error message if the backup couldn't start.
+        """
         can_unit_perform_backup, validation_message = self._can_unit_perform_backup()
         if not can_unit_perform_backup:
             logger.error(f"Backup failed: {validation_message}")
-            event.fail(validation_message)
-            return
+            return None, validation_message
 
         # Retrieve the S3 Parameters to use when uploading the backup logs to S3.
         s3_parameters, _ = self._retrieve_s3_parameters()
@@ -878,94 +1386,504 @@ Juju Version: {juju_version!s}
         ):
             error_message = "Failed to upload metadata to provided S3"
             logger.error(f"Backup failed: {error_message}")
-            event.fail(error_message)
-            return
+            return None, error_message
 
-        disabled_connectivity = False
-        if not self.charm.is_primary:
-            # Create a rule to mark the cluster as in a creating backup state and update
-            # the Patroni configuration.
+        command = [
+            "pgbackrest",
+            f"--stanza={self.stanza_name}",
+            "--log-level-console=debug",
+            f"--type={BACKUP_TYPE_OVERRIDES[backup_type]}",
+            "backup",
+        ]
+        is_primary = self.charm.is_primary
+        if is_primary:
+            # Force the backup to run in the primary if it's not possible to run it
+            # on the replicas (that happens when TLS is not enabled).
+            command.append("--no-backup-standby")
+        if process_max:
+            command.append(f"--process-max={process_max}")
+
+        # Record the job before updating the Patroni configuration, which tags the member as
+        # creating a backup while the job runs (in-progress backups are missing from the
+        # pgBackRest JSON output, reference: https://github.com/pgbackrest/pgbackrest/issues/2007).
+        job_id = job_id or self._generate_backup_job_id()
+        self.charm.unit_peer_data.update({
+            "backup-job": json.dumps({
+                "id": job_id,
+                "type": backup_type,
+                "status": "running",
+                "started": time.time(),
+                "connectivity-disabled": not is_primary,
+                "scheduled": scheduled,
+            })
+        })
+        if not is_primary:
+            # Disable the connectivity to the database while the backup copies the files
+            # from the replica (it's restored as soon as the job reports the copy is done).
             self._change_connectivity_to_database(connectivity=False)
-            disabled_connectivity = True
-
-        self.charm.unit.status = MaintenanceStatus("creating backup")
-        # Set flag due to missing in progress backups on JSON output
-        # (reference: https://github.com/pgbackrest/pgbackrest/issues/2007)
-        self.charm.update_config(is_creating_backup=True)
+        else:
+            self.charm.update_config()
 
         try:
-            command = [
-                "pgbackrest",
-                f"--stanza={self.stanza_name}",
-                "--log-level-console=debug",
-                f"--type={BACKUP_TYPE_OVERRIDES[backup_type]}",
-                "backup",
-            ]
-            if self.charm.is_primary:
-                # Force the backup to run in the primary if it's not possible to run it
-                # on the replicas (that happens when TLS is not enabled).
-                command.append("--no-backup-standby")
-            stdout, stderr = self._execute_command(command, stream=True)
-            backup_id = list(self._list_backups(show_failed=True).keys())[-1]
-        except ExecError as e:
+            self._start_backup_job(job_id, command)
+        except (APIError, ChangeError) as e:
             logger.exception(e)
+            self._release_backup_job(self._update_backup_job(status="failed", error=str(e)))
+            error_message = f"Failed to start the backup with error: {e!s}"
+            logger.error(f"Backup failed: {error_message}")
+            return None, error_message
+
+        logger.info(f"Backup job {job_id} started")
+        return job_id, None
+
+    def schedule_backups(self) -> None:
+        """Request the scheduled backup when it's due, from the leader.
+
+        The backup is requested to a unit elected through the application peer data. Its type
+        is planned from a fresh listing of the repository (the WAL archived since the cached
+        listing changes the plan), which also refreshes the catalog.
+        """
+        if not self.charm.unit.is_leader() or not self.charm.config.backup_schedule:
+            return
+        are_backup_settings_ok, _ = self._are_backup_settings_ok()
+        if not are_backup_settings_ok or "stanza" not in self.charm.app_peer_data:
+            return
+
+        now = datetime.now(timezone.utc)
+        last = self.charm.app_peer_data.get("backup-schedule-last")
+        if not last:
+            # Start following the schedule from now, rather than catching up right away.
+            self.charm.app_peer_data.update({"backup-schedule-last": str(now.timestamp())})
+            return
+        since = max(
+            datetime.fromtimestamp(float(last), timezone.utc), now - BACKUP_SCHEDULE_LOOKBACK
+        )
+        due = CronSchedule(self.charm.config.backup_schedule).last_due(since, now)
+        if due is None:
+            return
+
+        unit = self._elect_backup_unit()
+        if unit is None:
+            logger.warning("Scheduled backup skipped: no unit can create it")
+            return
+        s3_parameters, _ = self._retrieve_s3_parameters()
+        output = self._pgbackrest_info(ttl=0)
+        backup_type = plan_backup_type(
+            next(iter(json.loads(output)), None) if output else None,
+            int(s3_parameters["delete-older-than-days"]),
+            now.timestamp(),
+        )
+        scheduled = {
+            "id": due.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "type": backup_type,
+            "unit": unit,
+        }
+        logger.info(f"Scheduling a {backup_type} backup on {unit}")
+        self.charm.app_peer_data.update({
+            "backup-schedule-last": str(due.timestamp()),
+            "scheduled-backup": json.dumps(scheduled),
+        })
+
+    def _elect_backup_unit(self) -> str | None:
+        """Unit creating the backups: the least loaded replica, to spare the primary.
+
+        The healthy replicas are ranked by their replication lag (in WAL segments) and then
+        by the latency of their Patroni API, as a measure of their load. The synchronous
+        standbys come last when there are no more of them than the synchronous_node_count,
+        as the backup I/O would then slow down the commits on the primary.
+
+        The primary is only elected when the replicas can't create backups (without TLS,
+        they can't request the primary to archive the WAL, see _can_unit_perform_backup).
+        """
+        try:
+            topology = self.charm._patroni.cluster_topology
+        except RetryError:
+            return None
+        primary = topology.primary
+        replicas = [
+            member
+            for member in topology.members
+            if member["name"] != primary and member["state"] in STARTED_STATES
+        ]
+        if not self.charm.is_tls_enabled or not replicas:
+            return label2name(primary) if primary else None
+
+        members_health = self.charm._patroni.get_members_health()
+        sync_standbys = topology.sync_standbys
+        sync_standbys_needed = len(sync_standbys) <= self.charm._patroni._synchronous_node_count
+        segment_size = WAL_SEGMENT_SIZE * 1024 * 1024
 
-            # Recover the backup id from the logs.
-            backup_label_stdout_line = re.findall(
-                r"(new backup label = )([0-9]{8}[-][0-9]{6}[F])$", e.stdout, re.MULTILINE
+        def load(member: dict) -> tuple:
+            lag = member.get("lag")
+            return (
+                sync_standbys_needed and member["name"] in sync_standbys,
+                lag // segment_size if isinstance(lag, int) else float("inf"),
+                members_health[member["name"]]["latency"],
             )
-            if len(backup_label_stdout_line) > 0:
-                backup_id = backup_label_stdout_line[0][1]
-            else:
-                # Generate a backup id from the current date and time if the backup failed before
-                # generating the backup label (our backup id).
-                backup_id = self._generate_fake_backup_id(backup_type)
 
-            # Upload the logs to S3.
-            logs = f"""Stdout:
-{e.stdout}
+        candidates = [
+            member
+            for member in replicas
+            if member["name"] in members_health and members_health[member["name"]]["healthy"]
+        ]
+        if not candidates:
+            logger.warning("No healthy replica can create the backups")
+            return None
+        return label2name(min(candidates, key=load)["name"])
+
+    def _on_peer_relation_changed(self, _) -> None:
+        """Start the backups as soon as they are requested to this unit."""
+        self.run_scheduled_backup()
+        self.run_requested_backups()
 
-Stderr:
-{e.stderr}
-"""
-            self._upload_content_to_s3(
-                logs,
-                f"backup/{self.stanza_name}/{backup_id}/backup.log",
-                s3_parameters,
+    def _on_pebble_custom_notice(self, event) -> None:
+        """Upload the output of the backup job and finish it as soon as it exits."""
+        if event.notice.key == BACKUP_JOB_NOTICE:
+            self.check_backup_job()
+
+    def _on_backup_job_changed(self, _) -> None:
+        """Same as the notices of the backup job, dispatched by its watcher (Juju < 3.4)."""
+        self.check_backup_job()
+
+    @staticmethod
+    def _generate_backup_job_id() -> str:
+        """Generate the id of a backup job, unique across the units.
+
+        The id starts with the time of the request, to sort the jobs, and ends with a
+        random suffix, as the units may request backups in the same second.
+        """
+        return f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+
+    def run_requested_backups(self) -> None:
+        """Start the backups moved to this unit by the other units' create-backup actions."""
+        requests = {}
+        for unit in self.charm._peers.units if self.charm._peers else []:
+            request = self.charm._peers.data[unit].get("backup-request")
+            if request and (request := json.loads(request))["unit"] == self.charm.unit.name:
+                requests[unit.name] = request
+        # Each unit has a single request at a time, so the last one handled is tracked per
+        # requester (the clocks of the units may differ, so the ids aren't compared).
+        handled = self.charm.unit_peer_data.get("requested-backup", "{}")
+        try:
+            handled = json.loads(handled)
+        except ValueError:
+            # Recorded before the upgrade, as the id of the last request handled.
+            handled = {
+                requester: request["id"]
+                for requester, request in requests.items()
+                if request["id"] <= handled
+            }
+        for requester, request in sorted(requests.items(), key=lambda item: item[1]["id"]):
+            if handled.get(requester) == request["id"]:
+                continue
+            handled[requester] = request["id"]
+            self.charm.unit_peer_data.update({"requested-backup": json.dumps(handled)})
+            logger.info(f"A {request['type']} backup has been requested on unit")
+            _, error_message = self._create_backup(
+                request["type"], request.get("process-max"), job_id=request["id"]
             )
-            error_message = f"Failed to backup PostgreSQL with error: {e!s}"
-            logger.error(f"Backup failed: {error_message}")
-            event.fail(error_message)
-        else:
-            # Upload the logs to S3 and fail the action if it doesn't succeed.
-            logs = f"""Stdout:
-{stdout}
+            if error_message is None:
+                continue
+            logger.error(f"Requested backup {request['id']} failed: {error_message}")
+            if not self.is_backup_job_running:
+                # Report the failure through the get-backup-status action of this unit.
+                now = time.time()
+                self.charm.unit_peer_data.update({
+                    "backup-job": json.dumps({
+                        "id": request["id"],
+                        "type": request["type"],
+                        "status": "failed",
+                        "started": now,
+                        "finished": now,
+                        "error": error_message,
+                    })
+                })
+
+    def run_scheduled_backup(self) -> None:
+        """Start the scheduled backup requested to this unit, if it didn't start yet."""
+        scheduled = self.charm.app_peer_data.get("scheduled-backup")
+        if not scheduled:
+            return
+        scheduled = json.loads(scheduled)
+        if (
+            scheduled["unit"] != self.charm.unit.name
+            or self.charm.unit_peer_data.get("scheduled-backup") == scheduled["id"]
+        ):
+            return
 
-Stderr:
-{stderr}
-"""
-            if not self._upload_content_to_s3(
-                logs,
-                f"backup/{self.stanza_name}/{backup_id}/backup.log",
-                s3_parameters,
-            ):
-                error_message = "Error uploading logs to S3"
-                logger.error(f"Backup failed: {error_message}")
-                event.fail(error_message)
-            else:
-                logger.info(f"Backup succeeded: with backup-id {datetime_backup_requested}")
-                event.set_results({"backup-status": "backup created"})
+        # Record the attempt first, so a backup that can't start isn't retried on every hook.
+        self.charm.unit_peer_data.update({"scheduled-backup": scheduled["id"]})
+        logger.info(f"A scheduled {scheduled['type']} backup has been requested on unit")
+        _, error_message = self._create_backup(scheduled["type"], scheduled=scheduled["id"])
+        if error_message:
+            logger.error(f"Scheduled backup {scheduled['id']} failed: {error_message}")
+
+    def _start_backup_job(self, job_id: str, command: list[str]) -> None:
+        """Run a backup command as a Pebble service, which reports its progress to a file."""
+        # Remove the output left by a job that didn't finish (e.g. the unit was stopped).
+        for file in self.container.list_files(
+            os.path.dirname(BACKUP_JOB_STDOUT_FILE),
+            pattern=f"{os.path.basename(BACKUP_JOB_STDOUT_FILE)}.*",
+        ):
+            self.container.remove_path(file.path)
+        with open("scripts/backup_job.py") as file:
+            self._push_if_changed(
+                BACKUP_JOB_SCRIPT, file.read(), user=WORKLOAD_OS_USER, group=WORKLOAD_OS_GROUP
+            )
+        self.container.add_layer(
+            self.charm.backup_service,
+            {
+                "services": {
+                    self.charm.backup_service: {
+                        "override": "replace",
+                        "summary": "pgbackrest backup",
+                        "command": shlex.join(["python3", BACKUP_JOB_SCRIPT, job_id, *command]),
+                        "startup": "disabled",
+                        "user": WORKLOAD_OS_USER,
+                        "group": WORKLOAD_OS_GROUP,
+                        "on-success": "ignore",
+                        "on-failure": "ignore",
+                    }
+                },
+            },
+            combine=True,
+        )
+        self.container.start(self.charm.backup_service)
+        if self.model.juju_version < JujuVersion("3.4.0"):
+            # Pebble custom notices aren't supported, so the job is watched from the charm.
+            self.charm.backup_job_watcher.start_backup_job_watcher(job_id)
 
-        if disabled_connectivity:
-            # Remove the rule that marks the cluster as in a creating backup state
-            # and update the Patroni configuration.
+    @property
+    def backup_job(self) -> dict | None:
+        """Last backup job of this unit, as recorded in the peer relation data."""
+        job = self.charm.unit_peer_data.get("backup-job")
+        return json.loads(job) if job else None
+
+    @property
+    def is_backup_job_running(self) -> bool:
+        """Whether this unit is creating a backup."""
+        job = self.backup_job
+        return job is not None and job["status"] == "running"
+
+    def _update_backup_job(self, **fields) -> dict:
+        """Update the fields of the last backup job in the peer relation data."""
+        job = {**(self.backup_job or {}), **fields}
+        self.charm.unit_peer_data.update({"backup-job": json.dumps(job)})
+        return job
+
+    def _release_backup_job(self, job: dict) -> None:
+        """Remove the member tag and restore the connectivity changed for a backup job."""
+        if job.get("connectivity-disabled"):
             self._change_connectivity_to_database(connectivity=True)
+        else:
+            self.charm.update_config()
+
+    def _read_backup_job_state(self, job_id: str) -> dict | None:
+        """Progress reported by a backup job, if it was written already."""
+        try:
+            state = json.loads(self.container.pull(BACKUP_JOB_STATE_FILE).read())
+        except (PathError, ValueError):
+            return None
+        return state if state.get("id") == job_id else None
 
-        self.charm.update_config(is_creating_backup=False)
-        self.charm.unit.status = ActiveStatus()
+    def _is_backup_service_running(self) -> bool:
+        """Whether the backup job service is running."""
+        try:
+            return self.container.get_service(self.charm.backup_service).is_running()
+        except ModelError:
+            return False
+
+    def check_backup_job(self) -> dict | None:
+        """Refresh the progress of the running backup job and finish it once it exited.
+
+        Only the start and the end of the job are recorded in the peer data.
+
+        Returns:
+            the last backup job of this unit, with its current progress.
+        """
+        job = self.backup_job
+        if job is None or job["status"] != "running" or not self.container.can_connect():
+            return job
+
+        state = self._read_backup_job_state(job["id"])
+        if state is None or state["status"] == "running":
+            if self._is_backup_service_running():
+                if state is None:
+                    return job
+                if state.get("segments", 0) > self._backup_log_state(job["id"])["segments"]:
+                    s3_parameters, _ = self._retrieve_s3_parameters()
+                    self._upload_backup_log_segments(
+                        self._open_backup_log(s3_parameters, job["id"]), state["segments"]
+                    )
+                if state.get("copied") and job.get("connectivity-disabled"):
+                    # Only the copy of the files loads the replica, so the clients can
+                    # connect again while pgBackRest waits for the WAL to be archived.
+                    job = self._update_backup_job(**{"connectivity-disabled": False})
+                    self._change_connectivity_to_database(connectivity=True)
+                # The progress is read from the state file of the job, so it's kept out of
+                # the peer data, which would notify every unit on each check.
+                return {**job, **self._backup_job_progress(state)}
+            # The service was stopped (e.g. the container restarted) before reporting a result.
+            logger.error(f"Backup job {job['id']} stopped before finishing")
+            state = {**(state or {}), "status": "failed", "exit-code": None}
+        elif state.get("notify-error"):
+            # The job is only found finished by a later hook (e.g. update-status).
+            logger.warning(
+                f"Backup job {job['id']} failed to notify the charm: {state['notify-error']}"
+            )
+        return self._finish_backup_job(job, state)
+
+    @staticmethod
+    def _backup_job_progress(state: dict) -> dict:
+        """Progress fields of a backup job, with the estimated time of completion."""
+        percent = state.get("percent", 0.0)
+        progress = {
+            "files-done": state.get("files-done", 0),
+            "bytes-done": state.get("bytes-done", 0),
+            "percent": percent,
+        }
+        if 0 < percent < 100 and "started" in state and "updated" in state:
+            elapsed = state["updated"] - state["started"]
+            progress["eta"] = state["updated"] + elapsed * (100 - percent) / percent
+        return progress
+
+    def _finish_backup_job(self, job: dict, state: dict) -> dict:
+        """Upload the logs of a finished backup job to S3 and record its result."""
+        self._mark_repository_changed()
+        succeeded = state["status"] == "succeeded"
+
+        # Upload the rest of the logs to S3, stored under the id from the backup label when it
+        # was printed.
+        s3_parameters, _ = self._retrieve_s3_parameters()
+        backup_log = self._open_backup_log(s3_parameters, job["id"])
+        segments = state.get("segments", 0)
+        self._upload_backup_log_segments(backup_log, segments)
+        if state.get("label"):
+            backup_id = self._parse_backup_id(state["label"])[0]
+        elif succeeded:
+            backup_id = list(self._list_backups(show_failed=True).keys())[-1]
+        else:
+            # Generate a backup id from the current date and time if the backup failed before
+            # generating the backup label (our backup id).
+            backup_id = self._parse_backup_id(self._generate_fake_backup_id(job["type"]))[0]
+        last_segment = f"{BACKUP_JOB_STDOUT_FILE}.{segments + 1}"
+        files = {}
+        for path in [last_segment, BACKUP_JOB_STDERR_FILE]:
+            try:
+                files[path] = self.container.pull(path, encoding=None)
+            except PathError as e:
+                logger.warning(f"Failed to read the output of backup job {job['id']}: {e}")
+        try:
+            logs_uploaded = backup_log.finish(
+                files.get(last_segment),
+                files.get(BACKUP_JOB_STDERR_FILE),
+                self._backup_log_key(s3_parameters, backup_id),
+            )
+        finally:
+            for file in files.values():
+                file.close()
+        for path in [last_segment, BACKUP_JOB_STDERR_FILE]:
+            with suppress(PathError):
+                self.container.remove_path(path)
+        self._stored.backup_log = "{}"
+        self.charm.backup_job_watcher.stop_backup_job_watcher()
+
+        if not succeeded:
+            error = f"Failed to backup PostgreSQL with exit code {state.get('exit-code')}"
+        elif not logs_uploaded:
+            error = "Error uploading logs to S3"
+        else:
+            error = None
+        job = self._update_backup_job(**{
+            **self._backup_job_progress(state),
+            "status": "failed" if error else "succeeded",
+            "finished": time.time(),
+            "eta": None,
+            "backup-id": backup_id,
+            "error": error,
+        })
+        self._release_backup_job(job)
+
+        if error:
+            logger.error(f"Backup failed: {error}")
+        else:
+            logger.info(f"Backup succeeded: with backup-id {backup_id}")
+        return job
+
+    def _on_get_backup_status_action(self, event: ActionEvent) -> None:
+        """Report the progress of the last backup job of this unit."""
+        job = self.check_backup_job()
+        if job is None:
+            event.fail("No backup was created on this unit")
+            return
+
+        def isoformat(timestamp: float) -> str:
+            return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        results = {
+            "job-id": job["id"],
+            "type": job["type"],
+            "status": job["status"],
+            "started": isoformat(job["started"]),
+            "files-done": job.get("files-done", 0),
+            "bytes-done": job.get("bytes-done", 0),
+            "percent": f"{job.get('percent', 0.0):.2f}",
+        }
+        if job.get("eta"):
+            results["eta"] = isoformat(job["eta"])
+        if job.get("finished"):
+            results["finished"] = isoformat(job["finished"])
+        if job.get("backup-id"):
+            results["backup-id"] = job["backup-id"]
+        if job.get("error"):
+            results["error"] = job["error"]
+        event.set_results(results)
+
+    def _backup_log_key(self, s3_parameters: dict, backup_id: str) -> str:
+        """S3 key of the logs of a backup."""
+        return os.path.join(
+            s3_parameters["path"], f"backup/{self.stanza_name}/{backup_id}/backup.log"
+        ).lstrip("/")
+
+    def _backup_log_state(self, job_id: str) -> dict:
+        """State of the upload of the logs of a backup job, resumed from the previous hooks."""
+        state = json.loads(self._stored.backup_log)
+        return state if state.get("job") == job_id else {"job": job_id, "segments": 0}
+
+    def _open_backup_log(self, s3_parameters: dict, job_id: str) -> BackupLogUpload:
+        """Resume the upload of the logs of a backup job, under a key from the job id.
+
+        The key is outside the directory of the backups, which is managed by pgBackRest.
+        """
+        s3 = self._get_s3_session_resource(s3_parameters)
+        return BackupLogUpload(
+            s3.meta.client,
+            s3_parameters["bucket"],
+            os.path.join(
+                s3_parameters["path"], f"backup-jobs/{self.stanza_name}/{job_id}/backup.log"
+            ).lstrip("/"),
+            self._backup_log_state(job_id),
+        )
+
+    def _upload_backup_log_segments(self, backup_log: BackupLogUpload, segments: int) -> None:
+        """Upload the stdout segments completed by the backup job since the last upload."""
+        for number in range(backup_log.state["segments"] + 1, segments + 1):
+            path = f"{BACKUP_JOB_STDOUT_FILE}.{number}"
+            try:
+                with self.container.pull(path, encoding=None) as file:
+                    backup_log.upload_part(file.read())
+            except PathError as e:
+                logger.warning(f"Failed to read the output of the backup job: {e}")
+                backup_log.abort()
+            # The segments are removed even when the upload failed, to free the disk.
+            with suppress(PathError):
+                self.container.remove_path(path)
+            backup_log.state["segments"] = number
+        self._stored.backup_log = json.dumps(backup_log.state)
 
     def _on_s3_credential_gone(self, _) -> None:
         self.container.stop(self.charm.rotate_logs_service)
+        self.invalidate_catalog()
         if self.charm.unit.is_leader():
             self.charm.app_peer_data.update({
                 "stanza": "",
@@ -1016,6 +1934,7 @@ Stderr:
         timelines = self._list_timelines()
         is_backup_id_real = backup_id and backup_id in backups
         is_backup_id_timeline = backup_id and not is_backup_id_real and backup_id in timelines
+        recovery_plan = None
         if backup_id and not is_backup_id_real and not is_backup_id_timeline:
             error_message = f"Invalid backup-id: {backup_id}"
             logger.error(f"Restore failed: {error_message}")
@@ -1050,6 +1969,17 @@ Stderr:
             logger.info(
                 f"Chosen timeline {restore_stanza_timeline[1]} as nearest for the specified timestamp {restore_to_time}"
             )
+            if restore_to_time != "latest":
+                recovery_plan = self._get_recovery_plan(restore_to_time)
+                if not recovery_plan:
+                    error_message = f"No backup finished before {restore_to_time} to restore"
+                    logger.error(f"Restore failed: {error_message}")
+                    event.fail(error_message)
+                    return
+                logger.info(
+                    f"Restoring from backups {', '.join(recovery_plan['backups'])} with WAL from "
+                    f"{recovery_plan['wal_start']} to {recovery_plan['wal_stop'] or 'the latest archived segment'}"
+                )
 
         self.charm.unit.status = MaintenanceStatus("restoring backup")
 
@@ -1079,7 +2009,7 @@ Stderr:
         # work after the database service is stopped on Pebble.
         logger.info("Removing previous cluster information")
         try:
-            client = Client()
+            client = instrument_k8s_client(Client())
             client.delete(
                 Endpoints,
                 name=f"patroni-{self.charm._name}",
@@ -1098,10 +2028,12 @@ Stderr:
                 event.fail(error_message)
                 self._restart_database()
                 return
+        # The configuration in the DCS is gone along with the endpoints.
+        self.charm._stored.patroni_dcs_config_hash = None
 
         logger.info("Removing the contents of the data directory")
         try:
-            self._empty_data_files()
+            restore_delta = self._empty_data_files()
         except ExecError as e:
             error_message = f"Failed to remove contents of the data directory with error: {e!s}"
             logger.error(f"Restore failed: {error_message}")
@@ -1119,8 +2051,13 @@ Stderr:
             "restore-stanza": restore_stanza_timeline[0],
             "restore-timeline": restore_stanza_timeline[1] if restore_to_time else "",
             "restore-to-time": restore_to_time or "",
+            "restore-delta": "True" if restore_delta else "",
+            "restore-wal-stop": (recovery_plan["wal_stop"] or "") if recovery_plan else "",
             "s3-initialization-block-message": "",
         })
+        self._mark_repository_changed()
+        # Prefetch the WAL replayed after the restore of the base backup.
+        self._render_pgbackrest_conf_file()
         self.charm.update_config()
 
         # Start the database to start the restore process.
@@ -1236,6 +2173,179 @@ Stderr:
 
         return True
 
+    def _push_if_changed(self, path: str, content: str, **kwargs) -> bool:
+        """Push a file to the workload container only when its content changed.
+
+        Args:
+            path: the path of the file in the workload container.
+            content: the expected content of the file.
+            kwargs: extra arguments passed to the push call (e.g. user and group).
+
+        Returns:
+            Whether the file was pushed.
+        """
+        try:
+            if self.container.pull(path).read() == content:
+                return False
+        except PathError:
+            pass
+        self.container.push(path, content, **kwargs)
+        return True
+
+    @property
+    def spool_path(self) -> str:
+        """Spool directory of the asynchronous WAL archiving, in the data volume."""
+        return f"{self.charm._storage_path}/pgbackrest-spool"
+
+    @property
+    def restore_staging_path(self) -> str:
+        """Directory where the data files are kept aside for a delta restore."""
+        return f"{self.charm._storage_path}/pgdata-restore"
+
+    def _backup_process_max(self, cpu_count: int) -> int:
+        """Number of processes used by the backups (and the asynchronous WAL archiving)."""
+        process_max = self.charm.config.backup_process_max
+        if process_max in [None, "auto"]:
+            return max(cpu_count // 2, 1)
+        return process_max
+
+    def _backup_compress_level(self, cpu_count: int) -> int:
+        """Compression level of the backups and the archived WAL."""
+        compress_level = self.charm.config.backup_compress_level
+        if compress_level in [None, "auto"]:
+            return 1 if cpu_count <= 2 else 3
+        return compress_level
+
+    def _is_archive_async(self) -> bool:
+        """Whether the WAL is archived and fetched asynchronously.
+
+        It's always the case while restoring a backup, so the WAL replay after the
+        restore doesn't wait for a request to the repository for each segment.
+        """
+        return (
+            self.charm.config.backup_archive_async
+            or self.charm.is_cluster_restoring_backup
+            or self.charm.is_cluster_restoring_to_time
+        )
+
+    def _archive_get_queue_max(self) -> int | None:
+        """Size, in megabytes, of the WAL prefetched in the spool directory.
+
+        Unless configured, the prefetch is sized to a quarter of the WAL kept for the
+        replication (and at least the pgBackRest default of 128MB), so the spool doesn't
+        compete with pg_wal for the data volume.
+        """
+        config = self.charm.config
+        if config.backup_archive_get_queue_max is not None or not self._is_archive_async():
+            return config.backup_archive_get_queue_max
+        wal_keep_size = config.durability_wal_keep_size
+        if wal_keep_size is None:
+            wal_keep_size = 4096
+        return max(wal_keep_size // 4, 128)
+
+    def archive_queue_size(self) -> int | None:
+        """Size, in megabytes, of the WAL segments waiting to be archived.
+
+        Returns None if the archive status directory can't be listed.
+        """
+        try:
+            ready_segments = self.container.list_files(
+                f"{self.charm.pgdata_path}/pg_wal/archive_status", pattern="*.ready"
+            )
+        except (APIError, PathError, PebbleConnectionError) as e:
+            logger.debug(f"Failed to list the WAL segments waiting to be archived: {e}")
+            return None
+        return len(ready_segments) * WAL_SEGMENT_SIZE
+
+    def is_archive_push_queue_full(self) -> bool:
+        """Whether the WAL waiting to be archived exceeds the archive-push-queue-max.
+
+        Past that size, pgBackRest drops the WAL instead of archiving it, so the
+        point-in-time recovery is broken until the next backup.
+        """
+        push_queue_max = self.charm.config.backup_archive_push_queue_max
+        if push_queue_max is None or not self._are_backup_settings_ok()[0]:
+            return False
+        queue_size = self.archive_queue_size()
+        if queue_size is None or queue_size < push_queue_max:
+            return False
+        logger.warning(
+            f"{queue_size}MB of WAL waiting to be archived, over the {push_queue_max}MB archive-push-queue-max"
+        )
+        return True
+
+    def restore_progress(self) -> str | None:
+        """Progress of the restore on this unit, as a status message.
+
+        Returns None if no restore is progressing on this unit (or its logs can't be read).
+        """
+        progress = self._restore_log_progress()
+        if progress is not None and progress["restoring"]:
+            if not progress["files"]:
+                return "restoring backup"
+            return f"restoring backup: {progress['files']} files restored ({progress['percent']}%)"
+
+        restored_wal = RESTORED_WAL_PATTERN.findall(self.charm._patroni.last_postgresql_logs())
+        if not restored_wal:
+            return None
+        wal_stop = self.charm.app_peer_data.get("restore-wal-stop")
+        return (
+            f"restoring backup: replaying WAL at {_wal_segment_lsn(restored_wal[-1])}"
+            f"{f' of {_wal_segment_lsn(wal_stop)}' if wal_stop else ''}"
+        )
+
+    def _restore_log_progress(self) -> dict | None:
+        """Progress of the last restore command, parsed from its log.
+
+        The log has a line per restored file, so only the lines appended since the previous
+        hook are read, from the offset kept in the local state of the unit.
+
+        Returns None if the log can't be read.
+        """
+        path = (
+            f"{PGBACKREST_LOGS_PATH}/{self.charm.app_peer_data.get('restore-stanza')}-restore.log"
+        )
+        progress = json.loads(self._stored.restore_log)
+        if progress.get("path") != path:
+            progress = {"path": path, "offset": 0}
+        try:
+            size = self.container.list_files(path, itself=True)[0].size
+            if size < progress["offset"]:
+                # The log was rotated or truncated.
+                progress = {"path": path, "offset": 0}
+            appended = b""
+            if size > progress["offset"]:
+                appended, _ = self.container.exec(
+                    ["tail", "-c", f"+{progress['offset'] + 1}", path],
+                    user=WORKLOAD_OS_USER,
+                    group=WORKLOAD_OS_GROUP,
+                    encoding=None,
+                ).wait_output()
+        except (APIError, ChangeError, ExecError, PathError, PebbleConnectionError) as e:
+            logger.debug(f"Failed to read the restore logs: {e}")
+            return None
+
+        # The last line may still be being written.
+        appended = appended[: appended.rfind(b"\n") + 1]
+        progress["offset"] += len(appended)
+        # The log file is appended to, so only the last restore command is relevant.
+        for line in appended.decode(errors="replace").splitlines():
+            if "restore command begin" in line:
+                progress.update(restoring=True, files=0, percent=None)
+            elif "restore command end" in line:
+                progress["restoring"] = False
+            elif progress.get("restoring") and (match := RESTORE_FILE_PATTERN.search(line)):
+                progress["files"] += 1
+                progress["percent"] = match.group("percent")
+        self._stored.restore_log = json.dumps(progress)
+        return {"restoring": False, **progress}
+
+    def update_pgbackrest_configuration(self) -> None:
+        """Render the pgBackRest configuration, if the backups are configured."""
+        are_backup_settings_ok, _ = self._are_backup_settings_ok()
+        if are_backup_settings_ok:
+            self._render_pgbackrest_conf_file()
+
     def _render_pgbackrest_conf_file(self) -> bool:
         """Render the pgBackRest configuration file."""
         s3_parameters, missing_parameters = self._retrieve_s3_parameters()
@@ -1246,19 +2356,23 @@ Stderr:
             return False
 
         if self._tls_ca_chain_filename != "":
-            self.container.push(
+            self._push_if_changed(
                 self._tls_ca_chain_filename,
                 "\n".join(s3_parameters["tls-ca-chain"]),
                 user=WORKLOAD_OS_USER,
                 group=WORKLOAD_OS_GROUP,
             )
 
-        # Open the template pgbackrest.conf file.
-        with open("templates/pgbackrest.conf.j2") as file:
-            template = Template(file.read())
         cpu_count, _ = self.charm.get_available_resources()
+        config = self.charm.config
+        archive_async = self._is_archive_async()
+        if archive_async:
+            self.container.make_dir(
+                self.spool_path, make_parents=True, user=WORKLOAD_OS_USER, group=WORKLOAD_OS_GROUP
+            )
         # Render the template file with the correct values.
-        rendered = template.render(
+        rendered = render_template(
+            "pgbackrest.conf.j2",
             enable_tls=self.charm.is_tls_enabled and len(self.charm.peer_members_endpoints) > 0,
             peer_endpoints=self.charm.peer_members_endpoints,
             path=s3_parameters["path"],
@@ -1274,25 +2388,27 @@ Stderr:
             user=BACKUP_USER,
             retention_full=s3_parameters["delete-older-than-days"],
             process_max=max(cpu_count - 2, 1),
+            backup_process_max=self._backup_process_max(cpu_count),
+            compress_level=self._backup_compress_level(cpu_count),
+            archive_async=archive_async,
+            spool_path=self.spool_path,
+            archive_push_queue_max=config.backup_archive_push_queue_max,
+            archive_get_queue_max=self._archive_get_queue_max(),
         )
-        # Delete the original file and render the one with the right info.
-        filename = "/etc/pgbackrest.conf"
-        self.container.push(
-            filename,
+        # Replace the original file only when the rendered one differs.
+        self._push_if_changed(
+            "/etc/pgbackrest.conf",
             rendered,
             user=WORKLOAD_OS_USER,
             group=WORKLOAD_OS_GROUP,
         )
 
         # Render the logrotate configuration file.
-        with open("templates/pgbackrest.logrotate.j2") as file:
-            template = Template(file.read())
-        self.container.push(PGBACKREST_LOGROTATE_FILE, template.render())
+        self._push_if_changed(
+            PGBACKREST_LOGROTATE_FILE, render_template("pgbackrest.logrotate.j2")
+        )
         with open("scripts/rotate_logs.py") as f:
-            self.container.push(
-                "/home/postgres/rotate_logs.py",
-                f.read(),
-            )
+            self._push_if_changed("/home/postgres/rotate_logs.py", f.read())
         self.container.start(self.charm.rotate_logs_service)
 
         return True
@@ -1399,10 +2515,8 @@ Stderr:
             s3 = self._get_s3_session_resource(s3_parameters)
             bucket = s3.Bucket(bucket_name)
 
-            with tempfile.NamedTemporaryFile() as temp_file:
-                temp_file.write(content.encode("utf-8"))
-                temp_file.flush()
-                bucket.upload_file(temp_file.name, processed_s3_path)
+            with BytesIO(content.encode("utf-8")) as buf:
+                bucket.upload_fileobj(buf, processed_s3_path, Config=self._s3_transfer_config())
         except Exception as e:
             logger.exception(
                 f"Failed to upload content to S3 bucket={bucket_name}, path={processed_s3_path}",
@@ -1432,7 +2546,7 @@ Stderr:
             s3 = self._get_s3_session_resource(s3_parameters)
             bucket = s3.Bucket(bucket_name)
             with BytesIO() as buf:
-                bucket.download_fileobj(processed_s3_path, buf)
+                bucket.download_fileobj(processed_s3_path, buf, Config=self._s3_transfer_config())
                 return buf.getvalue().decode("utf-8")
         except ClientError as e:
             if e.response["Error"]["Code"] == "404":
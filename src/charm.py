@@ -12,6 +12,8 @@ import re
 import shutil
 import sys
 import time
+from collections.abc import Callable
+from contextlib import suppress
 from datetime import datetime
 from functools import cached_property
 from hashlib import shake_128
@@ -19,10 +21,8 @@ from pathlib import Path
 from typing import Literal, get_args
 from urllib.parse import urlparse
 
-from authorisation_rules_observer import (
-    AuthorisationRulesChangeCharmEvents,
-    AuthorisationRulesObserver,
-)
+from authorisation_rules_observer import AuthorisationRulesObserver
+from backup_job_watcher import BackupJobWatcher, PostgresqlCharmEvents
 
 # First platform-specific import, will fail on wrong architecture
 try:
@@ -50,6 +50,7 @@ from charms.postgresql_k8s.v0.postgresql import (
     PostgreSQL,
     PostgreSQLEnableDisableExtensionError,
     PostgreSQLGetCurrentTimelineError,
+    PostgreSQLGetPostgreSQLVersionError,
     PostgreSQLListUsersError,
     PostgreSQLUpdateUserPasswordError,
 )
@@ -60,7 +61,7 @@ from lightkube import ApiError, Client
 from lightkube.models.core_v1 import ServicePort, ServiceSpec
 from lightkube.models.meta_v1 import ObjectMeta
 from lightkube.resources.core_v1 import Endpoints, Node, Pod, Service
-from ops import JujuVersion, main
+from ops import JujuVersion, StoredState, main
 from ops.charm import (
     ActionEvent,
     HookEvent,
@@ -97,9 +98,13 @@ from backups import CANNOT_RESTORE_PITR, PostgreSQLBackups, is_s3_block_message
 from config import CharmConfig
 from constants import (
     APP_SCOPE,
+    AVAILABLE_RESOURCES_CACHE_TTL,
     BACKUP_USER,
     DATABASE_DEFAULT_NAME,
     DATABASE_PORT,
+    HOOK_PROFILE_FILE,
+    HOOK_PROFILE_FILE_BACKUP_COUNT,
+    HOOK_PROFILE_FILE_MAX_BYTES,
     METRICS_PORT,
     MONITORING_PASSWORD_KEY,
     MONITORING_USER,
@@ -108,6 +113,7 @@ from constants import (
     PGBACKREST_METRICS_PORT,
     PLUGIN_OVERRIDES,
     POSTGRES_LOG_FILES,
+    POSTGRESQL_EXPORTER_QUERIES_FILE,
     REPLICATION_PASSWORD_KEY,
     REPLICATION_USER,
     REWIND_PASSWORD_KEY,
@@ -129,6 +135,13 @@ from constants import (
 )
 from ldap import PostgreSQLLDAP
 from patroni import NotReadyError, Patroni, SwitchoverFailedError, SwitchoverNotSyncError
+from profiling import (
+    instrument_container,
+    instrument_database_connections,
+    instrument_k8s_client,
+    profile,
+    retry_sleep,
+)
 from relations.async_replication import (
     REPLICATION_CONSUMER_RELATION,
     REPLICATION_OFFER_RELATION,
@@ -157,6 +170,8 @@ logging.getLogger("httpx").setLevel(logging.ERROR)
 
 Scopes = Literal[APP_SCOPE, UNIT_SCOPE]
 PASSWORD_USERS = [*SYSTEM_USERS, "patroni"]
+# The server facts small enough to be kept in the local state of the unit.
+STORED_SERVER_FACTS = ["generation", "version", "validated"]
 
 
 class CannotConnectError(Exception):
@@ -167,7 +182,8 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
     """Charmed Operator for the PostgreSQL database."""
 
     config_type = CharmConfig
-    on = AuthorisationRulesChangeCharmEvents()
+    on = PostgresqlCharmEvents()
+    _stored = StoredState()
 
     def __init__(self, *args):
         super().__init__(*args)
@@ -182,6 +198,17 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             self.unit.status = BlockedStatus("Disabled")
             sys.exit(0)
 
+        self._stored.set_default(
+            available_resources={},
+            server_facts="{}",
+            server_generation=0,
+            patroni_config_hash=None,
+            patroni_dcs_config_hash=None,
+            patroni_yml_hash=None,
+            rock_image=None,
+            rock_version=None,
+        )
+
         self.peer_relation_app = DataPeerData(
             self.model,
             relation_name=PEER,
@@ -197,6 +224,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
         self.postgresql_service = "postgresql"
         self.rotate_logs_service = "rotate-logs"
+        self.backup_service = "pgbackrest-backup"
         self.pgbackrest_server_service = "pgbackrest server"
         self.ldap_sync_service = "ldap-sync"
         self.metrics_service = "metrics_server"
@@ -211,6 +239,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             "/usr/bin/juju-exec" if self.model.juju_version.major > 2 else "/usr/bin/juju-run"
         )
         self._observer = AuthorisationRulesObserver(self, run_cmd)
+        self.backup_job_watcher = BackupJobWatcher(self, run_cmd)
         self.framework.observe(self.on.databases_change, self._on_databases_change)
         self.framework.observe(self.on.config_changed, self._on_config_changed)
         self.framework.observe(self.on.leader_elected, self._on_leader_elected)
@@ -226,11 +255,15 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         self.framework.observe(self.on.get_primary_action, self._on_get_primary)
         self.framework.observe(self.on.update_status, self._on_update_status)
         self.framework.observe(self.on.secret_remove, self._on_secret_remove)
+        self.framework.observe(self.framework.on.commit, self._on_commit)
 
         self._certs_path = "/usr/local/share/ca-certificates"
         self._storage_path = self.meta.storages["pgdata"].location
         self.pgdata_path = f"{self._storage_path}/pgdata"
 
+        # Observed before the upgrade handlers, which may render the Patroni configuration
+        # (that depends on the Rock version) before the workload container is ready.
+        self.framework.observe(self.on.upgrade_charm, self._on_upgrade_charm_invalidate_caches)
         self.upgrade = PostgreSQLUpgrade(
             self,
             model=get_postgresql_k8s_dependencies_model(),
@@ -268,6 +301,9 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             except ModelError:
                 logger.exception("failed to open port")
         self.tracing = Tracing(self, tracing_relation_name=TRACING_RELATION_NAME)
+        # Send the profiled calls as spans only when they can reach a tracing backend.
+        profile.export_spans = self.model.get_relation(TRACING_RELATION_NAME) is not None
+        instrument_container(self.unit.get_container("postgresql"))
 
     def _on_databases_change(self, _):
         """Handle databases change event."""
@@ -422,7 +458,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
     @cached_property
     def postgresql(self) -> PostgreSQL:
         """Returns an instance of the object used to interact with the database."""
-        return PostgreSQL(
+        postgresql = PostgreSQL(
             primary_host=self.primary_endpoint,
             current_host=self.endpoint,
             user=USER,
@@ -430,6 +466,8 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             database=DATABASE_DEFAULT_NAME,
             system_users=SYSTEM_USERS,
         )
+        instrument_database_connections(postgresql, "_open_connection")
+        return postgresql
 
     @cached_property
     def endpoint(self) -> str:
@@ -689,6 +727,9 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         if self.is_blocked and "Configuration Error" in self.unit.status.message:
             self._set_active_status()
 
+        # Apply the backup parallelism and compression settings.
+        self.backup.update_pgbackrest_configuration()
+
         # Update the sync-standby endpoint in the async replication data.
         self.async_replication.update_async_replication_data()
 
@@ -907,7 +948,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
     def fix_leader_annotation(self) -> bool:
         """Fix the leader annotation if it's missing."""
-        client = Client()
+        client = self._lightkube_client
         try:
             endpoint = client.get(Endpoints, name=self.cluster_name, namespace=self._namespace)
             if "leader" not in endpoint.metadata.annotations:
@@ -949,6 +990,11 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
     def _on_postgresql_pebble_ready(self, event: WorkloadEvent) -> None:
         """Event handler for PostgreSQL container on PebbleReadyEvent."""
+        # The pod may have been rescheduled or its resources changed.
+        self._invalidate_available_resources()
+        self._invalidate_rock_version_if_image_changed()
+        self._invalidate_server_facts()
+
         if self._endpoint in self._endpoints:
             self._fix_pod()
 
@@ -966,6 +1012,14 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         # Create the PostgreSQL data directory. This is needed on cloud environments
         # where the volume is mounted with more restrictive permissions.
         self._create_pgdata(container)
+        with open("templates/postgres_exporter_queries.yaml") as file:
+            container.push(
+                POSTGRESQL_EXPORTER_QUERIES_FILE,
+                file.read(),
+                user=WORKLOAD_OS_USER,
+                group=WORKLOAD_OS_GROUP,
+                make_dirs=True,
+            )
 
         self.unit.set_workload_version(self._patroni.rock_postgresql_version)
 
@@ -1037,6 +1091,8 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
                 danger_state = ""
                 if len(self._patroni.get_running_cluster_members()) < self.app.planned_units():
                     danger_state = " (degraded)"
+                elif self.backup.is_archive_push_queue_full():
+                    danger_state = " (WAL archive queue full)"
                 self.unit.status = ActiveStatus(
                     f"{'Standby' if self.is_standby_leader else 'Primary'}{danger_state}"
                 )
@@ -1111,6 +1167,12 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         """Returns whether the unit is in a blocked state."""
         return isinstance(self.unit.status, BlockedStatus)
 
+    def _on_upgrade_charm_invalidate_caches(self, _) -> None:
+        """Drop the cached workload facts, as the refresh may have changed the image."""
+        self._invalidate_available_resources()
+        self._invalidate_rock_version_if_image_changed()
+        self._invalidate_server_facts()
+
     def _on_upgrade_charm(self, _) -> None:
         self._fix_pod()
 
@@ -1123,7 +1185,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             ApiError when there is any problem communicating
                 to K8s API
         """
-        client = Client()
+        client = self._lightkube_client
         patch = {
             "metadata": {"labels": {"application": "patroni", "cluster-name": self.cluster_name}}
         }
@@ -1142,7 +1204,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
         See https://github.com/canonical/postgresql-k8s-operator/issues/392
         """
-        client = Client()
+        client = self._lightkube_client
         svc_name = f"{self.app.name}-endpoints"
         try:
             client.get(Service, name=svc_name, namespace=self.model.name)
@@ -1159,7 +1221,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
     def _create_services(self) -> None:
         """Create kubernetes services for primary and replicas endpoints."""
-        client = Client()
+        client = self._lightkube_client
 
         pod0 = client.get(
             res=Pod,
@@ -1215,7 +1277,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             logger.debug("Early exit _cleanup_old_cluster_resources: cluster already initialised")
             return
 
-        client = Client()
+        client = self._lightkube_client
         for kind, suffix in itertools.product([Service, Endpoints], ["", "-config", "-sync"]):
             try:
                 client.delete(
@@ -1414,6 +1476,20 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         # Update the sync-standby endpoint in the async replication data.
         self.async_replication.update_async_replication_data()
 
+    def _on_commit(self, _) -> None:
+        """Release the resources held during the hook."""
+        # Only close the clients that were used in this hook.
+        if "_patroni" in self.__dict__:
+            self._patroni.close()
+        if "postgresql" in self.__dict__:
+            logger.debug(
+                f"Opened {self.postgresql.connections_opened} database connection(s) in this hook"
+            )
+            self.postgresql.close_connections()
+        profile.write(
+            HOOK_PROFILE_FILE, HOOK_PROFILE_FILE_MAX_BYTES, HOOK_PROFILE_FILE_BACKUP_COUNT
+        )
+
     def _on_stop(self, _):
         # Remove data from the drive when scaling down to zero to prevent
         # the cluster from getting stuck when scaling back up.
@@ -1540,6 +1616,8 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
     def _on_update_status(self, _) -> None:
         """Update the unit status message."""
         container = self.unit.get_container("postgresql")
+        # Refresh the progress of a running backup (and finish it) before any early exit.
+        self.backup.check_backup_job()
         if not self._on_update_status_early_exit_checks(container):
             return
 
@@ -1564,6 +1642,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
                 container.restart(self.postgresql_service)
             except ChangeError:
                 logger.exception("Failed to restart patroni")
+            self._invalidate_server_facts()
             # If service doesn't recover fast, exit and wait for next hook run to re-check
             if not self._patroni.member_started:
                 self.unit.status = MaintenanceStatus("Database service inactive, restarting")
@@ -1578,6 +1657,13 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         self.async_replication.update_async_replication_data()
 
         self.backup.coordinate_stanza_fields()
+        self.backup.schedule_backups()
+        self.backup.run_scheduled_backup()
+        self.backup.run_requested_backups()
+
+        # Keep the status of the ownership transfers that still run out of time.
+        if self.postgresql_client_relation.resume_ownership_transfers():
+            return
 
         self._set_active_status()
 
@@ -1602,6 +1688,8 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
         if not self._patroni.member_started:
             logger.debug("Restore check early exit: Patroni has not started yet")
+            if progress := self.backup.restore_progress():
+                self.unit.status = MaintenanceStatus(progress)
             return False
 
         restoring_backup = self.app_peer_data.get("restoring-backup")
@@ -1619,8 +1707,12 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             "restore-stanza": "",
             "restore-to-time": "",
             "restore-timeline": "",
+            "restore-delta": "",
+            "restore-wal-stop": "",
         })
         self.update_config()
+        # Stop prefetching the WAL, unless configured.
+        self.backup.update_pgbackrest_configuration()
         self.restore_patroni_on_failure_condition()
 
         logger.info(
@@ -1805,6 +1897,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
                     f"password={self.get_secret('app', MONITORING_PASSWORD_KEY)} "
                     "host=/var/run/postgresql port=5432 database=postgres"
                 ),
+                "PG_EXPORTER_EXTEND_QUERY_PATH": POSTGRESQL_EXPORTER_QUERIES_FILE,
             },
         }
 
@@ -1982,12 +2075,15 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             logger.exception(error_message)
             self.unit.status = BlockedStatus(error_message)
             return
+        self._invalidate_server_facts()
 
         # Update health check URL.
         self._update_pebble_layers()
 
         try:
-            for attempt in Retrying(wait=wait_fixed(3), stop=stop_after_delay(300)):
+            for attempt in Retrying(
+                wait=wait_fixed(3), stop=stop_after_delay(300), sleep=retry_sleep
+            ):
                 with attempt:
                     if not self._can_connect_to_postgresql:
                         raise CannotConnectError
@@ -2060,7 +2156,9 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
     @property
     def _can_connect_to_postgresql(self) -> bool:
         try:
-            for attempt in Retrying(stop=stop_after_delay(10), wait=wait_fixed(3)):
+            for attempt in Retrying(
+                stop=stop_after_delay(10), wait=wait_fixed(3), sleep=retry_sleep
+            ):
                 with attempt:
                     if not self.postgresql.get_postgresql_timezones():
                         logger.debug("Cannot connect to database (CannotConnectError)")
@@ -2306,9 +2404,9 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
 
         logger.info("Updating Patroni config file")
         # Update and reload configuration based on TLS files availability.
-        self._patroni.render_patroni_yml_file(
+        patroni_yml_hash = self._patroni.render_patroni_yml_file(
             connectivity=self.is_connectivity_enabled,
-            is_creating_backup=is_creating_backup,
+            is_creating_backup=is_creating_backup or self.backup.is_backup_job_running,
             enable_ldap=self.is_ldap_enabled,
             enable_tls=self.is_tls_enabled,
             is_no_sync_member=self.upgrade.is_no_sync_member,
@@ -2316,6 +2414,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             pitr_target=self.app_peer_data.get("restore-to-time"),
             restore_timeline=self.app_peer_data.get("restore-timeline"),
             restore_to_latest=self.app_peer_data.get("restore-to-time", None) == "latest",
+            restore_delta=self.app_peer_data.get("restore-delta") == "True",
             stanza=self.app_peer_data.get("stanza", self.unit_peer_data.get("stanza")),
             restore_stanza=self.app_peer_data.get("restore-stanza"),
             parameters=postgresql_parameters,
@@ -2345,8 +2444,13 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             logger.warning("Early exit update_config: Unable to patch Patroni API")
             return False
 
+        # Patroni only needs to be reloaded when its configuration or the TLS files changed.
+        patroni_config_hash = shake_128(
+            f"{patroni_yml_hash}{self.tls.get_tls_files()}".encode()
+        ).hexdigest(16)
         self._handle_postgresql_restart_need(
-            self.unit_peer_data.get("config_hash") != self.generate_config_hash
+            self.unit_peer_data.get("config_hash") != self.generate_config_hash,
+            patroni_config_hash,
         )
         self._restart_metrics_service()
         self._restart_ldap_sync_service()
@@ -2359,11 +2463,78 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             self.app_peer_data.update({"user_hash": self.generate_user_hash})
         return True
 
+    @cached_property
+    def _server_facts(self) -> dict:
+        """Facts about the PostgreSQL server of this unit that don't change while it runs.
+
+        The small facts (the version and the config values validated against the server) are kept
+        in the local state of the unit along with the generation of the server, which the charm
+        bumps when it restarts or reloads PostgreSQL (or its container starts), so they're only
+        retrieved again then. The lists of timezones and locales are large, so they're only kept
+        in memory during the hook.
+        """
+        generation = self._stored.server_generation
+        facts = {}
+        with suppress(json.JSONDecodeError):
+            facts = json.loads(self._stored.server_facts)
+        if facts.get("generation") != generation:
+            facts = {"generation": generation}
+        # Previous revisions also stored the lists of values known by the server.
+        facts = {name: facts[name] for name in STORED_SERVER_FACTS if name in facts}
+        self._stored.server_facts = json.dumps(facts)
+        return facts
+
+    def _invalidate_server_facts(self) -> None:
+        """Retrieve the server facts again, as PostgreSQL restarted or reloaded."""
+        self._stored.server_generation += 1
+        self.__dict__.pop("_server_facts", None)
+
+    def _server_fact(self, name: str, retrieve: Callable[[], list | str]) -> list | str:
+        """Cached fact about the PostgreSQL server, retrieved when not known yet."""
+        facts = self._server_facts
+        if name not in facts:
+            facts[name] = retrieve()
+            self._store_server_facts()
+        return facts[name]
+
+    def _store_server_facts(self) -> None:
+        """Keep the small server facts in the local state of the unit."""
+        facts = self._server_facts
+        self._stored.server_facts = json.dumps({
+            name: facts[name] for name in STORED_SERVER_FACTS if name in facts
+        })
+
+    def _is_server_value(
+        self, option: str, value: str | None, fact: str, retrieve: Callable[[], list[str]]
+    ) -> bool:
+        """Returns whether the value of a config option is one of the values the server knows."""
+        validated = self._server_facts.setdefault("validated", {})
+        if option in validated and validated[option] == value:
+            return True
+        if value not in set(self._server_fact(fact, retrieve)):
+            return False
+        validated[option] = value
+        self._store_server_facts()
+        return True
+
+    def get_postgresql_version(self) -> str:
+        """Returns the version of the PostgreSQL server of this unit.
+
+        Raises:
+            PostgreSQLGetPostgreSQLVersionError if the version can't be retrieved.
+        """
+        try:
+            return self._server_fact("version", self.postgresql.get_postgresql_version)
+        except psycopg2.Error as e:
+            raise PostgreSQLGetPostgreSQLVersionError() from e
+
     def _validate_config_options(self) -> None:
         """Validates specific config options that need access to the database or to the TLS status."""
-        if (
-            self.config.instance_default_text_search_config
-            not in self.postgresql.get_postgresql_text_search_configs()
+        if not self._is_server_value(
+            "instance_default_text_search_config",
+            self.config.instance_default_text_search_config,
+            "text-search-configs",
+            lambda: sorted(self.postgresql.get_postgresql_text_search_configs()),
         ):
             raise ValueError(
                 "instance_default_text_search_config config option has an invalid value"
@@ -2375,41 +2546,86 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         if not self.postgresql.validate_date_style(self.config.request_date_style):
             raise ValueError("request_date_style config option has an invalid value")
 
-        if self.config.request_time_zone not in self.postgresql.get_postgresql_timezones():
+        if not self._is_server_value(
+            "request_time_zone",
+            self.config.request_time_zone,
+            "timezones",
+            lambda: sorted(self.postgresql.get_postgresql_timezones()),
+        ):
             raise ValueError("request_time_zone config option has an invalid value")
 
-        if (
-            self.config.storage_default_table_access_method
-            not in self.postgresql.get_postgresql_default_table_access_methods()
+        if not self._is_server_value(
+            "storage_default_table_access_method",
+            self.config.storage_default_table_access_method,
+            "table-access-methods",
+            lambda: sorted(self.postgresql.get_postgresql_default_table_access_methods()),
         ):
             raise ValueError(
                 "storage_default_table_access_method config option has an invalid value"
             )
 
-        container = self.unit.get_container("postgresql")
-        output, _ = container.exec(["locale", "-a"]).wait_output()
-        locales = list(output.splitlines())
         for parameter in ["response_lc_monetary", "response_lc_numeric", "response_lc_time"]:
             value = self.model.config.get(parameter)
-            if value is not None and value not in locales:
+            if value is not None and not self._is_server_value(
+                parameter, value, "locales", self._list_locales
+            ):
                 raise ValueError(
                     f"Value for {parameter} not one of the locales available in the system"
                 )
 
-    def _handle_postgresql_restart_need(self, config_changed: bool):
-        """Handle PostgreSQL restart need based on the TLS configuration and configuration changes."""
+    def _list_locales(self) -> list[str]:
+        """Returns the locales available in the workload container."""
+        container = self.unit.get_container("postgresql")
+        output, _ = container.exec(["locale", "-a"]).wait_output()
+        return sorted(output.splitlines())
+
+    def _reload_patroni_configuration_if_changed(self, patroni_config_hash: str | None) -> bool:
+        """Reload Patroni, unless this configuration was already reloaded.
+
+        Returns:
+            whether Patroni was reloaded.
+        """
+        if (
+            patroni_config_hash is not None
+            and self._stored.patroni_config_hash == patroni_config_hash
+        ):
+            logger.debug("Patroni configuration unchanged, skipping reload")
+            return False
+        if not self._patroni.reload_patroni_configuration():
+            return False
+        self._invalidate_server_facts()
+        if patroni_config_hash is not None:
+            self._stored.patroni_config_hash = patroni_config_hash
+        return True
+
+    def _handle_postgresql_restart_need(
+        self, config_changed: bool, patroni_config_hash: str | None = None
+    ):
+        """Handle PostgreSQL restart need based on the TLS configuration and configuration changes.
+
+        Args:
+            config_changed: whether the charm configuration changed.
+            patroni_config_hash: hash of the Patroni configuration; when it's equal to the
+                last reloaded one, Patroni is not reloaded again.
+        """
         restart_postgresql = self.is_tls_enabled != self.postgresql.is_tls_enabled()
+        reloaded = False
         try:
-            self._patroni.reload_patroni_configuration()
+            reloaded = self._reload_patroni_configuration_if_changed(patroni_config_hash)
             self.unit_peer_data.update({"tls": "enabled" if self.is_tls_enabled else ""})
         except Exception as e:
             logger.error(f"Reload patroni call failed! error: {e!s}")
         if config_changed and not restart_postgresql:
             # Wait for some more time than the Patroni's loop_wait default value (10 seconds),
             # which tells how much time Patroni will wait before checking the configuration
-            # file again to reload it.
+            # file again to reload it. Without a reload, Patroni has no new configuration
+            # to apply, so a restart can only be already pending.
             try:
-                for attempt in Retrying(stop=stop_after_attempt(5), wait=wait_fixed(3)):
+                for attempt in Retrying(
+                    stop=stop_after_attempt(5 if reloaded else 1),
+                    wait=wait_fixed(3),
+                    sleep=retry_sleep,
+                ):
                     with attempt:
                         restart_postgresql = (
                             restart_postgresql or self.postgresql.is_restart_pending()
@@ -2453,6 +2669,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             if replan:
                 container.replan()
                 logging.info("Restarted postgresql service")
+                self._invalidate_server_facts()
         if current_layer.checks != new_layer.checks:
             # Changes were made, add the new layer.
             container.add_layer(self.postgresql_service, new_layer, combine=True)
@@ -2469,13 +2686,28 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         """
         return unit_name.replace("/", "-")
 
-    def _get_node_name_for_pod(self) -> str:
-        """Return the node name for a given pod."""
-        client = Client()
-        pod = client.get(
+    @cached_property
+    def _lightkube_client(self) -> Client:
+        """Kubernetes client shared by all the calls made during the hook."""
+        return instrument_k8s_client(Client())
+
+    @cached_property
+    def _pod(self) -> Pod:
+        """Pod of this unit, fetched once per hook."""
+        return self._lightkube_client.get(
             Pod, name=self._unit_name_to_pod_name(self.unit.name), namespace=self._namespace
         )
-        return pod.spec.nodeName
+
+    @cached_property
+    def _node(self) -> Node:
+        """Node where the pod of this unit runs, fetched once per hook."""
+        return self._lightkube_client.get(
+            Node, name=self._get_node_name_for_pod(), namespace=self._namespace
+        )
+
+    def _get_node_name_for_pod(self) -> str:
+        """Return the node name for a given pod."""
+        return self._pod.spec.nodeName
 
     def get_resources_limits(self, container_name: str) -> dict:
         """Return resources limits for a given container.
@@ -2483,30 +2715,30 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
         Args:
             container_name: name of the container to get resources limits for
         """
-        client = Client()
-        pod = client.get(
-            Pod, self._unit_name_to_pod_name(self.unit.name), namespace=self._namespace
-        )
-
-        for container in pod.spec.containers:
+        for container in self._pod.spec.containers:
             if container.name == container_name:
                 return container.resources.limits or {}
         return {}
 
     def get_node_allocable_memory(self) -> int:
         """Return the allocable memory in bytes for the current K8S node."""
-        client = Client()
-        node = client.get(Node, name=self._get_node_name_for_pod(), namespace=self._namespace)
-        return any_memory_to_bytes(node.status.allocatable["memory"])
+        return any_memory_to_bytes(self._node.status.allocatable["memory"])
 
     def get_node_cpu_cores(self) -> int:
         """Return the number of CPU cores for the current K8S node."""
-        client = Client()
-        node = client.get(Node, name=self._get_node_name_for_pod(), namespace=self._namespace)
-        return any_cpu_to_cores(node.status.allocatable["cpu"])
+        return any_cpu_to_cores(self._node.status.allocatable["cpu"])
 
     def get_available_resources(self) -> tuple[int, int]:
-        """Get available CPU cores and memory (in bytes) for the container."""
+        """Get available CPU cores and memory (in bytes) for the container.
+
+        The result is cached in the local unit state for AVAILABLE_RESOURCES_CACHE_TTL
+        seconds (not in the peer data, so refreshing it doesn't trigger any relation event),
+        so most hooks don't need to call the K8s API.
+        """
+        cached_resources = self._stored.available_resources
+        if cached_resources.get("expires", 0) > time.time():
+            return cached_resources["cpu"], cached_resources["memory"]
+
         cpu_cores = self.get_node_cpu_cores()
         allocable_memory = self.get_node_allocable_memory()
         container_limits = self.get_resources_limits(container_name="postgresql")
@@ -2523,8 +2755,36 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
                 logger.debug(f"Memory constrained to {memory_str} from resource limit")
                 allocable_memory = constrained_memory
 
+        self._stored.available_resources = {
+            "cpu": cpu_cores,
+            "memory": allocable_memory,
+            "expires": int(time.time()) + AVAILABLE_RESOURCES_CACHE_TTL,
+        }
         return cpu_cores, allocable_memory
 
+    def _invalidate_available_resources(self) -> None:
+        """Drop the cached available resources, so they are fetched again from the K8s API."""
+        self._stored.available_resources = {}
+        # Previous revisions cached them in the unit peer data.
+        self.unit_peer_data.pop("available-resources", None)
+
+    def _invalidate_rock_version_if_image_changed(self) -> None:
+        """Drop the cached Rock version when the workload container runs another image."""
+        try:
+            image = next(
+                status.imageID
+                for status in self._pod.status.containerStatuses
+                if status.name == "postgresql"
+            )
+        except (ApiError, StopIteration, TypeError):
+            image = None
+        if image is None or self._stored.rock_image != image:
+            self._stored.rock_version = None
+            self._stored.rock_image = image
+        # Previous revisions cached them in the unit peer data.
+        for key in ["rock-image", "rock-version"]:
+            self.unit_peer_data.pop(key, None)
+
     def on_deployed_without_trust(self) -> None:
         """Blocks the application and returns a specific error message for deployments made without --trust."""
         self.unit.status = BlockedStatus(
@@ -2560,7 +2820,9 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
             })
             return user_database_map
         try:
-            for user in self.postgresql.list_users(current_host=self.is_connectivity_enabled):
+            for user, databases in self.postgresql.list_accessible_databases_for_users(
+                current_host=self.is_connectivity_enabled
+            ).items():
                 if user in (
                     "backup",
                     "monitoring",
@@ -2570,11 +2832,7 @@ class PostgresqlOperatorCharm(TypedCharmBase[CharmConfig]):
                     "rewind",
                 ):
                     continue
-                if databases := ",".join(
-                    self.postgresql.list_accessible_databases_for_user(
-                        user, current_host=self.is_connectivity_enabled
-                    )
-                ):
+                if databases := ",".join(sorted(databases)):
                     user_database_map[user] = databases
                 else:
                     logger.debug(f"User {user} has no databases to connect to")
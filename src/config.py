@@ -10,6 +10,8 @@ from typing import Annotated, Literal
 from charms.data_platform_libs.v0.data_models import BaseConfigModel
 from pydantic import Field, NonNegativeInt, PositiveInt, validator
 
+from schedule import CronSchedule
+
 logger = logging.getLogger(__name__)
 
 # Type for worker process parameters that must be >= 2
@@ -56,6 +58,9 @@ FreezeMinAgeInt = Annotated[int, Field(ge=0, le=1000000000)]
 AutovacuumNapTimeInt = Annotated[int, Field(ge=1, le=2147483)]
 DeadlockTimeoutInt = Annotated[int, Field(ge=1, le=2147483647)]
 ProfileLimitMemoryInt = Annotated[int, Field(ge=128, le=9999999)]
+# The backups and the archived WAL are compressed with zst (see templates/pgbackrest.conf.j2),
+# for which pgBackRest accepts levels up to 22.
+BackupCompressLevelInt = Annotated[int, Field(ge=0, le=22)]
 
 
 class CharmConfig(BaseConfigModel):
@@ -63,6 +68,12 @@ class CharmConfig(BaseConfigModel):
 
     synchronous_node_count: Literal["all", "majority"] | PositiveInt
     synchronous_mode_strict: bool = Field(default=True)
+    backup_archive_async: bool = Field(default=False)
+    backup_archive_get_queue_max: PositiveInt | None
+    backup_archive_push_queue_max: PositiveInt | None
+    backup_compress_level: Literal["auto"] | BackupCompressLevelInt | None
+    backup_process_max: Literal["auto"] | PositiveInt | None
+    backup_schedule: str | None
     connection_authentication_timeout: AuthTimeoutInt | None
     connection_statement_timeout: PgIntMax | None
     cpu_max_logical_replication_workers: Literal["auto"] | WorkerProcessInt | None
@@ -258,6 +269,26 @@ class CharmConfig(BaseConfigModel):
         """Return plugin config names in a iterable."""
         return filter(lambda x: x.startswith("plugin_"), cls.keys())
 
+    @validator("backup_compress_level")
+    @classmethod
+    def backup_compress_level_values(cls, value: str | int | None) -> str | int | None:
+        """Check backup_compress_level config option is a level of the zst compress type.
+
+        The bounds of BackupCompressLevelInt aren't applied by pydantic to the members of a union.
+        """
+        if isinstance(value, int) and not 0 <= value <= 22:
+            raise ValueError("Value not between 0 and 22")
+
+        return value
+
+    @validator("backup_schedule")
+    @classmethod
+    def backup_schedule_values(cls, value: str) -> str | None:
+        """Check backup_schedule config option is in the crontab format."""
+        CronSchedule(value)
+
+        return value
+
     @validator("durability_synchronous_commit")
     @classmethod
     def durability_synchronous_commit_values(cls, value: str) -> str | None:
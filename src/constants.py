@@ -7,6 +7,8 @@ DATABASE_DEFAULT_NAME = "postgres"
 DATABASE_PORT = "5432"
 PEER = "database-peers"
 API_REQUEST_TIMEOUT = 5
+# Time (in seconds) the available CPU and memory of the unit are cached.
+AVAILABLE_RESOURCES_CACHE_TTL = 3600
 PATRONI_CLUSTER_STATUS_ENDPOINT = "cluster"
 BACKUP_USER = "backup"
 REPLICATION_USER = "replication"
@@ -20,9 +22,13 @@ WORKLOAD_OS_GROUP = "postgres"
 WORKLOAD_OS_USER = "postgres"
 METRICS_PORT = "9187"
 PGBACKREST_METRICS_PORT = "9854"
+# Custom queries of the postgres_exporter, pushed to the workload container.
+POSTGRESQL_EXPORTER_QUERIES_FILE = "/home/postgres/postgres-exporter-queries.yaml"
 POSTGRESQL_DATA_PATH = "/var/lib/postgresql/data/pgdata"
 POSTGRESQL_LOGS_PATH = "/var/log/postgresql"
 POSTGRESQL_LOGS_PATTERN = "postgresql*.log"
+# Size, in megabytes, of a WAL segment.
+WAL_SEGMENT_SIZE = 16
 POSTGRES_LOG_FILES = [
     "/var/log/pgbackrest/*",
     "/var/log/postgresql/patroni.log",
@@ -53,6 +59,20 @@ SPI_MODULE = ["refint", "autoinc", "insert_username", "moddatetime"]
 
 TRACING_RELATION_NAME = "tracing"
 
+# App peer data key of the read-only endpoint last published to each client relation.
+READ_ONLY_ENDPOINTS_KEY = "read-only-endpoints"
+# App peer data key of the client relations whose database waits for the rest of the
+# transfer of the ownership of its objects (resumed on update-status).
+OWNERSHIP_TRANSFERS_KEY = "ownership-transfers"
+# App peer data key of the request (database and extra user roles) last provided to
+# each client relation.
+PROVIDED_REQUESTS_KEY = "provided-requests"
+
+# Rotating file where the profile of each hook is appended (one JSON object per line).
+HOOK_PROFILE_FILE = "/var/log/postgresql-k8s-charm/hook-profile.jsonl"
+HOOK_PROFILE_FILE_MAX_BYTES = 1024 * 1024
+HOOK_PROFILE_FILE_BACKUP_COUNT = 3
+
 DATABASE = "database"
 LEGACY_DB = "db"
 LEGACY_DB_ADMIN = "db-admin"
@@ -61,6 +81,17 @@ ALL_LEGACY_RELATIONS = [LEGACY_DB, LEGACY_DB_ADMIN]
 ENDPOINT_SIMULTANEOUSLY_BLOCKING_MESSAGE = (
     "Please choose one endpoint to use. No need to relate all of them simultaneously!"
 )
+OWNERSHIP_TRANSFER_MESSAGE = "Transferring the ownership of the database objects"
 
 PGBACKREST_LOGROTATE_FILE = "/etc/logrotate.d/pgbackrest.logrotate"
 PGBACKREST_LOGS_PATH = "/var/log/pgbackrest"
+# Cached listing of the backups and timelines in the pgBackRest repository.
+PGBACKREST_CATALOG_FILE = "/home/postgres/pgbackrest-catalog.json"
+# Files of the backup job service (kept in sync with scripts/backup_job.py).
+BACKUP_JOB_SCRIPT = "/home/postgres/backup_job.py"
+BACKUP_JOB_STATE_FILE = "/home/postgres/backup-job.json"
+# stdout is written in numbered segments (e.g. backup-job.log.1), uploaded while the job runs.
+BACKUP_JOB_STDOUT_FILE = "/home/postgres/backup-job.log"
+BACKUP_JOB_STDERR_FILE = "/home/postgres/backup-job.err"
+# Pebble notice recorded by the backup job when it completes a segment of stdout or exits.
+BACKUP_JOB_NOTICE = "canonical.com/postgresql-k8s/backup-job"
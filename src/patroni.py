@@ -4,20 +4,29 @@
 
 """Helper class used to manage interactions with Patroni API and configuration files."""
 
+import json
 import logging
 import os
 import pwd
-from asyncio import as_completed, create_task, run, wait
+from asyncio import (
+    AbstractEventLoop,
+    as_completed,
+    create_task,
+    gather,
+    new_event_loop,
+    wait,
+)
 from contextlib import suppress
 from functools import cached_property
+from hashlib import shake_128
 from signal import SIGHUP
 from ssl import CERT_NONE, create_default_context
+from time import monotonic
 from typing import Any, TypedDict
 
 import requests
 import yaml
 from httpx import AsyncClient, BasicAuth, HTTPError
-from jinja2 import Template
 from ops.pebble import Error
 from tenacity import (
     Future,
@@ -39,7 +48,8 @@ from constants import (
     REWIND_USER,
     TLS_CA_FILE,
 )
-from utils import label2name
+from profiling import instrument_http_client, retry_sleep
+from utils import label2name, render_template, template_checksum
 
 STARTED_STATES = ["running", "streaming"]
 RUNNING_STATES = [*STARTED_STATES, "starting"]
@@ -89,6 +99,82 @@ class ClusterMember(TypedDict):
     lag: int
 
 
+class MemberHealth(TypedDict):
+    """Type for the health of a cluster member."""
+
+    role: str | None
+    state: str | None
+    lag: int | str | None
+    latency: float | None
+    healthy: bool
+
+
+class ClusterTopology:
+    """Point-in-time view of the Patroni cluster members.
+
+    A single snapshot is fetched from the Patroni REST API and shared by every
+    component of the charm until it's explicitly invalidated (e.g. after a switchover).
+    """
+
+    def __init__(self, members: list[ClusterMember]):
+        self.members = members
+
+    def _member_with_role(self, role: str, running: bool = False) -> str | None:
+        for member in self.members:
+            if member["role"] != role:
+                continue
+            if running and member["state"] not in STARTED_STATES:
+                logger.warning(f"{role} {member['name']} is not running")
+                continue
+            return member["name"]
+
+    @property
+    def primary(self) -> str | None:
+        """Name of the primary member."""
+        return self._member_with_role("leader")
+
+    def standby_leader(self, check_whether_is_running: bool = False) -> str | None:
+        """Name of the standby leader member."""
+        return self._member_with_role("standby_leader", running=check_whether_is_running)
+
+    @property
+    def sync_standbys(self) -> list[str]:
+        """Names of the sync standby members."""
+        return [member["name"] for member in self.members if member["role"] == "sync_standby"]
+
+    @property
+    def member_names(self) -> set[str]:
+        """Names of all the cluster members."""
+        return {member["name"] for member in self.members}
+
+    @property
+    def running_members(self) -> list[str]:
+        """Names of the members which are running or starting."""
+        return [member["name"] for member in self.members if member["state"] in RUNNING_STATES]
+
+    @property
+    def all_members_ready(self) -> bool:
+        """Whether all members are running and one of them is a leader or a standby leader."""
+        # Sometimes there may exist (for some period of time) only replicas
+        # after a failed switchover.
+        return all(member["state"] in STARTED_STATES for member in self.members) and any(
+            member["role"] in ["leader", "standby_leader"] for member in self.members
+        )
+
+    @property
+    def timeline(self) -> int | None:
+        """Latest timeline of the cluster members."""
+        return max((member.get("timeline", 0) for member in self.members), default=None)
+
+    @property
+    def is_creating_backup(self) -> bool:
+        """Whether any member is tagged as creating a backup."""
+        return any(
+            "tags" in member and member["tags"].get("is_creating_backup")
+            for member in self.members
+        )
+
+
 class Patroni:
     """This class handles the communication with Patroni API and configuration files."""
 
@@ -116,6 +202,9 @@ class Patroni:
         self._replication_password = replication_password
         self._rewind_password = rewind_password
         self._patroni_password = patroni_password
+        self._cluster_topology: ClusterTopology | None = None
+        self._async_clients: dict[bool, tuple[int | None, AsyncClient]] = {}
+        self._member_schemes: dict[str, str] = {}
 
     @property
     def _verify(self) -> str | bool:
@@ -124,6 +213,11 @@ class Patroni:
         # TLS is enabled, otherwise True is set because it's the default value.
         return f"{self._storage_path}/{TLS_CA_FILE}" if self._charm.is_peer_data_tls_set else True
 
+    @cached_property
+    def _session(self) -> requests.Session:
+        # Pooled keep-alive session shared by all the synchronous calls of the hook.
+        return instrument_http_client(requests.Session())
+
     @cached_property
     def _patroni_auth(self) -> requests.auth.HTTPBasicAuth:
         return requests.auth.HTTPBasicAuth("patroni", self._patroni_password)
@@ -140,13 +234,20 @@ class Patroni:
 
     @property
     def rock_postgresql_version(self) -> str | None:
-        """Version of Postgresql installed in the Rock image."""
+        """Version of Postgresql installed in the Rock image.
+
+        The version is remembered in the charm local state until the workload image changes.
+        """
+        if version := self._charm._stored.rock_version:
+            return version
         container = self._charm.unit.get_container("postgresql")
         if not container.can_connect():
             logger.debug("Cannot get Postgresql version from Rock. Container inaccessible")
             return
         snap_meta = container.pull("/meta.charmed-postgresql/snap.yaml")
-        return yaml.safe_load(snap_meta)["version"]
+        version = yaml.safe_load(snap_meta)["version"]
+        self._charm._stored.rock_version = version
+        return version
 
     @staticmethod
     def _dict_to_hba_string(_dict: dict[str, Any]) -> str:
@@ -159,10 +260,31 @@ class Patroni:
 
         return " ".join(f"{key}={value}" for key, value in _dict.items())
 
-    @cached_property
-    def cached_cluster_status(self):
+    @property
+    def cluster_topology(self) -> ClusterTopology:
+        """Cluster topology snapshot, fetched once and shared until invalidated.
+
+        Raises:
+            RetryError if no member of the cluster could be reached.
+        """
+        if self._cluster_topology is None:
+            self._cluster_topology = ClusterTopology(self.cluster_status())
+        return self._cluster_topology
+
+    def invalidate_cluster_topology(self) -> None:
+        """Drop the cluster topology snapshot, so the next read fetches it again."""
+        self._cluster_topology = None
+
+    def _reset_database_connections(self) -> None:
+        """Close the cached database connections, as the members they point to may change."""
+        # Don't create the database client only to close it.
+        if "postgresql" in self._charm.__dict__:
+            self._charm.postgresql.close_connections()
+
+    @property
+    def cached_cluster_status(self) -> list[ClusterMember]:
         """Cached cluster status."""
-        return self.cluster_status()
+        return self.cluster_topology.members
 
     def cluster_status(self, alternative_endpoints: list | None = None) -> list[ClusterMember]:
         """Query the cluster status."""
@@ -176,47 +298,90 @@ class Patroni:
             last_attempt=Future.construct(1, Exception("Unable to reach any units"), True)
         )
 
-    async def _httpx_get_request(self, url: str, verify: bool = True) -> dict[str, Any] | None:
-        if not self._patroni_async_auth:
-            return None
-        ssl_ctx = create_default_context()
+    @cached_property
+    def _event_loop(self) -> AbstractEventLoop:
+        # A single loop is kept for the lifetime of the hook, so the pooled async
+        # clients (which are bound to it) can be reused between requests.
+        return new_event_loop()
+
+    def _async_client(self, verify: bool = True) -> AsyncClient:
+        """Return the pooled async client for the given verification mode.
+
+        The client (and its SSL context) is only rebuilt when the CA file changes.
+        """
+        cafile = f"{self._storage_path}/{TLS_CA_FILE}"
+        ca_mtime = None
         if verify:
             with suppress(FileNotFoundError):
-                ssl_ctx.load_verify_locations(cafile=f"{self._storage_path}/{TLS_CA_FILE}")
+                ca_mtime = os.stat(cafile).st_mtime_ns
+        if (cached := self._async_clients.get(verify)) is not None:
+            cached_ca_mtime, client = cached
+            if cached_ca_mtime == ca_mtime:
+                return client
+            self._event_loop.run_until_complete(client.aclose())
+
+        ssl_ctx = create_default_context()
+        if verify:
+            if ca_mtime is not None:
+                ssl_ctx.load_verify_locations(cafile=cafile)
         else:
             ssl_ctx.check_hostname = False
             ssl_ctx.verify_mode = CERT_NONE
-        async with AsyncClient(
-            auth=self._patroni_async_auth, timeout=API_REQUEST_TIMEOUT, verify=ssl_ctx
-        ) as client:
-            try:
-                return (await client.get(url)).raise_for_status().json()
-            except (HTTPError, ValueError):
-                return None
+        client = instrument_http_client(
+            AsyncClient(auth=self._patroni_async_auth, timeout=API_REQUEST_TIMEOUT, verify=ssl_ctx)
+        )
+        self._async_clients[verify] = (ca_mtime, client)
+        return client
+
+    async def _httpx_get_request(
+        self, client: AsyncClient, scheme: str, endpoint: str, uri: str
+    ) -> tuple[str, dict[str, Any]] | None:
+        try:
+            response = await client.get(f"{scheme}://{endpoint}:8008{uri}")
+            return endpoint, response.raise_for_status().json()
+        except (HTTPError, ValueError):
+            return None
 
     async def _async_get_request(
-        self, uri: str, endpoints: list[str], verify: bool = True
-    ) -> dict[str, Any] | None:
+        self, uri: str, endpoints: list[str], client: AsyncClient, fallback: bool = False
+    ) -> tuple[str, dict[str, Any]] | None:
         tasks = [
-            create_task(self._httpx_get_request(f"https://{ip}:8008{uri}", verify))
-            for ip in endpoints
-        ]
-        # PG 14 still needs to check both schemas
-        tasks += [
-            create_task(self._httpx_get_request(f"http://{ip}:8008{uri}", verify))
-            for ip in endpoints
+            create_task(
+                self._httpx_get_request(
+                    client, self._member_scheme(endpoint, fallback), endpoint, uri
+                )
+            )
+            for endpoint in endpoints
         ]
-        for task in as_completed(tasks):
-            if result := await task:
-                for task in tasks:
-                    task.cancel()
-                await wait(tasks)
-                return result
+        try:
+            for task in as_completed(tasks):
+                if (result := await task) and result[1]:
+                    return result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await wait(tasks)
+
+    def _member_scheme(self, endpoint: str, fallback: bool = False) -> str:
+        """Scheme a member last answered on, defaulting to the one set in the peer data."""
+        scheme = self._member_schemes.get(endpoint)
+        if scheme is None:
+            scheme = "https" if self._charm.is_peer_data_tls_set else "http"
+        if fallback:
+            return "http" if scheme == "https" else "https"
+        return scheme
 
     def parallel_patroni_get_request(
         self, uri: str, endpoints: list[str] | None = None
     ) -> dict[str, Any] | None:
-        """Call all possible patroni endpoints in parallel."""
+        """Call all possible patroni endpoints in parallel.
+
+        Each member is first called on the scheme it last answered on (or the one expected
+        from the peer data). Only if no member answers, the other scheme is tried, since
+        members may still be switching between TLS and plain HTTP.
+        """
+        if not self._patroni_async_auth:
+            return None
         if not endpoints:
             endpoints = []
             if self._endpoint:
@@ -227,7 +392,26 @@ class Patroni:
         else:
             # TODO we don't know the other cluster's ca
             verify = False
-        return run(self._async_get_request(uri, endpoints, verify))
+        client = self._async_client(verify)
+        for fallback in (False, True):
+            if response := self._event_loop.run_until_complete(
+                self._async_get_request(uri, endpoints, client, fallback)
+            ):
+                endpoint, result = response
+                self._member_schemes[endpoint] = self._member_scheme(endpoint, fallback)
+                return result
+
+    def close(self) -> None:
+        """Close the pooled HTTP clients and the event loop used by them."""
+        if "_session" in self.__dict__:
+            self._session.close()
+            del self._session
+        if "_event_loop" in self.__dict__:
+            for _, client in self._async_clients.values():
+                self._event_loop.run_until_complete(client.aclose())
+            self._async_clients.clear()
+            self._event_loop.close()
+            del self._event_loop
 
     @cached_property
     def _synchronous_node_count(self) -> int:
@@ -256,9 +440,9 @@ class Patroni:
     def update_synchronous_node_count(self) -> None:
         """Update synchronous_node_count."""
         # Try to update synchronous_node_count.
-        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3)):
+        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3), sleep=retry_sleep):
             with attempt:
-                r = requests.patch(
+                r = self._session.patch(
                     f"{self._patroni_url}/config",
                     json=self.synchronous_configuration,
                     verify=self._verify,
@@ -269,6 +453,8 @@ class Patroni:
                 # Check whether the update was unsuccessful.
                 if r.status_code != 200:
                     raise UpdateSyncNodeCountError(f"received {r.status_code}")
+        # The sync standbys may change after the update.
+        self.invalidate_cluster_topology()
 
     def get_primary(
         self, unit_name_pattern=False, alternative_endpoints: list[str] | None = None
@@ -283,16 +469,17 @@ class Patroni:
             primary pod or unit name.
         """
         try:
-            cluster_status = self.cluster_status(alternative_endpoints)
-            for member in cluster_status:
-                if member["role"] == "leader":
-                    primary = member["name"]
-                    if unit_name_pattern:
-                        # Change the last dash to / in order to match unit name pattern.
-                        primary = label2name(primary)
-                    return primary
+            if alternative_endpoints:
+                primary = ClusterTopology(self.cluster_status(alternative_endpoints)).primary
+            else:
+                primary = self.cluster_topology.primary
         except RetryError:
             logger.debug("Unable to get primary. Cluster status unreachable")
+            return None
+        if primary is not None and unit_name_pattern:
+            # Change the last dash to / in order to match unit name pattern.
+            primary = label2name(primary)
+        return primary
 
     def get_standby_leader(
         self, unit_name_pattern=False, check_whether_is_running: bool = False
@@ -306,45 +493,25 @@ class Patroni:
         Returns:
             standby leader pod or unit name.
         """
-        # Request info from cluster endpoint (which returns all members of the cluster).
-        cluster_status = self.cluster_status()
-        if cluster_status:
-            for member in cluster_status:
-                if member["role"] == "standby_leader":
-                    if check_whether_is_running and member["state"] not in STARTED_STATES:
-                        logger.warning(f"standby leader {member['name']} is not running")
-                        continue
-                    standby_leader = member["name"]
-                    if unit_name_pattern:
-                        # Change the last dash to / in order to match unit name pattern.
-                        standby_leader = label2name(standby_leader)
-                    return standby_leader
+        standby_leader = self.cluster_topology.standby_leader(check_whether_is_running)
+        if standby_leader is not None and unit_name_pattern:
+            # Change the last dash to / in order to match unit name pattern.
+            standby_leader = label2name(standby_leader)
+        return standby_leader
 
     def get_sync_standby_names(self) -> list[str]:
         """Get the list of sync standby unit names."""
-        sync_standbys = []
-        # Request info from cluster endpoint (which returns all members of the cluster).
-        cluster_status = self.cluster_status()
-        if cluster_status:
-            for member in cluster_status:
-                if member["role"] == "sync_standby":
-                    sync_standbys.append(label2name(member["name"]))
-        return sync_standbys
+        return [label2name(member) for member in self.cluster_topology.sync_standbys]
 
-    @cached_property
+    @property
     def cluster_members(self) -> set:
         """Get the current cluster members."""
-        # Request info from cluster endpoint (which returns all members of the cluster).
-        return {member["name"] for member in self.cluster_status()}
+        return self.cluster_topology.member_names
 
     def get_running_cluster_members(self) -> list[str]:
         """List running patroni members."""
         try:
-            return [
-                member["name"]
-                for member in self.cluster_status()
-                if member["state"] in RUNNING_STATES
-            ]
+            return self.cluster_topology.running_members
         except Exception:
             return []
 
@@ -355,61 +522,132 @@ class Patroni:
             True if all members are ready False otherwise. Retries over a period of 10 seconds
             3 times to allow server time to start up.
         """
-        # Request info from cluster endpoint
-        # (which returns all members of the cluster and their states).
         try:
-            members = self.cluster_status()
+            return self.cluster_topology.all_members_ready
         except RetryError:
             return False
 
-        # Check if all members are running and one of them is a leader (primary) or
-        # a standby leader, because sometimes there may exist (for some period of time)
-        # only replicas after a failed switchover.
-        return all(member["state"] in STARTED_STATES for member in members) and any(
-            member["role"] in ["leader", "standby_leader"] for member in members
-        )
-
     @property
     def is_creating_backup(self) -> bool:
         """Returns whether a backup is being created."""
-        # Request info from cluster endpoint (which returns the list of tags from each
-        # cluster member; the "is_creating_backup" tag means that the member is creating
-        # a backup).
+        # The cluster endpoint returns the list of tags from each cluster member; the
+        # "is_creating_backup" tag means that the member is creating a backup.
         try:
-            members = self.cached_cluster_status
+            return self.cluster_topology.is_creating_backup
         except RetryError:
             return False
 
-        return any(
-            "tags" in member and member["tags"].get("is_creating_backup") for member in members
+    async def _probe_member_health(
+        self, client: AsyncClient, member_endpoint: str, is_primary: bool, timeout: float
+    ) -> MemberHealth:
+        endpoint = "leader" if is_primary else "replica?lag=100MB"
+        url = f"{self._member_scheme(member_endpoint)}://{member_endpoint}:8008/{endpoint}"
+        start = monotonic()
+        try:
+            response = await client.get(url, timeout=timeout)
+        except HTTPError:
+            return MemberHealth(role=None, state=None, lag=None, latency=None, healthy=False)
+        latency = monotonic() - start
+        # Patroni also returns the member status when it's unhealthy.
+        try:
+            status = response.json()
+        except ValueError:
+            status = {}
+        return MemberHealth(
+            role=status.get("role"),
+            state=status.get("state"),
+            lag=None,
+            latency=latency,
+            healthy=response.status_code == 200,
         )
 
+    async def _probe_members_health(
+        self, member_endpoints: list[str], primary_endpoint: str, timeout: float
+    ) -> list[MemberHealth]:
+        client = self._async_client()
+        return await gather(*[
+            self._probe_member_health(
+                client, member_endpoint, member_endpoint == primary_endpoint, timeout
+            )
+            for member_endpoint in member_endpoints
+        ])
+
+    def get_members_health(self, timeout: float = PATRONI_TIMEOUT) -> dict[str, MemberHealth]:
+        """Probe the health of all the cluster members concurrently.
+
+        The primary is checked through the leader endpoint and the other members through
+        the replica endpoint (which fails when the member lags more than 100MB behind).
+
+        Args:
+            timeout: time budget for each member to answer.
+
+        Returns:
+            the health of each member, keyed by the member name.
+        """
+        primary = self.get_primary()
+        primary_endpoint = (
+            f"{self._charm.app.name}-{primary.split('-')[-1]}.{self._charm.app.name}-endpoints"
+            if primary
+            else None
+        )
+        members_health = dict(
+            zip(
+                [member_endpoint.split(".")[0] for member_endpoint in self._endpoints],
+                self._event_loop.run_until_complete(
+                    self._probe_members_health(self._endpoints, primary_endpoint, timeout)
+                ),
+                strict=True,
+            )
+        )
+        self._add_members_lag(members_health)
+        return members_health
+
+    def get_member_health(self, timeout: float = PATRONI_TIMEOUT) -> MemberHealth:
+        """Probe the health of this member only.
+
+        Args:
+            timeout: time budget for the member to answer.
+
+        Returns:
+            the health of this member, checked as in `get_members_health`.
+        """
+        member_name = self._endpoint.split(".")[0]
+        member_health = self._event_loop.run_until_complete(
+            self._probe_member_health(
+                self._async_client(), self._endpoint, self.get_primary() == member_name, timeout
+            )
+        )
+        self._add_members_lag({member_name: member_health})
+        return member_health
+
+    def _add_members_lag(self, members_health: dict[str, MemberHealth]) -> None:
+        # The lag is already known from the cluster status.
+        with suppress(RetryError):
+            for member in self.cluster_topology.members:
+                if member["name"] in members_health:
+                    members_health[member["name"]]["lag"] = member.get("lag")
+
     @property
     def is_replication_healthy(self) -> bool:
         """Return whether the replication is healthy."""
         try:
-            for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3)):
+            for attempt in Retrying(
+                stop=stop_after_delay(60), wait=wait_fixed(3), sleep=retry_sleep
+            ):
                 with attempt:
-                    primary = self.get_primary()
-                    unit_id = primary.split("-")[-1]
-                    primary_endpoint = (
-                        f"{self._charm.app.name}-{unit_id}.{self._charm.app.name}-endpoints"
-                    )
-                    for member_endpoint in self._endpoints:
-                        endpoint = (
-                            "leader"
-                            if member_endpoint == primary_endpoint
-                            else "replica?lag=100MB"
-                        )
-                        url = self._patroni_url.replace(self._endpoint, member_endpoint)
-                        member_status = requests.get(
-                            f"{url}/{endpoint}",
-                            verify=self._verify,
-                            auth=self._patroni_auth,
-                            timeout=PATRONI_TIMEOUT,
-                        )
-                        if member_status.status_code != 200:
-                            raise Exception
+                    # Without a primary, every member would be probed as a replica.
+                    if self.get_primary() is None:
+                        self.invalidate_cluster_topology()
+                        raise Exception("no primary")
+                    members_health = self.get_members_health()
+                    if unhealthy_members := [
+                        member
+                        for member, health in members_health.items()
+                        if not health["healthy"]
+                    ]:
+                        # The primary may have changed in the meantime.
+                        self.invalidate_cluster_topology()
+                        raise Exception(f"unhealthy members: {', '.join(unhealthy_members)}")
         except RetryError:
             logger.exception("replication is not healthy")
             return False
@@ -425,9 +663,11 @@ class Patroni:
             Return whether the primary endpoint is redirecting connections to the primary pod.
         """
         try:
-            for attempt in Retrying(stop=stop_after_delay(10), wait=wait_fixed(1)):
+            for attempt in Retrying(
+                stop=stop_after_delay(10), wait=wait_fixed(1), sleep=retry_sleep
+            ):
                 with attempt:
-                    r = requests.get(
+                    r = self._session.get(
                         f"{'https' if self._charm.is_peer_data_tls_set else 'http'}://{self._primary_endpoint}:8008/health",
                         verify=self._verify,
                         auth=self._patroni_auth,
@@ -442,9 +682,9 @@ class Patroni:
 
     def get_patroni_health(self) -> dict[str, str]:
         """Gets, retires and parses the Patroni health endpoint."""
-        for attempt in Retrying(stop=stop_after_delay(15), wait=wait_fixed(3)):
+        for attempt in Retrying(stop=stop_after_delay(15), wait=wait_fixed(3), sleep=retry_sleep):
             with attempt:
-                r = requests.get(
+                r = self._session.get(
                     f"{self._patroni_url}/health",
                     verify=self._verify,
                     timeout=PATRONI_TIMEOUT,
@@ -483,7 +723,28 @@ class Patroni:
 
         return health.get("replication_state") == "streaming"
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    @staticmethod
+    def _is_config_applied(config: dict[str, Any], current_config: dict[str, Any]) -> bool:
+        """Returns whether all the values from a config patch are already set."""
+        for key, value in config.items():
+            if isinstance(value, dict):
+                if not isinstance(current_config.get(key), dict) or not Patroni._is_config_applied(
+                    value, current_config[key]
+                ):
+                    return False
+            elif value is None:
+                # Null values remove the key from the configuration.
+                if current_config.get(key) is not None:
+                    return False
+            elif key not in current_config or current_config[key] != value:
+                return False
+        return True
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        sleep=retry_sleep,
+    )
     def bulk_update_parameters_controller_by_patroni(
         self, parameters: dict[str, Any], base_parameters: dict[str, Any] | None
     ) -> None:
@@ -493,17 +754,41 @@ class Patroni:
         """
         if not base_parameters:
             base_parameters = {}
-        r = requests.patch(
+        config = {
+            "postgresql": {
+                "remove_data_directory_on_rewind_failure": False,
+                "remove_data_directory_on_diverged_timelines": False,
+                "parameters": parameters,
+            },
+            **base_parameters,
+        }
+        # Avoid writing to the DCS (which makes every member react) when nothing changed:
+        # the last configuration applied by this unit is remembered, and only when it isn't
+        # (e.g. after an upgrade or a restore) the current one is retrieved to compare.
+        config_hash = shake_128(json.dumps(config, sort_keys=True).encode()).hexdigest(16)
+        applied_hash = self._charm._stored.patroni_dcs_config_hash
+        if applied_hash == config_hash:
+            logger.debug("API bulk_update_parameters_controller_by_patroni: already applied")
+            return
+        if applied_hash is None:
+            try:
+                current_config = self._session.get(
+                    f"{self._patroni_url}/config",
+                    verify=self._verify,
+                    auth=self._patroni_auth,
+                    timeout=PATRONI_TIMEOUT,
+                ).json()
+            except (requests.RequestException, ValueError):
+                current_config = {}
+            if self._is_config_applied(config, current_config):
+                logger.debug("API bulk_update_parameters_controller_by_patroni: already applied")
+                self._charm._stored.patroni_dcs_config_hash = config_hash
+                return
+
+        r = self._session.patch(
             f"{self._patroni_url}/config",
             verify=self._verify,
-            json={
-                "postgresql": {
-                    "remove_data_directory_on_rewind_failure": False,
-                    "remove_data_directory_on_diverged_timelines": False,
-                    "parameters": parameters,
-                },
-                **base_parameters,
-            },
+            json=config,
             auth=self._patroni_auth,
             timeout=PATRONI_TIMEOUT,
         )
@@ -513,10 +798,11 @@ class Patroni:
             r.elapsed.total_seconds(),
         )
         r.raise_for_status()
+        self._charm._stored.patroni_dcs_config_hash = config_hash
 
     def promote_standby_cluster(self) -> None:
         """Promote a standby cluster to be a regular cluster."""
-        config_response = requests.get(
+        config_response = self._session.get(
             f"{self._patroni_url}/config",
             verify=self._verify,
             auth=self._patroni_auth,
@@ -524,21 +810,23 @@ class Patroni:
         )
         if "standby_cluster" not in config_response.json():
             raise StandbyClusterAlreadyPromotedError("standby cluster is already promoted")
-        requests.patch(
+        self._session.patch(
             f"{self._patroni_url}/config",
             verify=self._verify,
             json={"standby_cluster": None},
             auth=self._patroni_auth,
             timeout=PATRONI_TIMEOUT,
         )
-        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3)):
+        self._reset_database_connections()
+        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3), sleep=retry_sleep):
             with attempt:
+                self.invalidate_cluster_topology()
                 if self.get_primary() is None:
                     raise ClusterNotPromotedError("cluster not promoted")
 
     def set_failsafe_mode(self) -> None:
         """Patch the DCS with failsafe mode on."""
-        requests.patch(
+        self._session.patch(
             f"{self._patroni_url}/config",
             verify=self._verify,
             json={"failsafe_mode": True},
@@ -548,7 +836,7 @@ class Patroni:
 
     def set_max_timelines_history(self) -> None:
         """Patch the DCS with max_timelines_history limit."""
-        requests.patch(
+        self._session.patch(
             f"{self._patroni_url}/config",
             verify=self._verify,
             json={"max_timelines_history": 50},
@@ -556,17 +844,23 @@ class Patroni:
             timeout=PATRONI_TIMEOUT,
         )
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        sleep=retry_sleep,
+    )
     def reinitialize_postgresql(self) -> None:
         """Reinitialize PostgreSQL."""
-        requests.post(
+        self._session.post(
             f"{self._patroni_url}/reinitialize",
             verify=self._verify,
             auth=self._patroni_auth,
             timeout=PATRONI_TIMEOUT,
         )
+        self.invalidate_cluster_topology()
+        self._reset_database_connections()
 
-    def _render_file(self, path: str, content: str, mode: int) -> None:
+    def _render_file(self, path: str, content: str, mode: int) -> bool:
         """Write a content rendered from a template to a file.
 
         Args:
@@ -574,7 +868,13 @@ class Patroni:
             content: the data to be written to the file.
             mode: access permission mask applied to the
               file using chmod (e.g. 0o640).
+
+        Returns:
+            Whether the file content changed.
         """
+        with suppress(FileNotFoundError), open(path) as file:
+            if file.read() == content:
+                return False
         with open(path, "w+") as file:
             file.write(content)
         # Ensure correct permissions are set on the file.
@@ -587,6 +887,7 @@ class Patroni:
         except KeyError:
             # Ignore non existing user error when it wasn't created yet.
             pass
+        return True
 
     def render_patroni_yml_file(
         self,
@@ -602,9 +903,10 @@ class Patroni:
         pitr_target: str | None = None,
         restore_timeline: str | None = None,
         restore_to_latest: bool = False,
+        restore_delta: bool = False,
         parameters: dict[str, str] | None = None,
         user_databases_map: dict[str, str] | None = None,
-    ) -> None:
+    ) -> str:
         """Render the Patroni configuration file.
 
         Args:
@@ -621,60 +923,82 @@ class Patroni:
             pitr_target: point-in-time-recovery target for the restore.
             restore_timeline: timeline to restore from.
             restore_to_latest: restore all the WAL transaction logs from the stanza.
+            restore_delta: whether to restore over the previous data files, moved aside
+                before the restore, only fetching the files that differ from the backup.
             parameters: PostgreSQL parameters to be added to the postgresql.conf file.
             user_databases_map: map of databases to be accessible by each user.
-        """
-        # Open the template patroni.yml file.
-        with open("templates/patroni.yml.j2") as file:
-            template = Template(file.read())
 
+        Returns:
+            A hash of the values rendered in the configuration (the template is only
+            rendered, and the file written, when they change).
+        """
         ldap_params = self._charm.get_ldap_parameters()
 
-        # Render the template file with the correct values.
-        rendered = template.render(
-            connectivity=connectivity,
-            enable_ldap=enable_ldap,
-            enable_tls=enable_tls,
-            endpoint=self._endpoint,
-            endpoints=self._endpoints,
-            is_creating_backup=is_creating_backup,
-            is_no_sync_member=is_no_sync_member,
-            namespace=self._namespace,
-            storage_path=self._storage_path,
-            superuser_password=self._superuser_password,
-            replication_password=self._replication_password,
-            rewind_user=REWIND_USER,
-            rewind_password=self._rewind_password,
-            enable_pgbackrest_archiving=stanza is not None
+        values = {
+            "connectivity": connectivity,
+            "enable_ldap": enable_ldap,
+            "enable_tls": enable_tls,
+            "endpoint": self._endpoint,
+            "endpoints": self._endpoints,
+            "is_creating_backup": is_creating_backup,
+            "is_no_sync_member": is_no_sync_member,
+            "namespace": self._namespace,
+            "storage_path": self._storage_path,
+            "superuser_password": self._superuser_password,
+            "replication_password": self._replication_password,
+            "rewind_user": REWIND_USER,
+            "rewind_password": self._rewind_password,
+            "enable_pgbackrest_archiving": stanza is not None
             and disable_pgbackrest_archiving is False,
-            restoring_backup=backup_id is not None or pitr_target is not None,
-            backup_id=backup_id,
-            pitr_target=pitr_target if not restore_to_latest else None,
-            restore_timeline=restore_timeline,
-            restore_to_latest=restore_to_latest,
-            stanza=stanza,
-            restore_stanza=restore_stanza,
-            synchronous_node_count=self._synchronous_node_count,
-            maximum_lag_on_failover=self._charm.config.durability_maximum_lag_on_failover,
-            version=self.rock_postgresql_version.split(".")[0],
-            pg_parameters=parameters,
-            primary_cluster_endpoint=self._charm.async_replication.get_primary_cluster_endpoint(),
-            extra_replication_endpoints=self._charm.async_replication.get_standby_endpoints(),
-            ldap_parameters=self._dict_to_hba_string(ldap_params),
-            patroni_password=self._patroni_password,
-            user_databases_map=user_databases_map,
-        )
-        self._render_file(f"{self._storage_path}/patroni.yml", rendered, 0o644)
+            "restoring_backup": backup_id is not None or pitr_target is not None,
+            "backup_id": backup_id,
+            "pitr_target": pitr_target if not restore_to_latest else None,
+            "restore_timeline": restore_timeline,
+            "restore_to_latest": restore_to_latest,
+            "restore_delta": restore_delta,
+            "stanza": stanza,
+            "restore_stanza": restore_stanza,
+            "synchronous_node_count": self._synchronous_node_count,
+            "maximum_lag_on_failover": self._charm.config.durability_maximum_lag_on_failover,
+            "version": self.rock_postgresql_version.split(".")[0],
+            "pg_parameters": parameters,
+            "primary_cluster_endpoint": self._charm.async_replication.get_primary_cluster_endpoint(),
+            "extra_replication_endpoints": self._charm.async_replication.get_standby_endpoints(),
+            "ldap_parameters": self._dict_to_hba_string(ldap_params),
+            "patroni_password": self._patroni_password,
+            "user_databases_map": user_databases_map,
+        }
+        values_hash = shake_128(
+            json.dumps(
+                [template_checksum("patroni.yml.j2"), values], sort_keys=True, default=str
+            ).encode()
+        ).hexdigest(16)
+        path = f"{self._storage_path}/patroni.yml"
+        if self._charm._stored.patroni_yml_hash == values_hash and os.path.exists(path):
+            logger.debug("Patroni configuration values unchanged, skipping rendering")
+            return values_hash
 
-    def reload_patroni_configuration(self) -> None:
-        """Reloads the configuration after it was updated in the file."""
+        # Render the template file with the correct values.
+        self._render_file(path, render_template("patroni.yml.j2", **values), 0o644)
+        self._charm._stored.patroni_yml_hash = values_hash
+        return values_hash
+
+    def reload_patroni_configuration(self) -> bool:
+        """Reloads the configuration after it was updated in the file.
+
+        Returns:
+            whether Patroni was reloaded (it's skipped when its service isn't running).
+        """
         container = self._charm.unit.get_container("postgresql")
         if container.can_connect():
             services = container.pebble.get_services(names=[self._charm.postgresql_service])
             if len(services) > 0 and services[0].is_running():
                 container.send_signal(SIGHUP, self._charm.postgresql_service)
-                return
+                # Member tags (e.g. nofailover or is_creating_backup) may change on reload.
+                self.invalidate_cluster_topology()
+                return True
         logger.warning("Unable to find Patroni service. Skipping reload")
+        return False
 
     def last_postgresql_logs(self) -> str:
         """Get last log file content of Postgresql service in the container.
@@ -700,15 +1024,21 @@ class Patroni:
             logger.exception(error_message)
             return ""
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        sleep=retry_sleep,
+    )
     def restart_postgresql(self) -> None:
         """Restart PostgreSQL."""
-        requests.post(
+        self._session.post(
             f"{self._patroni_url}/restart",
             verify=self._verify,
             auth=self._patroni_auth,
             timeout=PATRONI_TIMEOUT,
         )
+        self.invalidate_cluster_topology()
+        self._reset_database_connections()
 
     def switchover(self, candidate: str | None = None, wait: bool = True) -> None:
         """Trigger a switchover."""
@@ -716,16 +1046,18 @@ class Patroni:
         if candidate is not None:
             candidate = candidate.replace("/", "-")
 
-        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3)):
+        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3), sleep=retry_sleep):
             with attempt:
                 primary = self.get_primary()
-                r = requests.post(
+                r = self._session.post(
                     f"{self._patroni_url}/switchover",
                     json={"leader": primary, "candidate": candidate},
                     verify=self._verify,
                     auth=self._patroni_auth,
                     timeout=PATRONI_TIMEOUT,
                 )
+        self.invalidate_cluster_topology()
+        self._reset_database_connections()
 
         # Check whether the switchover was unsuccessful.
         if r.status_code != 200:
@@ -741,8 +1073,11 @@ class Patroni:
         if not wait:
             return
 
-        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3), reraise=True):
+        for attempt in Retrying(
+            stop=stop_after_delay(60), wait=wait_fixed(3), reraise=True, sleep=retry_sleep
+        ):
             with attempt:
+                self.invalidate_cluster_topology()
                 new_primary = self.get_primary()
                 if (candidate is not None and new_primary != candidate) or new_primary == primary:
                     raise SwitchoverFailedError("primary was not switched correctly")
@@ -751,8 +1086,10 @@ class Patroni:
         retry=retry_if_result(lambda x: not x),
         stop=stop_after_attempt(10),
         wait=wait_exponential(multiplier=1, min=2, max=30),
+        sleep=retry_sleep,
     )
     def primary_changed(self, old_primary: str) -> bool:
         """Checks whether the primary unit has changed."""
+        self.invalidate_cluster_topology()
         primary = self.get_primary()
         return primary != old_primary
@@ -0,0 +1,242 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Lightweight profiling of the hot paths of a hook.
+
+Each hook runs in its own process, so a single module-level profile collects the number of
+calls and the time spent talking to Patroni (HTTP), PostgreSQL, the K8s API and Pebble,
+rendering templates and sleeping between the retries of the charm. Only the clients created
+by the charm are instrumented, so the calls done by the other libraries are left untouched.
+"""
+
+import heapq
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlparse
+
+import tenacity
+from opentelemetry import trace
+from ops import Container
+
+logger = logging.getLogger(__name__)
+
+_tracer = trace.get_tracer(__name__)
+
+# Number of slowest spans kept in the hook summary.
+MAX_SLOWEST_SPANS = 10
+
+
+class HookProfile:
+    """Calls and time spent per category during a hook."""
+
+    def __init__(self, max_slowest_spans: int = MAX_SLOWEST_SPANS):
+        self._max_slowest_spans = max_slowest_spans
+        # Whether the spans are also sent through the tracing integration.
+        self.export_spans = False
+        # Calls may be measured from several threads (e.g. the extension workers).
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new profile."""
+        self.started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.calls = Counter()
+        # Wall-clock time per category: concurrent calls of a category are counted once.
+        self.durations = defaultdict(float)
+        self._running = Counter()
+        self._running_since = {}
+        self._slowest_spans = []
+
+    @contextmanager
+    def measure(self, category: str, name: str, count: bool = True):
+        """Measure a call of the given category.
+
+        Args:
+            category: kind of the call (e.g. "http" or "k8s").
+            name: name of the span (e.g. the request path).
+            count: whether the call is counted or only its duration is added.
+        """
+        span = (
+            _tracer.start_as_current_span(name, attributes={"charm.profile.category": category})
+            if self.export_spans
+            else nullcontext()
+        )
+        start = time.perf_counter()
+        with self._lock:
+            if not self._running[category]:
+                self._running_since[category] = start
+            self._running[category] += 1
+        try:
+            with span:
+                yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                if count:
+                    self.calls[category] += 1
+                self._running[category] -= 1
+                if not self._running[category]:
+                    self.durations[category] += end - self._running_since.pop(category)
+                entry = (end - start, category, name)
+                if len(self._slowest_spans) < self._max_slowest_spans:
+                    heapq.heappush(self._slowest_spans, entry)
+                else:
+                    heapq.heappushpop(self._slowest_spans, entry)
+
+    def summary(self) -> dict[str, Any]:
+        """Summary of the hook, as written to the profile file."""
+        return {
+            "hook": os.environ.get("JUJU_DISPATCH_PATH", ""),
+            "unit": os.environ.get("JUJU_UNIT_NAME", ""),
+            "started": self.started.isoformat(),
+            "duration": round(time.perf_counter() - self._start, 6),
+            "calls": dict(self.calls),
+            "time": {category: round(value, 6) for category, value in self.durations.items()},
+            "slowest": [
+                {"category": category, "name": name, "duration": round(duration, 6)}
+                for duration, category, name in sorted(self._slowest_spans, reverse=True)
+            ],
+        }
+
+    def write(self, path: str, max_bytes: int, backup_count: int) -> None:
+        """Append the summary of the hook to a rotating file.
+
+        Failures are only logged, as profiling must never break a hook.
+        """
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        except OSError as e:
+            logger.debug(f"Cannot write the hook profile: {e}")
+            return
+        try:
+            handler.emit(
+                logging.makeLogRecord({"msg": json.dumps(self.summary()), "levelno": logging.INFO})
+            )
+        finally:
+            handler.close()
+
+
+profile = HookProfile()
+
+
+def _wrap(
+    owner: Any, attribute: str, category: str, name: Callable[..., str], count: bool = True
+) -> None:
+    function = getattr(owner, attribute)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with profile.measure(category, name(*args, **kwargs), count):
+            return function(*args, **kwargs)
+
+    setattr(owner, attribute, wrapper)
+
+
+def _wrap_async(owner: Any, attribute: str, category: str, name: Callable[..., str]) -> None:
+    function = getattr(owner, attribute)
+
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        with profile.measure(category, name(*args, **kwargs)):
+            return await function(*args, **kwargs)
+
+    setattr(owner, attribute, wrapper)
+
+
+def retry_sleep(seconds: float) -> None:
+    """Sleep between two attempts of a retry, measuring the wait.
+
+    The charm passes it as the `sleep` argument of its own `Retrying` objects and `retry`
+    decorators, so the retries of the other libraries are left untouched.
+    """
+    with profile.measure("retry_wait", "sleep"):
+        tenacity.sleep(seconds)
+
+
+def _request_name(request, *args, **kwargs) -> str:
+    return f"{request.method} {urlparse(str(request.url)).path}"
+
+
+def _resource_name(method: str, args: tuple, kwargs: dict) -> str:
+    resource = args[0] if args else kwargs.get("res", kwargs.get("obj"))
+    return f"{method.upper()} {getattr(resource, '__name__', type(resource).__name__)}"
+
+
+class _MeasuredK8sClient:
+    """Proxy of a lightkube client measuring the calls to the K8s API."""
+
+    _methods = frozenset(["get", "list", "create", "apply", "patch", "delete"])
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def __getattr__(self, attribute: str) -> Any:
+        value = getattr(self._client, attribute)
+        if attribute not in self._methods:
+            return value
+
+        @wraps(value)
+        def wrapper(*args, **kwargs):
+            with profile.measure("k8s", _resource_name(attribute, args, kwargs)):
+                return value(*args, **kwargs)
+
+        return wrapper
+
+
+def instrument_http_client(client: Any) -> Any:
+    """Measure the requests sent through a requests session or an httpx async client.
+
+    Returns:
+        the same client.
+    """
+    if inspect.iscoroutinefunction(client.send):
+        _wrap_async(client, "send", "http", _request_name)
+    else:
+        _wrap(client, "send", "http", _request_name)
+    return client
+
+
+def instrument_k8s_client(client: Any) -> Any:
+    """Measure the calls done through a lightkube client.
+
+    Returns:
+        a proxy of the client.
+    """
+    return _MeasuredK8sClient(client)
+
+
+def instrument_database_connections(owner: Any, attribute: str) -> None:
+    """Measure the connections opened through a method of an object."""
+    _wrap(owner, attribute, "db", lambda *args, **kwargs: "connect")
+
+
+def instrument_container(container: Container) -> None:
+    """Measure the commands executed in a workload container."""
+    pebble = container.pebble
+    execute = pebble.exec
+
+    @wraps(execute)
+    def wrapper(command, *args, **kwargs):
+        with profile.measure("exec", command[0]):
+            process = execute(command, *args, **kwargs)
+        # The time spent waiting for the command is added to the exec call that started it
+        # (wait_output doesn't go through wait).
+        _wrap(process, "wait", "exec", lambda *args: "wait", count=False)
+        _wrap(process, "wait_output", "exec", lambda *args: "wait", count=False)
+        return process
+
+    pebble.exec = wrapper
@@ -47,6 +47,7 @@ from constants import (
     WORKLOAD_OS_USER,
 )
 from patroni import ClusterNotPromotedError, NotReadyError, StandbyClusterAlreadyPromotedError
+from profiling import instrument_k8s_client, retry_sleep
 
 logger = logging.getLogger(__name__)
 
@@ -157,8 +158,11 @@ class PostgreSQLAsyncReplication(Object):
                 if self.charm._patroni.get_standby_leader() is not None:
                     self.charm._patroni.promote_standby_cluster()
                     try:
-                        for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(3)):
+                        for attempt in Retrying(
+                            stop=stop_after_delay(60), wait=wait_fixed(3), sleep=retry_sleep
+                        ):
                             with attempt:
+                                self.charm._patroni.invalidate_cluster_topology()
                                 if not self.charm.is_primary:
                                     raise ClusterNotPromotedError()
                     except RetryError:
@@ -649,7 +653,7 @@ class PostgreSQLAsyncReplication(Object):
 
     def _remove_previous_cluster_information(self) -> None:
         """Remove the previous cluster information."""
-        client = Client()
+        client = instrument_k8s_client(Client())
         for values in itertools.product(
             [Endpoints, Service],
             [
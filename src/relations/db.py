@@ -17,6 +17,7 @@ from ops import (
     ActiveStatus,
     BlockedStatus,
     CharmBase,
+    MaintenanceStatus,
     Object,
     Relation,
     RelationBrokenEvent,
@@ -30,6 +31,7 @@ from constants import (
     ALL_LEGACY_RELATIONS,
     DATABASE_PORT,
     ENDPOINT_SIMULTANEOUSLY_BLOCKING_MESSAGE,
+    OWNERSHIP_TRANSFER_MESSAGE,
 )
 from utils import new_password
 
@@ -111,11 +113,10 @@ class DbProvides(Object):
 
         logger.warning(f"DEPRECATION WARNING - `{self.relation_name}` is a legacy interface")
 
-        if (
-            not self.set_up_relation(event.relation)
-            and self.charm.unit.status.message
-            == f"Failed to initialize {self.relation_name} relation"
-        ):
+        if not self.set_up_relation(event.relation) and self.charm.unit.status.message in [
+            f"Failed to initialize {self.relation_name} relation",
+            OWNERSHIP_TRANSFER_MESSAGE,
+        ]:
             event.defer()
             return
 
@@ -158,7 +159,7 @@ class DbProvides(Object):
         """Checks if relation required roles."""
         return "roles" in relation.data.get(relation.app, {})
 
-    def set_up_relation(self, relation: Relation) -> bool:
+    def set_up_relation(self, relation: Relation) -> bool:  # noqa: C901
         """Set up the relation to be used by the application charm."""
         # Do not allow apps requesting extensions to be installed
         # (let them now about config options).
@@ -197,9 +198,16 @@ class DbProvides(Object):
             )
 
             plugins = self.charm.get_plugins()
-            self.charm.postgresql.create_database(
+            if not self.charm.postgresql.create_database(
                 database, user, plugins=plugins, client_relations=self.charm.client_relations
-            )
+            ):
+                logger.info(
+                    f"Setting up {self.relation_name} relation once the ownership of the objects"
+                    f" of database {database} is transferred"
+                )
+                if not self.charm._has_blocked_status:
+                    self.charm.unit.status = MaintenanceStatus(OWNERSHIP_TRANSFER_MESSAGE)
+                return False
 
             # Build the primary's connection string.
             primary = str(
@@ -227,7 +235,7 @@ class DbProvides(Object):
 
             postgresql_version = None
             try:
-                postgresql_version = self.charm.postgresql.get_postgresql_version()
+                postgresql_version = self.charm.get_postgresql_version()
             except PostgreSQLGetPostgreSQLVersionError:
                 logger.exception(
                     f"Failed to retrieve the PostgreSQL version to initialise/update {self.relation_name} relation"
@@ -368,7 +376,7 @@ class DbProvides(Object):
                 ROLES_BLOCKING_MESSAGE,
             ]
             and not self._check_for_blocking_relations(relation.id)
-        ):
+        ) or self.charm.unit.status.message == OWNERSHIP_TRANSFER_MESSAGE:
             self.charm.unit.status = ActiveStatus()
 
         self._update_unit_status_on_blocking_endpoint_simultaneously()
@@ -3,6 +3,7 @@
 
 """Postgres client relation hooks & helpers."""
 
+import json
 import logging
 
 from charms.data_platform_libs.v0.data_interfaces import (
@@ -22,6 +23,7 @@ from ops import (
     ActiveStatus,
     BlockedStatus,
     CharmBase,
+    MaintenanceStatus,
     Object,
     Relation,
     RelationBrokenEvent,
@@ -29,7 +31,14 @@ from ops import (
     RelationDepartedEvent,
 )
 
-from constants import DATABASE_PORT, ENDPOINT_SIMULTANEOUSLY_BLOCKING_MESSAGE
+from constants import (
+    DATABASE_PORT,
+    ENDPOINT_SIMULTANEOUSLY_BLOCKING_MESSAGE,
+    OWNERSHIP_TRANSFER_MESSAGE,
+    OWNERSHIP_TRANSFERS_KEY,
+    PROVIDED_REQUESTS_KEY,
+    READ_ONLY_ENDPOINTS_KEY,
+)
 from utils import new_password
 
 logger = logging.getLogger(__name__)
@@ -86,6 +95,9 @@ class PostgreSQLProvider(Object):
         """Handle the legacy postgresql-client relation changed event.
 
         Generate password and handle user and database creation for the related application.
+        The other relations waiting for their database are served in the same hook, so that
+        many applications related at once wait only once for the units to sync their
+        configuration.
         """
         # Check for some conditions before trying to access the PostgreSQL instance.
         if not self.charm.is_cluster_initialised or not self.charm._patroni.primary_endpoint_ready:
@@ -95,7 +107,47 @@ class PostgreSQLProvider(Object):
             event.defer()
             return
 
+        if self._is_database_provided(event.relation, event.database, event.extra_user_roles):
+            logger.debug("Early exit on_database_requested: database already provided")
+            return
+
+        self.charm.update_config()
+        if not self._is_user_config_synced():
+            event.defer()
+            return
+
+        requests = [(event.relation, event.database, event.extra_user_roles)]
+        requests.extend(self._pending_requests(exclude=event.relation))
+        if len(requests) > 1:
+            logger.info(f"Providing databases to {len(requests)} relations")
+        self._provide_databases(requests)
+
         self.charm.update_config()
+
+    def resume_ownership_transfers(self) -> bool:
+        """Resume providing the databases whose ownership transfer ran out of time.
+
+        Returns:
+            whether some relations still wait for their database.
+        """
+        if not self.charm.unit.is_leader() or not (relation_ids := self._ownership_transfers()):
+            return False
+
+        if not self.charm.is_cluster_initialised or not self.charm._patroni.primary_endpoint_ready:
+            logger.debug("Early exit resume_ownership_transfers: primary endpoint not ready")
+            return True
+
+        # The users were created, and the configuration synced with them, when the
+        # databases were first requested, so only the relations that get their database
+        # now need the configuration to be updated.
+        requests = self._pending_requests(relation_ids=relation_ids)
+        logger.info(f"Resuming the ownership transfers of {len(requests)} relations")
+        if self._provide_databases(requests):
+            self.charm.update_config()
+        return bool(self._ownership_transfers())
+
+    def _is_user_config_synced(self) -> bool:
+        """Whether all the other units synced the configuration of the users."""
         for key in self.charm._peers.data:
             # We skip the leader so we don't have to wait on the defer
             if (
@@ -105,79 +157,217 @@ class PostgreSQLProvider(Object):
                 != self.charm.generate_user_hash
             ):
                 logger.debug("Not all units have synced configuration")
-                event.defer()
-                return
+                return False
+        return True
 
-        # Retrieve the database name and extra user roles using the charm library.
-        database = event.database
+    def _ownership_transfers(self) -> set[int]:
+        """Relations waiting for the ownership transfer of the objects of their database.
 
-        # Make sure the relation access-group is added to the list
-        extra_user_roles = self._sanitize_extra_roles(event.extra_user_roles)
-        extra_user_roles.append(ACCESS_GROUP_RELATION)
+        It includes the relations queued after the one whose transfer ran out of time.
+        """
+        relation_ids = {relation.id for relation in self.model.relations[self.relation_name]}
+        return relation_ids.intersection(
+            json.loads(self.charm.app_peer_data.get(OWNERSHIP_TRANSFERS_KEY, "[]"))
+        )
 
-        try:
-            # Creates the user and the database for this specific relation.
-            user = f"relation_id_{event.relation.id}"
-            password = new_password()
-            self.charm.postgresql.create_user(user, password, extra_user_roles=extra_user_roles)
-            plugins = self.charm.get_plugins()
-
-            self.charm.postgresql.create_database(
-                database, user, plugins=plugins, client_relations=self.charm.client_relations
-            )
+    def _provide_databases(self, requests: list[tuple[Relation, str, str | None]]) -> bool:
+        """Create the users and databases requested through relations, stopping at the first error.
 
-            # Share the credentials with the application.
-            self.database_provides.set_credentials(event.relation.id, user, password)
+        A database is shared only once the ownership of its objects is transferred to the
+        relation user. When the transfer runs out of time, it's resumed on update-status
+        along with the relations queued after it.
 
-            # Set the read/write endpoint.
-            self.database_provides.set_endpoints(
-                event.relation.id,
-                f"{self.charm.primary_endpoint}:{DATABASE_PORT}",
-            )
+        Returns:
+            whether some databases were shared.
+        """
+        # Create all the users at once, otherwise (e.g. an invalid extra user role)
+        # each one is created on its own, so the error is reported for its relation.
+        users = {
+            f"relation_id_{relation.id}": (new_password(), self._extra_user_roles(extra_roles))
+            for relation, _, extra_roles in requests
+        }
+        users_created = False
+        if len(users) > 1:
+            try:
+                self.charm.postgresql.create_users(users)
+                users_created = True
+            except PostgreSQLCreateUserError as e:
+                logger.warning(
+                    f"Failed to create the users at once, creating them one by one: {e}"
+                )
 
-            # Set connection string URI.
-            self.database_provides.set_uris(
-                event.relation.id,
-                f"postgresql://{user}:{password}@{self.charm.primary_endpoint}:{DATABASE_PORT}/{database}",
-            )
+        plugins = self.charm.get_plugins()
+        previous_transfers = self._ownership_transfers()
+        transfers = set(previous_transfers)
+        provided_requests = self._provided_requests()
+        version = None
+        provided = False
+        for index, (relation, database, extra_roles) in enumerate(requests):
+            user = f"relation_id_{relation.id}"
+            password, extra_user_roles = users[user]
+            try:
+                if not users_created:
+                    self.charm.postgresql.create_user(
+                        user, password, extra_user_roles=extra_user_roles
+                    )
+                if not self.charm.postgresql.create_database(
+                    database, user, plugins=plugins, client_relations=self.charm.client_relations
+                ):
+                    logger.info(
+                        f"Providing database {database} once the ownership of its objects"
+                        " is transferred"
+                    )
+                    transfers.update(queued.id for queued, _, _ in requests[index:])
+                    if not self.charm._has_blocked_status:
+                        self.charm.unit.status = MaintenanceStatus(OWNERSHIP_TRANSFER_MESSAGE)
+                    break
+                transfers.discard(relation.id)
+                version = self._provide_database(relation, database, user, password, version)
+                provided_requests[str(relation.id)] = {
+                    "database": database,
+                    "extra-user-roles": extra_roles,
+                }
+                provided = True
+            except (
+                PostgreSQLCreateDatabaseError,
+                PostgreSQLCreateUserError,
+                PostgreSQLGetPostgreSQLVersionError,
+            ) as e:
+                logger.exception(e)
+                self.charm.unit.status = BlockedStatus(
+                    e.message
+                    if issubclass(type(e), PostgreSQLCreateUserError) and e.message is not None
+                    else f"Failed to initialize {self.relation_name} relation"
+                )
+                break
 
-            # Set TLS flag
-            self.database_provides.set_tls(
-                event.relation.id,
-                "True" if self.charm.is_tls_enabled else "False",
+        if transfers != previous_transfers:
+            self.charm.app_peer_data[OWNERSHIP_TRANSFERS_KEY] = json.dumps(sorted(transfers))
+        self._set_provided_requests(provided_requests)
+        if not transfers and self.charm.unit.status.message == OWNERSHIP_TRANSFER_MESSAGE:
+            self.charm.unit.status = ActiveStatus()
+        return provided
+
+    def _extra_user_roles(self, extra_user_roles: str | None) -> list[str]:
+        """Extra user roles of a relation user, always including the relation access-group."""
+        roles = self._sanitize_extra_roles(extra_user_roles)
+        roles.append(ACCESS_GROUP_RELATION)
+        return roles
+
+    def _provided_requests(self) -> dict[str, dict[str, str | None]]:
+        """Request (database and extra user roles) last provided to each client relation."""
+        return json.loads(self.charm.app_peer_data.get(PROVIDED_REQUESTS_KEY, "{}"))
+
+    def _set_provided_requests(self, provided_requests: dict[str, dict[str, str | None]]) -> None:
+        """Record the request last provided to each client relation."""
+        # Also forget the relations that are gone.
+        relation_ids = {str(relation.id) for relation in self.model.relations[self.relation_name]}
+        updated = {
+            relation_id: request
+            for relation_id, request in provided_requests.items()
+            if relation_id in relation_ids
+        }
+        if updated != self._provided_requests():
+            self.charm.app_peer_data[PROVIDED_REQUESTS_KEY] = json.dumps(updated, sort_keys=True)
+
+    def _is_database_provided(
+        self, relation: Relation, database: str | None, extra_user_roles: str | None
+    ) -> bool:
+        """Whether the request made through a relation was already provided.
+
+        A request with other extra user roles is provided again, so the user is updated.
+        The relations provided before the requests were recorded only compare the database.
+        """
+        if (
+            database is None
+            or self.database_provides.fetch_my_relation_field(relation.id, "database") != database
+        ):
+            return False
+        provided = self._provided_requests().get(str(relation.id))
+        return provided is None or provided == {
+            "database": database,
+            "extra-user-roles": extra_user_roles,
+        }
+
+    def _pending_requests(
+        self, exclude: Relation | None = None, relation_ids: set[int] | None = None
+    ) -> list[tuple[Relation, str, str | None]]:
+        """Relations whose requested database wasn't provided yet, with the extra user roles.
+
+        Args:
+            exclude: relation to leave out.
+            relation_ids: relations to check, instead of all of them.
+        """
+        requests = []
+        for relation in self.model.relations[self.relation_name]:
+            if (
+                (exclude is not None and relation.id == exclude.id)
+                or (relation_ids is not None and relation.id not in relation_ids)
+                or relation.app is None
+            ):
+                continue
+            database = self.database_provides.fetch_relation_field(relation.id, "database")
+            if not database:
+                continue
+            extra_user_roles = self.database_provides.fetch_relation_field(
+                relation.id, "extra-user-roles"
             )
+            if not self._is_database_provided(relation, database, extra_user_roles):
+                requests.append((relation, database, extra_user_roles))
+        return requests
 
-            # Set TLS CA
-            if self.charm.is_tls_enabled:
-                _, ca, _ = self.charm.tls.get_tls_files()
-                self.database_provides.set_tls_ca(event.relation.id, ca)
+    def _provide_database(
+        self,
+        relation: Relation,
+        database: str,
+        user: str,
+        password: str,
+        version: str | None = None,
+    ) -> str:
+        """Share the details of the database of a relation with the application.
+
+        Returns:
+            the PostgreSQL version, retrieved when not provided.
+        """
+        # Share the credentials with the application.
+        self.database_provides.set_credentials(relation.id, user, password)
 
-            # Update the read-only endpoint.
-            self.update_read_only_endpoint(event, user, password)
+        # Set the read/write endpoint.
+        self.database_provides.set_endpoints(
+            relation.id,
+            f"{self.charm.primary_endpoint}:{DATABASE_PORT}",
+        )
 
-            # Set the database version.
-            self.database_provides.set_version(
-                event.relation.id, self.charm.postgresql.get_postgresql_version()
-            )
+        # Set connection string URI.
+        self.database_provides.set_uris(
+            relation.id,
+            f"postgresql://{user}:{password}@{self.charm.primary_endpoint}:{DATABASE_PORT}/{database}",
+        )
 
-            # Set the database name
-            self.database_provides.set_database(event.relation.id, database)
+        # Set TLS flag
+        self.database_provides.set_tls(
+            relation.id,
+            "True" if self.charm.is_tls_enabled else "False",
+        )
 
-            self._update_unit_status(event.relation)
+        # Set TLS CA
+        if self.charm.is_tls_enabled:
+            _, ca, _ = self.charm.tls.get_tls_files()
+            self.database_provides.set_tls_ca(relation.id, ca)
 
-            self.charm.update_config()
-        except (
-            PostgreSQLCreateDatabaseError,
-            PostgreSQLCreateUserError,
-            PostgreSQLGetPostgreSQLVersionError,
-        ) as e:
-            logger.exception(e)
-            self.charm.unit.status = BlockedStatus(
-                e.message
-                if issubclass(type(e), PostgreSQLCreateUserError) and e.message is not None
-                else f"Failed to initialize {self.relation_name} relation"
-            )
-            return
+        # Update the read-only endpoint.
+        self.update_read_only_endpoint(relation, user, password, database)
+
+        # Set the database version.
+        if version is None:
+            version = self.charm.get_postgresql_version()
+        self.database_provides.set_version(relation.id, version)
+
+        # Set the database name
+        self.database_provides.set_database(relation.id, database)
+
+        self._update_unit_status(relation)
+        return version
 
     def _on_relation_departed(self, event: RelationDepartedEvent) -> None:
         """Set a flag to avoid deleting database users when not wanted."""
@@ -229,12 +419,16 @@ class PostgreSQLProvider(Object):
 
     def update_read_only_endpoint(
         self,
-        event: DatabaseRequestedEvent | None = None,
+        relation: Relation | None = None,
         user: str | None = None,
         password: str | None = None,
         database: str | None = None,
     ) -> None:
-        """Set the read-only endpoint only if there are replicas."""
+        """Set the read-only endpoint only if there are replicas.
+
+        Without a relation, the endpoint is only set in the relations where it changed
+        since it was last published (as remembered in the peer data).
+        """
         if not self.charm.unit.is_leader():
             return
 
@@ -245,41 +439,71 @@ class PostgreSQLProvider(Object):
             else f"{self.charm.primary_endpoint}:{DATABASE_PORT}"
         )
 
-        # Get the current relation or all the relations
-        # if this is triggered by another type of event.
-        relations = [event.relation] if event else self.model.relations[self.relation_name]
-        if not event:
-            user = None
-            password = None
-            database = None
-
-        for relation in relations:
-            self.database_provides.set_read_only_endpoints(
-                relation.id,
+        published = json.loads(self.charm.app_peer_data.get(READ_ONLY_ENDPOINTS_KEY, "{}"))
+        if relation:
+            self._set_read_only_endpoints([relation], endpoints, user, password, database)
+            updated = {**published, str(relation.id): endpoints}
+        else:
+            relations = self.model.relations[self.relation_name]
+            self._set_read_only_endpoints(
+                [
+                    relation
+                    for relation in relations
+                    if published.get(str(relation.id)) != endpoints
+                ],
                 endpoints,
             )
-            # Make sure that the URI will be a secret
-            if (
-                secret_fields := self.database_provides.fetch_relation_field(
-                    relation.id, "requested-secrets"
-                )
-            ) and "read-only-uris" in secret_fields:
-                if not user or not password or not database:
-                    user = f"relation_id_{relation.id}"
-                    database = self.database_provides.fetch_relation_field(relation.id, "database")
-                    password = self.database_provides.fetch_my_relation_field(
-                        relation.id, "password"
-                    )
+            # Also forget the relations that are gone.
+            updated = {str(relation.id): endpoints for relation in relations}
+        if updated != published:
+            self.charm.app_peer_data[READ_ONLY_ENDPOINTS_KEY] = json.dumps(updated, sort_keys=True)
 
-                if user and password:
-                    self.database_provides.set_read_only_uris(
-                        relation.id,
-                        f"postgresql://{user}:{password}@{endpoints}/{database}",
-                    )
-            # Reset the creds for the next iteration
-            user = None
-            password = None
-            database = None
+    def _set_read_only_endpoints(
+        self,
+        relations: list[Relation],
+        endpoints: str,
+        user: str | None = None,
+        password: str | None = None,
+        database: str | None = None,
+    ) -> None:
+        """Set the read-only endpoint, and URI when requested as a secret, in the relations.
+
+        The fields of all the relations are fetched at once, so each secret is read once
+        at most. The URI uses the provided credentials, or else the relation user ones.
+        """
+        if not relations:
+            return
+
+        relation_ids = [relation.id for relation in relations]
+        requested = self.database_provides.fetch_relation_data(
+            relation_ids, ["requested-secrets", "database"]
+        )
+        # Make sure that the URI will be a secret
+        uri_relation_ids = [
+            relation_id
+            for relation_id in relation_ids
+            if "read-only-uris" in (requested.get(relation_id, {}).get("requested-secrets") or "")
+        ]
+        credentials_provided = bool(user and password and database)
+        passwords = {}
+        if uri_relation_ids and not credentials_provided:
+            passwords = (
+                self.database_provides.fetch_my_relation_data(uri_relation_ids, ["password"]) or {}
+            )
+
+        for relation_id in relation_ids:
+            self.database_provides.set_read_only_endpoints(relation_id, endpoints)
+            if relation_id not in uri_relation_ids:
+                continue
+            if not credentials_provided:
+                user = f"relation_id_{relation_id}"
+                password = passwords.get(relation_id, {}).get("password")
+                database = requested.get(relation_id, {}).get("database")
+            if user and password:
+                self.database_provides.set_read_only_uris(
+                    relation_id,
+                    f"postgresql://{user}:{password}@{endpoints}/{database}",
+                )
 
     def update_tls_flag(self, tls: str) -> None:
         """Update TLS flag and CA in relation databag."""
@@ -0,0 +1,81 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Cron-like schedules."""
+
+from datetime import datetime, timedelta
+
+# Fields of a schedule: (name, minimum, maximum).
+FIELDS = [
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+]
+
+
+class CronSchedule:
+    """Schedule in the crontab format: "minute hour day-of-month month day-of-week".
+
+    Each field is "*", a value, a range ("1-5") or a list of them ("1,3,5"), optionally
+    with a step ("*/15"). Days of week go from 0 to 7 (0 and 7 are Sunday).
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != len(FIELDS):
+            raise ValueError(f"Expected {len(FIELDS)} fields in the schedule, got {len(fields)}")
+        self._minutes, self._hours, self._days, self._months, weekdays = (
+            self._parse_field(field, *spec) for field, spec in zip(fields, FIELDS, strict=True)
+        )
+        self._weekdays = {weekday % 7 for weekday in weekdays}
+        # As in cron, when both the day of month and the day of week are restricted,
+        # a day matching either of them matches.
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, name: str, minimum: int, maximum: int) -> set[int]:
+        values = set()
+        for part in field.split(","):
+            value_range, _, step = part.partition("/")
+            try:
+                if value_range == "*":
+                    start, end = minimum, maximum
+                else:
+                    start, _, end = value_range.partition("-")
+                    start = int(start)
+                    end = int(end) if end else (maximum if step else start)
+                step = int(step) if step else 1
+            except ValueError:
+                raise ValueError(f"Invalid {name} in the schedule: {part}") from None
+            if not minimum <= start <= end <= maximum or step < 1:
+                raise ValueError(f"Invalid {name} in the schedule: {part}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def matches(self, moment: datetime) -> bool:
+        """Whether the schedule matches the minute of a moment."""
+        if (
+            moment.minute not in self._minutes
+            or moment.hour not in self._hours
+            or moment.month not in self._months
+        ):
+            return False
+        day = moment.day in self._days
+        weekday = moment.isoweekday() % 7 in self._weekdays
+        if self._any_day:
+            return weekday
+        if self._any_weekday:
+            return day
+        return day or weekday
+
+    def last_due(self, since: datetime, now: datetime) -> datetime | None:
+        """Latest minute matched by the schedule after `since` and up to `now`."""
+        moment = now.replace(second=0, microsecond=0)
+        while moment > since:
+            if self.matches(moment):
+                return moment
+            moment -= timedelta(minutes=1)
+        return None
@@ -24,6 +24,7 @@ from typing_extensions import override
 
 from constants import APP_SCOPE, MONITORING_PASSWORD_KEY, MONITORING_USER, PATRONI_PASSWORD_KEY
 from patroni import SwitchoverFailedError
+from profiling import instrument_k8s_client, retry_sleep
 from utils import new_password
 
 logger = logging.getLogger(__name__)
@@ -127,8 +128,11 @@ class PostgreSQLUpgrade(DataUpgrade):
             self._patch_max_timelines_history()
 
         try:
-            for attempt in Retrying(stop=stop_after_attempt(6), wait=wait_fixed(10)):
+            for attempt in Retrying(
+                stop=stop_after_attempt(6), wait=wait_fixed(10), sleep=retry_sleep
+            ):
                 with attempt:
+                    self.charm._patroni.invalidate_cluster_topology()
                     if (
                         self.charm.unit.name.replace("/", "-")
                         in self.charm._patroni.cluster_members
@@ -201,6 +205,16 @@ class PostgreSQLUpgrade(DataUpgrade):
                 "wait for the backup creation to finish before starting the upgrade",
             )
 
+        members_health = self.charm._patroni.get_members_health()
+        if unhealthy_members := sorted(
+            member for member, health in members_health.items() if not health["healthy"]
+        ):
+            raise ClusterNotReadyError(
+                default_message,
+                f"replication is not healthy on {', '.join(unhealthy_members)}",
+                "wait for the replicas to catch up with the primary",
+            )
+
         # If the first unit is already the primary we don't need to do any
         # switchover.
         primary_unit_name = self.charm._patroni.get_primary(unit_name_pattern=True)
@@ -256,7 +270,7 @@ class PostgreSQLUpgrade(DataUpgrade):
         """Set the rolling update partition to a specific value."""
         try:
             patch = {"spec": {"updateStrategy": {"rollingUpdate": {"partition": partition}}}}
-            Client().patch(
+            instrument_k8s_client(Client()).patch(
                 StatefulSet,
                 name=self.charm.model.app.name,
                 namespace=self.charm.model.name,
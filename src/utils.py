@@ -6,6 +6,20 @@
 import re
 import secrets
 import string
+from functools import cache
+from hashlib import shake_128
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from profiling import profile
+
+# Templates are compiled once per process and their bytecode is kept on disk,
+# so later hooks skip parsing them again.
+_TEMPLATES = Environment(  # noqa: S701
+    loader=FileSystemLoader("templates"),
+    bytecode_cache=FileSystemBytecodeCache(),
+    auto_reload=False,
+)
 
 
 def new_password() -> str:
@@ -19,6 +33,31 @@ def new_password() -> str:
     return password
 
 
+def render_template(name: str, **kwargs) -> str:
+    """Render a template from the templates directory.
+
+    Args:
+        name: the file name of the template (e.g. "patroni.yml.j2").
+        kwargs: the values passed to the template.
+
+    Returns:
+        The rendered content.
+    """
+    with profile.measure("render", name):
+        return _TEMPLATES.get_template(name).render(**kwargs)
+
+
+@cache
+def template_checksum(name: str) -> str:
+    """Checksum of the source of a template from the templates directory.
+
+    Args:
+        name: the file name of the template (e.g. "patroni.yml.j2").
+    """
+    source, _, _ = _TEMPLATES.loader.get_source(_TEMPLATES, name)
+    return shake_128(source.encode()).hexdigest(16)
+
+
 def split_mem(mem_str) -> tuple:
     """Split a memory string into a number and a unit.
 
@@ -0,0 +1,404 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Local stand-ins for Patroni, PostgreSQL, S3 and the K8s API used by the benchmarks."""
+
+import json
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+PATRONI_PORT = 8008
+
+
+@pytest.fixture(autouse=True)
+def juju_version(monkeypatch):
+    """Run the hooks on a Juju with Pebble notices, so no backup job watcher is started."""
+    monkeypatch.setenv("JUJU_VERSION", "3.6.0")
+
+
+@pytest.fixture(autouse=True)
+def retry_waits():
+    """Record the waits of the charm's own retries instead of sleeping them."""
+    waits = []
+    with patch("tenacity.sleep", side_effect=waits.append):
+        yield waits
+
+
+class _PatroniStubHandler(BaseHTTPRequestHandler):
+    """Keep-alive stub of the Patroni REST API."""
+
+    protocol_version = "HTTP/1.1"
+    # Send each response in a single segment, as Patroni does.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    server: "PatroniStub"
+
+    def _reply(self, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> dict:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        return json.loads(body) if body else {}
+
+    def do_GET(self):
+        if self.path == "/cluster":
+            self._reply(self.server.cluster_status)
+        elif self.path == "/config":
+            self._reply(self.server.dynamic_config)
+        else:
+            self._reply({"state": "running", "role": "master"})
+
+    def do_POST(self):
+        self._read_body()
+        self._reply({})
+
+    def do_PATCH(self):
+        patch = self._read_body()
+        if self.path == "/config":
+            for key, value in patch.items():
+                if isinstance(value, dict):
+                    self.server.dynamic_config.setdefault(key, {}).update(value)
+                else:
+                    self.server.dynamic_config[key] = value
+        self._reply(self.server.dynamic_config)
+
+    def log_message(self, *args):
+        pass
+
+
+class PatroniStub(ThreadingHTTPServer):
+    """Patroni REST API answering for a cluster of a given size."""
+
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, _PatroniStubHandler)
+        self.connections = 0
+        self.dynamic_config = {}
+        self.set_members(3)
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+    def set_members(self, units: int) -> None:
+        """Answer for a cluster where the first unit is the primary."""
+        self.cluster_status = {
+            "members": [
+                {
+                    "name": f"postgresql-k8s-{unit}",
+                    "role": "leader" if unit == 0 else "sync_standby" if unit == 1 else "replica",
+                    "state": "running" if unit == 0 else "streaming",
+                    "host": f"postgresql-k8s-{unit}.postgresql-k8s-endpoints",
+                    "lag": 0,
+                }
+                for unit in range(units)
+            ]
+        }
+        self.dynamic_config = {}
+
+
+@pytest.fixture(scope="session")
+def patroni_stub():
+    try:
+        server = PatroniStub(("127.0.0.1", PATRONI_PORT))
+    except OSError as e:
+        # The charm always calls Patroni on its port. On CI, the benchmarks must not be
+        # skipped silently when it's taken.
+        message = f"port {PATRONI_PORT} is already in use: {e}"
+        if os.environ.get("CI"):
+            pytest.fail(message)
+        pytest.skip(message)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class _S3StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive stub of the S3 object API, enough for puts, gets, copies and multipart uploads."""
+
+    protocol_version = "HTTP/1.1"
+    server: "S3Stub"
+
+    def _reply(self, body: bytes = b"", status: int = 200, headers: dict | None = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # HEAD is answered as GET, without the body.
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        body = self.server.objects.get(unquote(urlsplit(self.path).path))
+        if body is None:
+            self._reply(b"<Error><Code>NoSuchKey</Code></Error>", status=404)
+        else:
+            self._reply(body, headers={"ETag": '"stub"'})
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_PUT(self):
+        body = self._read_body()
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        self.server.requests += 1
+        if "uploadId" in query:
+            self.server.parts.setdefault(query["uploadId"][0], {})[int(query["partNumber"][0])] = (
+                body
+            )
+        elif source := self.headers.get("x-amz-copy-source"):
+            self.server.objects[unquote(url.path)] = self.server.objects[
+                "/" + unquote(source).lstrip("/")
+            ]
+            self._reply(b'<CopyObjectResult><ETag>"stub"</ETag></CopyObjectResult>')
+            return
+        else:
+            self.server.objects[unquote(url.path)] = body
+        self._reply(headers={"ETag": '"stub"'})
+
+    def do_DELETE(self):
+        self.server.requests += 1
+        self.server.objects.pop(unquote(urlsplit(self.path).path), None)
+        self._reply(status=204)
+
+    def do_POST(self):
+        self._read_body()
+        url = urlsplit(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        self.server.requests += 1
+        if "uploads" in query:
+            upload_id = str(len(self.server.parts))
+            self.server.parts[upload_id] = {}
+            self._reply(
+                "<InitiateMultipartUploadResult>"
+                f"<UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>".encode()
+            )
+        else:
+            parts = self.server.parts.pop(query["uploadId"][0])
+            self.server.objects[unquote(url.path)] = b"".join(
+                parts[number] for number in sorted(parts)
+            )
+            self._reply(b"<CompleteMultipartUploadResult></CompleteMultipartUploadResult>")
+
+    def log_message(self, *args):
+        pass
+
+
+class S3Stub(ThreadingHTTPServer):
+    """S3 endpoint keeping the objects in memory, by path."""
+
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, _S3StubHandler)
+        self.connections = 0
+        self.requests = 0
+        self.objects = {}
+        self.parts = {}
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@pytest.fixture
+def s3_stub():
+    server = S3Stub(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def local_dns():
+    """Resolve the cluster hostnames to the local stubs."""
+    getaddrinfo = socket.getaddrinfo
+
+    def resolve(host, *args, **kwargs):
+        # anyio passes the hostname already IDNA-encoded.
+        if isinstance(host, bytes):
+            host = host.decode()
+        if host.startswith("postgresql-k8s-"):
+            host = "127.0.0.1"
+        return getaddrinfo(host, *args, **kwargs)
+
+    with patch("socket.getaddrinfo", resolve):
+        yield
+
+
+class FakeCursor:
+    """Cursor answering the queries with the rows registered in the fake database."""
+
+    def __init__(self, database: "FakePostgreSQL"):
+        self._database = database
+        self._rows = []
+
+    def __enter__(self):
+        """Use as a context manager, like the psycopg2 object."""
+        return self
+
+    def __exit__(self, *args):
+        """Keep the fake object usable after the context."""
+
+    def execute(self, query, *args) -> None:
+        self._database.queries += 1
+        query = str(query)
+        self._rows = next(
+            (rows() for pattern, rows in self._database.answers if pattern in query), []
+        )
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+    """psycopg2 connection stand-in."""
+
+    closed = 0
+    info = SimpleNamespace(transaction_status=TRANSACTION_STATUS_IDLE)
+
+    def __init__(self, database: "FakePostgreSQL"):
+        self._database = database
+        self.autocommit = False
+
+    def __enter__(self):
+        """Use as a context manager, like the psycopg2 object."""
+        return self
+
+    def __exit__(self, *args):
+        """Keep the fake object usable after the context."""
+
+    def cursor(self):
+        return FakeCursor(self._database)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePostgreSQL:
+    """Database answering the catalog queries done by the hooks."""
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.relation_users = {}
+        self.answers = [
+            ("version()", lambda: [("PostgreSQL 14.15 on x86_64-pc-linux-gnu",)]),
+            ("SHOW ssl", lambda: [("off",)]),
+            ("pg_ts_config", lambda: [("pg_catalog.simple",)]),
+            ("pg_timezone_names", lambda: [("UTC",)]),
+            ("pg_am", lambda: [("heap",)]),
+            (
+                "array_agg",
+                lambda: [(user, False, [db]) for user, db in self.relation_users.items()],
+            ),
+            ("pg_roles", lambda: [(user,) for user in self.relation_users]),
+            ("pg_user", lambda: [(user,) for user in self.relation_users]),
+            ("pg_extension", lambda: [("plpgsql", "1.0")]),
+            ("pg_is_in_recovery", lambda: [(False,)]),
+            ("timeline_id", lambda: [(1,)]),
+        ]
+
+    def connect(self, *args, **kwargs) -> FakeConnection:
+        self.connections += 1
+        return FakeConnection(self)
+
+
+@pytest.fixture
+def fake_postgresql():
+    database = FakePostgreSQL()
+    with patch("charms.postgresql_k8s.v0.postgresql.psycopg2.connect", database.connect):
+        yield database
+
+
+class FakeKubernetes:
+    """lightkube client stand-in, answering for the pod, node and services of the charm."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _call(self, method: str, resource, name: str | None = None, *args, **kwargs):
+        # The calls are measured by the charm, which instruments its clients.
+        kind = getattr(resource, "__name__", type(resource).__name__)
+        obj = MagicMock()
+        if kind == "Pod":
+            container = SimpleNamespace(
+                name="postgresql",
+                imageID="sha256:benchmark",
+                resources=SimpleNamespace(limits={"cpu": "2", "memory": "4Gi"}),
+            )
+            obj.spec.nodeName = "node-0"
+            obj.spec.containers = [container]
+            obj.status.containerStatuses = [container]
+            obj.metadata.labels = {}
+        elif kind == "Node":
+            obj.status.allocatable = {"cpu": "8", "memory": "32Gi"}
+        return obj
+
+    def get(self, resource, name=None, *args, **kwargs):
+        return self._call("GET", resource, name)
+
+    def patch(self, resource, name=None, *args, **kwargs):
+        return self._call("PATCH", resource, name)
+
+    def apply(self, obj, *args, **kwargs):
+        return self._call("APPLY", obj)
+
+    def create(self, obj, *args, **kwargs):
+        return self._call("CREATE", obj)
+
+    def delete(self, resource, name=None, *args, **kwargs):
+        return self._call("DELETE", resource, name)
+
+    def list(self, resource, *args, **kwargs):
+        self._call("LIST", resource)
+        return []
+
+
+@pytest.fixture
+def fake_kubernetes():
+    with (
+        patch("charm.Client", FakeKubernetes),
+        patch("backups.Client", FakeKubernetes),
+        patch("upgrade.Client", FakeKubernetes),
+        patch("relations.async_replication.Client", FakeKubernetes),
+    ):
+        yield FakeKubernetes
@@ -0,0 +1,286 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Measure the cost of the main hooks as the cluster and the number of clients grow.
+
+Each hook runs against local stand-ins for Patroni (an HTTP stub on :8008), PostgreSQL
+(a psycopg2 fake) and the K8s API (a lightkube fake), on a cluster whose configuration was
+already applied. create-backup also finishes the backup job it starts, through the state file
+and the Pebble notice of the job. The wall time, the number of calls to each stand-in, the
+retry waits (recorded, not slept) and the peak memory are recorded in
+tests/benchmarks/baseline.json. Only the counters and the retry waits are compared with the
+baseline, as they're deterministic; the wall time and the peak memory depend on the machine,
+so they're only reported.
+Set BENCHMARK_UPDATE_BASELINE=1 to record a new baseline instead.
+"""
+
+import json
+import logging
+import os
+import time
+import tracemalloc
+from functools import cached_property
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from ops.model import Container
+from ops.testing import ExecResult, Harness
+
+import profiling
+from charm import PostgresqlOperatorCharm
+from constants import (
+    APP_SCOPE,
+    BACKUP_JOB_NOTICE,
+    BACKUP_JOB_STATE_FILE,
+    BACKUP_JOB_STDERR_FILE,
+    BACKUP_JOB_STDOUT_FILE,
+    MONITORING_PASSWORD_KEY,
+    PATRONI_PASSWORD_KEY,
+    PEER,
+    REPLICATION_PASSWORD_KEY,
+    REWIND_PASSWORD_KEY,
+    USER_PASSWORD_KEY,
+)
+
+logger = logging.getLogger(__name__)
+
+BASELINE_FILE = Path(__file__).parent / "baseline.json"
+UPDATE_BASELINE = os.environ.get("BENCHMARK_UPDATE_BASELINE") == "1"
+# Wall time and memory depend on the machine, so they're only reported past these factors.
+TIME_TOLERANCE = float(os.environ.get("BENCHMARK_TIME_TOLERANCE", "3"))
+MEMORY_TOLERANCE = float(os.environ.get("BENCHMARK_MEMORY_TOLERANCE", "1.5"))
+
+UNITS = [3, 7, 15]
+CLIENT_RELATIONS = [10, 100, 1000]
+
+PGBACKREST_INFO = [
+    {
+        "name": "test-model.postgresql-k8s",
+        "backup": [
+            {
+                "label": "20260101-000000F",
+                "error": False,
+                "archive": {"start": "000000010000000000000003"},
+                "timestamp": {"start": 1767225600, "stop": 1767225660},
+                "type": "full",
+            }
+        ],
+    }
+]
+
+
+def _pgbackrest(args) -> ExecResult:
+    if "info" in args.command:
+        return ExecResult(stdout=json.dumps(PGBACKREST_INFO))
+    return ExecResult(stdout="new backup label = 20260101-000000F\n")
+
+
+def _deploy(units: int, client_relations: int, fake_postgresql, storage_path: Path) -> Harness:
+    """Build the state of the leader unit of an initialised cluster."""
+    harness = Harness(PostgresqlOperatorCharm)
+    harness.set_model_name("test-model")
+    harness.set_leader(True)
+    harness.handle_exec("postgresql", ["locale"], result="C")
+    harness.handle_exec("postgresql", ["pgbackrest"], handler=_pgbackrest)
+
+    peer_relation_id = harness.add_relation(PEER, "postgresql-k8s")
+    for unit in range(1, units):
+        harness.add_relation_unit(peer_relation_id, f"postgresql-k8s/{unit}")
+    harness.update_relation_data(
+        peer_relation_id,
+        "postgresql-k8s",
+        {
+            "cluster_initialised": "True",
+            "endpoints": json.dumps([
+                f"postgresql-k8s-{unit}.postgresql-k8s-endpoints" for unit in range(units)
+            ]),
+            "stanza": "test-model.postgresql-k8s",
+        },
+    )
+    harness.add_relation("restart", "postgresql-k8s")
+    upgrade_relation_id = harness.add_relation(
+        "upgrade", "postgresql-k8s", unit_data={"state": "idle"}
+    )
+    for unit in range(1, units):
+        harness.add_relation_unit(upgrade_relation_id, f"postgresql-k8s/{unit}")
+        harness.update_relation_data(
+            upgrade_relation_id, f"postgresql-k8s/{unit}", {"state": "idle"}
+        )
+    harness.add_relation(
+        "s3-parameters",
+        "s3-integrator",
+        app_data={"bucket": "backups", "access-key": "access", "secret-key": "secret"},
+    )
+
+    # Each remote unit rebuilds every relation of the model, so only the data is set, after
+    # all the relations were added.
+    relation_ids = [
+        harness.add_relation("database", f"application{client}")
+        for client in range(client_relations)
+    ]
+    for client, relation_id in enumerate(relation_ids):
+        harness.update_relation_data(
+            relation_id, f"application{client}", {"database": f"database{client}"}
+        )
+        fake_postgresql.relation_users[f"relation_id_{relation_id}"] = f"database{client}"
+
+    harness.begin()
+    # Patroni renders its configuration in the storage shared with the charm container.
+    harness.charm._storage_path = str(storage_path)
+    harness.charm.pgdata_path = str(storage_path / "pgdata")
+    (storage_path / "pgdata").mkdir()
+    for key in [
+        USER_PASSWORD_KEY,
+        REPLICATION_PASSWORD_KEY,
+        REWIND_PASSWORD_KEY,
+        MONITORING_PASSWORD_KEY,
+        PATRONI_PASSWORD_KEY,
+    ]:
+        harness.charm.set_secret(APP_SCOPE, key, "password")
+
+    harness.set_can_connect("postgresql", True)
+    root = harness.get_filesystem_root("postgresql")
+    for directory in ["etc/logrotate.d", "home/postgres", "meta.charmed-postgresql"]:
+        (root / directory).mkdir(parents=True)
+    (root / "meta.charmed-postgresql" / "snap.yaml").write_text("version: '14.15'\n")
+    container = harness.charm.unit.get_container("postgresql")
+    container.add_layer("postgresql", harness.charm._postgresql_layer())
+    container.replan()
+    # Start from a configuration already applied, as on a cluster running for a while.
+    harness.charm.update_config()
+    _end_dispatch(harness.charm)
+    return harness
+
+
+def _end_dispatch(charm: PostgresqlOperatorCharm) -> None:
+    """Drop what the charm keeps for a single hook, as Juju runs each one in a new process."""
+    with patch("charm.profile.write"):
+        charm._on_commit(None)
+    for obj in [charm, charm.backup]:
+        for cls in type(obj).__mro__:
+            for name, value in vars(cls).items():
+                if isinstance(value, cached_property):
+                    obj.__dict__.pop(name, None)
+
+
+def _run_backup_job(harness: Harness, job_id: str) -> None:
+    """Report the end of the backup job the way scripts/backup_job.py does it."""
+    container = harness.charm.unit.get_container("postgresql")
+    container.push(f"{BACKUP_JOB_STDOUT_FILE}.1", "new backup label = 20260101-000000F\n")
+    container.push(BACKUP_JOB_STDERR_FILE, "")
+    container.push(
+        BACKUP_JOB_STATE_FILE,
+        json.dumps({
+            "id": job_id,
+            "status": "succeeded",
+            "started": time.time(),
+            "updated": time.time(),
+            "files-done": 1000,
+            "bytes-done": 1024**3,
+            "percent": 100.0,
+            "label": "20260101-000000F",
+            "copied": True,
+            "segments": 0,
+            "exit-code": 0,
+        }),
+    )
+    container.stop(harness.charm.backup_service)
+    harness.pebble_notify("postgresql", BACKUP_JOB_NOTICE)
+    assert harness.charm.backup.backup_job["status"] == "succeeded"
+
+
+def _run_hook(harness: Harness, hook: str, peer_relation_id: int) -> None:
+    if hook == "update-status":
+        harness.charm.on.update_status.emit()
+    elif hook == "config-changed":
+        harness.charm.on.config_changed.emit()
+    elif hook == "peer-relation-changed":
+        harness.update_relation_data(peer_relation_id, "postgresql-k8s/1", {"ip": "10.1.0.2"})
+    elif hook == "database-requested":
+        harness.add_relation("database", "new-application", app_data={"database": "new"})
+    elif hook == "create-backup":
+        output = harness.run_action("create-backup")
+        _run_backup_job(harness, output.results["job-id"])
+
+
+def _check_against_baseline(baseline: dict, key: str, result: dict) -> None:
+    if UPDATE_BASELINE:
+        baseline[key] = result
+        return
+    # A missing entry would let a new or renamed case pass without any check.
+    assert key in baseline, f"no baseline for {key}, record it with BENCHMARK_UPDATE_BASELINE=1"
+    expected = baseline[key]
+    for counter in ["retry_wait", "http_calls", "db_connections", "k8s_calls", "pebble_execs"]:
+        assert result[counter] <= expected[counter], f"{key}: more {counter} than the baseline"
+    if result["peak_memory"] > expected["peak_memory"] * MEMORY_TOLERANCE:
+        logger.warning(f"{key}: peak memory above the baseline ({expected['peak_memory']})")
+    if result["wall_time"] > expected["wall_time"] * TIME_TOLERANCE:
+        logger.warning(f"{key}: wall time above the baseline ({expected['wall_time']})")
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    yield baseline
+    if UPDATE_BASELINE:
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.mark.parametrize("client_relations", CLIENT_RELATIONS)
+@pytest.mark.parametrize("units", UNITS)
+@pytest.mark.parametrize(
+    "hook",
+    [
+        "update-status",
+        "config-changed",
+        "peer-relation-changed",
+        "database-requested",
+        "create-backup",
+    ],
+)
+def test_hook(
+    hook,
+    units,
+    client_relations,
+    baseline,
+    patroni_stub,
+    local_dns,
+    fake_postgresql,
+    fake_kubernetes,
+    retry_waits,
+    tmp_path,
+):
+    patroni_stub.set_members(units)
+    harness = _deploy(units, client_relations, fake_postgresql, tmp_path)
+    peer_relation_id = harness.model.get_relation(PEER).id
+
+    retry_waits.clear()
+    with (
+        patch("backups.PostgreSQLBackups._upload_content_to_s3", return_value=True),
+        patch("backups.PostgreSQLBackups._get_s3_session_resource"),
+        patch("ops.model.Container.restart"),
+        patch("ops.model.Container.exec", autospec=True, side_effect=Container.exec) as _exec,
+    ):
+        profiling.profile.reset()
+        connections = fake_postgresql.connections
+        tracemalloc.start()
+        start = time.perf_counter()
+        _run_hook(harness, hook, peer_relation_id)
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _end_dispatch(harness.charm)
+
+    calls = profiling.profile.calls
+    result = {
+        "wall_time": round(wall_time, 4),
+        "retry_wait": sum(retry_waits),
+        "peak_memory": peak_memory,
+        "http_calls": calls["http"],
+        "db_connections": fake_postgresql.connections - connections,
+        "k8s_calls": calls["k8s"],
+        "pebble_execs": _exec.call_count,
+    }
+    logger.info(f"{hook} with {units} units and {client_relations} clients: {result}")
+    harness.cleanup()
+    _check_against_baseline(baseline, f"{hook}[{units}-{client_relations}]", result)
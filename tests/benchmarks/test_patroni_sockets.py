@@ -0,0 +1,61 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Count the sockets opened to the Patroni REST API during a typical hook."""
+
+import logging
+from unittest.mock import PropertyMock, patch
+
+import pytest
+from ops.testing import Harness
+
+from charm import PostgresqlOperatorCharm
+from patroni import Patroni
+from tests.helpers import STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+# One socket for the async client and one for the synchronous session.
+MAX_SOCKETS_PER_HOOK = 2
+
+
+@pytest.fixture
+def harness():
+    harness = Harness(PostgresqlOperatorCharm)
+    harness.begin()
+    yield harness
+    harness.cleanup()
+
+
+def test_sockets_per_hook(harness, patroni_stub):
+    patroni_stub.set_members(2)
+    patroni_stub.connections = 0
+    with patch(
+        "charm.PostgresqlOperatorCharm.is_peer_data_tls_set",
+        new_callable=PropertyMock(return_value=False),
+    ):
+        patroni = Patroni(
+            harness.charm,
+            "127.0.0.1",
+            [],
+            "127.0.0.1",
+            "test-model",
+            STORAGE_PATH,
+            "superuser-password",
+            "replication-password",
+            "rewind-password",
+            "patroni-password",
+        )
+
+        # Calls done by a hook that reconfigures the cluster and checks its health.
+        for _ in range(5):
+            patroni.invalidate_cluster_topology()
+            assert patroni.get_primary() == "postgresql-k8s-0"
+            assert patroni.get_sync_standby_names() == ["postgresql-k8s/1"]
+        for _ in range(5):
+            assert patroni.get_patroni_health()["state"] == "running"
+        patroni.bulk_update_parameters_controller_by_patroni({"max_connections": 100}, None)
+        patroni.restart_postgresql()
+        patroni.close()
+
+    logger.info("Sockets opened to the Patroni REST API: %d", patroni_stub.connections)
+    assert patroni_stub.connections <= MAX_SOCKETS_PER_HOOK
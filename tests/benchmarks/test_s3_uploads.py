@@ -0,0 +1,103 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Compare a new and a reused S3 client for the backup metadata and log uploads."""
+
+import logging
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+from unittest.mock import PropertyMock, patch
+
+import pytest
+from ops.testing import Harness
+
+from backups import BACKUP_LOG_PART_SIZE
+from charm import PostgresqlOperatorCharm
+
+logger = logging.getLogger(__name__)
+
+HOOKS = 5
+LOG_LINE = b"P01 DETAIL: backup file /var/lib/postgresql/data/pgdata/base/1/1249 (8KB, 1.00%)\n"
+# A complete segment of the output of the backup job, streamed while the job runs, and the
+# last one, appended once it exits.
+SEGMENT_LINES = BACKUP_LOG_PART_SIZE // len(LOG_LINE) + 1
+LAST_SEGMENT_LINES = SEGMENT_LINES // 2
+
+
+@pytest.fixture
+def harness():
+    harness = Harness(PostgresqlOperatorCharm)
+    harness.begin()
+    yield harness
+    harness.cleanup()
+
+
+def _backup_hook(backup, s3_parameters: dict, reuse_client: bool) -> None:
+    """S3 calls done by a backup: metadata, model check and log of the backup."""
+    for call in [
+        lambda: backup._upload_content_to_s3("metadata", "backup/stanza/latest", s3_parameters),
+        lambda: backup._upload_content_to_s3("uuid", "model-uuid.txt", s3_parameters),
+        lambda: backup._read_content_from_s3("model-uuid.txt", s3_parameters),
+    ]:
+        if not reuse_client:
+            backup._s3_resources.clear()
+        assert call()
+    if not reuse_client:
+        backup._s3_resources.clear()
+    log = backup._open_backup_log(s3_parameters, "20260101-000000")
+    assert log.upload_part(LOG_LINE * SEGMENT_LINES)
+    assert log.finish(
+        BytesIO(LOG_LINE * LAST_SEGMENT_LINES),
+        BytesIO(b"P00 WARN: benchmark\n"),
+        backup._backup_log_key(s3_parameters, "2026-01-01T00:00:00Z"),
+    )
+
+
+@pytest.mark.parametrize("reuse_client", [False, True])
+def test_backup_uploads(harness, s3_stub, reuse_client):
+    s3_parameters = {
+        "bucket": "backups",
+        "access-key": "access-key",
+        "secret-key": "secret-key",
+        "endpoint": s3_stub.endpoint,
+        "region": "us-east-1",
+        "path": "/postgresql",
+    }
+    backup = harness.charm.backup
+    with patch(
+        "charm.PostgreSQLBackups._tls_ca_chain_filename",
+        new_callable=PropertyMock(return_value=""),
+    ):
+        start = time.perf_counter()
+        for _ in range(HOOKS):
+            backup._s3_resources.clear()
+            _backup_hook(backup, s3_parameters, reuse_client)
+        wall_time = (time.perf_counter() - start) / HOOKS
+
+    log_key = f"/backups/postgresql/backup/{backup.stanza_name}/2026-01-01T00:00:00Z/backup.log"
+    assert s3_stub.objects[log_key].count(b"backup file") == SEGMENT_LINES + LAST_SEGMENT_LINES
+    # The log was moved from its provisional key.
+    assert not any("/backup-jobs/" in key for key in s3_stub.objects)
+    connections = s3_stub.connections / HOOKS
+    logger.info(
+        f"S3 uploads of a backup {'with' if reuse_client else 'without'} client reuse: "
+        f"{wall_time:.4f}s, {connections:.1f} connections, {s3_stub.requests} requests"
+    )
+    if reuse_client:
+        # A single keep-alive connection serves all the calls of the hook.
+        assert connections == 1
+    else:
+        assert connections >= 4
+
+
+def test_no_boto3_import_without_s3():
+    """Hooks that don't talk to S3 don't import boto3."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(["src", "lib", "."])}
+    output = subprocess.check_output(
+        [sys.executable, "-c", "import sys, charm; print('boto3' in sys.modules)"],
+        env=env,
+        text=True,
+    )
+    assert output.strip() == "False"
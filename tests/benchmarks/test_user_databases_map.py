@@ -0,0 +1,112 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Compare the per-user and the single-query retrieval of the user->databases map."""
+
+import logging
+import re
+import time
+from unittest.mock import patch
+
+import pytest
+from charms.postgresql_k8s.v0.postgresql import PostgreSQL
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+logger = logging.getLogger(__name__)
+
+# Round-trip time simulated for each query.
+QUERY_LATENCY = 0.0005
+DATABASES = [f"database_{i}" for i in range(10)]
+
+
+class _FakeCursor:
+    """Cursor answering the catalog queries for a cluster with a given number of roles."""
+
+    def __init__(self, connection: "_FakeConnection"):
+        self._connection = connection
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query) -> None:
+        self._connection.queries += 1
+        time.sleep(QUERY_LATENCY)
+        query = str(query)
+        roles = self._connection.roles
+        if "array_agg" in query:
+            self._rows = [(role, False, [database]) for role, database in roles.items()]
+        elif "pg_is_in_recovery" in query:
+            self._rows = [(False,)]
+        elif "usesuper" in query:
+            self._rows = []
+        elif "has_database_privilege" in query:
+            self._rows = [(roles[re.search(r"relation_id_\d+", query).group()],)]
+        else:
+            self._rows = [(role,) for role in roles]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConnection:
+    """psycopg2 connection stub."""
+
+    closed = 0
+
+    def __init__(self, roles: int):
+        self.roles = {f"relation_id_{i}": DATABASES[i % len(DATABASES)] for i in range(roles)}
+        self.queries = 0
+        self.autocommit = False
+
+    class info:  # noqa: N801
+        transaction_status = TRANSACTION_STATUS_IDLE
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("roles", [10, 100, 1000])
+def test_user_databases_map(roles):
+    postgresql = PostgreSQL("primary", "current", "operator", "password", "postgres")
+
+    with patch("charms.postgresql_k8s.v0.postgresql.psycopg2.connect") as _connect:
+        _connect.return_value = per_user_connection = _FakeConnection(roles)
+        start = time.perf_counter()
+        per_user = {
+            user: postgresql.list_accessible_databases_for_user(user)
+            for user in postgresql.list_users()
+        }
+        per_user_time = time.perf_counter() - start
+        postgresql.close_connections()
+
+        _connect.return_value = single_query_connection = _FakeConnection(roles)
+        start = time.perf_counter()
+        single_query = postgresql.list_accessible_databases_for_users()
+        single_query_time = time.perf_counter() - start
+
+    logger.info(
+        "%d roles: per user %d queries in %.4fs, single query %d queries in %.4fs",
+        roles,
+        per_user_connection.queries,
+        per_user_time,
+        single_query_connection.queries,
+        single_query_time,
+    )
+    assert single_query == per_user
+    assert single_query_connection.queries == 1
+    assert single_query_time < per_user_time
@@ -4,7 +4,7 @@
 import logging
 
 from pytest_operator.plugin import OpsTest
-from tenacity import Retrying, stop_after_attempt, wait_exponential
+from tenacity import Retrying, stop_after_attempt, wait_exponential, wait_fixed
 
 from .helpers import (
     DATABASE_APP_NAME,
@@ -21,6 +21,26 @@ logger = logging.getLogger(__name__)
 CANNOT_RESTORE_PITR = "cannot restore PITR, juju debug-log for details"
 
 
+async def create_backup(ops_test: OpsTest, unit_name: str, backup_type: str = "full") -> None:
+    """Create a backup on a unit and wait for the backup job to finish."""
+    action = await ops_test.model.units.get(unit_name).run_action(
+        "create-backup", **{"type": backup_type}
+    )
+    await action.wait()
+    job_id = action.results.get("job-id")
+    assert job_id, "backup hasn't started"
+    # The backup may have been moved to another unit.
+    unit_name = action.results.get("unit", unit_name)
+
+    for attempt in Retrying(stop=stop_after_attempt(60), wait=wait_fixed(10), reraise=True):
+        with attempt:
+            action = await ops_test.model.units.get(unit_name).run_action("get-backup-status")
+            await action.wait()
+            assert action.results.get("job-id") == job_id
+            assert action.results.get("status") != "running", "backup is still running"
+    assert action.results.get("status") == "succeeded", "backup hasn't succeeded"
+
+
 async def backup_deploy(
     ops_test: OpsTest,
     charm,
@@ -113,10 +133,7 @@ async def backup_operations(
     async with ops_test.fast_forward():
         await ops_test.model.wait_for_idle(status="active", timeout=1000, idle_period=30)
     logger.info("creating a backup")
-    action = await ops_test.model.units.get(replica).run_action("create-backup")
-    await action.wait()
-    backup_status = action.results.get("backup-status")
-    assert backup_status, "backup hasn't succeeded"
+    await create_backup(ops_test, replica)
     async with ops_test.fast_forward():
         await ops_test.model.wait_for_idle(status="active", timeout=1000)
 
@@ -138,12 +155,7 @@ async def backup_operations(
 
     # Run the "create backup" action.
     logger.info("creating a backup")
-    action = await ops_test.model.units.get(replica).run_action(
-        "create-backup", **{"type": "differential"}
-    )
-    await action.wait()
-    backup_status = action.results.get("backup-status")
-    assert backup_status, "backup hasn't succeeded"
+    await create_backup(ops_test, replica, "differential")
     async with ops_test.fast_forward():
         await ops_test.model.wait_for_idle(status="active", timeout=1000)
 
@@ -302,10 +314,7 @@ async def pitr_backup_operations(
     _create_table(address, password)
 
     logger.info("1: creating backup b1")
-    action = await ops_test.model.units.get(replica).run_action("create-backup")
-    await action.wait()
-    backup_status = action.results.get("backup-status")
-    assert backup_status, "backup hasn't succeeded"
+    await create_backup(ops_test, replica)
     async with ops_test.fast_forward():
         await ops_test.model.wait_for_idle(status="active", timeout=1000)
     backup_b1 = await _get_most_recent_backup(ops_test, ops_test.model.units.get(replica))
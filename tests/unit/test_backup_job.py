@@ -0,0 +1,71 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from scripts.backup_job import main, notify_charm
+
+
+def test_notify_charm(capsys):
+    with (
+        patch("scripts.backup_job.subprocess.run") as _run,
+        patch("scripts.backup_job.write_state") as _write_state,
+    ):
+        state = {"id": "fake-id", "status": "succeeded"}
+        _run.return_value = subprocess.CompletedProcess([], 0, "", "")
+        notify_charm(state)
+        _run.assert_called_once_with(
+            ["/charm/bin/pebble", "notify", "canonical.com/postgresql-k8s/backup-job"],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        assert capsys.readouterr().out == ""
+        _write_state.assert_not_called()
+
+        # Test that the failures are logged and kept in the state of the job.
+        _run.return_value = subprocess.CompletedProcess([], 1, "", "error: fake error\n")
+        notify_charm(state)
+        assert capsys.readouterr().out == "Failed to notify the charm: error: fake error\n"
+        _write_state.assert_called_once_with({**state, "notify-error": "error: fake error"})
+
+        _run.return_value = subprocess.CompletedProcess([], 1, "", "")
+        notify_charm(state)
+        assert state["notify-error"] == "exit code 1"
+
+        _run.side_effect = FileNotFoundError("fake error")
+        notify_charm(state)
+        assert capsys.readouterr().out.endswith("Failed to notify the charm: fake error\n")
+        assert state["notify-error"] == "fake error"
+
+
+def test_main(tmp_path):
+    output = "\n".join([
+        "P01 DETAIL: backup file /pgdata/base/1/1249 (440KB, 50.00%) checksum fake",
+        "P00 INFO: execute non-exclusive backup stop and wait for all WAL segments to archive",
+        "P00 INFO: new backup label = 20260101-000000F",
+    ])
+    with (
+        patch("sys.argv", ["script", "fake-id", sys.executable, "-c", f"print({output!r})"]),
+        patch("scripts.backup_job.STATE_FILE", str(tmp_path / "state.json")),
+        patch("scripts.backup_job.STDOUT_FILE", str(tmp_path / "stdout")),
+        patch("scripts.backup_job.STDERR_FILE", str(tmp_path / "stderr")),
+        patch("scripts.backup_job.notify_charm") as _notify_charm,
+        pytest.raises(SystemExit) as exit_info,
+    ):
+        main()
+
+    assert exit_info.value.code == 0
+    state = json.loads((tmp_path / "state.json").read_text())
+    assert state["status"] == "succeeded"
+    assert state["files-done"] == 1
+    assert state["percent"] == 50.0
+    assert state["label"] == "20260101-000000F"
+    # The charm is notified once the files were copied and when the job exits.
+    assert state["copied"]
+    assert _notify_charm.call_count == 2
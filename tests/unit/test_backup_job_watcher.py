@@ -0,0 +1,74 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from ops import pebble
+
+from scripts.backup_job_watcher import check_backup_job, main
+
+
+def test_check_backup_job():
+    client = MagicMock()
+    client.pull.side_effect = lambda path: StringIO(
+        '{"id": "fake-id", "status": "running", "segments": 2}'
+    )
+    client.get_services.return_value = [MagicMock(**{"is_running.return_value": True})]
+
+    # Test when the job is running.
+    assert check_backup_job(client, "state-file", "backup", "fake-id") == ("running", False, 2)
+    client.pull.assert_called_once_with("state-file")
+    client.get_services.assert_called_once_with(["backup"])
+
+    # Test when the job stopped without reporting its result.
+    client.get_services.return_value[0].is_running.return_value = False
+    assert check_backup_job(client, "state-file", "backup", "fake-id") == ("stopped", False, 2)
+
+    # Test when the state is of another job (not written yet).
+    assert check_backup_job(client, "state-file", "backup", "other-id") == ("stopped", False, 0)
+
+    # Test when the job exited.
+    client.get_services.reset_mock()
+    client.pull.side_effect = lambda path: StringIO(
+        '{"id": "fake-id", "status": "succeeded", "copied": true}'
+    )
+    assert check_backup_job(client, "state-file", "backup", "fake-id") == ("succeeded", True, 0)
+    client.get_services.assert_not_called()
+
+    # Test when the workload container can't be reached.
+    client.pull.side_effect = pebble.ConnectionError("fake error")
+    client.get_services.side_effect = pebble.ConnectionError("fake error")
+    assert check_backup_job(client, "state-file", "backup", "fake-id") == ("running", False, 0)
+
+
+def test_main():
+    with (
+        patch(
+            "sys.argv",
+            ["script", "socket", "state-file", "backup", "fake-id", "run_cmd", "unit/0", "dir"],
+        ),
+        patch("scripts.backup_job_watcher.sleep"),
+        patch("scripts.backup_job_watcher.pebble.Client") as _client,
+        patch("scripts.backup_job_watcher.check_backup_job") as _check_backup_job,
+        patch("scripts.backup_job_watcher.subprocess") as _subprocess,
+    ):
+        # Test that an event is dispatched for each segment, when the files were copied
+        # and when the job exits.
+        _check_backup_job.side_effect = [
+            ("running", False, 0),
+            ("running", False, 1),
+            ("running", False, 1),
+            ("running", True, 1),
+            ("succeeded", True, 1),
+        ]
+        main()
+        _client.assert_called_once_with(socket_path="socket")
+        assert _check_backup_job.call_count == 5
+        assert _subprocess.run.call_count == 3
+        _subprocess.run.assert_called_with([
+            "run_cmd",
+            "-u",
+            "unit/0",
+            "JUJU_DISPATCH_PATH=hooks/backup_job_changed dir/dispatch",
+        ])
@@ -1,19 +1,30 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 import datetime
+import json
+import time
+from io import BytesIO, StringIO
 from unittest.mock import MagicMock, PropertyMock, call, mock_open, patch
 
 import pytest
 from boto3.exceptions import S3UploadFailedError
 from botocore.exceptions import ClientError
 from jinja2 import Template
-from ops import ActiveStatus, BlockedStatus, MaintenanceStatus, Unit
-from ops.pebble import Change, ChangeError, ChangeID, ExecError
-from ops.testing import Harness
+from ops import ActiveStatus, BlockedStatus, JujuVersion, MaintenanceStatus, Unit
+from ops.pebble import Change, ChangeError, ChangeID, ExecError, PathError
+from ops.testing import ExecArgs, ExecResult, Harness
 from tenacity import RetryError, wait_fixed
 
+from backups import (
+    PGBACKREST_INFO_TTL,
+    S3_MAX_POOL_CONNECTIONS,
+    BackupLogUpload,
+    RecoveryIndex,
+    plan_backup_type,
+)
 from charm import PostgresqlOperatorCharm
-from constants import PEER
+from constants import PEER, PGBACKREST_CATALOG_FILE
+from patroni import ClusterTopology
 from tests.unit.helpers import _FakeApiError
 
 ANOTHER_CLUSTER_REPOSITORY_ERROR_MESSAGE = "the S3 repository has backups from another cluster"
@@ -29,6 +40,12 @@ def harness():
     # Mock generic sync client to avoid search to ~/.kube/config.
     patcher = patch("lightkube.core.client.GenericSyncClient")
     patcher.start()
+    # The timeline keys the cached timelines of the backups catalog.
+    topology_patcher = patch(
+        "charm.Patroni.cluster_topology",
+        new_callable=PropertyMock(return_value=ClusterTopology([])),
+    )
+    topology_patcher.start()
 
     harness = Harness(PostgresqlOperatorCharm)
 
@@ -38,6 +55,7 @@ def harness():
     harness.begin()
     yield harness
     harness.cleanup()
+    topology_patcher.stop()
 
 
 def test_stanza_name(harness):
@@ -119,6 +137,7 @@ def test_can_unit_perform_backup(harness):
     with (
         patch("charm.PostgreSQLBackups._are_backup_settings_ok") as _are_backup_settings_ok,
         patch("charm.Patroni.member_started", new_callable=PropertyMock) as _member_started,
+        patch("charm.Patroni.get_member_health") as _get_member_health,
         patch("ops.model.Application.planned_units") as _planned_units,
         patch(
             "charm.PostgresqlOperatorCharm.is_primary", new_callable=PropertyMock
@@ -140,6 +159,21 @@ def test_can_unit_perform_backup(harness):
             "Unit is in a blocking state",
         )
 
+        # Test when a backup is already being created on the unit.
+        harness.charm.unit.status = ActiveStatus()
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.unit.name,
+                {"backup-job": json.dumps({"id": "fake-id", "status": "running"})},
+            )
+        assert harness.charm.backup._can_unit_perform_backup() == (
+            False,
+            "A backup is already being created on this unit",
+        )
+        with harness.hooks_disabled():
+            harness.update_relation_data(peer_rel_id, harness.charm.unit.name, {"backup-job": ""})
+
         # Test when running the check in the primary, there are replicas and TLS is enabled.
         harness.charm.unit.status = ActiveStatus()
         _is_primary.return_value = True
@@ -196,6 +230,25 @@ def test_can_unit_perform_backup(harness):
         # Test when everything is ok to run a backup.
         _are_backup_settings_ok.return_value = (True, None)
         assert harness.charm.backup._can_unit_perform_backup() == (True, None)
+        _get_member_health.assert_not_called()
+
+        # Test when running the check in a replica that is lagging behind the primary.
+        _is_primary.return_value = False
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.unit.name,
+                {"tls": "True"},
+            )
+        _get_member_health.return_value = {"healthy": False}
+        assert harness.charm.backup._can_unit_perform_backup() == (
+            False,
+            "Unit cannot perform backups as it's lagging behind the primary",
+        )
+
+        # Test when running the check in a healthy replica.
+        _get_member_health.return_value = {"healthy": True}
+        assert harness.charm.backup._can_unit_perform_backup() == (True, None)
 
 
 def test_can_use_s3_repository(harness):
@@ -331,7 +384,7 @@ def test_create_bucket_if_not_exists(harness, tls_ca_chain_filename):
             new_callable=PropertyMock(return_value=tls_ca_chain_filename),
         ) as _tls_ca_chain_filename,
         patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
-        patch("backups.Config") as _config,
+        patch("botocore.client.Config") as _config,
     ):
         # Test when there are missing S3 parameters.
         _retrieve_s3_parameters.return_value = ([], ["bucket", "access-key", "secret-key"])
@@ -374,6 +427,8 @@ def test_create_bucket_if_not_exists(harness, tls_ca_chain_filename):
             # https://github.com/boto/boto3/issues/4400#issuecomment-2600742103
             request_checksum_calculation="when_required",
             response_checksum_validation="when_required",
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
         )
         head_bucket.assert_called_once()
         create.assert_not_called()
@@ -409,22 +464,49 @@ def test_create_bucket_if_not_exists(harness, tls_ca_chain_filename):
 
 
 def test_empty_data_files(harness):
-    with patch("ops.model.Container.exec") as _exec:
+    with (
+        patch("ops.model.Container.exec") as _exec,
+        patch("ops.model.Container.exists") as _exists,
+    ):
+        staging_path = "/var/lib/postgresql/data/pgdata-restore"
+        clean_command = ["rm", "-rf", staging_path]
         # Test when the removal of the data files fails.
+        _exists.return_value = False
         command = ["rm", "-r", "/var/lib/postgresql/data/pgdata"]
-        _exec.side_effect = ExecError(command=command, exit_code=1, stdout="", stderr="fake error")
+        _exec.side_effect = [
+            MagicMock(),
+            ExecError(command=command, exit_code=1, stdout="", stderr="fake error"),
+        ]
         try:
             harness.charm.backup._empty_data_files()
             assert False
         except ExecError:
             pass
-        _exec.assert_called_once_with(command)
+        _exec.assert_has_calls([call(clean_command), call(command)])
+
+        # Test when there is no data directory (e.g. after a failed restore).
+        _exec.reset_mock()
+        _exec.side_effect = [
+            MagicMock(),
+            ExecError(command=command, exit_code=1, stdout="", stderr="No such file or directory"),
+        ]
+        assert not harness.charm.backup._empty_data_files()
 
         # Test when data files are successfully removed.
         _exec.reset_mock()
         _exec.side_effect = None
-        harness.charm.backup._empty_data_files()
-        _exec.assert_called_once_with(command)
+        assert not harness.charm.backup._empty_data_files()
+        _exists.assert_called_with("/var/lib/postgresql/data/pgdata/PG_VERSION")
+        assert _exec.call_args_list == [call(clean_command), call(command)]
+
+        # Test that a valid data directory is kept aside for a delta restore.
+        _exec.reset_mock()
+        _exists.return_value = True
+        assert harness.charm.backup._empty_data_files()
+        assert _exec.call_args_list == [
+            call(clean_command),
+            call(["mv", "/var/lib/postgresql/data/pgdata", staging_path]),
+        ]
 
 
 def test_change_connectivity_to_database(harness):
@@ -480,17 +562,99 @@ def test_execute_command(harness):
         assert harness.charm.backup._execute_command(command, timeout=5) == ("fake stdout", "")
         _exec.assert_called_once_with(command, user="postgres", group="postgres", timeout=5)
 
-        # Test when streaming is enabled
-        _exec.reset_mock()
-        _exec.side_effect = None
-        _exec.return_value = MagicMock()
-        _exec.return_value.stdout = ["fake stdout 1\n", "fake stdout 2\n"]
-        _exec.return_value.stderr = ["fake stderr 1\n", "fake stderr 2\n"]
-        assert harness.charm.backup._execute_command(command, timeout=5, stream=True) == (
-            "fake stdout 1\nfake stdout 2\n",
-            "fake stderr 1\nfake stderr 2\n",
+
+def test_backup_log_upload():
+    s3_client = MagicMock()
+    s3_client.create_multipart_upload.return_value = {"UploadId": "test-upload-id"}
+    s3_client.upload_part.side_effect = lambda **kwargs: {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+    # Test when the whole log fits in a single part.
+    backup_log = BackupLogUpload(s3_client, "test-bucket", "test-path/jobs/fake-id/backup.log")
+    assert (
+        backup_log.finish(
+            BytesIO(b"new backup label = 20230101-090000F\n"),
+            BytesIO(b"fake stderr\n"),
+            "test-path/backup.log",
         )
-        _exec.assert_called_once_with(command, user="postgres", group="postgres", timeout=5)
+        is True
+    )
+    s3_client.put_object.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="test-path/backup.log",
+        Body=b"Stdout:\nnew backup label = 20230101-090000F\n\n\nStderr:\nfake stderr\n\n",
+    )
+    s3_client.create_multipart_upload.assert_not_called()
+
+    # Test when the log is uploaded in parts while the backup runs, under the provisional key.
+    s3_client.reset_mock()
+    backup_log = BackupLogUpload(s3_client, "test-bucket", "test-path/jobs/fake-id/backup.log")
+    assert backup_log.upload_part(b"segment 1\n") is True
+    s3_client.create_multipart_upload.assert_called_once_with(
+        Bucket="test-bucket", Key="test-path/jobs/fake-id/backup.log"
+    )
+    s3_client.upload_part.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="test-path/jobs/fake-id/backup.log",
+        UploadId="test-upload-id",
+        PartNumber=1,
+        Body=b"Stdout:\nsegment 1\n",
+    )
+    # The upload is resumed in a later hook from its state.
+    backup_log = BackupLogUpload(
+        s3_client, "test-bucket", "test-path/jobs/fake-id/backup.log", backup_log.state
+    )
+    assert backup_log.upload_part(b"segment 2\n") is True
+    with patch("backups.BACKUP_LOG_PART_SIZE", 16):
+        assert (
+            backup_log.finish(
+                BytesIO(b"segment 3\n"), BytesIO(b"fake stderr\n"), "test-path/backup.log"
+            )
+            is True
+        )
+    assert [call.kwargs["Body"] for call in s3_client.upload_part.call_args_list] == [
+        b"Stdout:\nsegment 1\n",
+        b"segment 2\n",
+        b"segment 3\n\n\nStderr:\nfake stderr\n",
+        b"\n",
+    ]
+    s3_client.put_object.assert_not_called()
+    s3_client.complete_multipart_upload.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="test-path/jobs/fake-id/backup.log",
+        UploadId="test-upload-id",
+        MultipartUpload={
+            "Parts": [{"ETag": f"etag-{number}", "PartNumber": number} for number in range(1, 5)]
+        },
+    )
+    s3_client.copy_object.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="test-path/backup.log",
+        CopySource={"Bucket": "test-bucket", "Key": "test-path/jobs/fake-id/backup.log"},
+    )
+    s3_client.delete_object.assert_called_once_with(
+        Bucket="test-bucket", Key="test-path/jobs/fake-id/backup.log"
+    )
+
+    # Test when the output of the job couldn't be read.
+    s3_client.reset_mock()
+    backup_log = BackupLogUpload(s3_client, "test-bucket", "test-path/jobs/fake-id/backup.log")
+    assert backup_log.finish(None, None, "test-path/backup.log") is True
+    assert s3_client.put_object.call_args.kwargs["Body"] == b"Stdout:\n\n\nStderr:\n\n"
+
+    # Test when a part fails to upload (the next parts aren't uploaded anymore).
+    s3_client.reset_mock()
+    s3_client.upload_part.side_effect = ClientError({"Error": {"Code": "500"}}, "UploadPart")
+    backup_log = BackupLogUpload(s3_client, "test-bucket", "test-path/jobs/fake-id/backup.log")
+    assert backup_log.upload_part(b"segment 1\n") is False
+    s3_client.abort_multipart_upload.assert_called_once_with(
+        Bucket="test-bucket", Key="test-path/jobs/fake-id/backup.log", UploadId="test-upload-id"
+    )
+    assert backup_log.state == {"upload-id": None, "parts": [], "failed": True}
+    assert backup_log.upload_part(b"segment 2\n") is False
+    assert backup_log.finish(BytesIO(b"segment 3\n"), None, "test-path/backup.log") is False
+    assert s3_client.upload_part.call_count == 1
+    s3_client.complete_multipart_upload.assert_not_called()
+    s3_client.put_object.assert_not_called()
 
 
 def test_format_backup_list(harness):
@@ -587,6 +751,7 @@ backup-id            | action              | status   | reference-backup-id  | L
         )
 
         # Test when backups are returned.
+        harness.charm.backup.invalidate_catalog()
         _execute_command.side_effect = [
             (
                 '[{"backup":[{"archive":{"start":"00000001000000000000000B"},"label":"20230101-090000F","error":"fake error","reference":null,"lsn":{"start":"0/3000000","stop":"0/5000000"},"timestamp":{"start":1719866711,"stop":1719866714}}]}]',
@@ -616,6 +781,7 @@ def test_list_backups(harness):
         assert harness.charm.backup._list_backups(show_failed=True) == dict[str, tuple[str, str]]()
 
         # Test when some backups are available.
+        harness.charm.backup.invalidate_catalog()
         _execute_command.return_value = (
             '[{"backup":[{"archive":{"start":"00000001000000000000000B"},"label":"20230101-090000F","error":"fake error"},{"archive":{"start":"0000000A000000000000000B"},"label":"20230101-100000F","error":null}],"name":"test-stanza"}]',
             None,
@@ -636,6 +802,7 @@ def test_list_timelines(harness):
         _execute_command.return_value = ("{}", None)
         assert harness.charm.backup._list_timelines() == dict[str, tuple[str, str]]()
 
+        harness.charm.backup.invalidate_catalog()
         _execute_command.return_value = (
             '{"test-stanza/14-1/00000002.history":{"type": "file","size": 32,"time": 1728937652}}',
             None,
@@ -645,19 +812,112 @@ def test_list_timelines(harness):
         ])
 
 
+def test_catalog(harness):
+    info_output = '[{"backup":[],"name":"test-stanza"}]'
+    history_output = "{}"
+    with (
+        patch("charm.PostgreSQLBackups._execute_command") as _execute_command,
+        patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
+        patch("charm.Patroni.cluster_topology", new_callable=PropertyMock) as _cluster_topology,
+        patch("backups.time.time", return_value=1000.0) as _time,
+    ):
+        harness.set_can_connect("postgresql", True)
+        _retrieve_s3_parameters.return_value = ({"bucket": "test-bucket"}, [])
+        _cluster_topology.return_value = ClusterTopology([{"name": "a", "timeline": 1}])
+
+        def listing(command: list[str]) -> str:
+            return "info" if "info" in command else "history"
+
+        _execute_command.side_effect = lambda command, **kwargs: (
+            {"info": info_output, "history": history_output}[listing(command)],
+            None,
+        )
+
+        def listings() -> list[str]:
+            listings = [listing(call.args[0]) for call in _execute_command.call_args_list]
+            _execute_command.reset_mock()
+            return listings
+
+        # Test that the listings are only run once and stored in the workload container.
+        for _ in range(2):
+            assert harness.charm.backup._pgbackrest_info() == info_output
+            assert harness.charm.backup._archive_history() == history_output
+        assert listings() == ["info", "history"]
+        container = harness.charm.unit.get_container("postgresql")
+        catalog = json.loads(container.pull(PGBACKREST_CATALOG_FILE).read())
+        assert catalog["info"]["output"] == info_output
+        assert catalog["history"]["output"] == history_output
+
+        # Test that the catalog is loaded from the workload container in a new hook, without
+        # listing the repository.
+        del harness.charm.backup._catalog
+        assert harness.charm.backup._pgbackrest_info() == info_output
+        assert harness.charm.backup._archive_history() == history_output
+        assert listings() == []
+
+        # Test that a new backup (or restore) only refreshes the backups.
+        harness.charm.backup._mark_repository_changed()
+        assert harness.charm.backup._pgbackrest_info() == info_output
+        assert harness.charm.backup._archive_history() == history_output
+        assert listings() == ["info"]
+
+        # Test that the backups are refreshed once their listing is too old.
+        _time.return_value = 1000.0 + PGBACKREST_INFO_TTL
+        assert harness.charm.backup._pgbackrest_info() == info_output
+        assert listings() == ["info"]
+
+        # Test that a new timeline only refreshes the timelines.
+        _cluster_topology.return_value = ClusterTopology([{"name": "a", "timeline": 2}])
+        assert harness.charm.backup._pgbackrest_info() == info_output
+        assert harness.charm.backup._archive_history() == history_output
+        assert listings() == ["history"]
+
+        # Test that new S3 credentials refresh everything.
+        _retrieve_s3_parameters.return_value = ({"bucket": "other-bucket"}, [])
+        harness.charm.backup._pgbackrest_info()
+        harness.charm.backup._archive_history()
+        assert listings() == ["info", "history"]
+
+        # Test that failed listings aren't cached.
+        harness.charm.backup.invalidate_catalog()
+        _execute_command.side_effect = None
+        _execute_command.return_value = (None, None)
+        assert harness.charm.backup._pgbackrest_info() is None
+        assert "info" not in harness.charm.backup._catalog
+        with pytest.raises(PathError):
+            container.pull(PGBACKREST_CATALOG_FILE)
+
+
 def test_get_nearest_timeline(harness):
     with (
-        patch("charm.PostgreSQLBackups._list_backups") as _list_backups,
+        patch("charm.PostgreSQLBackups._pgbackrest_info") as _pgbackrest_info,
+        patch("charm.PostgreSQLBackups._archive_history", return_value="{}"),
         patch("charm.PostgreSQLBackups._list_timelines") as _list_timelines,
     ):
-        _list_backups.return_value = dict[str, tuple[str, str]]()
+        _pgbackrest_info.return_value = "[]"
         _list_timelines.return_value = dict[str, tuple[str, str]]()
         assert harness.charm.backup._get_nearest_timeline("2022-02-24 05:00:00") is None
 
-        _list_backups.return_value = dict[str, tuple[str, str]]({
-            "2022-02-24T05:00:00Z": ("test-stanza", "1"),
-            "2024-02-24T05:00:00Z": ("test-stanza", "2"),
-        })
+        _list_timelines.reset_mock()
+        _pgbackrest_info.return_value = json.dumps([
+            {
+                "name": "test-stanza",
+                "backup": [
+                    {
+                        "label": "20220224-050000F",
+                        "error": False,
+                        "archive": {"start": "000000010000000000000001", "stop": None},
+                        "timestamp": {"start": 1645678800, "stop": 1645678800},
+                    },
+                    {
+                        "label": "20240224-050000F",
+                        "error": False,
+                        "archive": {"start": "000000020000000000000003", "stop": None},
+                        "timestamp": {"start": 1708750800, "stop": 1708750800},
+                    },
+                ],
+            }
+        ])
         _list_timelines.return_value = dict[str, tuple[str, str]]({
             "2023-02-24T05:00:00Z": ("test-stanza", "2")
         })
@@ -676,6 +936,62 @@ def test_get_nearest_timeline(harness):
         ](("test-stanza", "1"))
         assert harness.charm.backup._get_nearest_timeline("2022-01-01 00:00:00") is None
 
+        # The index is built once for the same listings of the repository, and also
+        # plans the recovery from the backups of the same listing.
+        _list_timelines.assert_called_once()
+        assert harness.charm.backup._get_recovery_plan("2025-01-01 00:00:00") == {
+            "backups": ["20240224-050000F"],
+            "wal_start": "000000020000000000000003",
+            "wal_stop": None,
+        }
+        _list_timelines.assert_called_once()
+
+
+def test_recovery_index():
+    backups = [
+        {
+            "label": "20230101-000000F",
+            "reference": None,
+            "archive": {"start": "000000010000000000000002", "stop": "000000010000000000000003"},
+            "timestamp": {"start": 1672531200, "stop": 1672531260},
+        },
+        {
+            "label": "20230101-000000F_20230102-000000I",
+            "reference": ["20230101-000000F"],
+            "archive": {"start": "000000010000000000000008", "stop": "000000010000000000000009"},
+            "timestamp": {"start": 1672617600, "stop": 1672617660},
+        },
+    ]
+    index = RecoveryIndex(
+        {
+            "2023-01-01T00:00:00Z": ("test-stanza", "1"),
+            "2023-01-02T00:00:00Z": ("test-stanza", "1"),
+            "2023-01-01T12:00:00Z": ("test-stanza", "2"),
+        },
+        backups,
+    )
+    assert index.latest() == ("test-stanza", "1")
+    assert index.nearest(1672531199) is None
+    assert index.nearest(1672531200) == ("test-stanza", "1")
+    assert index.nearest(1672574400) == ("test-stanza", "2")
+
+    # Test that no plan is found before the end of the first backup.
+    assert index.recovery_plan(1672531230) is None
+    # Test that the WAL range ends with the next backup.
+    assert index.recovery_plan(1672574400) == {
+        "backups": ["20230101-000000F"],
+        "wal_start": "000000010000000000000002",
+        "wal_stop": "000000010000000000000009",
+    }
+    # Test that an incremental backup needs the backups it references.
+    assert index.recovery_plan(1672704000) == {
+        "backups": ["20230101-000000F", "20230101-000000F_20230102-000000I"],
+        "wal_start": "000000010000000000000008",
+        "wal_stop": None,
+    }
+
+    assert RecoveryIndex({}).latest() is None
+
 
 def test_is_psql_timestamp(harness):
     assert harness.charm.backup._is_psql_timestamp("2022-02-24 05:00:00") is True
@@ -1191,16 +1507,23 @@ def test_on_create_backup_action(harness):
             "charm.PostgreSQLBackups._change_connectivity_to_database"
         ) as _change_connectivity_to_database,
         patch("charm.PostgreSQLBackups._list_backups") as _list_backups,
-        patch("charm.PostgreSQLBackups._execute_command") as _execute_command,
+        patch("charm.PostgreSQLBackups._start_backup_job") as _start_backup_job,
         patch(
             "charm.PostgresqlOperatorCharm.is_primary", new_callable=PropertyMock
         ) as _is_primary,
         patch("charm.PostgreSQLBackups._upload_content_to_s3") as _upload_content_to_s3,
         patch("backups.datetime") as _datetime,
+        patch("backups.uuid4") as _uuid4,
+        patch("backups.time.time", return_value=1672563600.0),
         patch("ops.JujuVersion.from_environ") as _from_environ,
         patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
         patch("charm.PostgreSQLBackups._can_unit_perform_backup") as _can_unit_perform_backup,
+        patch("charm.PostgreSQLBackups._elect_backup_unit") as _elect_backup_unit,
     ):
+        peer_rel_id = harness.model.get_relation(PEER).id
+        _elect_backup_unit.return_value = harness.charm.unit.name
+        _uuid4.return_value.hex = "0123456789abcdef"
+
         # Test when the unit cannot perform a backup because of type.
         mock_event = MagicMock()
         mock_event.params = {"type": "wrong"}
@@ -1249,132 +1572,955 @@ Juju Version: test-juju-version
         )
         mock_event.fail.assert_called_once()
         mock_event.set_results.assert_not_called()
+        _start_backup_job.assert_not_called()
 
         # Test when the backup is of type diff/incr when there's no previous full backup.
         mock_event.reset_mock()
         mock_event.params = {"type": "differential"}
         _upload_content_to_s3.return_value = True
         _is_primary.return_value = True
+        _list_backups.return_value = {}
         harness.charm.backup._on_create_backup_action(mock_event)
         mock_event.fail.assert_called_once()
         mock_event.set_results.assert_not_called()
 
-        # Test when the backup fails.
+        # Test when the backup job fails to start.
         mock_event.reset_mock()
         mock_event.params = {"type": "full"}
-        _upload_content_to_s3.return_value = True
-        _is_primary.return_value = True
-        _execute_command.side_effect = ExecError(
-            command=["fake", "command"], exit_code=1, stdout="", stderr="fake error"
+        _start_backup_job.side_effect = ChangeError(
+            err="fake error",
+            change=Change(
+                ChangeID("1"),
+                "fake kind",
+                "fake summary",
+                "fake status",
+                [],
+                True,
+                "fake error",
+                datetime.datetime.now(),
+                datetime.datetime.now(),
+            ),
         )
         harness.charm.backup._on_create_backup_action(mock_event)
-        update_config_calls = [
-            call(is_creating_backup=True),
-            call(is_creating_backup=False),
-        ]
-        _update_config.assert_has_calls(update_config_calls)
-        mock_event.fail.assert_called_once()
-        mock_event.set_results.assert_not_called()
-
-        # Test when the backup succeeds but the charm fails to upload the backup logs.
-        mock_event.reset_mock()
-        mock_event.params = {"type": "full"}
-        _upload_content_to_s3.reset_mock()
-        _upload_content_to_s3.side_effect = [True, False]
-        _execute_command.side_effect = None
-        _execute_command.return_value = "fake stdout", "fake stderr"
-        _list_backups.return_value = {"2023-01-01T09:00:00Z": harness.charm.backup.stanza_name}
-        _update_config.reset_mock()
-        mock_event.params = {"type": "full"}
-        harness.charm.backup._on_create_backup_action(mock_event)
-        _upload_content_to_s3.assert_has_calls([
-            call(
-                expected_metadata,
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/latest",
-                mock_s3_parameters,
-            ),
-            call(
-                "Stdout:\nfake stdout\n\nStderr:\nfake stderr\n",
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/2023-01-01T09:00:00Z/backup.log",
-                mock_s3_parameters,
-            ),
-        ])
-        _update_config.assert_has_calls(update_config_calls)
+        _start_backup_job.assert_called_once_with(
+            "2023-01-01T09:00:00Z-01234567",
+            [
+                "pgbackrest",
+                f"--stanza={harness.charm.backup.stanza_name}",
+                "--log-level-console=debug",
+                "--type=full",
+                "backup",
+                "--no-backup-standby",
+            ],
+        )
+        # The member is tagged while the job runs and untagged once it failed.
+        assert _update_config.call_count == 2
+        assert harness.charm.backup.backup_job["status"] == "failed"
+        assert not harness.charm.backup.is_backup_job_running
         mock_event.fail.assert_called_once()
         mock_event.set_results.assert_not_called()
 
-        # Test when the backup succeeds (including the upload of the backup logs).
+        # Test when the backup job starts (the action returns right away with the job id).
         mock_event.reset_mock()
-        mock_event.params = {"type": "full"}
-        _upload_content_to_s3.reset_mock()
-        _upload_content_to_s3.side_effect = None
-        _upload_content_to_s3.return_value = True
+        _start_backup_job.reset_mock()
+        _start_backup_job.side_effect = None
         _update_config.reset_mock()
+        mock_event.params = {"type": "full", "process-max": 4}
         harness.charm.backup._on_create_backup_action(mock_event)
-        _upload_content_to_s3.assert_has_calls([
-            call(
-                expected_metadata,
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/latest",
-                mock_s3_parameters,
-            ),
-            call(
-                "Stdout:\nfake stdout\n\nStderr:\nfake stderr\n",
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/2023-01-01T09:00:00Z/backup.log",
-                mock_s3_parameters,
-            ),
-        ])
+        assert "--process-max=4" in _start_backup_job.call_args.args[1]
+        _update_config.assert_called_once_with()
         _change_connectivity_to_database.assert_not_called()
-        _update_config.assert_has_calls(update_config_calls)
+        assert json.loads(
+            harness.get_relation_data(peer_rel_id, harness.charm.unit)["backup-job"]
+        ) == {
+            "id": "2023-01-01T09:00:00Z-01234567",
+            "type": "full",
+            "status": "running",
+            "started": 1672563600.0,
+            "connectivity-disabled": False,
+            "scheduled": None,
+        }
+        assert harness.charm.backup.is_backup_job_running
         mock_event.fail.assert_not_called()
-        mock_event.set_results.assert_called_once()
+        mock_event.set_results.assert_called_once_with({
+            "backup-status": "backup started",
+            "job-id": "2023-01-01T09:00:00Z-01234567",
+            "unit": "postgresql-k8s/0",
+        })
 
         # Test when this unit is a replica (the connectivity to the database should be changed).
         mock_event.reset_mock()
         mock_event.params = {"type": "full"}
-        _upload_content_to_s3.reset_mock()
+        _update_config.reset_mock()
         _is_primary.return_value = False
         harness.charm.backup._on_create_backup_action(mock_event)
-        _upload_content_to_s3.assert_has_calls([
-            call(
-                expected_metadata,
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/latest",
-                mock_s3_parameters,
-            ),
-            call(
-                "Stdout:\nfake stdout\n\nStderr:\nfake stderr\n",
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/2023-01-01T09:00:00Z/backup.log",
-                mock_s3_parameters,
-            ),
-        ])
-        assert _change_connectivity_to_database.call_count == 2
+        assert "--no-backup-standby" not in _start_backup_job.call_args.args[1]
+        _change_connectivity_to_database.assert_called_once_with(connectivity=False)
+        _update_config.assert_not_called()
+        assert harness.charm.backup.backup_job["connectivity-disabled"]
         mock_event.fail.assert_not_called()
-        mock_event.set_results.assert_called_once_with({"backup-status": "backup created"})
+        mock_event.set_results.assert_called_once()
 
-        # Test when this unit is a replica but gets promoted to primary mid-way
+        # Test that the backup is moved to the elected unit.
         mock_event.reset_mock()
-        mock_event.params = {"type": "full"}
-        _upload_content_to_s3.reset_mock()
-        _is_primary.return_value = (False, True)
+        _start_backup_job.reset_mock()
+        _datetime.now.return_value.strftime.return_value = "20230101-100000"
+        _elect_backup_unit.return_value = "postgresql-k8s/1"
+        mock_event.params = {"type": "full", "process-max": 2}
         harness.charm.backup._on_create_backup_action(mock_event)
-        _upload_content_to_s3.assert_has_calls([
-            call(
-                expected_metadata,
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/latest",
-                mock_s3_parameters,
-            ),
-            call(
-                "Stdout:\nfake stdout\n\nStderr:\nfake stderr\n",
-                f"backup/{harness.charm.model.name}.{harness.charm.cluster_name}/2023-01-01T09:00:00Z/backup.log",
-                mock_s3_parameters,
-            ),
-        ])
-        assert _change_connectivity_to_database.call_count == 2
-        _change_connectivity_to_database.assert_has_calls([
-            call(connectivity=False),
-            call(connectivity=True),
+        _start_backup_job.assert_not_called()
+        assert json.loads(
+            harness.get_relation_data(peer_rel_id, harness.charm.unit)["backup-request"]
+        ) == {
+            "id": "20230101-100000-01234567",
+            "type": "full",
+            "unit": "postgresql-k8s/1",
+            "process-max": 2,
+        }
+        mock_event.fail.assert_not_called()
+        mock_event.set_results.assert_called_once_with({
+            "backup-status": "backup requested",
+            "job-id": "20230101-100000-01234567",
+            "unit": "postgresql-k8s/1",
+        })
+
+
+def _wal_segment(position: int) -> str:
+    return f"00000001{position // 0x100:08X}{position % 0x100:08X}"
+
+
+def _info_backup(label: str, backup_type: str, stop_segment: int, error: bool = False) -> dict:
+    return {
+        "label": label,
+        "type": backup_type,
+        "error": error,
+        "timestamp": {"start": 900.0, "stop": 1000.0},
+        # 1GiB, i.e. 64 WAL segments.
+        "info": {"size": 1024**3},
+        "archive": {"start": _wal_segment(stop_segment - 1), "stop": _wal_segment(stop_segment)},
+    }
+
+
+def test_plan_backup_type():
+    full = _info_backup("20250301-000000F", "full", 10)
+
+    # Test when there is no full backup to reference.
+    assert plan_backup_type(None) == "full"
+    assert plan_backup_type({"backup": [], "archive": []}) == "full"
+    assert (
+        plan_backup_type({
+            "backup": [_info_backup("20250301-000000F", "full", 10, error=True)],
+            "archive": [{"max": _wal_segment(11)}],
+        })
+        == "full"
+    )
+
+    # Test when there is no archived WAL to estimate the changes from.
+    assert plan_backup_type({"backup": [full], "archive": []}) == "incremental"
+
+    # Test the planning from the changes since the full backup (2, 10 and 40 segments).
+    for last_segment, backup_type in [(12, "incremental"), (20, "differential"), (50, "full")]:
+        assert (
+            plan_backup_type({"backup": [full], "archive": [{"max": _wal_segment(last_segment)}]})
+            == backup_type
+        )
+
+    # Test that the changes since the last differential backup are the ones considered.
+    differential = _info_backup("20250301-000000F_20250302-000000D", "diff", 30)
+    assert (
+        plan_backup_type({
+            "backup": [full, differential],
+            "archive": [{"max": _wal_segment(35)}],
+        })
+        == "incremental"
+    )
+
+    # Test that the chain of incremental backups is bounded.
+    incrementals = [
+        _info_backup(f"20250301-000000F_2025030{day}-000000I", "incr", 10 + day)
+        for day in range(1, 7)
+    ]
+    assert (
+        plan_backup_type({
+            "backup": [full, *incrementals[:5]],
+            "archive": [{"max": _wal_segment(16)}],
+        })
+        == "incremental"
+    )
+    assert (
+        plan_backup_type({"backup": [full, *incrementals], "archive": [{"max": _wal_segment(16)}]})
+        == "differential"
+    )
+
+    # Test that a full backup is created before the last one leaves half of the retention.
+    repository = {"backup": [full], "archive": [{"max": _wal_segment(12)}]}
+    assert plan_backup_type(repository, 1, 1000.0 + 43199) == "incremental"
+    assert plan_backup_type(repository, 1, 1000.0 + 43200) == "full"
+
+
+def test_schedule_backups(harness):
+    now = datetime.datetime(2025, 3, 1, 15, 10, 42, tzinfo=datetime.timezone.utc)
+
+    class _FakeDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    with (
+        patch("backups.datetime", _FakeDatetime),
+        patch("charm.PostgreSQLBackups._are_backup_settings_ok") as _are_backup_settings_ok,
+        patch("charm.PostgreSQLBackups._elect_backup_unit") as _elect_backup_unit,
+        patch("charm.PostgreSQLBackups._pgbackrest_info") as _pgbackrest_info,
+        patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
+    ):
+        peer_rel_id = harness.model.get_relation(PEER).id
+        _are_backup_settings_ok.return_value = (True, None)
+        _elect_backup_unit.return_value = "postgresql-k8s/1"
+        _pgbackrest_info.return_value = json.dumps([{"backup": [], "archive": []}])
+        _retrieve_s3_parameters.return_value = ({"delete-older-than-days": "9999999"}, [])
+        with harness.hooks_disabled():
+            harness.update_relation_data(peer_rel_id, harness.charm.app.name, {"stanza": "test"})
+
+        # Test when the unit is not the leader.
+        harness.update_config({"backup_schedule": "0 2,14 * * *"})
+        harness.charm.backup.schedule_backups()
+        assert "backup-schedule-last" not in harness.get_relation_data(
+            peer_rel_id, harness.charm.app
+        )
+
+        # Test when the schedule is just configured (it starts being followed from now).
+        with harness.hooks_disabled():
+            harness.set_leader()
+        harness.charm.backup.schedule_backups()
+        app_data = harness.get_relation_data(peer_rel_id, harness.charm.app)
+        assert app_data["backup-schedule-last"] == str(now.timestamp())
+        assert "scheduled-backup" not in app_data
+        _elect_backup_unit.assert_not_called()
+
+        # Test when a backup is due.
+        last = datetime.datetime(2025, 3, 1, 12, 0, tzinfo=datetime.timezone.utc)
+        due = datetime.datetime(2025, 3, 1, 14, 0, tzinfo=datetime.timezone.utc)
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.app.name,
+                {"backup-schedule-last": str(last.timestamp())},
+            )
+        harness.charm.backup.schedule_backups()
+        app_data = harness.get_relation_data(peer_rel_id, harness.charm.app)
+        assert app_data["backup-schedule-last"] == str(due.timestamp())
+        assert json.loads(app_data["scheduled-backup"]) == {
+            "id": "2025-03-01T14:00:00Z",
+            "type": "full",
+            "unit": "postgresql-k8s/1",
+        }
+        # The type is planned from a fresh listing of the repository.
+        _pgbackrest_info.assert_called_once_with(ttl=0)
+
+        # Test that a backup is requested only once per schedule slot.
+        _elect_backup_unit.reset_mock()
+        harness.charm.backup.schedule_backups()
+        _elect_backup_unit.assert_not_called()
+
+        # Test when no unit can create the backup.
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.app.name,
+                {"backup-schedule-last": str(last.timestamp()), "scheduled-backup": ""},
+            )
+        _elect_backup_unit.return_value = None
+        harness.charm.backup.schedule_backups()
+        app_data = harness.get_relation_data(peer_rel_id, harness.charm.app)
+        assert app_data["backup-schedule-last"] == str(last.timestamp())
+        assert "scheduled-backup" not in app_data
+
+        # Test when the backups are not configured.
+        _elect_backup_unit.reset_mock()
+        _are_backup_settings_ok.return_value = (False, "fake error")
+        harness.charm.backup.schedule_backups()
+        _elect_backup_unit.assert_not_called()
+
+
+def test_schedule_backups_from_fresh_info(harness):
+    full = _info_backup("20250301-000000F", "full", 10)
+    cached_info = json.dumps([{"backup": [full], "archive": [{"max": _wal_segment(12)}]}])
+    fresh_info = json.dumps([{"backup": [full], "archive": [{"max": _wal_segment(50)}]}])
+    with (
+        patch("charm.PostgreSQLBackups._are_backup_settings_ok", return_value=(True, None)),
+        patch("charm.PostgreSQLBackups._elect_backup_unit", return_value="postgresql-k8s/1"),
+        patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
+        patch("charm.PostgreSQLBackups._execute_command") as _execute_command,
+    ):
+        peer_rel_id = harness.model.get_relation(PEER).id
+        _retrieve_s3_parameters.return_value = ({"delete-older-than-days": "9999999"}, [])
+        _execute_command.side_effect = lambda command, **kwargs: (
+            (cached_info if "info" in command else "{}"),
+            None,
+        )
+        harness.set_can_connect("postgresql", True)
+        harness.update_config({"backup_schedule": "0 2,14 * * *"})
+        # The repository was listed (and cached) before much WAL was archived.
+        assert harness.charm.backup._pgbackrest_info() == cached_info
+        with harness.hooks_disabled():
+            harness.set_leader()
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.app.name,
+                {"stanza": "test", "backup-schedule-last": str(time.time() - 86400)},
+            )
+
+        # Test that the scheduled backup is planned from the WAL archived since then.
+        _execute_command.side_effect = lambda command, **kwargs: (
+            (fresh_info if "info" in command else "{}"),
+            None,
+        )
+        assert harness.charm.backup._pgbackrest_info() == cached_info
+        harness.charm.backup.schedule_backups()
+        scheduled = harness.get_relation_data(peer_rel_id, harness.charm.app)["scheduled-backup"]
+        assert json.loads(scheduled)["type"] == "full"
+        # The catalog is refreshed for the rest of the hook.
+        assert harness.charm.backup._pgbackrest_info() == fresh_info
+
+
+def test_elect_backup_unit(harness):
+    segment = 16 * 1024 * 1024
+    topology = ClusterTopology([
+        {"name": "postgresql-k8s-0", "role": "leader", "state": "running"},
+        {"name": "postgresql-k8s-1", "role": "sync_standby", "state": "streaming", "lag": 0},
+        {"name": "postgresql-k8s-2", "role": "replica", "state": "streaming", "lag": 1024},
+        {"name": "postgresql-k8s-3", "role": "replica", "state": "streaming", "lag": 0},
+        {"name": "postgresql-k8s-4", "role": "replica", "state": "stopped", "lag": "unknown"},
+    ])
+    members_health = {
+        "postgresql-k8s-0": {"healthy": True, "latency": 0.01},
+        "postgresql-k8s-1": {"healthy": True, "latency": 0.01},
+        "postgresql-k8s-2": {"healthy": True, "latency": 0.02},
+        "postgresql-k8s-3": {"healthy": True, "latency": 0.05},
+        "postgresql-k8s-4": {"healthy": False, "latency": None},
+    }
+    with (
+        patch(
+            "charm.Patroni.cluster_topology", new_callable=PropertyMock, return_value=topology
+        ) as _cluster_topology,
+        patch(
+            "charm.Patroni.get_members_health", return_value=members_health
+        ) as _get_members_health,
+        patch(
+            "charm.Patroni._synchronous_node_count", new_callable=PropertyMock, return_value=1
+        ) as _synchronous_node_count,
+        patch(
+            "charm.PostgresqlOperatorCharm.is_tls_enabled", new_callable=PropertyMock
+        ) as _is_tls_enabled,
+    ):
+        # Test when the replicas can't create backups.
+        _is_tls_enabled.return_value = False
+        assert harness.charm.backup._elect_backup_unit() == "postgresql-k8s/0"
+        _get_members_health.assert_not_called()
+
+        # Test that the least loaded replica is elected (the lag is compared in WAL segments,
+        # and the only sync standby is spared).
+        _is_tls_enabled.return_value = True
+        assert harness.charm.backup._elect_backup_unit() == "postgresql-k8s/2"
+
+        # Test that the replication lag comes before the load.
+        topology.members[2]["lag"] = 2 * segment
+        assert harness.charm.backup._elect_backup_unit() == "postgresql-k8s/3"
+
+        # Test that the sync standbys can be elected when they aren't all needed.
+        _synchronous_node_count.return_value = 0
+        assert harness.charm.backup._elect_backup_unit() == "postgresql-k8s/1"
+
+        # Test when no replica is healthy.
+        for member in ["postgresql-k8s-1", "postgresql-k8s-2", "postgresql-k8s-3"]:
+            members_health[member]["healthy"] = False
+        assert harness.charm.backup._elect_backup_unit() is None
+
+        # Test when there are no replicas.
+        _cluster_topology.return_value = ClusterTopology([
+            {"name": "postgresql-k8s-0", "role": "leader", "state": "running"}
         ])
+        assert harness.charm.backup._elect_backup_unit() == "postgresql-k8s/0"
+
+        # Test when the cluster status can't be retrieved.
+        _cluster_topology.side_effect = RetryError(last_attempt=1)
+        assert harness.charm.backup._elect_backup_unit() is None
+
+
+def test_run_scheduled_backup(harness):
+    with patch("charm.PostgreSQLBackups._create_backup") as _create_backup:
+        peer_rel_id = harness.model.get_relation(PEER).id
+        _create_backup.return_value = ("fake-job-id", None)
+
+        # Test when no backup is scheduled.
+        harness.charm.backup.run_scheduled_backup()
+        _create_backup.assert_not_called()
+
+        # Test when the backup is scheduled on another unit.
+        scheduled = {
+            "id": "2025-03-01T14:00:00Z",
+            "type": "incremental",
+            "unit": "postgresql-k8s/1",
+        }
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, harness.charm.app.name, {"scheduled-backup": json.dumps(scheduled)}
+            )
+        harness.charm.backup.run_scheduled_backup()
+        _create_backup.assert_not_called()
+
+        # Test when the backup is scheduled on this unit.
+        scheduled["unit"] = harness.charm.unit.name
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, harness.charm.app.name, {"scheduled-backup": json.dumps(scheduled)}
+            )
+        harness.charm.backup.run_scheduled_backup()
+        _create_backup.assert_called_once_with("incremental", scheduled="2025-03-01T14:00:00Z")
+        assert (
+            harness.get_relation_data(peer_rel_id, harness.charm.unit)["scheduled-backup"]
+            == "2025-03-01T14:00:00Z"
+        )
+
+        # Test that the backup is not started twice (even if it failed to start).
+        _create_backup.reset_mock()
+        _create_backup.return_value = (None, "fake error")
+        harness.charm.backup.run_scheduled_backup()
+        _create_backup.assert_not_called()
+
+
+def test_run_requested_backups(harness):
+    with (
+        patch("charm.PostgreSQLBackups._create_backup") as _create_backup,
+        patch("backups.time.time", return_value=1672563600.0),
+    ):
+        peer_rel_id = harness.model.get_relation(PEER).id
+        harness.add_relation_unit(peer_rel_id, "postgresql-k8s/1")
+        harness.add_relation_unit(peer_rel_id, "postgresql-k8s/2")
+        _create_backup.return_value = ("20230101-090000-aaaaaaaa", None)
+
+        # Test when no backup is requested.
+        harness.charm.backup.run_requested_backups()
+        _create_backup.assert_not_called()
+
+        # Test when the backup is requested to another unit.
+        request = {"id": "20230101-090000-aaaaaaaa", "type": "full", "unit": "postgresql-k8s/2"}
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, "postgresql-k8s/1", {"backup-request": json.dumps(request)}
+            )
+        harness.charm.backup.run_requested_backups()
+        _create_backup.assert_not_called()
+
+        # Test when the backup is requested to this unit.
+        request.update({"unit": harness.charm.unit.name, "process-max": 2})
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, "postgresql-k8s/1", {"backup-request": json.dumps(request)}
+            )
+        harness.charm.backup.run_requested_backups()
+        _create_backup.assert_called_once_with("full", 2, job_id="20230101-090000-aaaaaaaa")
+        assert json.loads(
+            harness.get_relation_data(peer_rel_id, harness.charm.unit)["requested-backup"]
+        ) == {"postgresql-k8s/1": "20230101-090000-aaaaaaaa"}
+
+        # Test that the backup is not started twice, while a request from another unit in
+        # the same second (or from a unit whose clock is behind) is started.
+        _create_backup.reset_mock()
+        _create_backup.return_value = (None, "fake error")
+        request = {
+            "id": "20230101-085959-bbbbbbbb",
+            "type": "incremental",
+            "unit": harness.charm.unit.name,
+        }
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, "postgresql-k8s/2", {"backup-request": json.dumps(request)}
+            )
+        harness.charm.backup.run_requested_backups()
+        _create_backup.assert_called_once_with(
+            "incremental", None, job_id="20230101-085959-bbbbbbbb"
+        )
+        assert json.loads(
+            harness.get_relation_data(peer_rel_id, harness.charm.unit)["requested-backup"]
+        ) == {
+            "postgresql-k8s/1": "20230101-090000-aaaaaaaa",
+            "postgresql-k8s/2": "20230101-085959-bbbbbbbb",
+        }
+
+        # Test that the failure to start the backup is reported as the last job of this unit.
+        assert harness.charm.backup.backup_job == {
+            "id": "20230101-085959-bbbbbbbb",
+            "type": "incremental",
+            "status": "failed",
+            "started": 1672563600.0,
+            "finished": 1672563600.0,
+            "error": "fake error",
+        }
+        _create_backup.reset_mock()
+        harness.charm.backup.run_requested_backups()
+        _create_backup.assert_not_called()
+
+        # Test that the requests handled before the upgrade (when only the id of the last
+        # one was recorded) are not started again.
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.unit.name,
+                {"requested-backup": "20230101-090000-aaaaaaaa"},
+            )
+        harness.charm.backup.run_requested_backups()
+        _create_backup.assert_not_called()
+
+
+def test_on_pebble_custom_notice(harness):
+    with patch("charm.PostgreSQLBackups.check_backup_job") as _check_backup_job:
+        harness.set_can_connect("postgresql", True)
+        harness.pebble_notify("postgresql", "example.com/other")
+        _check_backup_job.assert_not_called()
+
+        harness.pebble_notify("postgresql", "canonical.com/postgresql-k8s/backup-job")
+        _check_backup_job.assert_called_once_with()
+
+
+def test_start_backup_job(harness):
+    with (
+        patch("charm.PostgreSQLBackups._push_if_changed") as _push_if_changed,
+        patch("builtins.open", mock_open(read_data="fake script")),
+        patch("ops.model.Container.add_layer") as _add_layer,
+        patch("ops.model.Container.start") as _start,
+        patch("charm.BackupJobWatcher.start_backup_job_watcher") as _start_backup_job_watcher,
+        patch("ops.model.Model.juju_version", new_callable=PropertyMock) as _juju_version,
+    ):
+        harness.set_can_connect("postgresql", True)
+        _juju_version.return_value = JujuVersion("3.6.8")
+        container = harness.charm.unit.get_container("postgresql")
+        container.push("/home/postgres/backup-job.log.3", "leftover", make_dirs=True)
+        container.push("/home/postgres/backup.conf", "other file")
+
+        harness.charm.backup._start_backup_job("20230101-090000", ["pgbackrest", "backup"])
+        # The output left by a previous job is removed.
+        assert not container.exists("/home/postgres/backup-job.log.3")
+        assert container.exists("/home/postgres/backup.conf")
+        _push_if_changed.assert_called_once_with(
+            "/home/postgres/backup_job.py", "fake script", user="postgres", group="postgres"
+        )
+        _add_layer.assert_called_once_with(
+            "pgbackrest-backup",
+            {
+                "services": {
+                    "pgbackrest-backup": {
+                        "override": "replace",
+                        "summary": "pgbackrest backup",
+                        "command": "python3 /home/postgres/backup_job.py 20230101-090000 pgbackrest backup",
+                        "startup": "disabled",
+                        "user": "postgres",
+                        "group": "postgres",
+                        "on-success": "ignore",
+                        "on-failure": "ignore",
+                    }
+                },
+            },
+            combine=True,
+        )
+        _start.assert_called_once_with("pgbackrest-backup")
+        _start_backup_job_watcher.assert_not_called()
+
+        # Test that the job is watched from the charm when Pebble custom notices aren't
+        # supported.
+        _juju_version.return_value = JujuVersion("3.1.8")
+        harness.charm.backup._start_backup_job("20230101-090000", ["pgbackrest", "backup"])
+        _start_backup_job_watcher.assert_called_once_with("20230101-090000")
+
+
+def test_on_backup_job_changed(harness):
+    with patch("charm.PostgreSQLBackups.check_backup_job") as _check_backup_job:
+        harness.charm.on.backup_job_changed.emit()
+        _check_backup_job.assert_called_once_with()
+
+
+@pytest.mark.parametrize("dispatch", ["notice", "watcher"])
+def test_backup_job_finished_when_dispatched(harness, dispatch, caplog):
+    with (
+        patch("charm.PostgreSQLBackups._mark_repository_changed"),
+        patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
+        patch("charm.PostgreSQLBackups._open_backup_log") as _open_backup_log,
+        patch("charm.PostgreSQLBackups._release_backup_job") as _release_backup_job,
+        patch("charm.BackupJobWatcher.stop_backup_job_watcher"),
+    ):
+        harness.set_can_connect("postgresql", True)
+        _retrieve_s3_parameters.return_value = ({"path": "test-path"}, [])
+        _open_backup_log.return_value.finish.return_value = True
+        _open_backup_log.return_value.state = {"job": "fake-id", "segments": 0}
+        container = harness.charm.unit.get_container("postgresql")
+        container.push(
+            "/home/postgres/backup-job.log.1",
+            "new backup label = 20230101-090000F\n",
+            make_dirs=True,
+        )
+        container.push("/home/postgres/backup-job.err", "")
+        container.push(
+            "/home/postgres/backup-job.json",
+            json.dumps({
+                "id": "fake-id",
+                "status": "succeeded",
+                "exit-code": 0,
+                "label": "20230101-090000F",
+                "segments": 0,
+                "notify-error": "fake error" if dispatch == "watcher" else None,
+            }),
+        )
+        harness.charm.backup._update_backup_job(
+            id="fake-id", type="full", status="running", started=100.0
+        )
+
+        # Test that the job is finished both when it records a Pebble notice (Juju 3.4+)
+        # and when its watcher dispatches the event (older Juju versions).
+        if dispatch == "notice":
+            harness.pebble_notify("postgresql", "canonical.com/postgresql-k8s/backup-job")
+        else:
+            harness.charm.on.backup_job_changed.emit()
+        job = harness.charm.backup.backup_job
+        assert job["status"] == "succeeded"
+        assert job["backup-id"] == "2023-01-01T09:00:00Z"
+        _release_backup_job.assert_called_once_with(job)
+        # A job that failed to record the notice reports it once it's found finished.
+        assert ("failed to notify the charm: fake error" in caplog.text) == (dispatch == "watcher")
+
+
+def test_check_backup_job(harness):
+    with (
+        patch("charm.PostgreSQLBackups._read_backup_job_state") as _read_backup_job_state,
+        patch("charm.PostgreSQLBackups._is_backup_service_running") as _is_backup_service_running,
+        patch("charm.PostgreSQLBackups._finish_backup_job") as _finish_backup_job,
+        patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
+        patch("charm.PostgreSQLBackups._open_backup_log") as _open_backup_log,
+        patch(
+            "charm.PostgreSQLBackups._upload_backup_log_segments"
+        ) as _upload_backup_log_segments,
+        patch(
+            "charm.PostgreSQLBackups._change_connectivity_to_database"
+        ) as _change_connectivity_to_database,
+    ):
+        harness.set_can_connect("postgresql", True)
+        _retrieve_s3_parameters.return_value = ({"path": "test-path"}, [])
+
+        # Test when no backup was created on the unit.
+        assert harness.charm.backup.check_backup_job() is None
+        _read_backup_job_state.assert_not_called()
+
+        # Test when the job didn't report its progress yet.
+        job = {"id": "fake-id", "type": "full", "status": "running", "started": 100.0}
+        harness.charm.backup._update_backup_job(**job)
+        _read_backup_job_state.return_value = None
+        _is_backup_service_running.return_value = True
+        assert harness.charm.backup.check_backup_job() == job
+
+        # Test when the job reports its progress.
+        _read_backup_job_state.return_value = {
+            "id": "fake-id",
+            "status": "running",
+            "started": 100.0,
+            "updated": 200.0,
+            "files-done": 10,
+            "bytes-done": 1024,
+            "percent": 25.0,
+        }
+        assert harness.charm.backup.check_backup_job() == {
+            **job,
+            "files-done": 10,
+            "bytes-done": 1024,
+            "percent": 25.0,
+            "eta": 500.0,
+        }
+        # The progress isn't written to the peer data.
+        assert harness.charm.backup.backup_job == job
+        _finish_backup_job.assert_not_called()
+        _upload_backup_log_segments.assert_not_called()
+
+        # Test when the job completed segments of its output.
+        _read_backup_job_state.return_value = {
+            **_read_backup_job_state.return_value,
+            "segments": 2,
+        }
+        harness.charm.backup.check_backup_job()
+        _open_backup_log.assert_called_once_with({"path": "test-path"}, "fake-id")
+        _upload_backup_log_segments.assert_called_once_with(_open_backup_log.return_value, 2)
+
+        # Test when the segments were uploaded already.
+        _upload_backup_log_segments.reset_mock()
+        harness.charm.backup._stored.backup_log = json.dumps({"job": "fake-id", "segments": 2})
+        harness.charm.backup.check_backup_job()
+        _upload_backup_log_segments.assert_not_called()
+        _change_connectivity_to_database.assert_not_called()
+
+        # Test that the connectivity is restored once the files were copied from the replica.
+        harness.charm.backup._update_backup_job(**{"connectivity-disabled": True})
+        _read_backup_job_state.return_value = {
+            **_read_backup_job_state.return_value,
+            "copied": True,
+        }
+        harness.charm.backup.check_backup_job()
+        _change_connectivity_to_database.assert_called_once_with(connectivity=True)
+        assert not harness.charm.backup.backup_job["connectivity-disabled"]
+        harness.charm.backup.check_backup_job()
+        _change_connectivity_to_database.assert_called_once_with(connectivity=True)
+
+        # Test when the job finished.
+        _read_backup_job_state.return_value = {
+            **_read_backup_job_state.return_value,
+            "status": "succeeded",
+            "exit-code": 0,
+        }
+        harness.charm.backup.check_backup_job()
+        _finish_backup_job.assert_called_once_with(
+            harness.charm.backup.backup_job, _read_backup_job_state.return_value
+        )
+
+        # Test when the job stopped without reporting its result.
+        _finish_backup_job.reset_mock()
+        _read_backup_job_state.return_value = None
+        _is_backup_service_running.return_value = False
+        harness.charm.backup.check_backup_job()
+        _finish_backup_job.assert_called_once_with(
+            harness.charm.backup.backup_job, {"status": "failed", "exit-code": None}
+        )
+
+        # Test when the job already finished.
+        _finish_backup_job.reset_mock()
+        _read_backup_job_state.reset_mock()
+        harness.charm.backup._update_backup_job(status="succeeded")
+        harness.charm.backup.check_backup_job()
+        _read_backup_job_state.assert_not_called()
+        _finish_backup_job.assert_not_called()
+
+
+def test_upload_backup_log_segments(harness):
+    with (
+        patch("ops.model.Container.pull") as _pull,
+        patch("ops.model.Container.remove_path") as _remove_path,
+    ):
+        backup_log = BackupLogUpload(MagicMock(), "test-bucket", "test-key", {"segments": 1})
+        backup_log.upload_part = MagicMock()
+        _pull.side_effect = lambda path, encoding: BytesIO(path.encode())
+
+        # Test when a segment is completed.
+        harness.charm.backup._upload_backup_log_segments(backup_log, 2)
+        _pull.assert_called_once_with("/home/postgres/backup-job.log.2", encoding=None)
+        backup_log.upload_part.assert_called_once_with(b"/home/postgres/backup-job.log.2")
+        _remove_path.assert_called_once_with("/home/postgres/backup-job.log.2")
+        assert json.loads(harness.charm.backup._stored.backup_log)["segments"] == 2
+
+        # Test when a segment can't be read (the rest of the log isn't uploaded).
+        backup_log.upload_part.reset_mock()
+        _pull.side_effect = [PathError("not-found", "fake error"), BytesIO(b"segment 4")]
+        harness.charm.backup._upload_backup_log_segments(backup_log, 4)
+        backup_log.upload_part.assert_called_once_with(b"segment 4")
+        assert json.loads(harness.charm.backup._stored.backup_log) == {
+            "upload-id": None,
+            "parts": [],
+            "failed": True,
+            "segments": 4,
+        }
+        assert _remove_path.call_count == 3
+
+
+def test_finish_backup_job(harness):
+    with (
+        patch("charm.PostgreSQLBackups._mark_repository_changed") as _mark_repository_changed,
+        patch("charm.PostgreSQLBackups._retrieve_s3_parameters") as _retrieve_s3_parameters,
+        patch("charm.PostgreSQLBackups._open_backup_log") as _open_backup_log,
+        patch(
+            "charm.PostgreSQLBackups._upload_backup_log_segments"
+        ) as _upload_backup_log_segments,
+        patch("charm.PostgreSQLBackups._list_backups") as _list_backups,
+        patch("charm.PostgreSQLBackups._generate_fake_backup_id") as _generate_fake_backup_id,
+        patch("charm.PostgreSQLBackups._release_backup_job") as _release_backup_job,
+        patch("ops.model.Container.pull") as _pull,
+        patch("ops.model.Container.remove_path") as _remove_path,
+        patch("charm.BackupJobWatcher.stop_backup_job_watcher") as _stop_backup_job_watcher,
+        patch("backups.time.time", return_value=300.0),
+    ):
+        _retrieve_s3_parameters.return_value = ({"path": "test-path"}, [])
+        files = {}
+
+        def pull(path, encoding):
+            files[path] = BytesIO(
+                b"fake stdout\n" if path.startswith("/home/postgres/backup-job.log.") else b"err"
+            )
+            return files[path]
+
+        _pull.side_effect = pull
+        backup_log = _open_backup_log.return_value
+        backup_log.finish.return_value = True
+        job = {"id": "fake-id", "type": "full", "status": "running", "started": 100.0}
+        state = {
+            "id": "fake-id",
+            "status": "failed",
+            "exit-code": 1,
+            "files-done": 1,
+            "bytes-done": 8192,
+            "percent": 0.5,
+            "segments": 2,
+        }
+
+        # Test when the backup failed before generating the backup label.
+        harness.charm.backup._update_backup_job(**job)
+        harness.charm.backup._stored.backup_log = json.dumps({"job": "fake-id", "segments": 1})
+        _generate_fake_backup_id.return_value = "20230101-090000F"
+        job = harness.charm.backup._finish_backup_job(job, state)
+        _mark_repository_changed.assert_called_once_with()
+        _open_backup_log.assert_called_once_with({"path": "test-path"}, "fake-id")
+        _upload_backup_log_segments.assert_called_once_with(backup_log, 2)
+        # The last segment and stderr are appended, and the logs are stored under a generated
+        # id when the backup failed before starting.
+        backup_log.finish.assert_called_once_with(
+            files["/home/postgres/backup-job.log.3"],
+            files["/home/postgres/backup-job.err"],
+            f"test-path/backup/{harness.charm.backup.stanza_name}/2023-01-01T09:00:00Z/backup.log",
+        )
+        assert all(file.closed for file in files.values())
+        # The output of the job is removed, and its watcher is stopped.
+        assert _remove_path.call_args_list == [
+            call("/home/postgres/backup-job.log.3"),
+            call("/home/postgres/backup-job.err"),
+        ]
+        _stop_backup_job_watcher.assert_called_once_with()
+        assert harness.charm.backup._stored.backup_log == "{}"
+        assert job == {
+            "id": "fake-id",
+            "type": "full",
+            "status": "failed",
+            "started": 100.0,
+            "finished": 300.0,
+            "files-done": 1,
+            "bytes-done": 8192,
+            "percent": 0.5,
+            "eta": None,
+            "backup-id": "2023-01-01T09:00:00Z",
+            "error": "Failed to backup PostgreSQL with exit code 1",
+        }
+        assert harness.charm.backup.backup_job == job
+        _release_backup_job.assert_called_once_with(job)
+
+        # Test when the backup failed after it started (the label is already known).
+        backup_log.reset_mock()
+        _generate_fake_backup_id.reset_mock()
+        state = {**state, "label": "20230102-090000F"}
+        job = harness.charm.backup._finish_backup_job(job, state)
+        _generate_fake_backup_id.assert_not_called()
+        assert backup_log.finish.call_args.args[2] == (
+            f"test-path/backup/{harness.charm.backup.stanza_name}/2023-01-02T09:00:00Z/backup.log"
+        )
+        assert job["backup-id"] == "2023-01-02T09:00:00Z"
+        assert job["status"] == "failed"
+
+        # Test when the backup succeeds but the charm fails to upload the backup logs.
+        backup_log.reset_mock()
+        backup_log.finish.return_value = False
+        _list_backups.return_value = {"2023-01-03T09:00:00Z": harness.charm.backup.stanza_name}
+        state = {**state, "status": "succeeded", "exit-code": 0, "percent": 100.0, "label": None}
+        job = harness.charm.backup._finish_backup_job(job, state)
+        assert backup_log.finish.call_args.args[2] == (
+            f"test-path/backup/{harness.charm.backup.stanza_name}/2023-01-03T09:00:00Z/backup.log"
+        )
+        assert job["status"] == "failed"
+        assert job["error"] == "Error uploading logs to S3"
+
+        # Test when the backup succeeds (including the upload of the backup logs), without
+        # stderr.
+        backup_log.reset_mock()
+        backup_log.finish.return_value = True
+        _list_backups.reset_mock()
+        _pull.side_effect = lambda path, encoding: (
+            pull(path, encoding)
+            if path.endswith(".log.3")
+            else (_ for _ in ()).throw(PathError("not-found", "fake error"))
+        )
+        state = {**state, "label": "20230101-090000F"}
+        job = harness.charm.backup._finish_backup_job(job, state)
+        # The logs are stored under the id from the backup label.
+        _list_backups.assert_not_called()
+        assert backup_log.finish.call_args.args[1] is None
+        assert job["status"] == "succeeded"
+        assert job["error"] is None
+        assert job["percent"] == 100.0
+
+
+def test_release_backup_job(harness):
+    with (
+        patch("charm.PostgresqlOperatorCharm.update_config") as _update_config,
+        patch(
+            "charm.PostgreSQLBackups._change_connectivity_to_database"
+        ) as _change_connectivity_to_database,
+    ):
+        harness.charm.backup._release_backup_job({"connectivity-disabled": False})
+        _update_config.assert_called_once_with()
+        _change_connectivity_to_database.assert_not_called()
+
+        _update_config.reset_mock()
+        harness.charm.backup._release_backup_job({"connectivity-disabled": True})
+        _update_config.assert_not_called()
+        _change_connectivity_to_database.assert_called_once_with(connectivity=True)
+
+
+def test_on_get_backup_status_action(harness):
+    with patch("charm.PostgreSQLBackups.check_backup_job") as _check_backup_job:
+        # Test when no backup was created on the unit.
+        mock_event = MagicMock()
+        _check_backup_job.return_value = None
+        harness.charm.backup._on_get_backup_status_action(mock_event)
+        mock_event.fail.assert_called_once_with("No backup was created on this unit")
+        mock_event.set_results.assert_not_called()
+
+        # Test when the backup is running.
+        mock_event.reset_mock()
+        _check_backup_job.return_value = {
+            "id": "20230101-090000",
+            "type": "full",
+            "status": "running",
+            "started": 1672563600.0,
+            "files-done": 10,
+            "bytes-done": 1024,
+            "percent": 25.0,
+            "eta": 1672567200.0,
+        }
+        harness.charm.backup._on_get_backup_status_action(mock_event)
         mock_event.fail.assert_not_called()
-        mock_event.set_results.assert_called_once_with({"backup-status": "backup created"})
+        mock_event.set_results.assert_called_once_with({
+            "job-id": "20230101-090000",
+            "type": "full",
+            "status": "running",
+            "started": "2023-01-01T09:00:00Z",
+            "files-done": 10,
+            "bytes-done": 1024,
+            "percent": "25.00",
+            "eta": "2023-01-01T10:00:00Z",
+        })
+
+        # Test when the backup failed.
+        mock_event.reset_mock()
+        _check_backup_job.return_value = {
+            **_check_backup_job.return_value,
+            "status": "failed",
+            "finished": 1672563660.0,
+            "eta": None,
+            "backup-id": "2023-01-01T09:00:00Z",
+            "error": "Failed to backup PostgreSQL with exit code 1",
+        }
+        harness.charm.backup._on_get_backup_status_action(mock_event)
+        mock_event.set_results.assert_called_once_with({
+            "job-id": "20230101-090000",
+            "type": "full",
+            "status": "failed",
+            "started": "2023-01-01T09:00:00Z",
+            "files-done": 10,
+            "bytes-done": 1024,
+            "percent": "25.00",
+            "finished": "2023-01-01T09:01:00Z",
+            "backup-id": "2023-01-01T09:00:00Z",
+            "error": "Failed to backup PostgreSQL with exit code 1",
+        })
 
 
 def test_on_list_backups_action(harness):
@@ -1429,11 +2575,16 @@ def test_on_restore_action(harness):
         patch("charm.PostgresqlOperatorCharm.update_config") as _update_config,
         patch("charm.PostgresqlOperatorCharm._create_pgdata") as _create_pgdata,
         patch("charm.PostgreSQLBackups._empty_data_files") as _empty_data_files,
+        patch(
+            "charm.PostgreSQLBackups._render_pgbackrest_conf_file"
+        ) as _render_pgbackrest_conf_file,
         patch("charm.PostgreSQLBackups._restart_database") as _restart_database,
         patch("lightkube.Client.delete") as _delete,
         patch("ops.model.Container.stop") as _stop,
         patch("charm.PostgreSQLBackups._list_backups") as _list_backups,
         patch("charm.PostgreSQLBackups._list_timelines") as _list_timelines,
+        patch("charm.PostgreSQLBackups._pgbackrest_info") as _pgbackrest_info,
+        patch("charm.PostgreSQLBackups._archive_history", return_value="{}"),
         patch("charm.PostgreSQLBackups._fetch_backup_from_id") as _fetch_backup_from_id,
         patch("charm.PostgreSQLBackups._pre_restore_checks") as _pre_restore_checks,
         patch(
@@ -1566,26 +2717,35 @@ def test_on_restore_action(harness):
         mock_event.reset_mock()
         _restart_database.reset_mock()
         _empty_data_files.side_effect = None
+        _empty_data_files.return_value = False
         _fetch_backup_from_id.return_value = "20230101-090000F"
+        harness.charm._stored.patroni_dcs_config_hash = "applied-hash"
         assert harness.get_relation_data(peer_rel_id, harness.charm.app) == {}
         harness.charm.backup._on_restore_action(mock_event)
         _restart_database.assert_not_called()
+        # The configuration is applied again to the new cluster.
+        assert harness.charm._stored.patroni_dcs_config_hash is None
         assert harness.get_relation_data(peer_rel_id, harness.charm.app) == {
             "restoring-backup": "20230101-090000F",
             "restore-stanza": f"{harness.charm.model.name}.{harness.charm.cluster_name}",
         }
+        # The cached listing of the repository is refreshed after the restore.
+        assert "last-backup" in harness.get_relation_data(peer_rel_id, harness.charm.unit)
+        _render_pgbackrest_conf_file.assert_called_once()
         _create_pgdata.assert_called_once()
         _update_config.assert_called_once()
         _start.assert_called_once_with("postgresql")
         mock_event.fail.assert_not_called()
         mock_event.set_results.assert_called_once_with({"restore-status": "restore started"})
 
-        # Test a successful PITR with the real backup id to the latest.
+        # Test a successful PITR with the real backup id to the latest
+        # (restoring over the existing data files).
         mock_event.reset_mock()
         _restart_database.reset_mock()
         _create_pgdata.reset_mock()
         _update_config.reset_mock()
         _start.reset_mock()
+        _empty_data_files.return_value = True
         mock_event.params = {"backup-id": "2023-01-01T09:00:00Z", "restore-to-time": "latest"}
         harness.charm.backup._on_restore_action(mock_event)
         _restart_database.assert_not_called()
@@ -1593,6 +2753,7 @@ def test_on_restore_action(harness):
             "restoring-backup": "20230101-090000F",
             "restore-timeline": "1",
             "restore-to-time": "latest",
+            "restore-delta": "True",
             "restore-stanza": f"{harness.charm.model.name}.{harness.charm.cluster_name}",
         }
         _create_pgdata.assert_called_once()
@@ -1601,18 +2762,44 @@ def test_on_restore_action(harness):
         mock_event.fail.assert_not_called()
         mock_event.set_results.assert_called_once_with({"restore-status": "restore started"})
 
+        # Test a failed PITR when no backup finished before the timestamp.
+        mock_event.reset_mock()
+        _stop.reset_mock()
+        _pgbackrest_info.return_value = json.dumps([
+            {
+                "name": harness.charm.backup.stanza_name,
+                "backup": [
+                    {
+                        "label": "20250224-050000F",
+                        "error": False,
+                        "archive": {
+                            "start": "000000020000000000000003",
+                            "stop": "000000020000000000000004",
+                        },
+                        "timestamp": {"start": 1740373200, "stop": 1740373260},
+                    }
+                ],
+            }
+        ])
+        mock_event.params = {"restore-to-time": "2025-02-24 05:00:00.001+00"}
+        harness.charm.backup._on_restore_action(mock_event)
+        mock_event.fail.assert_called_once()
+        _stop.assert_not_called()
+        mock_event.set_results.assert_not_called()
+
         # Test a successful PITR with only the timestamp.
         mock_event.reset_mock()
         _restart_database.reset_mock()
         _create_pgdata.reset_mock()
         _update_config.reset_mock()
         _start.reset_mock()
-        mock_event.params = {"restore-to-time": "2025-02-24 05:00:00.001+00"}
+        _empty_data_files.return_value = False
+        mock_event.params = {"restore-to-time": "2025-02-24 05:01:00.001+00"}
         harness.charm.backup._on_restore_action(mock_event)
         _restart_database.assert_not_called()
         assert harness.get_relation_data(peer_rel_id, harness.charm.app) == {
             "restore-timeline": "2",
-            "restore-to-time": "2025-02-24 05:00:00.001+00",
+            "restore-to-time": "2025-02-24 05:01:00.001+00",
             "restore-stanza": f"{harness.charm.model.name}.{harness.charm.cluster_name}",
         }
         _create_pgdata.assert_called_once()
@@ -1756,6 +2943,7 @@ def test_render_pgbackrest_conf_file(harness, tls_ca_chain_filename):
     with (
         patch("ops.model.Container.start") as _start,
         patch("ops.model.Container.push") as _push,
+        patch("ops.model.Container.pull", side_effect=PathError("not-found", "")) as _pull,
         patch(
             "charm.PostgreSQLBackups._tls_ca_chain_filename",
             new_callable=PropertyMock(return_value=tls_ca_chain_filename),
@@ -1814,25 +3002,28 @@ def test_render_pgbackrest_conf_file(harness, tls_ca_chain_filename):
             user="backup",
             retention_full=30,
             process_max=2,
+            backup_process_max=2,
+            compress_level=3,
+            archive_async=False,
+            spool_path=f"{harness.charm._storage_path}/pgbackrest-spool",
+            archive_push_queue_max=None,
+            archive_get_queue_max=None,
         )
 
-        # Patch the `open` method with our mock.
-        with patch("builtins.open", mock, create=True):
-            # Call the method
-            harness.charm.backup._render_pgbackrest_conf_file()
-
-        # Check the template is opened read-only in the call to open.
-        assert mock.call_args_list[0][0] == ("templates/pgbackrest.conf.j2",)
+        harness.charm.backup._render_pgbackrest_conf_file()
 
         # Get the expected content from a file.
-        with open("templates/pgbackrest.conf.j2") as file:
+        with open("templates/pgbackrest.logrotate.j2") as file:
             template = Template(file.read())
         log_rotation_expected_content = template.render()
+        with open("scripts/rotate_logs.py") as file:
+            rotate_logs_content = file.read()
 
-        # Ensure the correct rendered template is sent to _render_file method.
+        # Ensure the correct rendered templates are pushed to the workload container.
         calls = [
             call("/etc/pgbackrest.conf", expected_content, user="postgres", group="postgres"),
             call("/etc/logrotate.d/pgbackrest.logrotate", log_rotation_expected_content),
+            call("/home/postgres/rotate_logs.py", rotate_logs_content),
         ]
         if tls_ca_chain_filename != "":
             calls.insert(
@@ -1841,7 +3032,212 @@ def test_render_pgbackrest_conf_file(harness, tls_ca_chain_filename):
                     tls_ca_chain_filename, "fake-tls-ca-chain", user="postgres", group="postgres"
                 ),
             )
-        _push.assert_has_calls(calls)
+        assert _push.call_args_list == calls
+
+        # Test that files with an unchanged content are not pushed again.
+        _push.reset_mock()
+        pushed = {pushed_call.args[0]: pushed_call.args[1] for pushed_call in calls}
+        _pull.side_effect = lambda path: StringIO(pushed[path])
+        harness.charm.backup._render_pgbackrest_conf_file()
+        _push.assert_not_called()
+
+        # Test the parallelism, compression and asynchronous archiving settings.
+        _pull.side_effect = PathError("not-found", "")
+        harness.update_config({
+            "backup_archive_async": True,
+            "backup_archive_get_queue_max": 512,
+            "backup_archive_push_queue_max": 8192,
+            # Higher than the levels of gzip, which aren't used.
+            "backup_compress_level": "19",
+            "backup_process_max": "8",
+        })
+        with patch("ops.model.Container.make_dir") as _make_dir:
+            harness.charm.backup._render_pgbackrest_conf_file()
+        _make_dir.assert_called_once_with(
+            f"{harness.charm._storage_path}/pgbackrest-spool",
+            make_parents=True,
+            user="postgres",
+            group="postgres",
+        )
+        content = _push.call_args_list[-3].args[1]
+        for line in [
+            "compress-level=19",
+            "archive-async=y",
+            f"spool-path={harness.charm._storage_path}/pgbackrest-spool",
+            "archive-get-queue-max=512MB",
+            "archive-push-queue-max=8192MB",
+            "[global:backup]\nprocess-max=8",
+            "[global:archive-push]\nprocess-max=8",
+            "[global:archive-get]\nprocess-max=8",
+            "[global:restore]\nprocess-max=2",
+        ]:
+            assert line in content
+
+        # Test that the compression level is bounded by the levels of zst.
+        harness.update_config({"backup_compress_level": "23"})
+        with pytest.raises(ValueError):
+            harness.charm.config  # noqa: B018
+        harness.update_config({"backup_compress_level": "19"})
+
+        # Test that the prefetch queue is sized from the WAL kept for the replication.
+        harness.update_config(
+            {"durability_wal_keep_size": 2048}, unset=["backup_archive_get_queue_max"]
+        )
+        with patch("ops.model.Container.make_dir"):
+            harness.charm.backup._render_pgbackrest_conf_file()
+        assert "archive-get-queue-max=512MB" in _push.call_args_list[-3].args[1]
+        harness.update_config({"durability_wal_keep_size": 256})
+        assert harness.charm.backup._archive_get_queue_max() == 128
+        harness.update_config({"backup_archive_async": False})
+        assert harness.charm.backup._archive_get_queue_max() is None
+
+        # Test that the WAL is always prefetched while restoring a backup.
+        peer_rel_id = harness.model.get_relation(PEER).id
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, harness.charm.app.name, {"restore-to-time": "latest"}
+            )
+        assert harness.charm.backup._archive_get_queue_max() == 128
+
+
+def test_archive_queue_size(harness):
+    with patch("ops.model.Container.list_files") as _list_files:
+        _list_files.return_value = [MagicMock(), MagicMock(), MagicMock()]
+        assert harness.charm.backup.archive_queue_size() == 48
+        _list_files.assert_called_once_with(
+            f"{harness.charm.pgdata_path}/pg_wal/archive_status", pattern="*.ready"
+        )
+
+        # Test when the archive status directory can't be listed.
+        _list_files.side_effect = PathError("not-found", "")
+        assert harness.charm.backup.archive_queue_size() is None
+
+
+def test_restore_progress(harness):
+    with patch("charm.Patroni.last_postgresql_logs") as _last_postgresql_logs:
+        peer_rel_id = harness.model.get_relation(PEER).id
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, harness.charm.app.name, {"restore-stanza": "test-stanza"}
+            )
+        harness.set_can_connect("postgresql", True)
+        container = harness.charm.unit.get_container("postgresql")
+        log_path = "/var/log/pgbackrest/test-stanza-restore.log"
+        restore_logs = (
+            "P00   INFO: restore command begin 2.54.2: --delta --stanza=test-stanza\n"
+            "P00   INFO: restore command end: completed successfully\n"
+            "-------------------PROCESS START-------------------\n"
+            "P00   INFO: restore command begin 2.54.2: --delta --stanza=test-stanza\n"
+        )
+        container.push(log_path, restore_logs, make_dirs=True)
+        tail_commands = []
+
+        def tail(args: ExecArgs) -> ExecResult:
+            tail_commands.append(args.command)
+            offset = int(args.command[2])
+            with open(harness.get_filesystem_root(container) / log_path.lstrip("/"), "rb") as f:
+                return ExecResult(stdout=f.read()[offset - 1 :])
+
+        harness.handle_exec("postgresql", ["tail"], handler=tail)
+        _last_postgresql_logs.return_value = ""
+
+        # Test before any file is restored.
+        assert harness.charm.backup.restore_progress() == "restoring backup"
+        assert tail_commands == [["tail", "-c", "+1", log_path]]
+
+        # Test while restoring the files (including the ones kept by the delta restore), with
+        # a line still being written.
+        appended = (
+            "P01 DETAIL: restore file /var/lib/postgresql/data/pgdata/base/1/1249 "
+            "(440KB, 0.89%) checksum 7b2a1f0f\n"
+            "P02 DETAIL: restore file /var/lib/postgresql/data/pgdata/base/1/2608 - exists and "
+            "matches backup (bundle 1/0, 456KB, 1.81%) checksum 0d8e5c7a\n"
+            "P01 DETAIL: restore file /var/lib/postgresql/data/pgdata/base/1/2609 (8KB"
+        )
+        container.push(log_path, restore_logs + appended)
+        assert (
+            harness.charm.backup.restore_progress() == "restoring backup: 2 files restored (1.81%)"
+        )
+        # Only the lines appended since the last check are read.
+        assert tail_commands[-1] == ["tail", "-c", f"+{len(restore_logs) + 1}", log_path]
+
+        # Test that the log isn't read again when it didn't change.
+        restore_logs += appended[: appended.rfind("P01")]
+        appended = appended[appended.rfind("P01") :]
+        assert (
+            harness.charm.backup.restore_progress() == "restoring backup: 2 files restored (1.81%)"
+        )
+        assert tail_commands[-1] == ["tail", "-c", f"+{len(restore_logs) + 1}", log_path]
+        tail_commands.clear()
+        container.push(log_path, restore_logs)
+        assert (
+            harness.charm.backup.restore_progress() == "restoring backup: 2 files restored (1.81%)"
+        )
+        assert tail_commands == []
+
+        # Test while replaying the WAL.
+        container.push(
+            log_path,
+            restore_logs + "P00   INFO: restore command end: completed successfully\n",
+        )
+        assert harness.charm.backup.restore_progress() is None
+        _last_postgresql_logs.return_value = (
+            'LOG:  restored log file "00000001000000000000000A" from archive\n'
+            'LOG:  restored log file "000000010000000100000003" from archive\n'
+        )
+        assert (
+            harness.charm.backup.restore_progress()
+            == "restoring backup: replaying WAL at 1/3000000"
+        )
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id,
+                harness.charm.app.name,
+                {"restore-wal-stop": "0000000100000001000000FF"},
+            )
+        assert (
+            harness.charm.backup.restore_progress()
+            == "restoring backup: replaying WAL at 1/3000000 of 1/FF000000"
+        )
+
+        # Test when the log was rotated (it's read from its start).
+        container.push(
+            log_path, "P00   INFO: restore command begin 2.54.2: --delta --stanza=test-stanza\n"
+        )
+        assert harness.charm.backup.restore_progress() == "restoring backup"
+        assert tail_commands[-1] == ["tail", "-c", "+1", log_path]
+
+        # Test when the restore logs can't be read.
+        container.remove_path(log_path)
+        _last_postgresql_logs.return_value = ""
+        assert harness.charm.backup.restore_progress() is None
+
+
+def test_is_archive_push_queue_full(harness):
+    with (
+        patch("charm.PostgreSQLBackups.archive_queue_size") as _archive_queue_size,
+        patch("charm.PostgreSQLBackups._are_backup_settings_ok") as _are_backup_settings_ok,
+    ):
+        _are_backup_settings_ok.return_value = (True, None)
+        _archive_queue_size.return_value = 1024
+
+        # Test when there is no limit to the WAL waiting to be archived.
+        assert not harness.charm.backup.is_archive_push_queue_full()
+        _archive_queue_size.assert_not_called()
+
+        harness.update_config({"backup_archive_push_queue_max": 1024})
+        assert harness.charm.backup.is_archive_push_queue_full()
+
+        _archive_queue_size.return_value = 1008
+        assert not harness.charm.backup.is_archive_push_queue_full()
+
+        _archive_queue_size.return_value = None
+        assert not harness.charm.backup.is_archive_push_queue_full()
+
+        # Test when the backups are not configured.
+        _archive_queue_size.return_value = 2048
+        _are_backup_settings_ok.return_value = (False, "fake error")
+        assert not harness.charm.backup.is_archive_push_queue_full()
 
 
 def test_restart_database(harness):
@@ -2011,10 +3407,10 @@ def test_start_stop_pgbackrest_service(harness):
 )
 def test_upload_content_to_s3(harness, tls_ca_chain_filename):
     with (
-        patch("tempfile.NamedTemporaryFile") as _named_temporary_file,
         patch("charm.PostgreSQLBackups._construct_endpoint") as _construct_endpoint,
-        patch("backups.Session.resource") as _resource,
-        patch("backups.Config") as _config,
+        patch("boto3.session.Session.resource") as _resource,
+        patch("botocore.client.Config") as _config,
+        patch("charm.PostgreSQLBackups._s3_transfer_config") as _s3_transfer_config,
         patch(
             "charm.PostgreSQLBackups._tls_ca_chain_filename",
             new_callable=PropertyMock(return_value=tls_ca_chain_filename),
@@ -2031,12 +3427,15 @@ def test_upload_content_to_s3(harness, tls_ca_chain_filename):
             "path": "/test-path",
             "region": "us-east-1",
         }
+        uploaded = []
+
+        def upload_fileobj(fileobj, key, **kwargs):
+            uploaded.append((fileobj.read(), key, kwargs))
 
         # Test when any exception happens.
-        upload_file = _resource.return_value.Bucket.return_value.upload_file
+        upload_fileobj_mock = _resource.return_value.Bucket.return_value.upload_fileobj
         _resource.side_effect = ValueError
         _construct_endpoint.return_value = "https://s3.us-east-1.amazonaws.com"
-        _named_temporary_file.return_value.__enter__.return_value.name = "/tmp/test-file"
         assert harness.charm.backup._upload_content_to_s3(content, s3_path, s3_parameters) is False
         _resource.assert_called_once_with(
             "s3",
@@ -2048,14 +3447,15 @@ def test_upload_content_to_s3(harness, tls_ca_chain_filename):
             # https://github.com/boto/boto3/issues/4400#issuecomment-2600742103
             request_checksum_calculation="when_required",
             response_checksum_validation="when_required",
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
         )
-        _named_temporary_file.assert_not_called()
-        upload_file.assert_not_called()
+        upload_fileobj_mock.assert_not_called()
 
         _resource.reset_mock()
         _config.reset_mock()
         _resource.side_effect = None
-        upload_file.side_effect = S3UploadFailedError
+        upload_fileobj_mock.side_effect = S3UploadFailedError
         assert harness.charm.backup._upload_content_to_s3(content, s3_path, s3_parameters) is False
         _resource.assert_called_once_with(
             "s3",
@@ -2063,34 +3463,29 @@ def test_upload_content_to_s3(harness, tls_ca_chain_filename):
             verify=(tls_ca_chain_filename or None),
             config=_config.return_value,
         )
-        _config.assert_called_once_with(
-            # https://github.com/boto/boto3/issues/4400#issuecomment-2600742103
-            request_checksum_calculation="when_required",
-            response_checksum_validation="when_required",
-        )
-        _named_temporary_file.assert_called_once()
-        upload_file.assert_called_once_with("/tmp/test-file", "test-path/test-file.")
+        upload_fileobj_mock.assert_called_once()
 
-        # Test when the upload succeeds
+        # Test when the upload succeeds (the S3 resource of the hook is reused).
         _resource.reset_mock()
         _config.reset_mock()
-        _named_temporary_file.reset_mock()
-        upload_file.reset_mock()
-        upload_file.side_effect = None
+        _construct_endpoint.reset_mock()
+        upload_fileobj_mock.side_effect = upload_fileobj
         assert harness.charm.backup._upload_content_to_s3(content, s3_path, s3_parameters) is True
-        _resource.assert_called_once_with(
-            "s3",
-            endpoint_url="https://s3.us-east-1.amazonaws.com",
-            verify=(tls_ca_chain_filename or None),
-            config=_config.return_value,
-        )
-        _config.assert_called_once_with(
-            # https://github.com/boto/boto3/issues/4400#issuecomment-2600742103
-            request_checksum_calculation="when_required",
-            response_checksum_validation="when_required",
+        _resource.assert_not_called()
+        _config.assert_not_called()
+        _construct_endpoint.assert_not_called()
+        assert uploaded == [
+            (b"test-content", "test-path/test-file.", {"Config": _s3_transfer_config.return_value})
+        ]
+
+        # Test that other credentials get their own S3 resource.
+        assert (
+            harness.charm.backup._upload_content_to_s3(
+                content, s3_path, {**s3_parameters, "secret-key": "other-secret-key"}
+            )
+            is True
         )
-        _named_temporary_file.assert_called_once()
-        upload_file.assert_called_once_with("/tmp/test-file", "test-path/test-file.")
+        _resource.assert_called_once()
 
 
 def test_extract_error_message(harness):
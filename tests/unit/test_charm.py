@@ -8,7 +8,12 @@ from unittest.mock import MagicMock, Mock, PropertyMock, call, patch, sentinel
 
 import psycopg2
 import pytest
-from charms.postgresql_k8s.v0.postgresql import PostgreSQLUpdateUserPasswordError
+from charms.postgresql_k8s.v0.postgresql import (
+    ACCESS_GROUPS,
+    PostgreSQLGetPostgreSQLVersionError,
+    PostgreSQLListUsersError,
+    PostgreSQLUpdateUserPasswordError,
+)
 from lightkube import ApiError
 from lightkube.resources.core_v1 import Endpoints, Pod, Service
 from ops import JujuVersion
@@ -25,7 +30,7 @@ from requests import ConnectionError as RequestsConnectionError
 from tenacity import RetryError, wait_fixed
 
 from charm import EXTENSION_OBJECT_MESSAGE, PostgresqlOperatorCharm
-from constants import PEER, SECRET_INTERNAL_LABEL
+from constants import OWNERSHIP_TRANSFER_MESSAGE, PEER, SECRET_INTERNAL_LABEL
 from patroni import NotReadyError, SwitchoverFailedError, SwitchoverNotSyncError
 from tests.unit.helpers import _FakeApiError
 
@@ -540,6 +545,16 @@ def test_on_update_status(harness):
         harness.charm.on.update_status.emit()
         assert harness.model.unit.status == ActiveStatus("Primary")
 
+        # Test that the status of the ownership transfers still running is kept.
+        harness.model.unit.status = MaintenanceStatus(OWNERSHIP_TRANSFER_MESSAGE)
+        with patch(
+            "relations.postgresql_provider.PostgreSQLProvider.resume_ownership_transfers",
+            return_value=True,
+        ) as _resume_ownership_transfers:
+            harness.charm.on.update_status.emit()
+        _resume_ownership_transfers.assert_called_once_with()
+        assert harness.model.unit.status == MaintenanceStatus(OWNERSHIP_TRANSFER_MESSAGE)
+
 
 def test_on_update_status_no_connection(harness):
     with (
@@ -726,6 +741,10 @@ def test_on_update_status_after_restore_operation(harness):
     with (
         patch("charm.PostgresqlOperatorCharm._set_active_status") as _set_active_status,
         patch("charm.PostgreSQLBackups.can_use_s3_repository") as _can_use_s3_repository,
+        patch("charm.PostgreSQLBackups.restore_progress") as _restore_progress,
+        patch(
+            "charm.PostgreSQLBackups.update_pgbackrest_configuration"
+        ) as _update_pgbackrest_configuration,
         patch(
             "charms.postgresql_k8s.v0.postgresql.PostgreSQL.get_current_timeline"
         ) as _get_current_timeline,
@@ -757,11 +776,21 @@ def test_on_update_status_after_restore_operation(harness):
         harness.charm.unit.status = ActiveStatus()
         _pebble.get_services.return_value = [MagicMock(current=ServiceStatus.ACTIVE)]
         _member_started.return_value = False
+        _restore_progress.return_value = None
         harness.charm.on.update_status.emit()
         _update_config.assert_not_called()
         _set_active_status.assert_not_called()
         tc.assertIsInstance(harness.charm.unit.status, ActiveStatus)
 
+        # Test that the progress of the restore is reported.
+        _restore_progress.return_value = "restoring backup: 2 files restored (1.81%)"
+        harness.charm.on.update_status.emit()
+        _update_config.assert_not_called()
+        assert harness.charm.unit.status == MaintenanceStatus(
+            "restoring backup: 2 files restored (1.81%)"
+        )
+        harness.charm.unit.status = ActiveStatus()
+
         # Assert that the backup id is still in the application relation databag.
         tc.assertEqual(
             harness.get_relation_data(rel_id, harness.charm.app),
@@ -774,6 +803,7 @@ def test_on_update_status_after_restore_operation(harness):
         harness.charm.on.update_status.emit()
         _update_config.assert_called_once()
         _set_active_status.assert_called_once()
+        _update_pgbackrest_configuration.assert_called_once()
         assert isinstance(harness.charm.unit.status, ActiveStatus)
 
         # Assert that the backup id is not in the application relation databag anymore.
@@ -812,6 +842,9 @@ def test_on_upgrade_charm(harness):
             side_effect=[_FakeApiError, None, None],
         ) as _create_services,
         patch("charm.PostgreSQLUpgrade.idle", new_callable=PropertyMock) as _idle,
+        patch(
+            "charm.PostgresqlOperatorCharm._invalidate_rock_version_if_image_changed"
+        ) as _invalidate_rock_version_if_image_changed,
     ):
         # Test when the cluster is being upgraded.
         harness.charm.unit.status = ActiveStatus()
@@ -820,6 +853,8 @@ def test_on_upgrade_charm(harness):
         _create_services.assert_not_called()
         _patch_pod_labels.assert_called_once()
         assert isinstance(harness.charm.unit.status, ActiveStatus)
+        # The cached Rock version is checked against the (maybe refreshed) image.
+        _invalidate_rock_version_if_image_changed.assert_called_once_with()
 
         # Test with a problem happening when trying to create the k8s resources.
         _patch_pod_labels.reset_mock()
@@ -987,6 +1022,7 @@ def test_postgresql_layer(harness):
                             f"password={harness.charm.get_secret('app', 'monitoring-password')} "
                             "host=/var/run/postgresql port=5432 database=postgres"
                         ),
+                        "PG_EXPORTER_EXTEND_QUERY_PATH": "/home/postgres/postgres-exporter-queries.yaml",
                     },
                 },
                 PGBACKREST_METRICS_SERVICE: {
@@ -1114,6 +1150,10 @@ def test_validate_config_options(harness):
         _charm_lib.return_value.validate_group_map.return_value = False
         _charm_lib.return_value.get_postgresql_timezones.return_value = []
 
+        def restart_postgresql():
+            # Invalidate the server facts cached by the previous validation.
+            harness.charm._invalidate_server_facts()
+
         # Test instance_default_text_search_config exception
         with harness.hooks_disabled():
             harness.update_config({"instance_default_text_search_config": "pg_catalog.test"})
@@ -1128,6 +1168,7 @@ def test_validate_config_options(harness):
         _charm_lib.return_value.get_postgresql_text_search_configs.return_value = [
             "pg_catalog.test"
         ]
+        restart_postgresql()
 
         # Test ldap_map exception
         with harness.hooks_disabled():
@@ -1163,6 +1204,86 @@ def test_validate_config_options(harness):
         _charm_lib.return_value.get_postgresql_timezones.return_value = ["TEST_ZONE"]
 
 
+def test_server_facts(harness):
+    with (
+        patch("charm.PostgresqlOperatorCharm.postgresql", new_callable=PropertyMock) as _charm_lib,
+        patch("ops.model.Container.exec") as _exec,
+    ):
+        _charm_lib.return_value.get_postgresql_text_search_configs.return_value = {
+            "pg_catalog.simple"
+        }
+        _charm_lib.return_value.get_postgresql_timezones.return_value = {"UTC"}
+        _charm_lib.return_value.get_postgresql_default_table_access_methods.return_value = {"heap"}
+        _charm_lib.return_value.validate_group_map.return_value = True
+        _charm_lib.return_value.validate_date_style.return_value = True
+        _charm_lib.return_value.get_postgresql_version.return_value = "14.15"
+        _exec.return_value.wait_output.return_value = ("C\nC.UTF-8\nen_US.utf8\n", "")
+
+        # Test that the facts are retrieved and only the small ones are stored in the local
+        # state of the unit, along with the validated config values.
+        harness.charm._validate_config_options()
+        assert harness.charm.get_postgresql_version() == "14.15"
+        assert "server-facts" not in harness.charm.unit_peer_data
+        assert json.loads(harness.charm._stored.server_facts) == {
+            "generation": 0,
+            "validated": {
+                "instance_default_text_search_config": "pg_catalog.simple",
+                "request_time_zone": "UTC",
+                "storage_default_table_access_method": "heap",
+                "response_lc_monetary": "C",
+                "response_lc_numeric": "C",
+                "response_lc_time": "C",
+            },
+            "version": "14.15",
+        }
+
+        # Test that the next hooks use the stored facts while the server keeps running.
+        _charm_lib.reset_mock()
+        _exec.reset_mock()
+        harness.charm.__dict__.pop("_server_facts")
+        harness.charm._validate_config_options()
+        assert harness.charm.get_postgresql_version() == "14.15"
+        _charm_lib.return_value.get_postgresql_text_search_configs.assert_not_called()
+        _charm_lib.return_value.get_postgresql_timezones.assert_not_called()
+        _charm_lib.return_value.get_postgresql_version.assert_not_called()
+        _exec.assert_not_called()
+
+        # Test that only the list of values of a changed config option is retrieved.
+        _charm_lib.return_value.get_postgresql_timezones.return_value = {"UTC", "Europe/Lisbon"}
+        harness.charm.__dict__.pop("_server_facts")
+        with harness.hooks_disabled():
+            harness.update_config({"request_time_zone": "Europe/Lisbon"})
+        harness.charm._validate_config_options()
+        _charm_lib.return_value.get_postgresql_timezones.assert_called_once_with()
+        _charm_lib.return_value.get_postgresql_text_search_configs.assert_not_called()
+        _exec.assert_not_called()
+        assert (
+            json.loads(harness.charm._stored.server_facts)["validated"]["request_time_zone"]
+            == "Europe/Lisbon"
+        )
+        _charm_lib.reset_mock()
+
+        # Test that the lists stored by previous revisions are dropped.
+        harness.charm._stored.server_facts = json.dumps({
+            **json.loads(harness.charm._stored.server_facts),
+            "timezones": ["UTC", "Europe/Lisbon"],
+        })
+        harness.charm.__dict__.pop("_server_facts")
+        harness.charm._validate_config_options()
+        assert "timezones" not in json.loads(harness.charm._stored.server_facts)
+
+        # Test that the facts are retrieved again after the charm reloads the server.
+        _charm_lib.return_value.get_postgresql_version.side_effect = psycopg2.OperationalError
+        with patch("charm.Patroni.reload_patroni_configuration", return_value=True):
+            assert harness.charm._reload_patroni_configuration_if_changed("new-hash")
+        assert harness.charm._stored.server_generation == 1
+        harness.charm._validate_config_options()
+        _charm_lib.return_value.get_postgresql_timezones.assert_called_once_with()
+        _exec.assert_called_once_with(["locale", "-a"])
+        with pytest.raises(PostgreSQLGetPostgreSQLVersionError):
+            harness.charm.get_postgresql_version()
+
+
 def test_scope_obj(harness):
     assert harness.charm._scope_obj("app") == harness.charm.framework.model.app
     assert harness.charm._scope_obj("unit") == harness.charm.framework.model.unit
@@ -1633,6 +1754,7 @@ def test_update_config(harness):
             restore_timeline=None,
             pitr_target=None,
             restore_to_latest=False,
+            restore_delta=False,
             parameters=expected_parameters,
             user_databases_map={"operator": "all", "replication": "all", "rewind": "all"},
         )
@@ -1663,6 +1785,7 @@ def test_update_config(harness):
             restore_timeline=None,
             pitr_target=None,
             restore_to_latest=False,
+            restore_delta=False,
             parameters=expected_parameters,
             user_databases_map={"operator": "all", "replication": "all", "rewind": "all"},
         )
@@ -1734,6 +1857,34 @@ def test_handle_postgresql_restart_need(harness):
                 _generate_metrics_jobs.assert_not_called()
                 _restart.assert_not_called()
 
+        # Test that the hash isn't recorded when Patroni wasn't reloaded (its service
+        # wasn't running), so the next hook reloads it.
+        _reload_patroni_configuration.reset_mock()
+        _reload_patroni_configuration.return_value = False
+        harness.charm._handle_postgresql_restart_need(False, "fake-hash")
+        assert harness.charm._stored.patroni_config_hash is None
+
+        # Test that a pending restart is checked only once, without waiting,
+        # when Patroni wasn't reloaded.
+        _is_tls_enabled.return_value = False
+        postgresql_mock.is_tls_enabled = PropertyMock(return_value=False)
+        postgresql_mock.is_restart_pending = PropertyMock(return_value=False)
+        with patch("charm.retry_sleep") as _retry_sleep:
+            harness.charm._handle_postgresql_restart_need(True, "fake-hash")
+        postgresql_mock.is_restart_pending.assert_called_once_with()
+        _retry_sleep.assert_not_called()
+
+        # Test that Patroni is only reloaded when its configuration changes.
+        _reload_patroni_configuration.reset_mock()
+        _reload_patroni_configuration.return_value = True
+        harness.charm._handle_postgresql_restart_need(False, "fake-hash")
+        harness.charm._handle_postgresql_restart_need(False, "fake-hash")
+        _reload_patroni_configuration.assert_called_once_with()
+        assert harness.charm._stored.patroni_config_hash == "fake-hash"
+        assert "patroni_config_hash" not in harness.get_relation_data(rel_id, harness.charm.unit)
+        harness.charm._handle_postgresql_restart_need(False, "other-fake-hash")
+        assert _reload_patroni_configuration.call_count == 2
+
 
 def test_set_active_status(harness):
     with (
@@ -1795,6 +1946,28 @@ def test_set_active_status(harness):
                 assert isinstance(harness.charm.unit.status, MaintenanceStatus)
 
 
+def test_set_active_status_archive_queue_full(harness):
+    with (
+        patch("charm.Patroni.get_running_cluster_members", return_value=["test"]),
+        patch(
+            "charm.PostgresqlOperatorCharm.is_standby_leader",
+            new_callable=PropertyMock,
+            return_value=False,
+        ),
+        patch("charm.Patroni.get_primary", return_value=harness.charm.unit.name),
+        patch("charm.PostgreSQLUpgrade.idle", new_callable=PropertyMock, return_value=True),
+        patch(
+            "charm.PostgreSQLBackups.is_archive_push_queue_full", return_value=True
+        ) as _is_archive_push_queue_full,
+    ):
+        harness.charm._set_active_status()
+        assert harness.charm.unit.status == ActiveStatus("Primary (WAL archive queue full)")
+
+        _is_archive_push_queue_full.return_value = False
+        harness.charm._set_active_status()
+        assert harness.charm.unit.status == ActiveStatus("Primary")
+
+
 def test_create_pgdata(harness):
     container = MagicMock()
     container.exists.return_value = False
@@ -2322,3 +2495,114 @@ def test_reset_upgrade_statuses(harness):
         assert harness.charm.unit.status == MaintenanceStatus(
             "upgrade completed, run resume-upgrade to proceed"
         )
+
+
+def test_relations_user_databases_map(harness):
+    with (
+        patch("charm.Patroni.member_started", new_callable=PropertyMock) as _member_started,
+        patch("charm.PostgresqlOperatorCharm.postgresql") as _postgresql,
+    ):
+        # Test when the cluster is not initialised yet.
+        assert harness.charm.relations_user_databases_map == {
+            "operator": "all",
+            "replication": "all",
+            "rewind": "all",
+        }
+        _postgresql.list_accessible_databases_for_users.assert_not_called()
+
+        # Test that the users and their databases are retrieved in a single call.
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                harness.model.get_relation(PEER).id,
+                harness.charm.app.name,
+                {"cluster_initialised": "True"},
+            )
+        _member_started.return_value = True
+        _postgresql.list_accessible_databases_for_users.return_value = {
+            "operator": {"all"},
+            "relation_id_2": {"db2", "db1"},
+            "relation_id_3": set(),
+        }
+        _postgresql.list_access_groups.return_value = set(ACCESS_GROUPS)
+        assert harness.charm.relations_user_databases_map == {"relation_id_2": "db1,db2"}
+        _postgresql.list_accessible_databases_for_users.assert_called_once_with(current_host=True)
+
+        # Test when the users can't be listed.
+        _postgresql.list_accessible_databases_for_users.side_effect = PostgreSQLListUsersError
+        assert harness.charm.relations_user_databases_map == {
+            "operator": "all",
+            "replication": "all",
+            "rewind": "all",
+        }
+
+
+def test_get_available_resources(harness):
+    with (
+        patch("charm.Client") as _client,
+        patch("charm.time.time", return_value=1000) as _time,
+    ):
+        pod = _client.return_value.get.return_value
+        pod.spec.nodeName = "fake-node"
+        container = MagicMock()
+        container.name = "postgresql"
+        container.resources.limits = {"cpu": "2", "memory": "1Gi"}
+        pod.spec.containers = [container]
+        pod.status.allocatable = {"cpu": "4", "memory": "8Gi"}
+
+        # Test that the Pod and the Node are fetched only once through a single client.
+        assert harness.charm.get_available_resources() == (2, 1073741824)
+        _client.assert_called_once_with()
+        assert _client.return_value.get.call_count == 2
+        assert harness.charm._stored.available_resources == {
+            "cpu": 2,
+            "memory": 1073741824,
+            "expires": 4600,
+        }
+        # The peer data isn't touched, so the other units don't get any event.
+        assert "available-resources" not in harness.charm.unit_peer_data
+
+        # Test that the cached resources are used until they expire.
+        _client.return_value.get.reset_mock()
+        _time.return_value = 4599
+        assert harness.charm.get_available_resources() == (2, 1073741824)
+        _client.return_value.get.assert_not_called()
+
+        _time.return_value = 4600
+        del harness.charm._pod
+        del harness.charm._node
+        assert harness.charm.get_available_resources() == (2, 1073741824)
+        assert _client.return_value.get.call_count == 2
+
+        # Test that the cache can be invalidated.
+        harness.charm._invalidate_available_resources()
+        assert harness.charm._stored.available_resources == {}
+
+
+def test_invalidate_rock_version_if_image_changed(harness):
+    with patch("charm.PostgresqlOperatorCharm._pod", new_callable=PropertyMock) as _pod:
+        container_status = MagicMock(imageID="sha256:first")
+        container_status.name = "postgresql"
+        _pod.return_value.status.containerStatuses = [container_status]
+        harness.charm._stored.rock_image = "sha256:first"
+        harness.charm._stored.rock_version = "16.9"
+        # Previous revisions cached them in the unit peer data.
+        harness.charm.unit_peer_data.update({"rock-image": "sha256:first", "rock-version": "16.9"})
+
+        # Test that the cached version is kept while the image is the same.
+        harness.charm._invalidate_rock_version_if_image_changed()
+        assert harness.charm._stored.rock_version == "16.9"
+        assert "rock-image" not in harness.charm.unit_peer_data
+        assert "rock-version" not in harness.charm.unit_peer_data
+
+        # Test that the cached version is dropped when the image changes.
+        container_status.imageID = "sha256:second"
+        harness.charm._invalidate_rock_version_if_image_changed()
+        assert harness.charm._stored.rock_version is None
+        assert harness.charm._stored.rock_image == "sha256:second"
+
+        # Test that the cached version is dropped when the image cannot be retrieved.
+        harness.charm._stored.rock_version = "16.9"
+        _pod.side_effect = _FakeApiError
+        harness.charm._invalidate_rock_version_if_image_changed()
+        assert harness.charm._stored.rock_version is None
+        assert harness.charm._stored.rock_image is None
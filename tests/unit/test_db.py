@@ -12,11 +12,11 @@ from charms.postgresql_k8s.v0.postgresql import (
 )
 from ops import Unit
 from ops.framework import EventBase
-from ops.model import ActiveStatus, BlockedStatus
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus
 from ops.testing import Harness
 
 from charm import PostgresqlOperatorCharm
-from constants import DATABASE_PORT, PEER
+from constants import DATABASE_PORT, OWNERSHIP_TRANSFER_MESSAGE, PEER
 
 DATABASE = "test_database"
 RELATION_NAME = "db"
@@ -251,15 +251,20 @@ def test_set_up_relation(harness):
             (extensions, set()),
             (extensions, set()),
             (extensions, set()),
+            (extensions, set()),
         ]
         postgresql_mock.create_user = PropertyMock(
-            side_effect=[None, None, PostgreSQLCreateUserError, None, None]
+            side_effect=[None, None, PostgreSQLCreateUserError, None, None, None]
         )
         postgresql_mock.create_database = PropertyMock(
-            side_effect=[None, None, PostgreSQLCreateDatabaseError, None]
+            side_effect=[True, True, PostgreSQLCreateDatabaseError, False, True]
         )
         postgresql_mock.get_postgresql_version = PropertyMock(return_value=POSTGRESQL_VERSION)
 
+        def restart_postgresql():
+            # Invalidate the server facts (like the version) cached by the charm.
+            harness.charm._invalidate_server_facts()
+
         # Assert no operation is done when at least one of the requested extensions
         # is disabled.
         relation = harness.model.get_relation(RELATION_NAME, rel_id)
@@ -308,7 +313,9 @@ def test_set_up_relation(harness):
         assert not isinstance(harness.model.unit.status, BlockedStatus)
 
         # Assert that the correct calls were made when the database name is
-        # provided only in the unit databag.
+        # provided only in the unit databag (after a restart of PostgreSQL, so
+        # the version is retrieved again).
+        restart_postgresql()
         postgresql_mock.create_user.reset_mock()
         postgresql_mock.create_database.reset_mock()
         postgresql_mock.get_postgresql_version.reset_mock()
@@ -386,7 +393,17 @@ def test_set_up_relation(harness):
         assert harness.get_relation_data(rel_id, harness.charm.app.name) == {}
         assert harness.get_relation_data(rel_id, harness.charm.unit.name) == {}
 
+        # The relation waits for the transfer of the ownership of the database objects.
+        harness.charm.unit.status = ActiveStatus()
+        assert not harness.charm.legacy_db_relation.set_up_relation(relation)
+        postgresql_mock.get_postgresql_version.assert_not_called()
+        _update_unit_status.assert_not_called()
+        assert harness.model.unit.status == MaintenanceStatus(OWNERSHIP_TRANSFER_MESSAGE)
+        assert harness.get_relation_data(rel_id, harness.charm.app.name) == {}
+        assert harness.get_relation_data(rel_id, harness.charm.unit.name) == {}
+
         # version is not updated due to a PostgreSQLGetPostgreSQLVersionError.
+        restart_postgresql()
         postgresql_mock.get_postgresql_version.side_effect = PostgreSQLGetPostgreSQLVersionError
         harness.charm.unit.status = ActiveStatus()
         assert harness.charm.legacy_db_relation.set_up_relation(relation)
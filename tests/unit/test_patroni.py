@@ -2,12 +2,15 @@
 # Copyright 2021 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import shlex
 from signal import SIGHUP
-from unittest.mock import MagicMock, Mock, PropertyMock, mock_open, patch
+from unittest.mock import AsyncMock, Mock, PropertyMock, mock_open, patch
 
+import httpx
 import pytest
 import requests
 import tenacity
+import yaml
 from jinja2 import Template
 from ops.testing import Harness
 from tenacity import RetryError, stop_after_delay, wait_fixed
@@ -71,6 +74,29 @@ def mocked_requests_get(*args, **kwargs):
     raise requests.exceptions.Timeout()
 
 
+def test_rock_postgresql_version(harness, patroni):
+    harness.add_relation("database-peers", "postgresql-k8s")
+    harness.set_can_connect("postgresql", True)
+    root = harness.get_filesystem_root("postgresql")
+    (root / "meta.charmed-postgresql").mkdir(parents=True)
+    (root / "meta.charmed-postgresql" / "snap.yaml").write_text("version: '16.9'\n")
+
+    with patch(
+        "ops.model.Container.pull", wraps=harness.charm.unit.get_container("postgresql").pull
+    ) as _pull:
+        # Test that the version is read from the Rock only once.
+        assert patroni.rock_postgresql_version == "16.9"
+        assert patroni.rock_postgresql_version == "16.9"
+        _pull.assert_called_once_with("/meta.charmed-postgresql/snap.yaml")
+        assert harness.charm._stored.rock_version == "16.9"
+
+        # Test that the version is read again when the cached one is dropped.
+        harness.charm._stored.rock_version = None
+        (root / "meta.charmed-postgresql" / "snap.yaml").write_text("version: '16.10'\n")
+        assert patroni.rock_postgresql_version == "16.10"
+        assert _pull.call_count == 2
+
+
 def test_dict_to_hba_string(harness, patroni):
     mock_data = {
         "ldapbasedn": "dc=example,dc=net",
@@ -117,6 +143,51 @@ def test_get_primary(harness, patroni):
         assert patroni.get_primary(unit_name_pattern=True) == "postgresql/0"
 
 
+def test_parallel_patroni_get_request_scheme_discovery(harness, patroni):
+    called_urls = []
+
+    async def _get(url):
+        called_urls.append(url)
+        response = Mock()
+        if url.startswith("https://"):
+            response.raise_for_status.side_effect = httpx.ConnectError("refused")
+        else:
+            response.raise_for_status.return_value = response
+            response.json.return_value = {"members": []}
+        return response
+
+    with (
+        patch(
+            "charm.PostgresqlOperatorCharm.is_peer_data_tls_set", new_callable=PropertyMock
+        ) as _is_peer_data_tls_set,
+        patch("patroni.AsyncClient") as _async_client,
+    ):
+        _async_client.return_value.get.side_effect = _get
+        _async_client.return_value.aclose = AsyncMock()
+
+        # Test that the scheme from the peer data is tried first and only falls back to
+        # the other scheme when no member answers.
+        _is_peer_data_tls_set.return_value = True
+        assert patroni.parallel_patroni_get_request("/cluster", ["server1"]) == {"members": []}
+        assert called_urls == ["https://server1:8008/cluster", "http://server1:8008/cluster"]
+
+        # Test that the scheme the member answered on is remembered.
+        called_urls.clear()
+        assert patroni.parallel_patroni_get_request("/cluster", ["server1"]) == {"members": []}
+        assert called_urls == ["http://server1:8008/cluster"]
+
+        # Test that the client is reused between requests.
+        _async_client.assert_called_once()
+
+        # Test that nothing is returned when no member answers.
+        called_urls.clear()
+        _async_client.return_value.get.side_effect = httpx.ConnectError("refused")
+        assert patroni.parallel_patroni_get_request("/cluster", ["server1"]) is None
+
+        patroni.close()
+        _async_client.return_value.aclose.assert_awaited_once_with()
+
+
 def test_is_creating_backup(harness, patroni):
     with patch("charm.Patroni.cluster_status") as _cluster_status:
         # Test when one member is creating a backup.
@@ -127,33 +198,162 @@ def test_is_creating_backup(harness, patroni):
         assert patroni.is_creating_backup
 
         # Test when no member is creating a backup.
-        del patroni.cached_cluster_status
+        patroni.invalidate_cluster_topology()
         _cluster_status.return_value = [{"name": "postgresql-0"}, {"name": "postgresql-1"}]
         assert not patroni.is_creating_backup
 
 
+def test_cluster_topology(harness, patroni):
+    with patch("charm.Patroni.cluster_status") as _cluster_status:
+        _cluster_status.return_value = [
+            {"name": "postgresql-0", "role": "leader", "state": "running"},
+            {"name": "postgresql-1", "role": "sync_standby", "state": "streaming"},
+            {"name": "postgresql-2", "role": "replica", "state": "stopped"},
+        ]
+
+        # Test that the snapshot is shared between the queries.
+        assert patroni.get_primary() == "postgresql-0"
+        assert patroni.get_sync_standby_names() == ["postgresql/1"]
+        assert patroni.cluster_members == {"postgresql-0", "postgresql-1", "postgresql-2"}
+        assert patroni.get_running_cluster_members() == ["postgresql-0", "postgresql-1"]
+        assert not patroni.are_all_members_ready()
+        _cluster_status.assert_called_once_with()
+
+        # Test that the snapshot is fetched again after being invalidated.
+        patroni.invalidate_cluster_topology()
+        _cluster_status.return_value = [
+            {"name": "postgresql-0", "role": "replica", "state": "streaming"},
+            {"name": "postgresql-1", "role": "leader", "state": "running"},
+        ]
+        assert patroni.get_primary() == "postgresql-1"
+        assert patroni.are_all_members_ready()
+        assert _cluster_status.call_count == 2
+
+        # Test that failed fetches aren't cached.
+        patroni.invalidate_cluster_topology()
+        _cluster_status.side_effect = RetryError(last_attempt=1)
+        assert patroni.get_primary() is None
+        _cluster_status.side_effect = None
+        assert patroni.get_primary() == "postgresql-1"
+        assert _cluster_status.call_count == 4
+
+
+def test_get_members_health(harness, patroni):
+    async def _get(url, timeout):
+        response = Mock()
+        if "postgresql-k8s-2" in url:
+            raise httpx.ConnectTimeout("timed out")
+        if url.endswith("/leader"):
+            response.status_code = 200
+            response.json.return_value = {"role": "primary", "state": "running"}
+        else:
+            response.status_code = 503
+            response.json.return_value = {"role": "replica", "state": "streaming"}
+        return response
+
+    with (
+        patch("charm.Patroni.get_primary", return_value="postgresql-k8s-0"),
+        patch("charm.Patroni.cluster_status") as _cluster_status,
+        patch("patroni.AsyncClient") as _async_client,
+    ):
+        _async_client.return_value.get.side_effect = _get
+        _cluster_status.return_value = [
+            {"name": "postgresql-k8s-0", "role": "leader", "state": "running"},
+            {"name": "postgresql-k8s-1", "role": "replica", "state": "streaming", "lag": 1024},
+        ]
+        patroni._endpoints = [
+            "postgresql-k8s-0.postgresql-k8s-endpoints",
+            "postgresql-k8s-1.postgresql-k8s-endpoints",
+            "postgresql-k8s-2.postgresql-k8s-endpoints",
+        ]
+
+        members_health = patroni.get_members_health()
+
+        assert members_health.keys() == {
+            "postgresql-k8s-0",
+            "postgresql-k8s-1",
+            "postgresql-k8s-2",
+        }
+        assert members_health["postgresql-k8s-0"]["healthy"]
+        assert members_health["postgresql-k8s-0"]["role"] == "primary"
+        assert members_health["postgresql-k8s-0"]["latency"] is not None
+        assert not members_health["postgresql-k8s-1"]["healthy"]
+        assert members_health["postgresql-k8s-1"]["state"] == "streaming"
+        assert members_health["postgresql-k8s-1"]["lag"] == 1024
+        assert members_health["postgresql-k8s-2"] == {
+            "role": None,
+            "state": None,
+            "lag": None,
+            "latency": None,
+            "healthy": False,
+        }
+
+
+def test_get_member_health(harness, patroni):
+    with (
+        patch("charm.Patroni.get_primary", return_value="postgresql-k8s-0"),
+        patch("charm.Patroni.cluster_status") as _cluster_status,
+        patch("patroni.AsyncClient") as _async_client,
+    ):
+        response = Mock(status_code=200)
+        response.json.return_value = {"role": "replica", "state": "streaming"}
+        _async_client.return_value.get = AsyncMock(return_value=response)
+        _cluster_status.return_value = [
+            {"name": "postgresql-k8s-0", "role": "leader", "state": "running"},
+            {"name": "postgresql-k8s-1", "role": "replica", "state": "streaming", "lag": 1024},
+        ]
+        patroni._endpoint = "postgresql-k8s-1.postgresql-k8s-endpoints"
+        patroni._endpoints = [
+            "postgresql-k8s-0.postgresql-k8s-endpoints",
+            "postgresql-k8s-1.postgresql-k8s-endpoints",
+        ]
+
+        member_health = patroni.get_member_health()
+
+        # Only this member is probed, as a replica.
+        _async_client.return_value.get.assert_awaited_once()
+        assert _async_client.return_value.get.call_args.args[0].endswith(
+            "postgresql-k8s-1.postgresql-k8s-endpoints:8008/replica?lag=100MB"
+        )
+        assert member_health["healthy"]
+        assert member_health["state"] == "streaming"
+        assert member_health["lag"] == 1024
+
+
 def test_is_replication_healthy(harness, patroni):
     with (
-        patch("requests.get") as _get,
-        patch("charm.Patroni.get_primary"),
+        patch("charm.Patroni.get_members_health") as _get_members_health,
+        patch("charm.Patroni.get_primary", return_value="postgresql-k8s-0") as _get_primary,
         patch("patroni.stop_after_delay", return_value=stop_after_delay(0)),
     ):
         # Test when replication is healthy.
-        _get.return_value.status_code = 200
+        _get_members_health.return_value = {
+            "postgresql-k8s-0": {"healthy": True},
+            "postgresql-k8s-1": {"healthy": True},
+        }
         assert patroni.is_replication_healthy
 
         # Test when replication is not healthy.
-        _get.side_effect = [
-            MagicMock(status_code=200),
-            MagicMock(status_code=200),
-            MagicMock(status_code=503),
-        ]
+        _get_members_health.return_value = {
+            "postgresql-k8s-0": {"healthy": True},
+            "postgresql-k8s-1": {"healthy": False},
+        }
         assert not patroni.is_replication_healthy
 
+        # Test when there is no primary (the members would all look like healthy replicas).
+        _get_members_health.reset_mock()
+        _get_members_health.return_value = {
+            "postgresql-k8s-0": {"healthy": True},
+            "postgresql-k8s-1": {"healthy": True},
+        }
+        _get_primary.return_value = None
+        assert not patroni.is_replication_healthy
+        _get_members_health.assert_not_called()
+
 
 def test_member_streaming(harness, patroni):
     with (
-        patch("requests.get") as _get,
+        patch("requests.Session.get") as _get,
         patch("patroni.stop_after_delay", return_value=stop_after_delay(0)),
     ):
         # Test when the member is streaming from primary.
@@ -172,6 +372,72 @@ def test_member_streaming(harness, patroni):
         assert not patroni.member_streaming
 
 
+def test_bulk_update_parameters_controller_by_patroni(harness, patroni):
+    with (
+        patch("requests.Session.get") as _get,
+        patch("requests.Session.patch") as _patch,
+    ):
+        current_config = {
+            "loop_wait": 10,
+            "synchronous_node_count": 1,
+            "postgresql": {
+                "remove_data_directory_on_rewind_failure": False,
+                "remove_data_directory_on_diverged_timelines": False,
+                "parameters": {"max_connections": 100, "wal_keep_size": 4096},
+            },
+        }
+        _get.return_value.json.return_value = current_config
+
+        # Test that the DCS is not patched when the configuration is already applied.
+        patroni.bulk_update_parameters_controller_by_patroni(
+            {"max_connections": 100}, {"synchronous_node_count": 1}
+        )
+        _get.assert_called_once()
+        _patch.assert_not_called()
+
+        # Test that the current configuration isn't retrieved again once it's known.
+        _get.reset_mock()
+        patroni.bulk_update_parameters_controller_by_patroni(
+            {"max_connections": 100}, {"synchronous_node_count": 1}
+        )
+        _get.assert_not_called()
+        _patch.assert_not_called()
+
+        # Test that the DCS is patched when a value changed.
+        patroni.bulk_update_parameters_controller_by_patroni(
+            {"max_connections": 200}, {"synchronous_node_count": 1}
+        )
+        _get.assert_not_called()
+        _patch.assert_called_once_with(
+            "http://postgresql-k8s-0:8008/config",
+            verify=True,
+            json={
+                "postgresql": {
+                    "remove_data_directory_on_rewind_failure": False,
+                    "remove_data_directory_on_diverged_timelines": False,
+                    "parameters": {"max_connections": 200},
+                },
+                "synchronous_node_count": 1,
+            },
+            auth=patroni._patroni_auth,
+            timeout=PATRONI_TIMEOUT,
+        )
+
+        # Test that the DCS is patched when the current configuration can't be retrieved.
+        _patch.reset_mock()
+        harness.charm._stored.patroni_dcs_config_hash = None
+        _get.side_effect = requests.ConnectionError
+        patroni.bulk_update_parameters_controller_by_patroni({"max_connections": 100}, None)
+        _patch.assert_called_once()
+
+        # Test that the configuration is applied again when the patch fails.
+        _patch.reset_mock()
+        _patch.return_value.raise_for_status.side_effect = requests.HTTPError
+        with patch("tenacity.sleep"), pytest.raises(RetryError):
+            patroni.bulk_update_parameters_controller_by_patroni({"max_connections": 300}, None)
+        assert _patch.call_count == 3
+
+
 def test_render_file(harness, patroni):
     with (
         patch("os.chmod") as _chmod,
@@ -190,10 +456,10 @@ def test_render_file(harness, patroni):
             _pwnam.return_value.pw_uid = 35
             _pwnam.return_value.pw_gid = 35
             # Call the method using a temporary configuration file.
-            patroni._render_file(filename, "rendered-content", 0o640)
+            assert patroni._render_file(filename, "rendered-content", 0o640)
 
         # Check the rendered file is opened with "w+" mode.
-        assert mock.call_args_list[0][0] == (filename, "w+")
+        assert mock.call_args_list[-1][0] == (filename, "w+")
         # Ensure that the correct user is lookup up.
         _pwnam.assert_called_with("postgres")
         # Ensure the file is chmod'd correctly.
@@ -201,6 +467,14 @@ def test_render_file(harness, patroni):
         # Ensure the file is chown'd correctly.
         _chown.assert_called_with(filename, uid=35, gid=35)
 
+        # Test that the file is not written again when its content didn't change.
+        _chmod.reset_mock()
+        mock = mock_open(read_data="rendered-content")
+        with patch("builtins.open", mock, create=True):
+            assert not patroni._render_file(filename, "rendered-content", 0o640)
+        mock.assert_called_once_with(filename)
+        _chmod.assert_not_called()
+
 
 def test_render_patroni_yml_file(harness, patroni):
     with (
@@ -229,17 +503,8 @@ def test_render_patroni_yml_file(harness, patroni):
             patroni_password=patroni._patroni_password,
         )
 
-        # Setup a mock for the `open` method, set returned data to postgresql.conf template.
-        with open("templates/patroni.yml.j2") as f:
-            mock = mock_open(read_data=f.read())
-
-        # Patch the `open` method with our mock.
-        with patch("builtins.open", mock, create=True):
-            # Call the method
-            patroni.render_patroni_yml_file(enable_tls=False)
+        patroni.render_patroni_yml_file(enable_tls=False)
 
-        # Check the template is opened read-only in the call to open.
-        assert mock.call_args_list[0][0] == ("templates/patroni.yml.j2",)
         # Ensure the correct rendered template is sent to _render_file method.
         _render_file.assert_called_once_with(
             f"{STORAGE_PATH}/patroni.yml",
@@ -266,10 +531,7 @@ def test_render_patroni_yml_file(harness, patroni):
         )
         assert expected_content_with_tls != expected_content
 
-        # Patch the `open` method with our mock.
-        with patch("builtins.open", mock, create=True):
-            # Call the method
-            patroni.render_patroni_yml_file(enable_tls=True)
+        patroni.render_patroni_yml_file(enable_tls=True)
 
         # Ensure the correct rendered template is sent to _render_file method.
         _render_file.assert_called_once_with(
@@ -286,11 +548,88 @@ def test_render_patroni_yml_file(harness, patroni):
         assert "ssl_key_file: /var/lib/postgresql/data/key.pem" in expected_content_with_tls
 
 
+def test_render_patroni_yml_file_unchanged_values(harness, patroni, tmp_path):
+    with (
+        patch(
+            "charm.Patroni.rock_postgresql_version", new_callable=PropertyMock
+        ) as _rock_postgresql_version,
+        patch("charm.Patroni._render_file") as _render_file,
+        patch("patroni.render_template", return_value="rendered-content") as _render_template,
+    ):
+        _rock_postgresql_version.return_value = "14.7"
+        patroni._storage_path = str(tmp_path)
+        (tmp_path / "patroni.yml").write_text("rendered-content")
+
+        values_hash = patroni.render_patroni_yml_file(enable_tls=False)
+        _render_file.assert_called_once_with(f"{tmp_path}/patroni.yml", "rendered-content", 0o644)
+
+        # The template isn't rendered again while the values are the same.
+        _render_template.reset_mock()
+        _render_file.reset_mock()
+        assert patroni.render_patroni_yml_file(enable_tls=False) == values_hash
+        _render_template.assert_not_called()
+        _render_file.assert_not_called()
+
+        # Nor when the file is missing or the values changed.
+        (tmp_path / "patroni.yml").unlink()
+        assert patroni.render_patroni_yml_file(enable_tls=False) == values_hash
+        _render_file.assert_called_once()
+        _render_file.reset_mock()
+        assert patroni.render_patroni_yml_file(enable_tls=True) != values_hash
+        _render_file.assert_called_once()
+
+
+def test_render_patroni_yml_file_restore(harness, patroni):
+    with (
+        patch(
+            "charm.Patroni.rock_postgresql_version", new_callable=PropertyMock
+        ) as _rock_postgresql_version,
+        patch("charm.Patroni._render_file") as _render_file,
+    ):
+        _rock_postgresql_version.return_value = "14.7"
+
+        # Test the restore into an empty data directory.
+        patroni.render_patroni_yml_file(backup_id="20230101-090000F", restore_stanza="test")
+        bootstrap = yaml.safe_load(_render_file.call_args.args[1])["bootstrap"]
+        assert bootstrap["method"] == "pgbackrest"
+        assert bootstrap["pgbackrest"]["command"].split() == [
+            "pgbackrest",
+            "--stanza=test",
+            f"--pg1-path={STORAGE_PATH}/pgdata",
+            "--log-level-file=detail",
+            "--set=20230101-090000F",
+            "--target-action=promote",
+            "--type=immediate",
+            "restore",
+        ]
+
+        # Test the delta restore over the previous data files.
+        patroni.render_patroni_yml_file(
+            backup_id="20230101-090000F", restore_stanza="test", restore_delta=True
+        )
+        bootstrap = yaml.safe_load(_render_file.call_args.args[1])["bootstrap"]
+        command = shlex.split(bootstrap["pgbackrest"]["command"])
+        assert command[:5] == [
+            "bash",
+            "-c",
+            '[ ! -d "$0" ] || { rm -rf "$1" && mv "$0" "$1"; }; shift; exec "$@"',
+            f"{STORAGE_PATH}/pgdata-restore",
+            f"{STORAGE_PATH}/pgdata",
+        ]
+        assert command[5:10] == [
+            "pgbackrest",
+            "--stanza=test",
+            f"--pg1-path={STORAGE_PATH}/pgdata",
+            "--log-level-file=detail",
+            "--delta",
+        ]
+
+
 def test_primary_endpoint_ready(harness, patroni):
     with (
         patch("patroni.stop_after_delay", return_value=stop_after_delay(0)),
         patch("patroni.wait_fixed", return_value=wait_fixed(0)),
-        patch("requests.get") as _get,
+        patch("requests.Session.get") as _get,
     ):
         # Test with an issue when trying to connect to the Patroni API.
         _get.side_effect = RetryError
@@ -308,10 +647,23 @@ def test_primary_endpoint_ready(harness, patroni):
         assert patroni.primary_endpoint_ready
 
 
+def test_reset_database_connections(harness, patroni):
+    with patch("requests.Session.post"):
+        # Test that the database client isn't created only to close its connections.
+        assert "postgresql" not in harness.charm.__dict__
+        patroni.restart_postgresql()
+        assert "postgresql" not in harness.charm.__dict__
+
+        # Test that the connections of the client used in the hook are closed.
+        harness.charm.__dict__["postgresql"] = postgresql = Mock()
+        patroni.restart_postgresql()
+        postgresql.close_connections.assert_called_once_with()
+
+
 def test_switchover(harness, patroni):
     with (
         patch("patroni.stop_after_delay", return_value=tenacity.stop_after_delay(0)),
-        patch("requests.post") as _post,
+        patch("requests.Session.post") as _post,
         patch("patroni.Patroni.get_primary") as _get_primary,
     ):
         # Test a successful switchover.
@@ -378,7 +730,7 @@ def test_switchover(harness, patroni):
 
 def test_member_started_true(patroni):
     with (
-        patch("patroni.requests.get") as _get,
+        patch("requests.Session.get") as _get,
         patch("patroni.stop_after_delay", return_value=tenacity.stop_after_delay(0)),
         patch("patroni.wait_fixed", return_value=tenacity.wait_fixed(0)),
     ):
@@ -396,7 +748,7 @@ def test_member_started_true(patroni):
 
 def test_member_started_false(patroni):
     with (
-        patch("patroni.requests.get") as _get,
+        patch("requests.Session.get") as _get,
         patch("patroni.stop_after_delay", return_value=tenacity.stop_after_delay(0)),
         patch("patroni.wait_fixed", return_value=tenacity.wait_fixed(0)),
     ):
@@ -414,7 +766,7 @@ def test_member_started_false(patroni):
 
 def test_member_started_error(patroni):
     with (
-        patch("patroni.requests.get") as _get,
+        patch("requests.Session.get") as _get,
         patch("patroni.stop_after_delay", return_value=tenacity.stop_after_delay(0)),
         patch("patroni.wait_fixed", return_value=tenacity.wait_fixed(0)),
     ):
@@ -462,7 +814,7 @@ def test_update_synchronous_node_count(harness, patroni):
     with (
         patch("patroni.stop_after_delay", return_value=stop_after_delay(0)) as _wait_fixed,
         patch("patroni.wait_fixed", return_value=wait_fixed(0)) as _wait_fixed,
-        patch("requests.patch") as _patch,
+        patch("requests.Session.patch") as _patch,
     ):
         response = _patch.return_value
         response.status_code = 200
@@ -486,7 +838,7 @@ def test_update_synchronous_node_count(harness, patroni):
 
 def test_set_failsafe_mode(harness, patroni):
     with (
-        patch("requests.patch") as _patch,
+        patch("requests.Session.patch") as _patch,
     ):
         patroni.set_failsafe_mode()
 
@@ -501,7 +853,7 @@ def test_set_failsafe_mode(harness, patroni):
 
 def test_set_max_timelines_history(harness, patroni):
     with (
-        patch("requests.patch") as _patch,
+        patch("requests.Session.patch") as _patch,
     ):
         patroni.set_max_timelines_history()
 
@@ -522,7 +874,7 @@ def test_reload_patroni_configuration(harness, patroni):
         # Can't connect
         harness.set_can_connect("postgresql", False)
 
-        patroni.reload_patroni_configuration()
+        assert not patroni.reload_patroni_configuration()
 
         assert not _send_signal.called
         assert not _pebble.get_services.called
@@ -531,7 +883,7 @@ def test_reload_patroni_configuration(harness, patroni):
         harness.set_can_connect("postgresql", True)
         _pebble.get_services.return_value = []
 
-        patroni.reload_patroni_configuration()
+        assert not patroni.reload_patroni_configuration()
 
         assert not _send_signal.called
         _pebble.get_services.assert_called_once_with(names=["postgresql"])
@@ -542,7 +894,7 @@ def test_reload_patroni_configuration(harness, patroni):
         mock_svc.is_running.return_value = False
         _pebble.get_services.return_value = [mock_svc]
 
-        patroni.reload_patroni_configuration()
+        assert not patroni.reload_patroni_configuration()
 
         assert not _send_signal.called
         _pebble.get_services.assert_called_once_with(names=["postgresql"])
@@ -551,6 +903,6 @@ def test_reload_patroni_configuration(harness, patroni):
         # Reload
         mock_svc.is_running.return_value = True
 
-        patroni.reload_patroni_configuration()
+        assert patroni.reload_patroni_configuration()
 
         _send_signal.assert_called_once_with(SIGHUP, "postgresql")
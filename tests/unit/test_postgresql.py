@@ -1,17 +1,28 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
-from unittest.mock import call, patch
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, call, patch
 
 import psycopg2
 import pytest
 from charms.postgresql_k8s.v0.postgresql import (
     ACCESS_GROUP_INTERNAL,
     ACCESS_GROUPS,
+    EXTENSIONS_MAX_WORKERS,
     PERMISSIONS_GROUP_ADMIN,
+    REASSIGNABLE_OWNERS_QUERY,
     PostgreSQLCreateDatabaseError,
+    PostgreSQLCreateUserError,
+    PostgreSQLEnableDisableExtensionError,
     PostgreSQLGetLastArchivedWALError,
+    PostgreSQLListUsersError,
 )
 from ops.testing import Harness
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_UNKNOWN,
+)
 from psycopg2.sql import SQL, Composed, Identifier, Literal
 
 from charm import PostgresqlOperatorCharm
@@ -76,9 +87,15 @@ def test_create_database(harness):
         patch(
             "charms.postgresql_k8s.v0.postgresql.PostgreSQL._generate_database_privileges_statements"
         ) as _generate_database_privileges_statements,
+        patch(
+            "charms.postgresql_k8s.v0.postgresql.PostgreSQL._transfer_ownership"
+        ) as _transfer_ownership,
         patch(
             "charms.postgresql_k8s.v0.postgresql.PostgreSQL._connect_to_database"
         ) as _connect_to_database,
+        patch(
+            "charms.postgresql_k8s.v0.postgresql.PostgreSQL._release_connection"
+        ) as _release_connection,
     ):
         # Test a successful database creation.
         database = "test_database"
@@ -92,7 +109,7 @@ def test_create_database(harness):
         client_relations = [database_relation]
         schemas = [("test_schema_1",), ("test_schema_2",)]
         _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value.fetchall.return_value = schemas
-        harness.charm.postgresql.create_database(database, user, plugins, client_relations)
+        assert harness.charm.postgresql.create_database(database, user, plugins, client_relations)
         execute = _connect_to_database.return_value.cursor.return_value.execute
         execute.assert_has_calls([
             call(
@@ -169,13 +186,20 @@ def test_create_database(harness):
         _generate_database_privileges_statements.assert_called_once_with(
             1, [schemas[0][0], schemas[1][0]], user
         )
+        _transfer_ownership.assert_called_once_with(
+            _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value,
+            user,
+        )
         _enable_disable_extensions.assert_called_once_with(
             {plugins[0]: True, plugins[1]: True}, database
         )
+        # The connection to the new database isn't kept.
+        _release_connection.assert_called_once_with(database)
 
         # Test when two relations request the same database.
         _connect_to_database.reset_mock()
         _generate_database_privileges_statements.reset_mock()
+        _transfer_ownership.reset_mock()
         with harness.hooks_disabled():
             other_rel_id = harness.add_relation("database", "other-application")
             harness.add_relation_unit(other_rel_id, "other-application/0")
@@ -186,6 +210,19 @@ def test_create_database(harness):
         _generate_database_privileges_statements.assert_called_once_with(
             2, [schemas[0][0], schemas[1][0]], user
         )
+        # The objects are only transferred to the user of a single relation.
+        _transfer_ownership.assert_not_called()
+
+        # Test when the transfer of the ownership of the objects runs out of time.
+        _enable_disable_extensions.reset_mock()
+        _generate_database_privileges_statements.reset_mock()
+        _transfer_ownership.return_value = False
+        assert not harness.charm.postgresql.create_database(
+            database, user, plugins, [database_relation]
+        )
+        _transfer_ownership.assert_called_once()
+        _generate_database_privileges_statements.assert_not_called()
+        _enable_disable_extensions.assert_not_called()
 
         # Test a failed database creation.
         _enable_disable_extensions.reset_mock()
@@ -196,6 +233,7 @@ def test_create_database(harness):
         except PostgreSQLCreateDatabaseError:
             pass
         _enable_disable_extensions.assert_not_called()
+        assert _release_connection.call_count == 4
 
 
 def test_grant_internal_access_group_memberships(harness):
@@ -237,35 +275,6 @@ def test_generate_database_privileges_statements(harness):
     assert harness.charm.postgresql._generate_database_privileges_statements(
         1, ["test_schema_1", "test_schema_2"], "test_user"
     ) == [
-        Composed([
-            SQL(
-                "DO $$\nDECLARE r RECORD;\nBEGIN\n  FOR r IN (SELECT statement FROM (SELECT 1 AS index,'ALTER TABLE '|| schemaname || '.\"' || tablename ||'\" OWNER TO "
-            ),
-            Identifier("test_user"),
-            SQL(
-                ";' AS statement\nFROM pg_tables WHERE NOT schemaname IN ('pg_catalog', 'information_schema')\nUNION SELECT 2 AS index,'ALTER SEQUENCE '|| sequence_schema || '.\"' || sequence_name ||'\" OWNER TO "
-            ),
-            Identifier("test_user"),
-            SQL(
-                ";' AS statement\nFROM information_schema.sequences WHERE NOT sequence_schema IN ('pg_catalog', 'information_schema')\nUNION SELECT 3 AS index,'ALTER FUNCTION '|| nsp.nspname || '.\"' || p.proname ||'\"('||pg_get_function_identity_arguments(p.oid)||') OWNER TO "
-            ),
-            Identifier("test_user"),
-            SQL(
-                ";' AS statement\nFROM pg_proc p JOIN pg_namespace nsp ON p.pronamespace = nsp.oid WHERE NOT nsp.nspname IN ('pg_catalog', 'information_schema') AND p.prokind = 'f'\nUNION SELECT 4 AS index,'ALTER PROCEDURE '|| nsp.nspname || '.\"' || p.proname ||'\"('||pg_get_function_identity_arguments(p.oid)||') OWNER TO "
-            ),
-            Identifier("test_user"),
-            SQL(
-                ";' AS statement\nFROM pg_proc p JOIN pg_namespace nsp ON p.pronamespace = nsp.oid WHERE NOT nsp.nspname IN ('pg_catalog', 'information_schema') AND p.prokind = 'p'\nUNION SELECT 5 AS index,'ALTER AGGREGATE '|| nsp.nspname || '.\"' || p.proname ||'\"('||pg_get_function_identity_arguments(p.oid)||') OWNER TO "
-            ),
-            Identifier("test_user"),
-            SQL(
-                ";' AS statement\nFROM pg_proc p JOIN pg_namespace nsp ON p.pronamespace = nsp.oid WHERE NOT nsp.nspname IN ('pg_catalog', 'information_schema') AND p.prokind = 'a'\nUNION SELECT 6 AS index,'ALTER VIEW '|| schemaname || '.\"' || viewname ||'\" OWNER TO "
-            ),
-            Identifier("test_user"),
-            SQL(
-                ";' AS statement\nFROM pg_catalog.pg_views WHERE NOT schemaname IN ('pg_catalog', 'information_schema')) AS statements ORDER BY index) LOOP\n      EXECUTE format(r.statement);\n  END LOOP;\nEND; $$;"
-            ),
-        ]),
         Composed([
             SQL(
                 "UPDATE pg_catalog.pg_largeobject_metadata\nSET lomowner = (SELECT oid FROM pg_roles WHERE rolname = "
@@ -367,6 +376,164 @@ def test_generate_database_privileges_statements(harness):
     ]
 
 
+def test_transfer_ownership(harness):
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [
+        [("relation_id_1",)],
+        [
+            ("TABLE", '"public"."table_1"'),
+            ("TABLE", '"public"."table_2"'),
+            ("SEQUENCE", '"public"."sequence_1"'),
+            ("FUNCTION", '"public"."function_1"(integer)'),
+            ("VIEW", '"public"."view_1"'),
+        ],
+    ]
+
+    def alter(kind, name):
+        return call(
+            Composed([
+                SQL("ALTER "),
+                SQL(kind),
+                SQL(" "),
+                SQL(name),
+                SQL(" OWNER TO "),
+                Identifier("test_user"),
+                SQL(";"),
+            ])
+        )
+
+    with patch("charms.postgresql_k8s.v0.postgresql.OWNERSHIP_CHUNK_SIZE", 2):
+        assert harness.charm.postgresql._transfer_ownership(cursor, "test_user")
+    calls = cursor.execute.call_args_list
+    assert calls[0].args[0].seq[1] == Literal([
+        "test_user",
+        USER,
+        PERMISSIONS_GROUP_ADMIN,
+        *SYSTEM_USERS,
+    ])
+    # The role owning objects only in this database hands them over at once.
+    assert calls[1] == call(
+        Composed([
+            SQL("REASSIGN OWNED BY "),
+            Identifier("relation_id_1"),
+            SQL(" TO "),
+            Identifier("test_user"),
+            SQL(";"),
+        ])
+    )
+    # The other objects are transferred in chunks.
+    assert calls[3:] == [
+        call(SQL("BEGIN;")),
+        alter("TABLE", '"public"."table_1"'),
+        alter("TABLE", '"public"."table_2"'),
+        call(SQL("COMMIT;")),
+        call(SQL("BEGIN;")),
+        alter("SEQUENCE", '"public"."sequence_1"'),
+        alter("FUNCTION", '"public"."function_1"(integer)'),
+        call(SQL("COMMIT;")),
+        call(SQL("BEGIN;")),
+        alter("VIEW", '"public"."view_1"'),
+        call(SQL("COMMIT;")),
+    ]
+
+    # A chunk is committed once it takes longer than its time budget.
+    cursor.reset_mock()
+    cursor.fetchall.side_effect = [
+        [],
+        [("TABLE", '"public"."table_1"'), ("TABLE", '"public"."table_2"')],
+    ]
+    with patch("charms.postgresql_k8s.v0.postgresql.OWNERSHIP_CHUNK_SECONDS", 0):
+        harness.charm.postgresql._transfer_ownership(cursor, "test_user")
+    assert cursor.execute.call_args_list[2:] == [
+        call(SQL("BEGIN;")),
+        alter("TABLE", '"public"."table_1"'),
+        call(SQL("COMMIT;")),
+        call(SQL("BEGIN;")),
+        alter("TABLE", '"public"."table_2"'),
+        call(SQL("COMMIT;")),
+    ]
+
+    # The transfer stops after its time budget, to be resumed later.
+    cursor.reset_mock()
+    cursor.fetchall.side_effect = [
+        [],
+        [("TABLE", '"public"."table_1"'), ("TABLE", '"public"."table_2"')],
+    ]
+    with (
+        patch("charms.postgresql_k8s.v0.postgresql.OWNERSHIP_CHUNK_SIZE", 1),
+        patch("charms.postgresql_k8s.v0.postgresql.OWNERSHIP_TRANSFER_SECONDS", 0),
+    ):
+        assert not harness.charm.postgresql._transfer_ownership(cursor, "test_user")
+    assert cursor.execute.call_args_list[2:] == [
+        call(SQL("BEGIN;")),
+        alter("TABLE", '"public"."table_1"'),
+        call(SQL("COMMIT;")),
+    ]
+
+    # A failed chunk is rolled back, so the connection can be reused.
+    cursor.reset_mock()
+    cursor.fetchall.side_effect = [[], [("TABLE", '"public"."table_1"')]]
+    cursor.execute.side_effect = [None, None, None, psycopg2.Error, None]
+    with pytest.raises(psycopg2.Error):
+        harness.charm.postgresql._transfer_ownership(cursor, "test_user")
+    assert cursor.execute.call_args_list[2:] == [
+        call(SQL("BEGIN;")),
+        alter("TABLE", '"public"."table_1"'),
+        call(SQL("ROLLBACK;")),
+    ]
+    cursor.execute.side_effect = None
+
+    # Nothing is done when the user already owns everything.
+    cursor.reset_mock()
+    cursor.fetchall.side_effect = [[], []]
+    assert harness.charm.postgresql._transfer_ownership(cursor, "test_user")
+    assert cursor.execute.call_count == 2
+
+
+def test_transfer_ownership_mixed_owners(harness):
+    # Only the roles owning nothing but the objects the ALTER statements handle are
+    # reassigned at once.
+    assert (
+        "o.classid NOT IN ('pg_catalog.pg_class'::regclass, 'pg_catalog.pg_proc'::regclass)"
+        in REASSIGNABLE_OWNERS_QUERY
+    )
+    assert "c.relkind NOT IN ('r', 'p', 'S', 'v')" in REASSIGNABLE_OWNERS_QUERY
+
+    # relation_id_1 owns only a table, so it's reassigned, while relation_id_2 also owns a
+    # schema, so its table is transferred with an ALTER statement (and the schema kept).
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [
+        [("relation_id_1",)],
+        [("TABLE", '"relation_2_schema"."table_2"')],
+    ]
+    assert harness.charm.postgresql._transfer_ownership(cursor, "test_user")
+    calls = cursor.execute.call_args_list
+    assert calls[1] == call(
+        Composed([
+            SQL("REASSIGN OWNED BY "),
+            Identifier("relation_id_1"),
+            SQL(" TO "),
+            Identifier("test_user"),
+            SQL(";"),
+        ])
+    )
+    assert calls[3:] == [
+        call(SQL("BEGIN;")),
+        call(
+            Composed([
+                SQL("ALTER "),
+                SQL("TABLE"),
+                SQL(" "),
+                SQL('"relation_2_schema"."table_2"'),
+                SQL(" OWNER TO "),
+                Identifier("test_user"),
+                SQL(";"),
+            ])
+        ),
+        call(SQL("COMMIT;")),
+    ]
+
+
 def test_get_last_archived_wal(harness):
     with patch(
         "charms.postgresql_k8s.v0.postgresql.PostgreSQL._connect_to_database"
@@ -390,6 +557,30 @@ def test_get_last_archived_wal(harness):
         execute.assert_called_once_with("SELECT last_archived_wal FROM pg_stat_archiver;")
 
 
+def test_list_accessible_databases_for_users(harness):
+    with patch(
+        "charms.postgresql_k8s.v0.postgresql.PostgreSQL._connect_to_database"
+    ) as _connect_to_database:
+        # Test a successful call.
+        cursor = _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [
+            ("operator", True, []),
+            ("relation_id_2", False, ["db1", "db2"]),
+            ("relation_id_3", False, []),
+        ]
+        assert harness.charm.postgresql.list_accessible_databases_for_users() == {
+            "operator": {"all"},
+            "relation_id_2": {"db1", "db2"},
+            "relation_id_3": set(),
+        }
+        cursor.execute.assert_called_once()
+
+        # Test a failed call.
+        cursor.execute.side_effect = psycopg2.Error
+        with pytest.raises(PostgreSQLListUsersError):
+            harness.charm.postgresql.list_accessible_databases_for_users()
+
+
 def test_build_postgresql_group_map(harness):
     assert harness.charm.postgresql.build_postgresql_group_map(None) == []
     assert harness.charm.postgresql.build_postgresql_group_map("ldap_group=admin") == []
@@ -506,28 +697,333 @@ def test_configure_pgaudit(harness):
         ])
 
 
+def test_create_users(harness):
+    with (
+        patch(
+            "charms.postgresql_k8s.v0.postgresql.PostgreSQL._connect_to_database"
+        ) as _connect_to_database,
+        patch(
+            "charms.postgresql_k8s.v0.postgresql.PostgreSQL.list_valid_privileges_and_roles",
+            return_value=({"createdb"}, {"relation_access", "readers"}),
+        ),
+    ):
+        cursor = _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [("existing",)]
+
+        # Test that all the users are created or updated in a single transaction.
+        harness.charm.postgresql.create_users({
+            "existing": ("password1", None),
+            "new": ("password2", ["createdb", "readers"]),
+        })
+        assert cursor.execute.call_args_list == [
+            call(
+                SQL("SELECT rolname FROM pg_roles WHERE rolname = ANY({});").format(
+                    Literal(["existing", "new"])
+                )
+            ),
+            call(SQL("BEGIN;")),
+            call(SQL("SET LOCAL log_statement = 'none';")),
+            call(
+                SQL("ALTER ROLE {}WITH LOGIN ENCRYPTED PASSWORD 'password1';").format(
+                    Identifier("existing")
+                )
+            ),
+            call(
+                SQL("CREATE ROLE {}WITH LOGIN ENCRYPTED PASSWORD 'password2' createdb;").format(
+                    Identifier("new")
+                )
+            ),
+            call(SQL("GRANT {} TO {};").format(Identifier("readers"), Identifier("new"))),
+            call(SQL("COMMIT;")),
+        ]
+
+        # Test that no user is created when one of them has invalid extra user roles.
+        cursor.execute.reset_mock()
+        with pytest.raises(PostgreSQLCreateUserError):
+            harness.charm.postgresql.create_users({
+                "new": ("password", None),
+                "invalid": ("password", ["invalid_privilege"]),
+            })
+        assert call(SQL("BEGIN;")) not in cursor.execute.call_args_list
+
+
+def test_create_users_fallback(harness):
+    with patch("charms.postgresql_k8s.v0.postgresql.psycopg2.connect") as _connect:
+        connection = MagicMock(closed=0)
+        connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+        connection.__enter__.return_value = connection
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        # The connection reaches the primary.
+        cursor.fetchone.return_value = (False,)
+        statements = []
+
+        def execute(statement):
+            statements.append(statement)
+            if statement == SQL("ROLLBACK;"):
+                connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+            elif "CREATE ROLE" in repr(statement) and "invalid" in repr(statement):
+                # The error aborts the transaction opened by the batch.
+                connection.info.transaction_status = TRANSACTION_STATUS_INERROR
+                raise psycopg2.Error
+
+        cursor.execute.side_effect = execute
+        _connect.return_value = connection
+        postgresql = harness.charm.postgresql
+
+        # Test that the users can be created one by one on the same connection after the
+        # batch failed.
+        with pytest.raises(PostgreSQLCreateUserError):
+            postgresql.create_users({"valid": ("password", None), "invalid": ("password", None)})
+        statements.clear()
+        postgresql.create_user("valid", "password")
+        assert statements[:2] == [SQL("ROLLBACK;"), SQL("SELECT pg_is_in_recovery();")]
+        assert statements[-1] == SQL("COMMIT;")
+        assert postgresql.connections_opened == 1
+
+
+def test_enable_disable_extensions(harness):
+    with (
+        patch("charms.postgresql_k8s.v0.postgresql.psycopg2.connect") as _connect,
+        patch(
+            "charms.postgresql_k8s.v0.postgresql.PostgreSQL._configure_pgaudit"
+        ) as _configure_pgaudit,
+    ):
+        postgresql = harness.charm.postgresql
+        installed = {
+            "postgres": {"plpgsql"},
+            "db1": {"plpgsql", "pg_trgm"},
+            "db2": {"plpgsql", "pg_trgm", "pgaudit"},
+        }
+        pgaudit_log = ["ROLE,DDL,MISC,MISC_SET"]
+        statements = {}
+        failing = set()
+
+        def connect(dsn, **kwargs):
+            database = dsn.split("'")[1]
+            connection = MagicMock(closed=0)
+            connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+            connection.__enter__.return_value = connection
+            cursor = connection.cursor.return_value.__enter__.return_value
+
+            def execute(query):
+                if query == SQL("SELECT pg_is_in_recovery();"):
+                    cursor.fetchone.return_value = (False,)
+                elif "pg_database" in query:
+                    cursor.fetchall.return_value = [(database,) for database in installed]
+                elif "current_setting" in query:
+                    cursor.fetchone.return_value = pgaudit_log
+                elif "pg_extension" in query:
+                    cursor.fetchall.return_value = [
+                        (extension,) for extension in installed[database]
+                    ]
+                elif database in failing:
+                    raise psycopg2.Error
+                else:
+                    statements.setdefault(database, []).append(query)
+
+            cursor.execute.side_effect = execute
+            return connection
+
+        _connect.side_effect = connect
+        extensions = {
+            "fuzzystrmatch": False,
+            "plperl": False,
+            "postgis": False,
+            "pg_trgm": True,
+            "pgaudit": True,
+        }
+
+        # Test that only the missing or unwanted extensions are changed, with pgAudit
+        # disabled meanwhile.
+        postgresql.enable_disable_extensions(extensions)
+        assert statements == {
+            "postgres": [
+                "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+                "CREATE EXTENSION IF NOT EXISTS pgaudit;",
+            ],
+            "db1": ["CREATE EXTENSION IF NOT EXISTS pgaudit;"],
+        }
+        assert _configure_pgaudit.call_args_list == [call(False), call(True)]
+        # Test that the connections to the other databases are closed.
+        assert set(postgresql._connections) == {(postgresql.primary_host, postgresql.database)}
+
+        # Test that nothing is done when the extensions are already in place.
+        for database in installed:
+            installed[database] |= {"pg_trgm", "pgaudit"}
+        statements.clear()
+        _configure_pgaudit.reset_mock()
+        postgresql.enable_disable_extensions(extensions)
+        assert statements == {}
+        _configure_pgaudit.assert_not_called()
+
+        # Test that pgAudit is only reconfigured when its state changes.
+        pgaudit_log[0] = "none"
+        postgresql.enable_disable_extensions(extensions)
+        assert statements == {}
+        _configure_pgaudit.assert_called_once_with(True)
+
+        # Test on a single database.
+        pgaudit_log[0] = "ROLE,DDL,MISC,MISC_SET"
+        _configure_pgaudit.reset_mock()
+        postgresql.enable_disable_extensions({**extensions, "pg_trgm": False}, "db2")
+        assert statements == {"db2": ["DROP EXTENSION IF EXISTS pg_trgm;"]}
+        assert _configure_pgaudit.call_args_list == [call(False), call(True)]
+
+        # Test that extensions with a quoted name are compared to their unquoted name.
+        statements.clear()
+        _configure_pgaudit.reset_mock()
+        postgresql.enable_disable_extensions({**extensions, '"uuid-ossp"': True}, "db2")
+        assert statements == {"db2": ['CREATE EXTENSION IF NOT EXISTS "uuid-ossp";']}
+        installed["db2"].add("uuid-ossp")
+        statements.clear()
+        postgresql.enable_disable_extensions({**extensions, '"uuid-ossp"': True}, "db2")
+        assert statements == {}
+        postgresql.enable_disable_extensions({**extensions, '"uuid-ossp"': False}, "db2")
+        assert statements == {"db2": ['DROP EXTENSION IF EXISTS "uuid-ossp";']}
+        installed["db2"].remove("uuid-ossp")
+        statements.clear()
+        postgresql.enable_disable_extensions({**extensions, '"uuid-ossp"': False}, "db2")
+        assert statements == {}
+
+        # Test when an extension fails to be created.
+        installed["db1"] = set()
+        failing.add("db1")
+        with pytest.raises(PostgreSQLEnableDisableExtensionError):
+            postgresql.enable_disable_extensions(extensions)
+
+
 def test_validate_group_map(harness):
     with patch(
         "charms.postgresql_k8s.v0.postgresql.PostgreSQL._connect_to_database"
     ) as _connect_to_database:
-        execute = _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value.execute
-        _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value.fetchone.return_value = None
+        cursor = _connect_to_database.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
 
-        query = SQL("SELECT TRUE FROM pg_roles WHERE rolname={};")
+        query = SQL("SELECT rolname FROM pg_roles WHERE rolname = ANY({});")
 
         assert harness.charm.postgresql.validate_group_map(None) is True
 
         assert harness.charm.postgresql.validate_group_map("") is False
         assert harness.charm.postgresql.validate_group_map("ldap_group=") is False
-        execute.assert_has_calls([
-            call(query.format(Literal(""))),
-        ])
+        cursor.execute.assert_called_once_with(query.format(Literal([""])))
 
+        cursor.fetchall.return_value = [("admin",)]
         assert harness.charm.postgresql.validate_group_map("ldap_group=admin") is True
         assert harness.charm.postgresql.validate_group_map("ldap_group=admin,") is False
         assert harness.charm.postgresql.validate_group_map("ldap_group admin") is False
 
-        assert harness.charm.postgresql.validate_group_map("ldap_group=missing_group") is False
-        execute.assert_has_calls([
-            call(query.format(Literal("missing_group"))),
-        ])
+        # Test that all the groups are validated in a single query.
+        cursor.execute.reset_mock()
+        cursor.fetchall.return_value = [("readers",)]
+        assert (
+            harness.charm.postgresql.validate_group_map(
+                "ldap_group=readers,other_ldap_group=missing_group"
+            )
+            is False
+        )
+        cursor.execute.assert_called_once_with(query.format(Literal(["missing_group", "readers"])))
+
+
+def test_connection_cache(harness):
+    with patch("charms.postgresql_k8s.v0.postgresql.psycopg2.connect") as _connect:
+        connections = [MagicMock(closed=0) for _ in range(7)]
+        for connection in connections:
+            connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = (False,)
+        _connect.side_effect = connections
+        postgresql = harness.charm.postgresql
+        execute = connections[0].cursor.return_value.__enter__.return_value.execute
+
+        # Test that the connections are reused for the same host and database, once they
+        # are checked to still reach the primary.
+        assert postgresql._connect_to_database() == connections[0]
+        execute.assert_not_called()
+        assert postgresql._connect_to_database() == connections[0]
+        execute.assert_called_once_with(SQL("SELECT pg_is_in_recovery();"))
+        assert postgresql._connect_to_database(database="other") == connections[1]
+        assert postgresql.connections_opened == 2
+
+        # Test that a connection in a failed transaction is rolled back and reused.
+        def rollback(statement):
+            if statement == SQL("ROLLBACK;"):
+                connections[0].info.transaction_status = TRANSACTION_STATUS_IDLE
+
+        execute.reset_mock()
+        execute.side_effect = rollback
+        connections[0].info.transaction_status = TRANSACTION_STATUS_INERROR
+        assert postgresql._connect_to_database() == connections[0]
+        assert execute.call_args_list == [
+            call(SQL("ROLLBACK;")),
+            call(SQL("SELECT pg_is_in_recovery();")),
+        ]
+        connections[0].close.assert_not_called()
+
+        # Test that a connection still in a transaction after the rollback is replaced.
+        execute.side_effect = None
+        connections[0].info.transaction_status = TRANSACTION_STATUS_INERROR
+        assert postgresql._connect_to_database() == connections[2]
+        connections[0].close.assert_called_once_with()
+        assert postgresql.connections_opened == 3
+
+        # Test that a broken connection is replaced.
+        connections[2].info.transaction_status = TRANSACTION_STATUS_UNKNOWN
+        assert postgresql._connect_to_database() == connections[3]
+        connections[2].close.assert_called_once_with()
+        assert postgresql.connections_opened == 4
+
+        # Test that a connection failing on its first use is replaced.
+        connections[
+            3
+        ].cursor.return_value.__enter__.return_value.execute.side_effect = (
+            psycopg2.OperationalError
+        )
+        assert postgresql._connect_to_database() == connections[4]
+        connections[3].close.assert_called_once_with()
+
+        # Test that a connection to a member that is no longer the primary is replaced.
+        connections[4].cursor.return_value.__enter__.return_value.fetchone.return_value = (True,)
+        assert postgresql._connect_to_database() == connections[5]
+        connections[4].close.assert_called_once_with()
+
+        # Test that the role isn't checked for the connections to another host.
+        assert postgresql._connect_to_database(database_host="replica") == connections[6]
+        connections[6].cursor.return_value.__enter__.return_value.fetchone.return_value = (True,)
+        assert postgresql._connect_to_database(database_host="replica") == connections[6]
+
+        # Test that a connection closed by its user is opened again.
+        _connect.side_effect = None
+        connections[5].closed = 1
+        assert postgresql._connect_to_database() == _connect.return_value
+        assert postgresql.connections_opened == 8
+
+        # Test that all the connections are closed.
+        postgresql.close_connections()
+        connections[1].close.assert_called_once_with()
+        connections[6].close.assert_called_once_with()
+        assert postgresql._connections == {}
+
+
+def test_connection_cache_parallel_workers(harness):
+    def connect(*args, **kwargs):
+        connection = MagicMock(closed=0)
+        connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+        return connection
+
+    def use_database(database):
+        postgresql._connect_to_database(database=database)
+        postgresql._release_connection(database)
+
+    with patch(
+        "charms.postgresql_k8s.v0.postgresql.psycopg2.connect", side_effect=connect
+    ) as _connect:
+        postgresql = harness.charm.postgresql
+        databases = [f"database-{index}" for index in range(200)]
+
+        # Test that the connections opened by the workers are all counted and released.
+        with ThreadPoolExecutor(max_workers=EXTENSIONS_MAX_WORKERS) as executor:
+            list(executor.map(use_database, databases))
+        assert _connect.call_count == len(databases)
+        assert postgresql.connections_opened == len(databases)
+        assert postgresql._connections == {}
@@ -1,7 +1,8 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-from unittest.mock import Mock, PropertyMock, patch, sentinel
+import json
+from unittest.mock import Mock, PropertyMock, call, patch, sentinel
 
 import pytest
 from charms.postgresql_k8s.v0.postgresql import (
@@ -12,11 +13,17 @@ from charms.postgresql_k8s.v0.postgresql import (
 )
 from ops import Unit
 from ops.framework import EventBase
-from ops.model import ActiveStatus, BlockedStatus
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus
 from ops.testing import Harness
 
 from charm import PostgresqlOperatorCharm
-from constants import PEER
+from constants import (
+    OWNERSHIP_TRANSFER_MESSAGE,
+    OWNERSHIP_TRANSFERS_KEY,
+    PEER,
+    PROVIDED_REQUESTS_KEY,
+    READ_ONLY_ENDPOINTS_KEY,
+)
 
 DATABASE = "test_database"
 EXTRA_USER_ROLES = "CREATEDB,CREATEROLE"
@@ -92,7 +99,7 @@ def test_on_database_requested(harness):
             side_effect=[None, PostgreSQLCreateUserError, None, None]
         )
         postgresql_mock.create_database = PropertyMock(
-            side_effect=[None, PostgreSQLCreateDatabaseError, None]
+            side_effect=[True, PostgreSQLCreateDatabaseError, True]
         )
         postgresql_mock.get_postgresql_version = PropertyMock(
             side_effect=[
@@ -167,11 +174,185 @@ def test_on_database_requested(harness):
             "tls": "False",
         }
 
-        # BlockedStatus due to a PostgreSQLGetPostgreSQLVersionError.
+        # BlockedStatus due to a PostgreSQLGetPostgreSQLVersionError (the version is only
+        # retrieved again after PostgreSQL restarts).
+        harness.charm._invalidate_server_facts()
         request_database(harness)
         assert isinstance(harness.model.unit.status, BlockedStatus)
 
 
+def test_on_database_requested_batch(harness):
+    with (
+        patch("charm.PostgresqlOperatorCharm.update_config") as _update_config,
+        patch.object(PostgresqlOperatorCharm, "postgresql", Mock()) as postgresql_mock,
+        patch.object(EventBase, "defer") as _defer,
+        patch(
+            "charm.Patroni.primary_endpoint_ready", new_callable=PropertyMock(return_value=True)
+        ),
+        patch("relations.postgresql_provider.new_password", return_value="test-password"),
+    ):
+        postgresql_mock.get_postgresql_version.return_value = POSTGRESQL_VERSION
+        rel_id = harness.model.get_relation(RELATION_NAME).id
+        peer_rel_id = harness.model.get_relation(PEER).id
+        with harness.hooks_disabled():
+            other_rel_id = harness.add_relation(RELATION_NAME, "other-application")
+            harness.add_relation_unit(other_rel_id, "other-application/0")
+            harness.update_relation_data(
+                other_rel_id, "other-application", {"database": "other_database"}
+            )
+
+        # Test that the database requested through the other relation is also provided.
+        harness.update_relation_data(
+            rel_id, "application", {"database": DATABASE, "extra-user-roles": EXTRA_USER_ROLES}
+        )
+        _defer.assert_not_called()
+        postgresql_mock.create_users.assert_called_once_with({
+            f"relation_id_{rel_id}": (
+                "test-password",
+                [*EXTRA_USER_ROLES.lower().split(","), ACCESS_GROUP_RELATION],
+            ),
+            f"relation_id_{other_rel_id}": ("test-password", [ACCESS_GROUP_RELATION]),
+        })
+        postgresql_mock.create_user.assert_not_called()
+        assert [call.args[:2] for call in postgresql_mock.create_database.call_args_list] == [
+            (DATABASE, f"relation_id_{rel_id}"),
+            ("other_database", f"relation_id_{other_rel_id}"),
+        ]
+        postgresql_mock.get_postgresql_version.assert_called_once_with()
+        assert _update_config.call_count == 2
+        for relation_id, database in [(rel_id, DATABASE), (other_rel_id, "other_database")]:
+            relation_data = harness.get_relation_data(relation_id, harness.charm.app.name)
+            assert relation_data["database"] == database
+            assert relation_data["version"] == POSTGRESQL_VERSION
+
+        # Test that the request of the other relation is then skipped.
+        postgresql_mock.reset_mock()
+        _update_config.reset_mock()
+        event = Mock()
+        event.relation = harness.model.get_relation(RELATION_NAME, other_rel_id)
+        event.database = "other_database"
+        event.extra_user_roles = None
+        harness.charm.postgresql_client_relation._on_database_requested(event)
+        postgresql_mock.create_users.assert_not_called()
+        postgresql_mock.create_user.assert_not_called()
+        _update_config.assert_not_called()
+        assert json.loads(
+            harness.get_relation_data(peer_rel_id, harness.charm.app.name)[PROVIDED_REQUESTS_KEY]
+        ) == {
+            str(rel_id): {"database": DATABASE, "extra-user-roles": EXTRA_USER_ROLES},
+            str(other_rel_id): {"database": "other_database", "extra-user-roles": None},
+        }
+
+        # Test that a request with other extra user roles is provided again.
+        event.extra_user_roles = "createdb"
+        harness.charm.postgresql_client_relation._on_database_requested(event)
+        postgresql_mock.create_user.assert_called_once_with(
+            f"relation_id_{other_rel_id}",
+            "test-password",
+            extra_user_roles=["createdb", ACCESS_GROUP_RELATION],
+        )
+        assert json.loads(
+            harness.get_relation_data(peer_rel_id, harness.charm.app.name)[PROVIDED_REQUESTS_KEY]
+        )[str(other_rel_id)] == {"database": "other_database", "extra-user-roles": "createdb"}
+
+        # Test that the relations provided before the requests were recorded only
+        # compare the database.
+        postgresql_mock.reset_mock()
+        with harness.hooks_disabled():
+            harness.update_relation_data(
+                peer_rel_id, harness.charm.app.name, {PROVIDED_REQUESTS_KEY: ""}
+            )
+        event.extra_user_roles = None
+        harness.charm.postgresql_client_relation._on_database_requested(event)
+        postgresql_mock.create_user.assert_not_called()
+
+        # Test that the users are created one by one when they can't be created at once.
+        postgresql_mock.create_users.side_effect = PostgreSQLCreateUserError
+        with harness.hooks_disabled():
+            for relation_id in [rel_id, other_rel_id]:
+                harness.update_relation_data(relation_id, harness.charm.app.name, {"database": ""})
+        harness.charm.postgresql_client_relation._on_database_requested(event)
+        postgresql_mock.create_users.assert_called_once()
+        assert postgresql_mock.create_user.call_count == 2
+        assert postgresql_mock.create_database.call_count == 2
+
+
+def test_resume_ownership_transfers(harness):
+    with (
+        patch("charm.PostgresqlOperatorCharm.update_config") as _update_config,
+        patch(
+            "relations.postgresql_provider.PostgreSQLProvider._is_user_config_synced"
+        ) as _is_user_config_synced,
+        patch.object(PostgresqlOperatorCharm, "postgresql", Mock()) as postgresql_mock,
+        patch(
+            "charm.Patroni.primary_endpoint_ready", new_callable=PropertyMock(return_value=True)
+        ),
+        patch("relations.postgresql_provider.new_password", return_value="test-password"),
+    ):
+        postgresql_mock.get_postgresql_version.return_value = POSTGRESQL_VERSION
+        rel_id = harness.model.get_relation(RELATION_NAME).id
+        peer_rel_id = harness.model.get_relation(PEER).id
+        with harness.hooks_disabled():
+            other_rel_id = harness.add_relation(RELATION_NAME, "other-application")
+            harness.add_relation_unit(other_rel_id, "other-application/0")
+            harness.update_relation_data(
+                other_rel_id, "other-application", {"database": "other_database"}
+            )
+
+        # Test that nothing is resumed when no transfer ran out of time.
+        assert not harness.charm.postgresql_client_relation.resume_ownership_transfers()
+        postgresql_mock.create_database.assert_not_called()
+
+        # Test that the databases aren't shared while the ownership transfer of the first
+        # one runs out of time (the other one is queued after it).
+        postgresql_mock.create_database.return_value = False
+        harness.update_relation_data(rel_id, "application", {"database": DATABASE})
+        postgresql_mock.create_database.assert_called_once()
+        for relation_id in [rel_id, other_rel_id]:
+            assert "database" not in harness.get_relation_data(relation_id, harness.charm.app.name)
+        assert harness.get_relation_data(peer_rel_id, harness.charm.app.name)[
+            OWNERSHIP_TRANSFERS_KEY
+        ] == json.dumps(sorted([rel_id, other_rel_id]))
+        assert harness.model.unit.status == MaintenanceStatus(OWNERSHIP_TRANSFER_MESSAGE)
+
+        # Test that a non leader unit doesn't resume the transfers.
+        postgresql_mock.reset_mock()
+        with harness.hooks_disabled():
+            harness.set_leader(False)
+        assert not harness.charm.postgresql_client_relation.resume_ownership_transfers()
+        postgresql_mock.create_database.assert_not_called()
+
+        # Test that the configuration isn't updated while the transfer still runs out of time.
+        with harness.hooks_disabled():
+            harness.set_leader(True)
+        _update_config.reset_mock()
+        _is_user_config_synced.reset_mock()
+        assert harness.charm.postgresql_client_relation.resume_ownership_transfers()
+        postgresql_mock.create_database.assert_called_once()
+        _update_config.assert_not_called()
+        _is_user_config_synced.assert_not_called()
+
+        # Test that the transfer is resumed, and then the databases are shared.
+        postgresql_mock.reset_mock()
+        postgresql_mock.create_database.return_value = True
+        assert not harness.charm.postgresql_client_relation.resume_ownership_transfers()
+        _update_config.assert_called_once()
+        _is_user_config_synced.assert_not_called()
+        assert [call.args[:2] for call in postgresql_mock.create_database.call_args_list] == [
+            (DATABASE, f"relation_id_{rel_id}"),
+            ("other_database", f"relation_id_{other_rel_id}"),
+        ]
+        for relation_id, database in [(rel_id, DATABASE), (other_rel_id, "other_database")]:
+            assert (
+                harness.get_relation_data(relation_id, harness.charm.app.name)["database"]
+                == database
+            )
+        assert harness.get_relation_data(peer_rel_id, harness.charm.app.name)[
+            OWNERSHIP_TRANSFERS_KEY
+        ] == json.dumps([])
+        assert harness.model.unit.status == ActiveStatus()
+
+
 def test_on_relation_departed(harness):
     with patch("charm.Patroni.member_started", new_callable=PropertyMock(return_value=True)):
         peer_rel_id = harness.model.get_relation(PEER).id
@@ -222,6 +403,82 @@ def test_on_relation_broken(harness):
         postgresql_mock.delete_user.assert_not_called()
 
 
+def test_update_read_only_endpoint(harness):
+    replicas_endpoint = "postgresql-k8s-replicas.None.svc.cluster.local:5432"
+    primary_endpoint = "postgresql-k8s-primary.None.svc.cluster.local:5432"
+    rel_id = harness.model.get_relation(RELATION_NAME).id
+    peer_rel_id = harness.model.get_relation(PEER).id
+    with harness.hooks_disabled():
+        other_rel_id = harness.add_relation(RELATION_NAME, "other-application")
+        harness.add_relation_unit(other_rel_id, "other-application/0")
+        harness.update_relation_data(
+            other_rel_id,
+            "other-application",
+            {"database": DATABASE, "requested-secrets": '["read-only-uris"]'},
+        )
+        harness.update_relation_data(
+            other_rel_id, harness.charm.app.name, {"password": "test-password"}
+        )
+    provider = harness.charm.postgresql_client_relation
+
+    # Test that the endpoint (and URI when requested) is set in all the relations.
+    provider.update_read_only_endpoint()
+    assert harness.get_relation_data(rel_id, harness.charm.app.name) == {
+        "read-only-endpoints": replicas_endpoint
+    }
+    assert (
+        harness.get_relation_data(other_rel_id, harness.charm.app.name)["read-only-endpoints"]
+        == replicas_endpoint
+    )
+    assert (
+        provider.database_provides.fetch_my_relation_field(other_rel_id, "read-only-uris")
+        == f"postgresql://relation_id_{other_rel_id}:test-password@{replicas_endpoint}/{DATABASE}"
+    )
+
+    with (
+        patch.object(
+            provider.database_provides,
+            "fetch_relation_data",
+            wraps=provider.database_provides.fetch_relation_data,
+        ) as _fetch_relation_data,
+        patch.object(
+            provider.database_provides,
+            "fetch_my_relation_data",
+            wraps=provider.database_provides.fetch_my_relation_data,
+        ) as _fetch_my_relation_data,
+    ):
+        # Test that nothing is fetched or set when the endpoint didn't change.
+        provider.update_read_only_endpoint()
+        _fetch_relation_data.assert_not_called()
+        _fetch_my_relation_data.assert_not_called()
+
+        # Test that the fields of all the relations are fetched at once when it changes
+        with harness.hooks_disabled():
+            harness.remove_relation_unit(peer_rel_id, harness.charm.unit.name)
+        provider.update_read_only_endpoint()
+        # (the library itself also reads the requested database when the data is updated).
+        assert _fetch_relation_data.call_args_list[0] == call(
+            [rel_id, other_rel_id], ["requested-secrets", "database"]
+        )
+        _fetch_my_relation_data.assert_called_once_with([other_rel_id], ["password"])
+    for relation_id in [rel_id, other_rel_id]:
+        relation_data = harness.get_relation_data(relation_id, harness.charm.app.name)
+        assert relation_data["read-only-endpoints"] == primary_endpoint
+    assert (
+        provider.database_provides.fetch_my_relation_field(other_rel_id, "read-only-uris")
+        == f"postgresql://relation_id_{other_rel_id}:test-password@{primary_endpoint}/{DATABASE}"
+    )
+
+    # Test that the removed relations are forgotten.
+    with harness.hooks_disabled():
+        harness.remove_relation(rel_id)
+    provider.update_read_only_endpoint()
+    assert (
+        harness.get_relation_data(peer_rel_id, harness.charm.app.name)[READ_ONLY_ENDPOINTS_KEY]
+        == f'{{"{other_rel_id}": "{primary_endpoint}"}}'
+    )
+
+
 def test_update_tls_flag(harness):
     with (
         patch("charm.PostgreSQLTLS.get_tls_files", return_value=(None, sentinel.ca, None)),
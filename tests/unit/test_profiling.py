@@ -0,0 +1,217 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+import tenacity
+from lightkube.resources.core_v1 import Pod
+
+import profiling
+from profiling import HookProfile, _wrap, _wrap_async
+
+
+@pytest.fixture
+def profile():
+    profile = HookProfile(max_slowest_spans=2)
+    with patch("profiling.profile", profile):
+        yield profile
+
+
+def test_measure(profile):
+    with patch("profiling.time.perf_counter", side_effect=[0, 1, 2, 5, 10, 10.5, 20, 22]):
+        with profile.measure("http", "GET /cluster"):
+            pass
+        with profile.measure("k8s", "GET /api/v1/pods"):
+            pass
+        with profile.measure("http", "GET /health"):
+            pass
+        with profile.measure("exec", "wait", count=False):
+            pass
+
+    assert profile.calls == {"http": 2, "k8s": 1}
+    assert profile.durations == {"http": 1.5, "k8s": 3, "exec": 2}
+    # Only the slowest spans are kept.
+    assert [span["name"] for span in profile.summary()["slowest"]] == ["GET /api/v1/pods", "wait"]
+
+    # Test that the call is measured even when it fails.
+    with pytest.raises(ValueError), profile.measure("db", "connect"):
+        raise ValueError()
+    assert profile.calls["db"] == 1
+
+    # Test that spans are only exported when requested.
+    with patch("profiling._tracer") as _tracer:
+        with profile.measure("http", "GET /cluster"):
+            pass
+        _tracer.start_as_current_span.assert_not_called()
+
+        profile.export_spans = True
+        with profile.measure("http", "GET /cluster"):
+            pass
+        _tracer.start_as_current_span.assert_called_once_with(
+            "GET /cluster", attributes={"charm.profile.category": "http"}
+        )
+
+
+def test_write(profile, tmp_path):
+    path = tmp_path / "profile" / "hook-profile.jsonl"
+    with profile.measure("http", "GET /cluster"):
+        pass
+
+    with patch.dict(
+        "os.environ",
+        {"JUJU_DISPATCH_PATH": "hooks/config-changed", "JUJU_UNIT_NAME": "postgresql-k8s/0"},
+    ):
+        profile.write(str(path), 1024, 1)
+        profile.write(str(path), 1024, 1)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    summary = json.loads(lines[0])
+    assert summary["hook"] == "hooks/config-changed"
+    assert summary["unit"] == "postgresql-k8s/0"
+    assert summary["calls"] == {"http": 1}
+
+    # Test that the file is rotated.
+    profile.write(str(path), len(lines[0]) * 2, 1)
+    assert (tmp_path / "profile" / "hook-profile.jsonl.1").exists()
+
+    # Test that a failure to write the file doesn't raise.
+    with patch("profiling.Path.mkdir", side_effect=PermissionError):
+        profile.write(str(path), 1024, 1)
+
+
+def test_wrap(profile):
+    async def send(request):
+        return request
+
+    owner = SimpleNamespace(get=lambda request: request, send=send)
+    _wrap(owner, "get", "http", lambda request: f"GET {request}")
+    _wrap_async(owner, "send", "http", lambda request: f"POST {request}")
+
+    assert owner.get("/cluster") == "/cluster"
+    assert asyncio.run(owner.send("/switchover")) == "/switchover"
+    assert profile.calls == {"http": 2}
+    assert {span["name"] for span in profile.summary()["slowest"]} == {
+        "GET /cluster",
+        "POST /switchover",
+    }
+
+
+def test_measure_concurrent_calls(profile):
+    async def request(delay):
+        with profile.measure("http", "GET /health"):
+            await asyncio.sleep(delay)
+
+    async def concurrent_requests():
+        await asyncio.gather(request(0.1), request(0.1), request(0.1))
+
+    asyncio.run(concurrent_requests())
+
+    # The concurrent calls are counted, but their time is the wall-clock time.
+    assert profile.calls["http"] == 3
+    assert 0.1 <= profile.durations["http"] < 0.2
+
+
+def test_instrument_http_client(profile):
+    async def send(request, *args, **kwargs):
+        return request
+
+    request = SimpleNamespace(method="GET", url="http://postgresql-k8s-0:8008/cluster?x=1")
+    session = requests.Session()
+    with patch.object(session, "send", return_value="response") as _send:
+        assert profiling.instrument_http_client(session) is session
+        assert session.send(request, timeout=1) == "response"
+        _send.assert_called_once_with(request, timeout=1)
+    client = SimpleNamespace(send=send)
+    profiling.instrument_http_client(client)
+    assert asyncio.run(client.send(request)) is request
+
+    assert profile.calls == {"http": 2}
+    assert {span["name"] for span in profile.summary()["slowest"]} == {"GET /cluster"}
+    # Only the given clients are measured.
+    assert "send" not in vars(requests.Session())
+
+
+def test_instrument_k8s_client(profile):
+    client = MagicMock()
+    measured_client = profiling.instrument_k8s_client(client)
+
+    measured_client.get(Pod, name="postgresql-k8s-0")
+    measured_client.patch(res=Pod, name="postgresql-k8s-0", obj={})
+    assert measured_client.namespace is client.namespace
+
+    client.get.assert_called_once_with(Pod, name="postgresql-k8s-0")
+    client.patch.assert_called_once_with(res=Pod, name="postgresql-k8s-0", obj={})
+    assert profile.calls == {"k8s": 2}
+    assert {span["name"] for span in profile.summary()["slowest"]} == {"GET Pod", "PATCH Pod"}
+
+
+def test_instrument_database_connections(profile):
+    owner = SimpleNamespace(_open_connection=lambda database, host: f"{host}/{database}")
+    profiling.instrument_database_connections(owner, "_open_connection")
+
+    assert owner._open_connection("postgres", "localhost") == "localhost/postgres"
+    assert profile.calls == {"db": 1}
+
+
+def test_instrument_container(profile):
+    container = MagicMock()
+    process = SimpleNamespace(wait=lambda: None, wait_output=lambda: ("C", ""))
+    container.pebble.exec.return_value = process
+    execute = container.pebble.exec
+    profiling.instrument_container(container)
+
+    assert container.pebble.exec(["locale", "-a"], user="postgres") is process
+    assert process.wait_output() == ("C", "")
+    process.wait()
+
+    execute.assert_called_once_with(["locale", "-a"], user="postgres")
+    # The waits are added to the time of the command, but not counted as calls.
+    assert profile.calls == {"exec": 1}
+    assert {span["name"] for span in profile.summary()["slowest"]} == {"locale", "wait"}
+
+
+def test_retry_sleep():
+    profile = HookProfile()
+    sleeps = []
+    with (
+        patch("profiling.profile", profile),
+        patch("time.sleep", sleeps.append),
+    ):
+
+        @tenacity.retry(
+            stop=tenacity.stop_after_attempt(3),
+            wait=tenacity.wait_fixed(2),
+            sleep=profiling.retry_sleep,
+        )
+        def fail():
+            raise ValueError
+
+        # Test that the sleeps between the attempts are measured, also for the decorated
+        # functions.
+        with pytest.raises(tenacity.RetryError):
+            fail()
+        for attempt in tenacity.Retrying(
+            stop=tenacity.stop_after_attempt(2),
+            wait=tenacity.wait_fixed(1),
+            sleep=profiling.retry_sleep,
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number == 1:
+                    raise ValueError
+        assert sleeps == [2, 2, 1]
+        assert profile.calls["retry_wait"] == 3
+
+        # Test that the retries of the other libraries are left untouched.
+        for attempt in tenacity.Retrying(
+            stop=tenacity.stop_after_attempt(2), wait=tenacity.wait_fixed(1)
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number == 1:
+                    raise ValueError
+        assert sleeps == [2, 2, 1, 1]
+        assert profile.calls["retry_wait"] == 3
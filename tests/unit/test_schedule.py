@@ -0,0 +1,64 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+from datetime import datetime, timezone
+
+import pytest
+
+from schedule import CronSchedule
+
+
+def test_invalid_schedules():
+    for expression in [
+        "",
+        "0 2 * *",
+        "0 2 * * * *",
+        "60 2 * * *",
+        "0 24 * * *",
+        "0 2 0 * *",
+        "0 2 * 13 *",
+        "0 2 * * 8",
+        "0 2-1 * * *",
+        "*/0 2 * * *",
+        "a 2 * * *",
+    ]:
+        with pytest.raises(ValueError):
+            CronSchedule(expression)
+
+
+def test_matches():
+    # Every day at 2:30.
+    schedule = CronSchedule("30 2 * * *")
+    assert schedule.matches(datetime(2025, 3, 1, 2, 30, tzinfo=timezone.utc))
+    assert not schedule.matches(datetime(2025, 3, 1, 2, 31, tzinfo=timezone.utc))
+    assert not schedule.matches(datetime(2025, 3, 1, 3, 30, tzinfo=timezone.utc))
+
+    # Every 15 minutes of the working hours, on weekdays (1 March 2025 is a Saturday).
+    schedule = CronSchedule("*/15 9-17 * * 1-5")
+    assert schedule.matches(datetime(2025, 3, 3, 9, 45, tzinfo=timezone.utc))
+    assert not schedule.matches(datetime(2025, 3, 3, 9, 50, tzinfo=timezone.utc))
+    assert not schedule.matches(datetime(2025, 3, 3, 18, 0, tzinfo=timezone.utc))
+    assert not schedule.matches(datetime(2025, 3, 1, 9, 45, tzinfo=timezone.utc))
+
+    # Sunday is both 0 and 7.
+    for weekday in ["0", "7"]:
+        schedule = CronSchedule(f"0 0 * * {weekday}")
+        assert schedule.matches(datetime(2025, 3, 2, 0, 0, tzinfo=timezone.utc))
+
+    # When both days are restricted, either of them matches.
+    schedule = CronSchedule("0 0 1,15 * 6")
+    assert schedule.matches(datetime(2025, 3, 1, 0, 0, tzinfo=timezone.utc))
+    assert schedule.matches(datetime(2025, 3, 8, 0, 0, tzinfo=timezone.utc))
+    assert schedule.matches(datetime(2025, 3, 15, 0, 0, tzinfo=timezone.utc))
+    assert not schedule.matches(datetime(2025, 3, 2, 0, 0, tzinfo=timezone.utc))
+
+
+def test_last_due():
+    schedule = CronSchedule("0 2,14 * * *")
+    now = datetime(2025, 3, 1, 15, 10, 42, tzinfo=timezone.utc)
+
+    assert schedule.last_due(datetime(2025, 3, 1, 0, 0, tzinfo=timezone.utc), now) == datetime(
+        2025, 3, 1, 14, 0, tzinfo=timezone.utc
+    )
+    # A time that was already due is not due again.
+    assert schedule.last_due(datetime(2025, 3, 1, 14, 0, tzinfo=timezone.utc), now) is None
+    assert schedule.last_due(datetime(2025, 3, 1, 14, 30, tzinfo=timezone.utc), now) is None
@@ -185,12 +185,17 @@ def test_pre_upgrade_check(harness):
             "charm.Patroni.is_creating_backup", new_callable=PropertyMock
         ) as _is_creating_backup,
         patch("charm.Patroni.are_all_members_ready") as _are_all_members_ready,
+        patch("charm.Patroni.get_members_health") as _get_members_health,
     ):
         harness.set_leader(True)
 
         # Set some side effects to test multiple situations.
-        _are_all_members_ready.side_effect = [False, True, True, True, True, True, True]
-        _is_creating_backup.side_effect = [True, False, False, False, False, False]
+        _are_all_members_ready.side_effect = [False, True, True, True, True, True, True, True]
+        _is_creating_backup.side_effect = [True, False, False, False, False, False, False]
+        _get_members_health.side_effect = [
+            {"postgresql-k8s-0": {"healthy": True}, "postgresql-k8s-1": {"healthy": False}},
+            *[{"postgresql-k8s-0": {"healthy": True}, "postgresql-k8s-1": {"healthy": True}}] * 5,
+        ]
         _switchover.side_effect = [None, SwitchoverFailedError]
 
         # Test when not all members are ready.
@@ -213,6 +218,16 @@ def test_pre_upgrade_check(harness):
         _set_list_of_sync_standbys.assert_not_called()
         _set_rolling_update_partition.assert_not_called()
 
+        # Test when the replication is not healthy.
+        try:
+            harness.charm.upgrade.pre_upgrade_check()
+            assert False
+        except ClusterNotReadyError as e:
+            assert e.cause == "replication is not healthy on postgresql-k8s-1"
+        _switchover.assert_not_called()
+        _set_list_of_sync_standbys.assert_not_called()
+        _set_rolling_update_partition.assert_not_called()
+
         # Test when the primary is already the first unit.
         unit_zero_name = f"{harness.charm.app.name}/0"
         _get_primary.return_value = unit_zero_name